@@ -0,0 +1,120 @@
+"""
+Micro-benchmark for the boundary rule engine.
+
+Measures the per-page cost of start detection as the number of start rules
+grows, comparing one re.search per rule ("before") with the engine's single
+combined scan, both page-by-page and batched.
+
+Usage:
+    python benchmarks/bench_boundary_rules.py [pdf_path] [--pages N] [--repeat N]
+
+Page header texts are taken from the PDF (default: data/28-34_ocr.pdf) and repeated
+up to --pages pages, so only the rule evaluation is timed.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pypdfium2 as pdfium
+
+from goms_extractor.boundary_rules import BoundaryRule, BoundaryRuleEngine
+from goms_extractor.splitter import HEADER_BAND_RATIO
+
+DEFAULT_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "28-34_ocr.pdf")
+
+# Start headings seen in GO and gazette PDFs, added to the rule set in this order
+HEADINGS = [
+    "GOVERNMENT OF",
+    "THE ANDHRA PRADESH GAZETTE",
+    "G.O.RT.NO",
+    "GAZETTE OF INDIA",
+    "PUBLISHED BY AUTHORITY",
+    "NOTIFICATION NO",
+    "PROCEEDINGS OF THE",
+    "MEMO NO",
+    "CIRCULAR NO",
+    "TELANGANA GAZETTE",
+    "EXTRAORDINARY",
+    "ORDER NO",
+    "RULES ISSUED UNDER",
+    "ABSTRACT OF",
+    "STATEMENT OF OBJECTS",
+    "OFFICE OF THE",
+]
+
+
+def load_headers(pdf_path: str, num_pages: int):
+    """Extract the header band text of each page, cycled up to num_pages."""
+    doc = pdfium.PdfDocument(pdf_path)
+    headers = []
+    try:
+        for i in range(len(doc)):
+            page = doc[i]
+            textpage = page.get_textpage()
+            width, height = page.get_size()
+            headers.append(textpage.get_text_bounded(0, height * (1 - HEADER_BAND_RATIO), width, height))
+            textpage.close()
+            page.close()
+    finally:
+        doc.close()
+    return [headers[i % len(headers)] for i in range(num_pages)]
+
+
+def best_of(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark boundary rule evaluation cost per page")
+    parser.add_argument("pdf_path", nargs="?", default=DEFAULT_PDF)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    headers = load_headers(args.pdf_path, args.pages)
+    print(f"{len(headers)} page headers from {os.path.basename(args.pdf_path)}")
+    print(f"{'Rules':<5} | {'Per-rule re.search':<18} | {'Engine per page':<15} | {'Engine batch':<12} | {'Same starts'}")
+    print("-" * 75)
+
+    for num_rules in (1, 2, 4, 8, 16):
+        headings = HEADINGS[:num_rules]
+        engine = BoundaryRuleEngine([BoundaryRule(f"r{i}", "start", h) for i, h in enumerate(headings)])
+        per_rule = [re.compile(re.escape(h), re.IGNORECASE) for h in headings]
+
+        def naive():
+            # Every rule has to run to find the earliest heading on the page
+            starts = []
+            for h in headers:
+                matches = [m for m in (rx.search(h[:300]) for rx in per_rule) if m]
+                earliest = min(matches, key=lambda m: m.start()) if matches else None
+                starts.append(earliest is not None)
+            return starts
+
+        def single():
+            return [engine.detect_starts([h])[0] is not None for h in headers]
+
+        def batch():
+            return [start is not None for start in engine.detect_starts(headers)]
+
+        same = naive() == single() == batch()
+        to_us = 1e6 / len(headers)
+        naive_us = best_of(naive, args.repeat) * to_us
+        single_us = best_of(single, args.repeat) * to_us
+        batch_us = best_of(batch, args.repeat) * to_us
+        print(f"{num_rules:<5} | {naive_us:<15.2f} us | {single_us:<12.2f} us | {batch_us:<9.2f} us | {same}")
+
+
+if __name__ == "__main__":
+    main()
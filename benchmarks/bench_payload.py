@@ -0,0 +1,120 @@
+"""
+Benchmark for payload slimming before PDFs are sent to Gemini.
+
+For every PDF and slimming mode (off = the current path), reports the payload
+size, the time spent slimming and the prompt tokens. Tokens are counted with
+Vertex AI count_tokens when --count-tokens is given and GOOGLE_CLOUD_PROJECT is
+set, and estimated (258 per page plus the prompt) otherwise. --generate also
+times a full conversion request per mode. Savings per PDF are recorded through
+the token tracker.
+
+Usage:
+    python benchmarks/bench_payload.py [pdf_path ...] [--modes off,strip,raster,auto]
+        [--dpi N] [--color bilevel|gray] [--count-tokens] [--generate] [--repeat N]
+
+Defaults to data/*.pdf.
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from goms_extractor import payload as payload_module
+from goms_extractor.payload import slim_pdf_payload, PAYLOAD_MODES
+from goms_extractor.md_converter import (
+    GENERATION_CONFIG,
+    _conversion_contents,
+    _count_pages,
+    _response_text,
+    PROMPT_TOKENS_ESTIMATE,
+    PDF_PAGE_INPUT_TOKENS
+)
+from goms_extractor.gemini_client import get_converter_client
+from goms_extractor.token_tracker import TokenTracker
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def best_slim(pdf_bytes: bytes, mode: str, pages: int, repeat: int):
+    """Slim `repeat` times and return the result with the best time."""
+    best = None
+    for _ in range(repeat):
+        result = slim_pdf_payload(pdf_bytes, mode=mode, pages=pages)
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF payload slimming for Gemini requests")
+    parser.add_argument("pdf_paths", nargs="*", default=sorted(glob.glob(os.path.join(DATA_DIR, "*.pdf"))))
+    parser.add_argument("--modes", default=",".join(PAYLOAD_MODES))
+    parser.add_argument("--dpi", type=int, default=None)
+    parser.add_argument("--color", choices=["bilevel", "gray"], default=None)
+    parser.add_argument("--count-tokens", action="store_true", help="Count prompt tokens with Vertex AI")
+    parser.add_argument("--generate", action="store_true", help="Time one conversion request per mode")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.dpi:
+        payload_module.MD_PAYLOAD_DPI = args.dpi
+    if args.color:
+        payload_module.MD_PAYLOAD_COLOR = args.color
+    modes = [mode.strip() for mode in args.modes.split(",")]
+
+    client = get_converter_client()
+    live = (args.count_tokens or args.generate) and client.configured
+    if (args.count_tokens or args.generate) and not client.configured:
+        print("GOOGLE_CLOUD_PROJECT not set: token counts are estimated and --generate is skipped\n")
+    tracker = TokenTracker()
+
+    print(f"{'File':<40} | {'Mode':<6} | {'Applied':<7} | {'Pages':<5} | {'KB':<7} | {'Saved':<6} | {'Slim s':<6} | {'Tokens':<7} | {'Gen s':<6} | {'MD chars'}")
+    print("-" * 125)
+    for pdf_path in args.pdf_paths:
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+        pages = _count_pages(pdf_bytes)
+        original_tokens = None
+        for mode in modes:
+            result = best_slim(pdf_bytes, mode, pages, args.repeat)
+            contents = _conversion_contents(result["pdf_bytes"])
+
+            tokens = PROMPT_TOKENS_ESTIMATE + PDF_PAGE_INPUT_TOKENS * pages
+            if live:
+                tokens = client.model.count_tokens(contents).total_tokens
+            if mode == "off":
+                original_tokens = tokens
+
+            generate_seconds, chars = None, None
+            if args.generate and client.configured:
+                started = time.perf_counter()
+                response = client.generate_content(contents, generation_config=GENERATION_CONFIG)
+                generate_seconds = round(time.perf_counter() - started, 2)
+                chars = len(_response_text(response))
+
+            if mode != "off":
+                tracker.track_payload(
+                    f"{os.path.basename(pdf_path)} [{mode}]",
+                    {k: v for k, v in result.items() if k != "pdf_bytes"},
+                    prompt_tokens=tokens if live else None,
+                    original_prompt_tokens=original_tokens if live else None
+                )
+
+            saved = 100 * result["saved_bytes"] / result["original_bytes"] if result["original_bytes"] else 0
+            print(
+                f"{os.path.basename(pdf_path):<40} | {mode:<6} | {result['applied']:<7} | {pages:<5} | "
+                f"{result['bytes'] / 1024:<7.0f} | {saved:<5.0f}% | {result['seconds']:<6.3f} | "
+                f"{tokens:<7} | {generate_seconds if generate_seconds is not None else '-':<6} | {chars if chars is not None else '-'}"
+            )
+
+    print()
+    print(tracker.get_payload_summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Memory benchmark for split_goms on large inputs.
+
+Builds synthetic compilations by repeating a source PDF up to each target page
+count, then splits each one in a fresh subprocess with and without the
+bounded-memory window, and reports the process peak RSS. With windowing the
+peak should stay roughly flat as the page count grows.
+
+Usage:
+    python benchmarks/bench_split_memory.py [pdf_path ...] [--pages 500 2000 ...] [--window 200]
+
+Defaults to data/GO_123_Dated_the-14--March--2001.pdf (one GO start page)
+followed by data/68-73.pdf (continuation pages), i.e. one 7-page GO per cycle.
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+# Add parent directory to path for imports
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pypdf import PdfReader, PdfWriter
+
+DEFAULT_PDFS = [
+    os.path.join(ROOT, "data", "GO_123_Dated_the-14--March--2001.pdf"),
+    os.path.join(ROOT, "data", "68-73.pdf"),
+]
+
+# Runs in the child process so each measurement starts from a clean heap
+CHILD_SCRIPT = """
+import os, sys, json, contextlib
+sys.path.insert(0, {root!r})
+from goms_extractor.splitter import split_goms
+with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    result = split_goms({pdf!r}, {out!r}, scan_mode={mode!r}, window_pages={window}, use_cache=False, ocr=False)
+print(json.dumps({{"status": result["status"], "gos": len(result.get("go_index", [])), **result.get("memory_stats", {{}})}}))
+"""
+
+
+def build_compilation(source_pdfs, num_pages: int, path: str):
+    """Write a PDF of num_pages pages by cycling through the source PDFs' pages."""
+    pages = [page for source_pdf in source_pdfs for page in PdfReader(source_pdf).pages]
+    writer = PdfWriter()
+    for i in range(num_pages):
+        writer.add_page(pages[i % len(pages)])
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def run_split(pdf_path: str, scan_mode: str, window_pages: int) -> dict:
+    with tempfile.TemporaryDirectory() as out_dir:
+        script = CHILD_SCRIPT.format(root=ROOT, pdf=pdf_path, out=out_dir, mode=scan_mode, window=window_pages)
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark split_goms peak RSS with and without windowing")
+    parser.add_argument("pdf_paths", nargs="*", default=DEFAULT_PDFS)
+    parser.add_argument("--pages", type=int, nargs="+", default=[350, 1400, 5600])
+    parser.add_argument("--window", type=int, default=200)
+    parser.add_argument("--scan-mode", default="header", choices=["header", "full"])
+    args = parser.parse_args()
+
+    print(f"{'Pages':<6} | {'GOs':<5} | {'Standard peak MB':<16} | {f'Window {args.window} peak MB':<18}")
+    print("-" * 55)
+    with tempfile.TemporaryDirectory() as work_dir:
+        for num_pages in args.pages:
+            pdf_path = os.path.join(work_dir, f"compilation_{num_pages}.pdf")
+            build_compilation(args.pdf_paths, num_pages, pdf_path)
+            standard = run_split(pdf_path, args.scan_mode, 0)
+            windowed = run_split(pdf_path, args.scan_mode, args.window)
+            print(f"{num_pages:<6} | {windowed['gos']:<5} | {standard['process_peak_rss_mb']:<16} | {windowed['process_peak_rss_mb']:<18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark for the split_goms boundary scan.
+
+Compares the legacy full-page pdfplumber scan ("before") with the single-open
+header-band scan ("after") and reports pages/sec for each. With --workers N it
+also times the sharded process-pool header scan (pool startup included) and
+reports its speedup over the single-process header scan. "Split p/s" is a whole
+split_goms run with the default flags (selective OCR check, text sidecars,
+written PDFs; split cache off), for the end-to-end cost around the scan.
+
+"Same index" compares the GO indexes of the two scans, with the number of GOs
+found; "n/a" means neither scan found a GO, so the comparison says nothing. The
+scans can legitimately differ: the full scan matches start rules in the first
+300 characters of the page text, the header scan in the first 300 characters of
+the top HEADER_BAND_RATIO (30%) of the page. A GO whose heading sits lower on
+the page (e.g. one starting mid-page after a short preceding text) is found
+only by the full scan.
+
+Usage:
+    python benchmarks/bench_split_scan.py [pdf_path ...] [--repeat N] [--workers N]
+
+Defaults to data/28-34.pdf.
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from goms_extractor.splitter import scan_pages_full, scan_pages_header_band, scan_pages_parallel, build_go_index, split_goms
+
+DEFAULT_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "28-34.pdf")
+
+
+def time_scan(scan_fn, pdf_path: str, repeat: int):
+    """Run a scan function `repeat` times and return (best_seconds, results)."""
+    best = None
+    results = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = scan_fn(pdf_path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def time_split(pdf_path: str, repeat: int) -> float:
+    """Best time of `repeat` default-flag split_goms runs into a scratch directory."""
+    output_dir = tempfile.mkdtemp(prefix="bench_split_")
+    try:
+        best, _ = time_scan(lambda path: split_goms(path, output_dir=output_dir, use_cache=False), pdf_path, repeat)
+        return best
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark split_goms boundary scan modes")
+    parser.add_argument("pdf_paths", nargs="*", default=[DEFAULT_PDF])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=0, help="Also time the process-pool scan with this many workers")
+    args = parser.parse_args()
+
+    header = f"{'File':<40} | {'Pages':<5} | {'Full p/s':<10} | {'Header p/s':<10} | {'Speedup':<7} | {'Same index':<10} | {'Split p/s'}"
+    if args.workers > 1:
+        header += f" | {'Parallel p/s':<12} | {'Par. speedup':<12} | {'Parallelism'}"
+    print(header)
+    print("-" * len(header))
+    for pdf_path in args.pdf_paths:
+        full_seconds, full_results = time_scan(scan_pages_full, pdf_path, args.repeat)
+        header_seconds, header_results = time_scan(scan_pages_header_band, pdf_path, args.repeat)
+
+        num_pages = len(full_results)
+        full_rate = num_pages / full_seconds if full_seconds else float("inf")
+        header_rate = num_pages / header_seconds if header_seconds else float("inf")
+        speedup = full_seconds / header_seconds if header_seconds else float("inf")
+        full_index = build_go_index(full_results, num_pages)
+        header_index = build_go_index(header_results, num_pages)
+        same_index = f"{full_index == header_index} ({len(full_index)})" if full_index or header_index else "n/a"
+
+        split_seconds = time_split(pdf_path, args.repeat)
+        split_rate = num_pages / split_seconds if split_seconds else float("inf")
+        row = f"{os.path.basename(pdf_path):<40} | {num_pages:<5} | {full_rate:<10.1f} | {header_rate:<10.1f} | {speedup:<7.1f} | {same_index!s:<10} | {split_rate:<9.1f}"
+        if args.workers > 1:
+            stats = {}
+
+            def parallel_scan(path):
+                stats.update(scan_pages_parallel(path, num_pages, "header", workers=args.workers))
+                return stats["results"]
+
+            parallel_seconds, parallel_results = time_scan(parallel_scan, pdf_path, args.repeat)
+            parallel_rate = num_pages / parallel_seconds if parallel_seconds else float("inf")
+            # Speedup against the single-process header scan, wall clock including pool startup
+            parallel_speedup = header_seconds / parallel_seconds if parallel_seconds else float("inf")
+            assert parallel_results == header_results
+            row += f" | {parallel_rate:<12.1f} | {parallel_speedup:<12.2f} | {stats['parallelism']}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,7 +24,7 @@ User will provide a PDF file path. Extract the file path from the user input and
 Rules:
 1. Extract the PDF path from user input
 2. Call the split_goms function with the extracted PDF path
-3. OCR preprocessing is COMPULSORY - the function will fail if ocrmypdf is not installed
+3. OCR runs automatically on pages without a usable text layer (ocrmypdf is needed for those pages)
 4. Verify the output directory exists or create it
 5. Process only valid GO documents
 6. Return a summary of the splitting results
@@ -51,7 +51,7 @@ Input:
 Rules: 
 1. Extract the split_result from the previous agent
 2. Call the convert_split_gos_to_markdown function with the split_result
-3. OCR preprocessing is COMPULSORY - the function will fail if ocrmypdf is not installed
+3. OCR has already been applied by the splitter to pages that needed it
 4. Ensure all PDF files are successfully converted to markdown
 5. Return the list of markdown file paths
 
@@ -0,0 +1,549 @@
+"""
+Offline bulk backfill of markdown conversions with batch prediction.
+
+Converting years of archived gazettes through the online generate_content path
+competes with live jobs for the same quota and keeps API workers busy for hours.
+The backfill instead runs every Gemini request for a corpus as one batch job:
+
+1. prepare: each split GO goes through the usual cache / local-first / payload
+   steps (md_converter._prepare_conversion). GOs that still need Gemini become
+   one request line per page chunk in a JSONL file, with their PDFs staged
+   next to it. GOs are prepared a small window at a time (twice the prepare
+   workers), and each GO's PDF bytes are dropped once its lines are written,
+   so memory does not grow with the size of the corpus
+2. submit: the JSONL is staged and submitted as a batch prediction job
+3. wait: the job is polled until it ends
+4. collect: response lines are matched back to their GO and chunk through the
+   request label, and each GO is finished exactly as an online conversion would
+   be (stitched, written as <split name>.md, cached, tokens tracked)
+
+The state of a backfill is kept in a manifest.json in its work directory, so a
+long job can be submitted by one process and collected by another (--resume).
+
+The batch service is pluggable: VertexBatchClient stages files in GCS and runs
+Vertex AI batch prediction; tests use a local fake with the same interface.
+
+Split GO files are only named by GO number and page range, and GO numbers
+restart every year, so a corpus is split one gazette per subdirectory of the
+split directory, and each gazette's markdown goes to the matching subdirectory
+of the output directory.
+
+Usage:
+    python -m goms_extractor.batch_backfill gazette.pdf [more.pdf | dir ...]
+        [--output-dir DIR] [--work-dir DIR] [--no-wait]
+    python -m goms_extractor.batch_backfill --resume WORK_DIR/manifest.json
+"""
+
+import os
+import json
+import time
+import uuid
+import argparse
+from datetime import datetime
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Iterable
+
+from dotenv import load_dotenv
+
+from .gemini_client import GeminiConverterClient, DEFAULT_CONVERTER_MODEL
+from .markdown_cache import summarize_cache_results
+from .payload import summarize_payloads
+from .split_cache import hash_file
+from .token_tracker import TokenTracker, summarize_usage
+from . import md_converter
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+BATCH_PREPARE_WORKERS = int(os.getenv("BATCH_PREPARE_WORKERS", str(os.cpu_count() or 4)))
+
+# Request label carrying the GO/chunk key (echoed back with every response)
+KEY_LABEL = "backfill_key"
+
+
+class BatchJobFailed(RuntimeError):
+    """Raised when a batch job ends without succeeding"""
+
+
+class BatchPredictionClient:
+    """
+    Interface of a batch prediction service.
+
+    Attributes:
+        project_id: Project the job runs in
+        model_name: Gemini model the requests are sent to
+    """
+
+    project_id: Optional[str] = None
+    model_name: str = DEFAULT_CONVERTER_MODEL
+
+    def stage_file(self, local_path: str, name: str) -> str:
+        """Make a local file readable by the service; returns its URI."""
+        raise NotImplementedError
+
+    def submit(self, input_uri: str, job_name: str) -> str:
+        """Submit a JSONL request file as a batch job; returns the job id."""
+        raise NotImplementedError
+
+    def poll(self, job_id: str) -> Dict[str, Any]:
+        """Job state: {"state": "running|succeeded|failed", "error", "output"}."""
+        raise NotImplementedError
+
+    def read_outputs(self, output: str) -> Iterable[Dict[str, Any]]:
+        """Parsed JSONL output lines ({"request", "response" or "status"}) of a finished job."""
+        raise NotImplementedError
+
+
+class VertexBatchClient(BatchPredictionClient):
+    """Vertex AI batch prediction, with inputs and outputs in a GCS bucket"""
+
+    def __init__(
+        self,
+        bucket_name: Optional[str] = None,
+        prefix: str = "batch_backfill",
+        project_id: Optional[str] = None,
+        location: Optional[str] = None,
+        model_name: Optional[str] = None
+    ):
+        """
+        Args:
+            bucket_name: GCS bucket for staged inputs and outputs (default: GCS_BUCKET)
+            prefix: Path prefix inside the bucket
+            project_id: GCP project (default: GOOGLE_CLOUD_PROJECT)
+            location: Vertex AI region (default: GOOGLE_CLOUD_REGION or us-central1)
+            model_name: Gemini model (default: GEMINI_CONVERTER_MODEL)
+        """
+        self.bucket_name = bucket_name or os.getenv("GCS_BUCKET")
+        if not self.bucket_name:
+            raise ValueError("GCS bucket name must be provided either as argument or via GCS_BUCKET environment variable")
+        self.prefix = prefix.strip("/")
+        self.project_id = project_id or os.getenv("GOOGLE_CLOUD_PROJECT")
+        self.location = location or os.getenv("GOOGLE_CLOUD_REGION", "us-central1")
+        self.model_name = model_name or os.getenv("GEMINI_CONVERTER_MODEL", DEFAULT_CONVERTER_MODEL)
+        self._bucket = None
+        self._initialized = False
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            from google.cloud import storage
+            self._bucket = storage.Client(project=self.project_id).bucket(self.bucket_name)
+        return self._bucket
+
+    def _init_vertex(self):
+        if not self._initialized:
+            import vertexai
+            vertexai.init(project=self.project_id, location=self.location)
+            self._initialized = True
+
+    def stage_file(self, local_path: str, name: str) -> str:
+        path = f"{self.prefix}/{name}"
+        self.bucket.blob(path).upload_from_filename(local_path)
+        return f"gs://{self.bucket_name}/{path}"
+
+    def submit(self, input_uri: str, job_name: str) -> str:
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        self._init_vertex()
+        job = BatchPredictionJob.submit(
+            source_model=self.model_name,
+            input_dataset=input_uri,
+            output_uri_prefix=f"gs://{self.bucket_name}/{self.prefix}/{job_name}/output",
+            job_display_name=job_name
+        )
+        return job.resource_name
+
+    def poll(self, job_id: str) -> Dict[str, Any]:
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        self._init_vertex()
+        job = BatchPredictionJob(job_id)
+        if not job.has_ended:
+            return {"state": "running", "error": None, "output": None}
+        if job.has_succeeded:
+            return {"state": "succeeded", "error": None, "output": job.output_location}
+        return {"state": "failed", "error": str(job.error), "output": job.output_location}
+
+    def read_outputs(self, output: str) -> Iterable[Dict[str, Any]]:
+        prefix = output[len(f"gs://{self.bucket_name}/"):].rstrip("/") + "/"
+        for blob in self.bucket.client.list_blobs(self.bucket_name, prefix=prefix):
+            if blob.name.endswith(".jsonl"):
+                for line in blob.download_as_text().splitlines():
+                    if line.strip():
+                        yield json.loads(line)
+
+
+def _request_line(key: str, prompt: str, pdf_uri: str) -> Dict[str, Any]:
+    """One batch request: the same prompt and generation config as the online path."""
+    return {
+        "request": {
+            "contents": [{
+                "role": "user",
+                "parts": [
+                    {"text": prompt},
+                    {"fileData": {"fileUri": pdf_uri, "mimeType": "application/pdf"}}
+                ]
+            }],
+            "generationConfig": {
+                "temperature": md_converter.GENERATION_CONFIG["temperature"],
+                "maxOutputTokens": md_converter.GENERATION_CONFIG["max_output_tokens"]
+            },
+            "labels": {KEY_LABEL: key}
+        }
+    }
+
+
+def _manifest_path(work_dir: str) -> str:
+    return os.path.join(work_dir, "manifest.json")
+
+
+def save_manifest(manifest: Dict[str, Any]) -> str:
+    path = _manifest_path(manifest["work_dir"])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def prepare_backfill(
+    go_pdfs: List[str],
+    client: BatchPredictionClient,
+    output_dir: Optional[str] = None,
+    work_dir: Optional[str] = None,
+    use_cache: bool = True,
+    local_first: Optional[bool] = None,
+    max_workers: Optional[int] = None,
+    output_subdirs: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Resolve what can be resolved without Gemini and write the batch request file.
+
+    Args:
+        go_pdfs: Split GO PDFs to convert
+        client: Batch service; staged PDF URIs end up in the request lines
+        output_dir: Markdown output directory (default: outputs/markdown_goms)
+        work_dir: Directory for the request file, staged PDFs and manifest
+            (default: outputs/batch_backfill/<job name>)
+        use_cache, local_first: As for md_converter.convert_go_to_markdown
+        max_workers: Threads preparing GOs (default: BATCH_PREPARE_WORKERS);
+            at most twice as many GOs are held in memory at once
+        output_subdirs: GO PDF -> subdirectory of output_dir for its markdown
+            (see _split_corpus), so GOs of different gazettes with the same
+            file name do not overwrite each other
+
+    Returns:
+        The manifest: {"job_name", "work_dir", "output_dir", "model_name",
+        "use_cache", "requests", "input_file", "results" (GOs finished without
+        Gemini), "pending" (GOs waiting for batch responses), "job_id", "state"}
+    """
+    job_name = f"goms-backfill-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    if work_dir is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        work_dir = os.path.join(os.path.dirname(script_dir), "outputs", "batch_backfill", job_name)
+    inputs_dir = os.path.join(work_dir, "inputs")
+    os.makedirs(inputs_dir, exist_ok=True)
+
+    # Only used for the cache key's model name and the not-configured check
+    converter_client = GeminiConverterClient(project_id=client.project_id, model_name=client.model_name)
+
+    def prepare(pdf_path: str):
+        go_output_dir = output_dir
+        if output_subdirs and pdf_path in output_subdirs:
+            go_output_dir = os.path.join(output_dir or md_converter._default_output_dir(), output_subdirs[pdf_path])
+        try:
+            return md_converter._prepare_conversion(pdf_path, go_output_dir, None, converter_client, use_cache, local_first)
+        except Exception as e:
+            return {"result": md_converter._conversion_error(f"Error preparing GO for batch conversion: {str(e)}")}
+
+    manifest = {
+        "job_name": job_name,
+        "work_dir": work_dir,
+        "output_dir": output_dir,
+        "model_name": client.model_name,
+        "use_cache": use_cache,
+        "created_at": datetime.now().isoformat(),
+        "requests": 0,
+        "input_file": os.path.join(work_dir, "requests.jsonl"),
+        "results": {},
+        "pending": {},
+        "job_id": None,
+        "state": "prepared"
+    }
+
+    def write_requests(index: int, pdf_path: str, conversion: Dict[str, Any], requests_file):
+        if conversion["result"] is not None:
+            manifest["results"][pdf_path] = conversion["result"]
+            return
+        chunks = []
+        for number, (start, end) in enumerate(conversion["chunks"]):
+            key = f"go-{index:06d}-{number:03d}"
+            prompt, pdf_bytes = md_converter._chunk_prompt_and_pdf(conversion, start, end)
+            staged_path = os.path.join(inputs_dir, f"{key}.pdf")
+            with open(staged_path, "wb") as f:
+                f.write(pdf_bytes)
+            uri = client.stage_file(staged_path, f"{job_name}/inputs/{key}.pdf")
+            requests_file.write(json.dumps(_request_line(key, prompt, uri)) + "\n")
+            chunks.append({"key": key, "start": start, "end": end})
+        manifest["requests"] += len(chunks)
+        manifest["pending"][pdf_path] = {
+            "output_dir": conversion["output_dir"],
+            "cache_key": conversion["cache_key"],
+            "quality": conversion["quality"],
+            "payload": conversion["payload"],
+            "chunks": chunks
+        }
+
+    logger.info("Preparing %d GOs for batch conversion", len(go_pdfs))
+    workers = max_workers or BATCH_PREPARE_WORKERS
+    window = 2 * workers
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            open(manifest["input_file"], "w", encoding="utf-8") as requests_file:
+        for window_start in range(0, len(go_pdfs), window):
+            window_pdfs = go_pdfs[window_start:window_start + window]
+            for offset, conversion in enumerate(executor.map(prepare, window_pdfs)):
+                write_requests(window_start + offset, window_pdfs[offset], conversion, requests_file)
+                conversion.pop("pdf_bytes", None)
+
+    logger.info("%d GOs resolved without Gemini, %d GOs in %d batch requests", len(manifest["results"]), len(manifest["pending"]), manifest["requests"])
+    save_manifest(manifest)
+    return manifest
+
+
+def submit_backfill(manifest: Dict[str, Any], client: BatchPredictionClient) -> Dict[str, Any]:
+    """Stage the request file and submit it; records the job id in the manifest."""
+    if not manifest["requests"]:
+        manifest["state"] = "succeeded"
+        save_manifest(manifest)
+        return manifest
+    input_uri = client.stage_file(manifest["input_file"], f"{manifest['job_name']}/requests.jsonl")
+    manifest["job_id"] = client.submit(input_uri, manifest["job_name"])
+    manifest["state"] = "running"
+    manifest["submitted_at"] = datetime.now().isoformat()
+    logger.info("Submitted batch job %s (%d requests)", manifest["job_id"], manifest["requests"])
+    save_manifest(manifest)
+    return manifest
+
+
+def wait_for_backfill(
+    manifest: Dict[str, Any],
+    client: BatchPredictionClient,
+    poll_seconds: Optional[float] = None,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Poll the batch job until it ends. Raises TimeoutError after timeout seconds
+    (the job keeps running; resume later) and BatchJobFailed if it fails.
+    """
+    poll_seconds = BATCH_POLL_SECONDS if poll_seconds is None else poll_seconds
+    started = time.monotonic()
+    while manifest["state"] == "running":
+        status = client.poll(manifest["job_id"])
+        if status["state"] != "running":
+            manifest["state"] = status["state"]
+            manifest["output"] = status["output"]
+            manifest["error"] = status["error"]
+            manifest["ended_at"] = datetime.now().isoformat()
+            save_manifest(manifest)
+            break
+        if timeout is not None and time.monotonic() - started >= timeout:
+            raise TimeoutError(f"Batch job {manifest['job_id']} still running after {timeout}s")
+        time.sleep(poll_seconds)
+    if manifest["state"] == "failed":
+        raise BatchJobFailed(f"Batch job {manifest['job_id']} failed: {manifest.get('error')}")
+    return manifest
+
+
+def _response_from_json(response: Dict[str, Any]):
+    """Attribute view of a JSON GenerateContentResponse, as md_converter reads online responses."""
+    candidates = response.get("candidates") or []
+    parts = (candidates[0].get("content") or {}).get("parts", []) if candidates else []
+    usage = response.get("usageMetadata") or {}
+    return SimpleNamespace(
+        text="".join(part.get("text", "") for part in parts),
+        candidates=[
+            SimpleNamespace(finish_reason=SimpleNamespace(name=candidate.get("finishReason", "")))
+            for candidate in candidates
+        ],
+        usage_metadata=SimpleNamespace(
+            prompt_token_count=usage.get("promptTokenCount", 0),
+            candidates_token_count=usage.get("candidatesTokenCount", 0),
+            total_token_count=usage.get("totalTokenCount", 0)
+        ) if usage else None
+    )
+
+
+def collect_backfill(manifest: Dict[str, Any], client: BatchPredictionClient) -> Dict[str, Any]:
+    """
+    Write the batch responses back as markdown files.
+
+    Returns:
+        Same dictionary as md_converter.convert_split_gos_to_markdown, plus
+        "batch" ({"job_id", "job_name", "requests", "failed_requests"})
+    """
+    lines = {}
+    if manifest["pending"]:
+        for line in client.read_outputs(manifest["output"]):
+            key = ((line.get("request") or {}).get("labels") or {}).get(KEY_LABEL)
+            if key:
+                lines[key] = line
+
+    converter_client = GeminiConverterClient(project_id=client.project_id, model_name=manifest["model_name"])
+    cache = md_converter.get_markdown_cache() if manifest["use_cache"] and md_converter.MD_CACHE_ENABLED else None
+    results = dict(manifest["results"])
+    failed_requests = 0
+    for pdf_path, pending in manifest["pending"].items():
+        pieces, errors = [], []
+        for chunk in pending["chunks"]:
+            line = lines.get(chunk["key"])
+            if line is None or line.get("status") or not (line.get("response") or {}).get("candidates"):
+                errors.append(f"pages {chunk['start'] + 1}-{chunk['end']}: {(line or {}).get('status') or 'no response'}")
+                continue
+            pieces.append(md_converter._chunk_piece(chunk["start"], chunk["end"], _response_from_json(line["response"])))
+        if errors:
+            failed_requests += len(errors)
+            results[pdf_path] = md_converter._conversion_error(f"Batch conversion failed for {'; '.join(errors)}")
+            continue
+        conversion = {
+            "output_dir": pending["output_dir"],
+            "client": converter_client,
+            "cache": cache,
+            "cache_key": pending["cache_key"],
+            "quality": pending["quality"],
+            "payload": pending["payload"]
+        }
+        try:
+            results[pdf_path] = md_converter._finish_conversion(pdf_path, conversion, pieces)
+            results[pdf_path]["batch_job"] = manifest["job_id"]
+        except Exception as e:
+            results[pdf_path] = md_converter._conversion_error(f"Error writing batch conversion: {str(e)}")
+
+    conversion_results = list(results.values())
+    markdown_files = [result["markdown_path"] for result in conversion_results if result["status"] == "success"]
+    manifest["state"] = "collected"
+    manifest["collected_at"] = datetime.now().isoformat()
+    save_manifest(manifest)
+
+    TokenTracker().log_summary(summarize_usage(conversion_results))
+
+    total_files = len(conversion_results)
+    return {
+        "status": "success" if markdown_files else "error",
+        "message": f"Converted {len(markdown_files)}/{total_files} GO PDFs to markdown (batch job {manifest['job_id']})",
+        "markdown_files": markdown_files,
+        "conversion_results": conversion_results,
+        "cache_stats": summarize_cache_results(conversion_results),
+        "converter_stats": md_converter.summarize_converters(conversion_results),
+        "payload_stats": summarize_payloads(conversion_results),
+        "token_usage": summarize_usage(conversion_results),
+        "batch": {
+            "job_id": manifest["job_id"],
+            "job_name": manifest["job_name"],
+            "requests": manifest["requests"],
+            "failed_requests": failed_requests
+        }
+    }
+
+
+def backfill_markdown(
+    go_pdfs: List[str],
+    client: BatchPredictionClient,
+    output_dir: Optional[str] = None,
+    work_dir: Optional[str] = None,
+    use_cache: bool = True,
+    local_first: Optional[bool] = None,
+    poll_seconds: Optional[float] = None,
+    timeout: Optional[float] = None,
+    output_subdirs: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Convert split GO PDFs to markdown with one batch prediction job: prepare,
+    submit, wait and collect (see the module docstring).
+
+    Returns:
+        Same dictionary as collect_backfill
+    """
+    manifest = prepare_backfill(go_pdfs, client, output_dir, work_dir, use_cache, local_first, output_subdirs=output_subdirs)
+    submit_backfill(manifest, client)
+    wait_for_backfill(manifest, client, poll_seconds, timeout)
+    return collect_backfill(manifest, client)
+
+
+def _gazette_subdir(gazette: str) -> str:
+    """<gazette stem>_<content hash prefix>: unique per gazette, even for equal file names in different directories."""
+    return f"{os.path.splitext(os.path.basename(gazette))[0]}_{hash_file(gazette)[:12]}"
+
+
+def _split_corpus(paths: List[str], split_dir: Optional[str]) -> tuple:
+    """
+    Split every gazette PDF (files, or directories of them) into GO PDFs, each
+    gazette into its own subdirectory of split_dir.
+
+    Returns:
+        (GO PDFs, {GO PDF: gazette subdirectory}) for prepare_backfill's
+        go_pdfs and output_subdirs
+    """
+    from .splitter import split_goms
+
+    if split_dir is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        split_dir = os.path.join(os.path.dirname(script_dir), "outputs", "split_goms")
+    gazettes = []
+    for path in paths:
+        if os.path.isdir(path):
+            gazettes.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".pdf")))
+        else:
+            gazettes.append(path)
+    go_pdfs, output_subdirs = [], {}
+    for gazette in gazettes:
+        subdir = _gazette_subdir(gazette)
+        split_result = split_goms(gazette, output_dir=os.path.join(split_dir, subdir))
+        if split_result.get("status") != "success":
+            logger.warning("Skipping %s: %s", gazette, split_result.get("message"))
+            continue
+        for go_pdf in split_result["split_files"]:
+            # The same gazette given twice has the same subdirectory and GO PDFs
+            if go_pdf not in output_subdirs:
+                go_pdfs.append(go_pdf)
+                output_subdirs[go_pdf] = subdir
+    return go_pdfs, output_subdirs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill GO markdown for a corpus of gazettes with Vertex AI batch prediction")
+    parser.add_argument("paths", nargs="*", help="Gazette PDFs or directories of them")
+    parser.add_argument("--output-dir", default=None, help="Markdown output directory")
+    parser.add_argument("--split-dir", default=None, help="Split GO PDF directory")
+    parser.add_argument("--work-dir", default=None, help="Backfill work directory (request file, manifest)")
+    parser.add_argument("--resume", default=None, help="manifest.json of a submitted backfill to wait for and collect")
+    parser.add_argument("--no-wait", action="store_true", help="Submit and exit; collect later with --resume")
+    parser.add_argument("--poll-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    client = VertexBatchClient()
+    if args.resume:
+        manifest = load_manifest(args.resume)
+    else:
+        if not args.paths:
+            parser.error("give gazette PDFs to backfill, or --resume")
+        go_pdfs, output_subdirs = _split_corpus(args.paths, args.split_dir)
+        manifest = prepare_backfill(go_pdfs, client, args.output_dir, args.work_dir, output_subdirs=output_subdirs)
+        submit_backfill(manifest, client)
+        if args.no_wait:
+            print(f"Submitted. Collect with: python -m goms_extractor.batch_backfill --resume {_manifest_path(manifest['work_dir'])}")
+            return
+    wait_for_backfill(manifest, client, args.poll_seconds)
+    result = collect_backfill(manifest, client)
+    print(result["message"])
+
+
+if __name__ == "__main__":
+    main()
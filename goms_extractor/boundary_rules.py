@@ -0,0 +1,226 @@
+"""
+Boundary rule engine for the GO splitter.
+
+A rule set has two kinds of rules:
+
+- "start" rules are literal headings (e.g. "GOVERNMENT OF", "THE ANDHRA PRADESH
+  GAZETTE"). A page starts a new GO when one of them appears in the first
+  `header_chars` characters of its header text. All start headings are compiled
+  into a single prefix-factored (trie) regex, so one pass over the header finds
+  any of them and the per-page cost barely moves as headings are added.
+- "metadata" rules are regexes with one capture group (e.g. the G.O.Ms.No). They
+  are combined into one alternation and run once over a start page's text; the
+  first match of each rule wins.
+
+Batches of pages are evaluated with a single scan over the joined header texts.
+
+The active rule set comes from BOUNDARY_RULES_FILE (a JSON list of rules) or the
+BOUNDARY_RULE_SET preset name ("default" or "gazette").
+"""
+
+import os
+import re
+import json
+import hashlib
+from bisect import bisect_right
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional, Callable, Sequence
+
+RULE_KINDS = ("start", "metadata")
+# Characters of the header text checked for start headings
+DEFAULT_HEADER_CHARS = 300
+# Joins page headers in batch mode; never part of a heading, so matches cannot span pages
+_PAGE_SEPARATOR = "\x00"
+
+
+@dataclass(frozen=True)
+class BoundaryRule:
+    """One boundary rule: a start heading or a metadata pattern"""
+    name: str
+    kind: str
+    # start rules: literal heading, matched case-insensitively
+    # metadata rules: regex with one capture group, matched case-insensitively
+    pattern: str
+
+
+DEFAULT_RULES = [
+    BoundaryRule("government_heading", "start", "GOVERNMENT OF"),
+    BoundaryRule("goms_no", "metadata", r'G\.O\.Ms\.No\.?\s*(\d+)'),
+    BoundaryRule("gort_no", "metadata", r'G\.O\.Rt\.No\.?\s*(\d+)'),
+]
+
+# Gazette reprints: GOs may also open with the gazette masthead or a bare G.O.Rt.No
+GAZETTE_RULES = DEFAULT_RULES + [
+    BoundaryRule("ap_gazette_masthead", "start", "THE ANDHRA PRADESH GAZETTE"),
+    BoundaryRule("gort_heading", "start", "G.O.RT.NO"),
+]
+
+RULE_SETS = {
+    "default": DEFAULT_RULES,
+    "gazette": GAZETTE_RULES,
+}
+
+
+def _trie_pattern(phrases: Sequence[str]) -> str:
+    """
+    Build a regex matching any of the phrases, with common prefixes factored out
+    (e.g. "GO|GOVT" -> "GO(?:VT)?"), so the regex engine does not re-try every
+    alternative at every position.
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        alternatives = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        # A phrase ends here: the longer continuations are optional
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class BoundaryRuleEngine:
+    """Compiled boundary rules with single-page and batch evaluation"""
+
+    def __init__(self, rules: Sequence[BoundaryRule], header_chars: int = DEFAULT_HEADER_CHARS):
+        """
+        Compile a rule set.
+
+        Args:
+            rules: Start and metadata rules
+            header_chars: Characters of header text checked for start headings
+        """
+        for rule in rules:
+            if rule.kind not in RULE_KINDS:
+                raise ValueError(f"Invalid kind for boundary rule '{rule.name}': {rule.kind!r} (expected one of {RULE_KINDS})")
+        self.rules = list(rules)
+        self.header_chars = header_chars
+
+        start_rules = [r for r in self.rules if r.kind == "start"]
+        # Headers are upper-cased once, so the heading regex runs case-sensitively
+        self._start_names = {r.pattern.upper(): r.name for r in start_rules}
+        self._start_regex = re.compile(_trie_pattern(list(self._start_names))) if start_rules else None
+
+        metadata_rules = [r for r in self.rules if r.kind == "metadata"]
+        self._metadata_regexes = {r.name: re.compile(r.pattern, re.IGNORECASE) for r in metadata_rules}
+        self._metadata_group_names = {f"m{i}": r.name for i, r in enumerate(metadata_rules)}
+        self._metadata_regex = re.compile(
+            "|".join(f"(?P<m{i}>{r.pattern})" for i, r in enumerate(metadata_rules)),
+            re.IGNORECASE
+        ) if metadata_rules else None
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of the rule set, for cache keys."""
+        material = json.dumps({"rules": [asdict(r) for r in self.rules], "header_chars": self.header_chars}, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+    def detect_starts(self, header_texts: Sequence[str]) -> List[Optional[str]]:
+        """
+        Find the start heading of each page in one scan over the whole batch.
+
+        Returns:
+            For each page, the name of the earliest matching start rule, or None
+        """
+        starts: List[Optional[str]] = [None] * len(header_texts)
+        if self._start_regex is None or not header_texts:
+            return starts
+
+        headers = [text[:self.header_chars].upper() for text in header_texts]
+        offsets = []
+        position = 0
+        for header in headers:
+            offsets.append(position)
+            position += len(header) + len(_PAGE_SEPARATOR)
+
+        for match in self._start_regex.finditer(_PAGE_SEPARATOR.join(headers)):
+            page = bisect_right(offsets, match.start()) - 1
+            if starts[page] is None:
+                starts[page] = self._start_names[match.group(0)]
+        return starts
+
+    def extract_metadata(self, text: str) -> Dict[str, str]:
+        """Return the first capture of each metadata rule found in the text."""
+        metadata: Dict[str, str] = {}
+        if self._metadata_regex is None:
+            return metadata
+        for match in self._metadata_regex.finditer(text):
+            name = self._metadata_group_names[match.lastgroup]
+            if name not in metadata:
+                metadata[name] = self._metadata_regexes[name].match(text, match.start()).group(1)
+                if len(metadata) == len(self._metadata_regexes):
+                    break
+        return metadata
+
+    def evaluate_batch(
+        self,
+        header_texts: Sequence[str],
+        full_text: Optional[Callable[[int], str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Evaluate a batch of pages.
+
+        Args:
+            header_texts: Header text of each page
+            full_text: Optional callback returning the full text of page i of the
+                batch; metadata is read from it for start pages (default: the
+                header text)
+
+        Returns:
+            Per page: {"is_start", "start_rule", "metadata"}
+        """
+        results = []
+        for i, start_rule in enumerate(self.detect_starts(header_texts)):
+            metadata = {}
+            if start_rule:
+                metadata = self.extract_metadata(full_text(i) if full_text else header_texts[i])
+            results.append({"is_start": start_rule is not None, "start_rule": start_rule, "metadata": metadata})
+        return results
+
+    def evaluate(self, text: str) -> Dict[str, Any]:
+        """Evaluate a single page (header and metadata read from the same text)."""
+        return self.evaluate_batch([text])[0]
+
+
+def go_number(metadata: Dict[str, str]) -> Optional[str]:
+    """GO label from page metadata: the G.O.Ms.No, else "Rt.<G.O.Rt.No>", else None."""
+    if metadata.get("goms_no"):
+        return metadata["goms_no"]
+    if metadata.get("gort_no"):
+        return f"Rt.{metadata['gort_no']}"
+    return None
+
+
+def load_rules(rule_set: Optional[str] = None, rules_file: Optional[str] = None) -> List[BoundaryRule]:
+    """
+    Load a rule set: a JSON rules file if given (or BOUNDARY_RULES_FILE), otherwise
+    a named preset (or BOUNDARY_RULE_SET, default "default").
+
+    A rules file is a JSON list of {"name", "kind", "pattern"} objects.
+    """
+    rules_file = rules_file or os.getenv("BOUNDARY_RULES_FILE")
+    if rules_file:
+        with open(rules_file, "r", encoding="utf-8") as f:
+            return [BoundaryRule(**rule) for rule in json.load(f)]
+
+    rule_set = rule_set or os.getenv("BOUNDARY_RULE_SET", "default")
+    if rule_set not in RULE_SETS:
+        raise ValueError(f"Unknown boundary rule set: {rule_set!r} (expected one of {tuple(RULE_SETS)})")
+    return list(RULE_SETS[rule_set])
+
+
+_default_engine: Optional[BoundaryRuleEngine] = None
+
+
+def get_boundary_engine() -> BoundaryRuleEngine:
+    """Return the process-wide engine for the configured rule set."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = BoundaryRuleEngine(load_rules())
+    return _default_engine
@@ -0,0 +1,177 @@
+"""
+Live progress of markdown conversions.
+
+Gemini requests are streamed (MD_STREAM_ENABLED): output arrives in chunks
+instead of one response at the end. Each chunk is counted in the GO's progress
+entry and, when the request covers the whole GO, appended to <markdown
+file>.partial as it arrives. A job can therefore report characters and tokens
+generated so far per GO, the time to the first chunk, and requests that have
+stopped producing output (idle_seconds), long before the GO is finished.
+
+The .partial file is a preview: once the conversion finishes the full markdown
+replaces it as the GO's markdown file, and a GO that fails or is cancelled has
+its .partial file removed, so a markdown file is only ever a finished one.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# Output token estimate for chunks that do not report usage
+CHARS_PER_TOKEN = 4
+
+
+def partial_path(markdown_path: str) -> str:
+    """Where a GO's markdown is streamed before it is finished."""
+    return f"{markdown_path}.partial"
+
+
+class ConversionProgress:
+    """Progress entries for one job's GOs, keyed by markdown file name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.gos: Dict[str, Dict[str, Any]] = {}
+
+    def track(self, pdf_path: str, markdown_path: Optional[str] = None) -> "GoProgress":
+        """Register a GO (state "queued") and return its progress handle."""
+        return GoProgress(pdf_path, markdown_path, self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of every entry plus job totals, for the job status endpoint."""
+        now = time.monotonic()
+        with self._lock:
+            gos = {}
+            for name, entry in self.gos.items():
+                view = {k: v for k, v in entry.items() if not k.startswith("_")}
+                if entry["state"] == "streaming" and entry["_last_chunk"] is not None:
+                    view["idle_seconds"] = round(now - entry["_last_chunk"], 3)
+                gos[name] = view
+        states = [entry["state"] for entry in gos.values()]
+        return {
+            "gos": gos,
+            "totals": {
+                "gos": len(gos),
+                "queued": states.count("queued"),
+                "streaming": states.count("streaming"),
+                "done": states.count("done"),
+                "error": states.count("error"),
+                "cancelled": states.count("cancelled"),
+                "chars": sum(entry["chars"] for entry in gos.values()),
+                "output_tokens": sum(entry["output_tokens"] for entry in gos.values())
+            }
+        }
+
+
+class GoProgress:
+    """Progress of one GO; safe to update from several chunk requests at once"""
+
+    def __init__(self, pdf_path: str, markdown_path: Optional[str] = None, owner: Optional[ConversionProgress] = None):
+        self.name = os.path.splitext(os.path.basename(pdf_path))[0]
+        self.markdown_path = markdown_path
+        self._lock = owner._lock if owner else threading.Lock()
+        self._started = time.monotonic()
+        self.entry = {
+            "state": "queued",
+            "chars": 0,
+            "output_tokens": 0,
+            "requests": 0,
+            "first_chunk_seconds": None,
+            "last_chunk_at": None,
+            "markdown_path": None,
+            "_last_chunk": None
+        }
+        if owner is not None:
+            with self._lock:
+                owner.gos[self.name] = self.entry
+
+    def stream(self, write_file: bool = False) -> "MarkdownStream":
+        """Sink for one streamed request; write_file appends its text to the .partial markdown file."""
+        return MarkdownStream(self, self.markdown_path if write_file else None)
+
+    def finish(self, state: str, markdown_path: Optional[str] = None):
+        """
+        Mark the GO "done", "error" or "cancelled" (its job's budget was reached).
+        Unless it is done, any text streamed so far is deleted.
+        """
+        if state != "done" and self.markdown_path:
+            try:
+                os.remove(partial_path(self.markdown_path))
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.entry["state"] = state
+            self.entry["markdown_path"] = markdown_path
+
+    def _add(self, chars: int, tokens: int, first: bool):
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entry
+            entry["chars"] += chars
+            entry["output_tokens"] += tokens
+            if first:
+                entry["requests"] += 1
+                entry["state"] = "streaming"
+            if chars > 0:
+                if entry["first_chunk_seconds"] is None:
+                    entry["first_chunk_seconds"] = round(now - self._started, 3)
+                entry["_last_chunk"] = now
+                entry["last_chunk_at"] = datetime.now().isoformat()
+
+
+class MarkdownStream:
+    """
+    Receives one request's streamed text (see GeminiConverterClient). begin() is
+    called before every attempt, so a retried request starts over instead of
+    counting or writing its text twice, and end() after it.
+
+    The .partial file is opened once per attempt and written through its buffer,
+    so the async path does not open, write and close a file on the event loop
+    for every chunk; the preview can lag the stream by up to one buffer.
+    """
+
+    def __init__(self, progress: GoProgress, output_path: Optional[str] = None):
+        self.progress = progress
+        self.output_path = partial_path(output_path) if output_path else None
+        self.chars = 0
+        self.tokens = 0
+        self._started = False
+        self._file = None
+
+    def begin(self):
+        self.end()
+        self.progress._add(-self.chars, -self.tokens, first=not self._started)
+        self._started = True
+        self.chars = self.tokens = 0
+        if self.output_path:
+            self._file = open(self.output_path, "w", encoding="utf-8")
+
+    def end(self):
+        """Close the attempt's .partial file (the stream finished, failed or was retried)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """
+        Take this request's text back out of the GO's progress, e.g. when its
+        truncated response is re-split and the halves stream their own text.
+        """
+        self.end()
+        self.progress._add(-self.chars, -self.tokens, first=False)
+        self.chars = self.tokens = 0
+
+    def append(self, text: str, output_tokens: Optional[int] = None):
+        """
+        Count (and write) a chunk of text. output_tokens is the cumulative output
+        token count reported with the chunk, if any.
+        """
+        if self._file is not None:
+            self._file.write(text)
+        chars = len(text)
+        tokens = output_tokens if output_tokens is not None else (self.chars + chars) // CHARS_PER_TOKEN
+        self.progress._add(chars, tokens - self.tokens, first=False)
+        self.chars += chars
+        self.tokens = tokens
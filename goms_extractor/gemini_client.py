@@ -0,0 +1,270 @@
+"""
+Shared Vertex AI Gemini client for the markdown converter.
+
+Vertex AI is initialized once per process and a single GenerativeModel handle
+(and with it the underlying gRPC channel) is reused by every conversion, across
+worker threads and jobs. The API creates the client at startup and warms it with
+a preflight call; its state is reported by /health.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from dotenv import load_dotenv
+
+from .rate_limiter import AdaptiveRateLimiter, get_rate_limiter
+from . import metrics
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_CONVERTER_MODEL = "gemini-2.0-flash-exp"
+
+
+class GeminiClientNotConfigured(RuntimeError):
+    """Raised when GOOGLE_CLOUD_PROJECT is not set"""
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text or ""
+    except ValueError:
+        # Chunks without text parts (e.g. the final one carrying only the finish reason)
+        return ""
+
+
+class StreamedResponse:
+    """
+    A streamed generate_content call assembled into one response: the joined
+    text, plus the candidates (finish reason) and usage of the last chunk that
+    reported them.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.candidates = None
+        self.usage_metadata = None
+
+    def add(self, chunk, stream) -> None:
+        text = _chunk_text(chunk)
+        usage = getattr(chunk, "usage_metadata", None) or None
+        if getattr(chunk, "candidates", None):
+            self.candidates = chunk.candidates
+        if usage is not None:
+            self.usage_metadata = usage
+        if text:
+            self.text += text
+            output_tokens = getattr(usage, "candidates_token_count", None) if usage else None
+            stream.append(text, output_tokens if isinstance(output_tokens, int) else None)
+
+
+class GeminiConverterClient:
+    """Long-lived Gemini model handle shared by all markdown conversions"""
+
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        location: Optional[str] = None,
+        model_name: Optional[str] = None,
+        limiter: Optional[AdaptiveRateLimiter] = None
+    ):
+        """
+        Initialize the client. Configuration is read once, here; Vertex AI itself
+        is initialized lazily on first use (or by preflight()).
+
+        Args:
+            project_id: GCP project (default: GOOGLE_CLOUD_PROJECT)
+            location: Vertex AI region (default: GOOGLE_CLOUD_REGION or us-central1)
+            model_name: Gemini model (default: GEMINI_CONVERTER_MODEL or gemini-2.0-flash-exp)
+            limiter: Rate limiter wrapping every generate call (default: the
+                process-wide limiter, see rate_limiter.get_rate_limiter)
+        """
+        self.project_id = project_id or os.getenv("GOOGLE_CLOUD_PROJECT")
+        self.location = location or os.getenv("GOOGLE_CLOUD_REGION", "us-central1")
+        self.model_name = model_name or os.getenv("GEMINI_CONVERTER_MODEL", DEFAULT_CONVERTER_MODEL)
+        self.limiter = limiter or get_rate_limiter()
+        self.created_at = datetime.now().isoformat()
+        self._model = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.last_error: Optional[str] = None
+        self.preflight_result: Optional[Dict[str, Any]] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.project_id)
+
+    @property
+    def model(self):
+        """The shared GenerativeModel, created on first access."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    if not self.configured:
+                        raise GeminiClientNotConfigured("GOOGLE_CLOUD_PROJECT environment variable not set")
+                    import vertexai
+                    from vertexai.generative_models import GenerativeModel
+
+                    logger.info("Initializing Vertex AI (project: %s, location: %s)", self.project_id, self.location)
+                    vertexai.init(project=self.project_id, location=self.location)
+                    self._model = GenerativeModel(self.model_name)
+                    logger.info("Gemini model initialized: %s", self.model_name)
+        return self._model
+
+    def generate_content(self, contents, generation_config: Optional[Dict[str, Any]] = None, estimated_tokens: int = 0, stream=None):
+        """
+        Call generate_content on the shared model through the rate limiter
+        (throttled attempts are retried with backoff), counting calls and errors.
+        
+        Args:
+            contents: Gemini request contents
+            generation_config: Generation config
+            estimated_tokens: Token estimate reserved against the TPM budget
+            stream: Optional sink (see conversion_progress.MarkdownStream). When
+                given, the response is streamed: stream.begin() is called before
+                each attempt, stream.append(text, output_tokens) per chunk and
+                stream.end() when the attempt ends, and a StreamedResponse is
+                returned
+        """
+        model = self.model
+        endpoint = self._call_started()
+
+        def streamed():
+            stream.begin()
+            response = StreamedResponse()
+            try:
+                for chunk in model.generate_content(contents, generation_config=generation_config, stream=True):
+                    response.add(chunk, stream)
+            finally:
+                stream.end()
+            return response
+
+        started, outcome = time.perf_counter(), "error"
+        try:
+            response = self.limiter.call(
+                streamed if stream is not None else lambda: model.generate_content(contents, generation_config=generation_config),
+                estimated_tokens
+            )
+            outcome = "ok"
+            metrics.record_gemini_usage(response)
+            return response
+        except Exception as e:
+            self._record_error(e)
+            raise
+        finally:
+            self._call_finished(endpoint, started, outcome)
+
+    async def generate_content_async(self, contents, generation_config: Optional[Dict[str, Any]] = None, estimated_tokens: int = 0, stream=None):
+        """
+        Await generate_content_async on the shared model through the rate limiter.
+        No thread is held while the request is in flight; callers may further bound
+        concurrency with a semaphore (see md_converter.get_conversion_semaphore).
+        stream works as in generate_content.
+        """
+        model = self.model
+        endpoint = self._call_started()
+
+        async def streamed():
+            stream.begin()
+            response = StreamedResponse()
+            try:
+                async for chunk in await model.generate_content_async(contents, generation_config=generation_config, stream=True):
+                    response.add(chunk, stream)
+            finally:
+                stream.end()
+            return response
+
+        started, outcome = time.perf_counter(), "error"
+        try:
+            response = await self.limiter.call_async(
+                streamed if stream is not None else lambda: model.generate_content_async(contents, generation_config=generation_config),
+                estimated_tokens
+            )
+            outcome = "ok"
+            metrics.record_gemini_usage(response)
+            return response
+        except Exception as e:
+            self._record_error(e)
+            raise
+        finally:
+            self._call_finished(endpoint, started, outcome)
+
+    def _call_started(self) -> str:
+        endpoint = metrics.current_endpoint()
+        with self._stats_lock:
+            self.calls += 1
+            self.in_flight += 1
+        metrics.GEMINI_IN_FLIGHT.inc(endpoint=endpoint)
+        return endpoint
+
+    def _call_finished(self, endpoint: str, started: float, outcome: str):
+        with self._stats_lock:
+            self.in_flight -= 1
+        metrics.GEMINI_IN_FLIGHT.dec(endpoint=endpoint)
+        metrics.GEMINI_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, outcome=outcome)
+
+    def _record_error(self, error: Exception):
+        with self._stats_lock:
+            self.errors += 1
+            self.last_error = str(error)
+
+    def preflight(self) -> Dict[str, Any]:
+        """
+        Warm the client: initialize Vertex AI, build the model and make one cheap
+        count_tokens round trip, so auth and the channel are ready before the
+        first GO arrives. Never raises.
+
+        Returns:
+            {"status": "ok|error|not_configured", "seconds", "checked_at", "error"}
+        """
+        started = time.perf_counter()
+        result = {"status": "ok", "seconds": None, "checked_at": datetime.now().isoformat(), "error": None}
+        try:
+            self.model.count_tokens("preflight")
+        except GeminiClientNotConfigured as e:
+            result.update({"status": "not_configured", "error": str(e)})
+        except Exception as e:
+            result.update({"status": "error", "error": str(e)})
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        self.preflight_result = result
+        logger.info("Gemini preflight %s in %ss", result["status"], result["seconds"])
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        """Client state for /health."""
+        return {
+            "configured": self.configured,
+            "initialized": self._model is not None,
+            "model": self.model_name,
+            "project_id": self.project_id,
+            "location": self.location,
+            "created_at": self.created_at,
+            "preflight": self.preflight_result,
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "last_error": self.last_error
+        }
+
+
+_shared_client: Optional[GeminiConverterClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_converter_client() -> GeminiConverterClient:
+    """Return the process-wide converter client."""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = GeminiConverterClient()
+    return _shared_client
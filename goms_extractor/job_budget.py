@@ -0,0 +1,112 @@
+"""
+Per-job token budget and deadline for markdown conversion.
+
+A direct job can be given a Gemini token budget (max_tokens) and a wall-clock
+deadline (deadline_seconds, counted from the start of the job, split included).
+The async converters check the budget before every Gemini request and charge it
+with each response's total tokens. Once either limit is reached the budget is
+stopped with a reason ("token_budget" or "deadline") and no further request is
+sent: GOs still waiting for one are cancelled. Requests already in flight when
+the token budget runs out are allowed to finish, since their tokens are spent
+anyway; at the deadline everything still running is cancelled. The job then
+returns what was finished so far, marked with the reason.
+
+The budget lives on the job's event loop; it is not meant to be shared between
+threads.
+"""
+
+import os
+import time
+from typing import Dict, Any, Optional
+
+from .token_tracker import response_usage
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Defaults for jobs that do not set their own limits (0 = unlimited)
+JOB_MAX_TOKENS = int(os.getenv("JOB_MAX_TOKENS", "0"))
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "0"))
+
+TOKEN_BUDGET = "token_budget"
+DEADLINE = "deadline"
+
+
+class BudgetExceeded(Exception):
+    """Raised instead of sending a Gemini request once the job's budget is stopped"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Job {reason} reached")
+        self.reason = reason
+
+
+class JobBudget:
+    """Token and wall-clock limits of one job"""
+
+    def __init__(self, max_tokens: Optional[int] = None, deadline_seconds: Optional[float] = None):
+        self.max_tokens = max_tokens or None
+        self.deadline_seconds = deadline_seconds or None
+        self._started = time.monotonic()
+        self.tokens_used = 0
+        self.requests = 0
+        self.reason: Optional[str] = None
+        self.stopped_after_seconds: Optional[float] = None
+        self.cancelled_gos = 0
+
+    @classmethod
+    def from_limits(cls, max_tokens: Optional[int] = None, deadline_seconds: Optional[float] = None) -> Optional["JobBudget"]:
+        """Budget for a job, falling back to JOB_MAX_TOKENS / JOB_DEADLINE_SECONDS; None without limits."""
+        max_tokens = max_tokens if max_tokens is not None else JOB_MAX_TOKENS
+        deadline_seconds = deadline_seconds if deadline_seconds is not None else JOB_DEADLINE_SECONDS
+        if not max_tokens and not deadline_seconds:
+            return None
+        return cls(max_tokens, deadline_seconds)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.deadline_seconds is None:
+            return None
+        return max(self.deadline_seconds - self.elapsed(), 0.0)
+
+    def stop(self, reason: str):
+        """Stop the job for reason; the first reason wins."""
+        if self.reason is not None:
+            return
+        self.reason = reason
+        self.stopped_after_seconds = round(self.elapsed(), 3)
+        logger.warning("Job %s reached after %ss and %d tokens, stopping", reason, self.stopped_after_seconds, self.tokens_used)
+
+    def check(self) -> Optional[str]:
+        """The reason the job was stopped, stopping it first if the deadline has passed."""
+        if self.reason is None and self.deadline_seconds is not None and self.elapsed() >= self.deadline_seconds:
+            self.stop(DEADLINE)
+        return self.reason
+
+    def ensure(self):
+        """Raise BudgetExceeded if the job is stopped; called before each Gemini request."""
+        reason = self.check()
+        if reason is not None:
+            raise BudgetExceeded(reason)
+
+    def charge(self, response):
+        """Count a Gemini response's tokens, stopping the job once max_tokens is reached."""
+        usage = response_usage(response)
+        self.requests += 1
+        if usage:
+            self.tokens_used += usage["total_tokens"]
+        if self.max_tokens is not None and self.tokens_used >= self.max_tokens:
+            self.stop(TOKEN_BUDGET)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.max_tokens,
+            "deadline_seconds": self.deadline_seconds,
+            "tokens_used": self.tokens_used,
+            "requests": self.requests,
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "stopped": self.reason,
+            "stopped_after_seconds": self.stopped_after_seconds,
+            "cancelled_gos": self.cancelled_gos
+        }
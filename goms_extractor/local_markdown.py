@@ -0,0 +1,221 @@
+"""
+Local, layout-aware PDF to markdown conversion for GOs with a usable text layer.
+
+Many split GOs already carry clean text (born-digital or OCR'd upstream), and
+plain extracted text is close to what Gemini returns for them. This module
+builds the same kind of markdown from pdfplumber's text lines, positions and
+tables, without calling the LLM:
+
+- centred, upper-case lines and the standard GO headings (ABSTRACT, ORDER,
+  NOTIFICATION, ...) become ``##`` headings
+- G.O.Ms.No / G.O.Rt.No references are bolded
+- tables found by pdfplumber are rendered as markdown tables
+- vertical gaps between lines become paragraph breaks
+
+Each GO is scored (0-1) for how trustworthy its text layer is before any layout
+work, from the splitter's text sidecar when there is one (pdfium text otherwise),
+and md_converter falls back to Gemini when the score is below LOCAL_MD_MIN_QUALITY.
+"""
+
+import io
+import re
+import os
+import statistics
+from typing import Dict, Any, List, Optional
+
+import pdfplumber
+import pypdfium2 as pdfium
+
+from .ocr import text_layer_quality
+from .text_sidecar import text_sidecar_path, read_text_sidecar
+
+LOCAL_MD_MIN_QUALITY = float(os.getenv("LOCAL_MD_MIN_QUALITY", "0.9"))
+
+# Headings GOs use even when they are not centred
+_HEADING_PATTERN = re.compile(
+    r'^(GOVERNMENT OF\b.*|ABSTRACT|ORDERS?:?-?|NOTIFICATION|AMENDMENTS?|ANNEXURE.*|MEMORANDUM|'
+    r'READ(?: THE FOLLOWING)?:?-?|\(BY ORDER AND IN THE NAME OF THE GOVERNOR.*)$',
+    re.IGNORECASE
+)
+_GO_REFERENCE = re.compile(r'(G\.?O\.?\s*(?:Ms|Rt)\.?\s*No\.?\s*\d+)', re.IGNORECASE)
+
+# A token is "clean" if it reads like a word, a number or a reference
+_CLEAN_TOKEN = re.compile(
+    r"^(?:[A-Za-z]+(?:['’-][A-Za-z]+)*"    # words, hyphenated words, possessives
+    r"|\d+(?:st|nd|rd|th)?"                 # numbers, ordinals
+    r"|[\d.,/:-]+"                          # dates, rule numbers, amounts
+    r"|(?:[A-Za-z]{1,4}\.)+[A-Za-z]*\d*"    # abbreviations: G.O.Ms.No.123, dt.
+    r"|\(?[ivxlcdm]+\)|\(?[a-z0-9]{1,3}\))$",  # list markers: (i) (a) 1)
+    re.IGNORECASE
+)
+_TOKEN_STRIP = "\"'“”‘’.,;:!?()[]"
+
+
+def _is_heading(text: str, x0: float, x1: float, block_center: float, block_width: float) -> bool:
+    if len(text) > 90:
+        return False
+    if _HEADING_PATTERN.match(text):
+        return True
+    letters = [c for c in text if c.isalpha()]
+    if len(letters) < 4 or sum(c.isupper() for c in letters) / len(letters) < 0.9:
+        return False
+    centred = abs((x0 + x1) / 2 - block_center) <= 0.08 * block_width
+    indented = x0 - (block_center - block_width / 2) > 0.1 * block_width
+    return centred and indented
+
+
+def _table_to_markdown(rows: List[List[Optional[str]]]) -> str:
+    rows = [[(cell or "").replace("\n", " ").replace("|", "\\|").strip() for cell in row] for row in rows if row]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * width]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+    return "\n".join(lines)
+
+
+def _inside(line: Dict[str, Any], bbox) -> bool:
+    x0, top, x1, bottom = bbox
+    cx, cy = (line["x0"] + line["x1"]) / 2, (line["top"] + line["bottom"]) / 2
+    return x0 <= cx <= x1 and top <= cy <= bottom
+
+
+def page_to_markdown(page) -> str:
+    """Render one pdfplumber page as markdown blocks."""
+    tables = page.find_tables()
+    lines = [line for line in page.extract_text_lines(strip=True, return_chars=False) if line["text"]]
+    body = [line for line in lines if not any(_inside(line, table.bbox) for table in tables)]
+
+    # Text block geometry, for centring (GOs are rarely centred on the page itself)
+    wide = [line for line in body if len(line["text"]) > 20] or body
+    if wide:
+        left, right = min(line["x0"] for line in wide), max(line["x1"] for line in wide)
+    else:
+        left, right = 0, page.width
+    block_center, block_width = (left + right) / 2, max(right - left, 1)
+    heights = [line["bottom"] - line["top"] for line in body]
+    line_height = statistics.median(heights) if heights else 10
+
+    # Lines and tables in reading order
+    items = [(line["top"], "line", line) for line in body] + [(table.bbox[1], "table", table) for table in tables]
+    items.sort(key=lambda item: item[0])
+
+    blocks: List[str] = []
+    current: List[str] = []
+    previous_bottom = None
+
+    def flush():
+        if current:
+            blocks.append("\n".join(current))
+            current.clear()
+
+    for top, kind, item in items:
+        if kind == "table":
+            flush()
+            rendered = _table_to_markdown(item.extract())
+            if rendered:
+                blocks.append(rendered)
+            previous_bottom = item.bbox[3]
+            continue
+        text = item["text"]
+        if _is_heading(text, item["x0"], item["x1"], block_center, block_width):
+            flush()
+            blocks.append(f"## {text}")
+        else:
+            if previous_bottom is not None and top - previous_bottom > line_height:
+                flush()
+            current.append(_GO_REFERENCE.sub(r"**\1**", text))
+        previous_bottom = item["bottom"]
+    flush()
+    return "\n\n".join(blocks)
+
+
+def text_quality_score(page_texts: List[str]) -> Dict[str, Any]:
+    """
+    Score extracted text (0-1): share of pages with a usable text layer x
+    character validity x share of clean word tokens. OCR noise and garbled font
+    encodings pull the token and character terms down; scanned pages without a
+    text layer pull coverage down.
+    """
+    page_qualities = [text_layer_quality(text) for text in page_texts]
+    pages = len(page_texts)
+    usable = [q for q in page_qualities if not q["needs_ocr"]]
+    coverage = len(usable) / pages if pages else 0.0
+    chars = sum(q["chars"] for q in page_qualities)
+    char_quality = (sum(q["chars"] * q["valid_ratio"] for q in page_qualities) / chars) if chars else 0.0
+
+    tokens = [token.strip(_TOKEN_STRIP) for text in page_texts for token in text.split()]
+    tokens = [token for token in tokens if token]
+    clean = sum(1 for token in tokens if _CLEAN_TOKEN.match(token))
+    token_quality = clean / len(tokens) if tokens else 0.0
+
+    return {
+        "score": round(coverage * char_quality * token_quality, 3),
+        "pages": pages,
+        "text_pages": len(usable),
+        "coverage": round(coverage, 3),
+        "char_quality": round(char_quality, 3),
+        "token_quality": round(token_quality, 3),
+        "chars": chars
+    }
+
+
+def extract_page_texts(pdf_path: Optional[str] = None, pdf_bytes: Optional[bytes] = None) -> List[str]:
+    """
+    Per-page text of a GO for scoring. Read from the GO's text sidecar when the
+    splitter wrote one next to pdf_path (also for virtual splits, whose sidecars
+    sit at the manifest's split_file path), otherwise extracted with pdfium
+    (milliseconds per page, unlike a full pdfplumber layout parse).
+    """
+    if pdf_path:
+        sidecar = text_sidecar_path(pdf_path)
+        if os.path.exists(sidecar):
+            return [page["text"] for page in read_text_sidecar(sidecar)]
+    doc = pdfium.PdfDocument(pdf_bytes if pdf_bytes is not None else pdf_path)
+    try:
+        texts = []
+        for page in doc:
+            textpage = page.get_textpage()
+            try:
+                texts.append(textpage.get_text_range())
+            finally:
+                textpage.close()
+                page.close()
+        return texts
+    finally:
+        doc.close()
+
+
+def convert_pdf_to_markdown_local(
+    pdf_path: Optional[str] = None,
+    pdf_bytes: Optional[bytes] = None,
+    min_quality: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Convert a GO PDF to markdown from its text layer. The text is scored first;
+    the (slower) layout pass only runs if the score reaches min_quality.
+
+    Args:
+        pdf_path: GO PDF path (used when pdf_bytes is not given)
+        pdf_bytes: GO PDF content
+        min_quality: Score needed to build markdown (default: LOCAL_MD_MIN_QUALITY)
+
+    Returns:
+        {"markdown": str or None if the score is too low, "quality": text_quality_score(...)}
+    """
+    min_quality = LOCAL_MD_MIN_QUALITY if min_quality is None else min_quality
+    quality = text_quality_score(extract_page_texts(pdf_path, pdf_bytes))
+    if quality["score"] < min_quality:
+        return {"markdown": None, "quality": quality}
+
+    source = io.BytesIO(pdf_bytes) if pdf_bytes is not None else pdf_path
+    page_markdown = []
+    with pdfplumber.open(source) as pdf:
+        for page in pdf.pages:
+            try:
+                page_markdown.append(page_to_markdown(page))
+            finally:
+                page.close()
+    markdown = "\n\n".join(block for block in page_markdown if block).strip()
+    return {"markdown": markdown, "quality": quality}
@@ -0,0 +1,218 @@
+"""
+Structured, non-blocking logging for the extraction pipeline.
+
+Every module logs through get_logger(__name__), below the "goms_extractor"
+logger. Records are put on a bounded in-memory queue by the calling thread and
+formatted and written to stderr by one background thread (a QueueListener), so
+conversion threads never wait on console I/O or on each other's writes. If the
+queue is full the record is dropped and counted (dropped_records(), served as
+goms_log_records_dropped on /metrics) rather than blocking the pipeline.
+
+Records carry the job and GO they were logged for. log_context(job=..., go=...)
+sets them for the calling context; asyncio tasks inherit them, and work handed
+to a thread pool keeps them when submitted through tracing.bind(). With
+LOG_FORMAT=json each record is one JSON object with the context as fields;
+otherwise it is a text line ending in [job=... go=...].
+
+Messages that would otherwise be written once per page or per GO go through
+sample(): only the first and then every LOG_SAMPLE_EVERY-th call for a key is
+logged. Counts are kept per job, so each job's first message for a key is
+written. Debug calls check the level first and format lazily, so with LOG_LEVEL
+above DEBUG they cost a level comparison.
+
+Settings: LOG_LEVEL (INFO), LOG_FORMAT (text or json), LOG_QUEUE_SIZE (10000),
+LOG_SAMPLE_EVERY (50).
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import contextlib
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "50"))
+
+ROOT_LOGGER = "goms_extractor"
+
+CONTEXT_FIELDS = ("job", "go")
+
+_context: contextvars.ContextVar = contextvars.ContextVar("goms_log_context", default={})
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Attach fields (job, go) to every record logged from the with block."""
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current_context() -> Dict[str, Any]:
+    return dict(_context.get())
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the calling context's fields onto the record. It is attached to the
+    QueueHandler, so it runs in the thread that logs, where the contextvars are
+    set, before the record is queued for the listener thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = " ".join(f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS if getattr(record, field, None))
+        if getattr(record, "sample_every", None):
+            context = f"{context} sampled=1/{record.sample_every}".strip()
+        return f"{line} [{context}]" if context else line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for field in CONTEXT_FIELDS + ("sample_every",):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: records that do not fit are counted and dropped."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in this process, so the record needs no pickling, but
+        # its %-args are merged here: callers may change them (lists, usage
+        # dicts) before the writer thread gets to the record. The level check
+        # has already run, so this only costs for records that are written
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_setup_lock = threading.Lock()
+_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None, queue_size: Optional[int] = None):
+    """
+    (Re)configure the goms_extractor logger: a non-blocking queue handler in front
+    of one background writer. Called on import with the LOG_* settings.
+    """
+    global _handler, _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+        logger = logging.getLogger(ROOT_LOGGER)
+        if _handler is not None:
+            logger.removeHandler(_handler)
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+        _handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size or LOG_QUEUE_SIZE))
+        _handler.addFilter(ContextFilter())
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=False)
+        _listener.start()
+
+        logger.addHandler(_handler)
+        logger.setLevel(level or LOG_LEVEL)
+        logger.propagate = False
+
+
+def flush_logging():
+    """Wait until every queued record has been written (tests, shutdown)."""
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener.start()
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module; names outside the package are nested under it."""
+    if name != ROOT_LOGGER and not name.startswith(ROOT_LOGGER + "."):
+        name = f"{ROOT_LOGGER}.{name}"
+    return logging.getLogger(name)
+
+
+# Sample counts per job (None outside a job); the oldest job's counts are
+# dropped once this many jobs have been seen
+SAMPLE_JOBS = 256
+
+_sample_counts: Dict[Optional[str], Dict[str, int]] = {}
+_sample_lock = threading.Lock()
+
+
+def sample(logger: logging.Logger, key: str, msg: str, *args, level: int = logging.DEBUG, every: Optional[int] = None):
+    """
+    Log msg for the first call with key in the current job and then every
+    `every` (LOG_SAMPLE_EVERY) calls.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    every = every or LOG_SAMPLE_EVERY
+    job = _context.get().get("job")
+    with _sample_lock:
+        counts = _sample_counts.get(job)
+        if counts is None:
+            if len(_sample_counts) >= SAMPLE_JOBS:
+                del _sample_counts[next(iter(_sample_counts))]
+            counts = _sample_counts[job] = {}
+        count = counts.get(key, 0)
+        counts[key] = count + 1
+    if count % every == 0:
+        logger.log(level, msg, *args, extra={"sample_every": every} if every > 1 else None)
+
+
+setup_logging()
+atexit.register(lambda: _listener.stop() if _listener is not None else None)
@@ -0,0 +1,142 @@
+"""
+Content-addressed cache of markdown conversions.
+
+Gazettes reprint the same GO and failed jobs get re-run, so the same pages reach
+the converter again and again. Entries are keyed by a hash of the GO's
+normalized page content (page content streams and the image/form XObjects they
+draw, not the PDF's file-level bytes, which differ with every re-split or
+reprint) together with the prompt, model name and generation config. A hit
+returns the stored markdown without calling Vertex AI.
+
+Storage, LRU clock and eviction come from split_cache.JsonFileCache, shared
+with the split cache (one JSON file per entry, mtime as the LRU clock, oldest
+entries evicted past the size cap).
+"""
+
+import os
+import io
+import json
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+from pypdf import PdfReader
+from pypdf.generic import IndirectObject
+
+from .split_cache import JsonFileCache
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+
+def _hash_xobjects(resources, digest, seen: set):
+    """Feed the data of every XObject reachable from a resources dict into the digest."""
+    if resources is None:
+        return
+    xobjects = resources.get_object().get("/XObject")
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in sorted(xobjects.keys()):
+        ref = xobjects.raw_get(name)
+        if isinstance(ref, IndirectObject):
+            if (ref.idnum, ref.generation) in seen:
+                continue
+            seen.add((ref.idnum, ref.generation))
+        xobject = ref.get_object()
+        digest.update(xobject.get("/Subtype", "").encode("latin-1"))
+        digest.update(xobject.get_data())
+        # Form XObjects can draw further images
+        _hash_xobjects(xobject.get("/Resources"), digest, seen)
+
+
+def page_content_hash(pdf_bytes: bytes) -> str:
+    """
+    Hash the normalized page content of a PDF: each page's size, decoded content
+    stream and drawn XObjects, in page order. Document IDs, timestamps, object
+    numbering and compression differences do not change the hash. Falls back to
+    hashing the raw bytes if the PDF cannot be parsed.
+    """
+    digest = hashlib.sha256()
+    try:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        for page in reader.pages:
+            digest.update(b"\x00page")
+            digest.update(repr([float(v) for v in page.mediabox]).encode("ascii"))
+            digest.update(str(page.get("/Rotate", 0)).encode("ascii"))
+            contents = page.get_contents()
+            if contents is not None:
+                digest.update(contents.get_data())
+            _hash_xobjects(page.get("/Resources"), digest, set())
+    except Exception as e:
+        logger.debug("Could not normalize PDF content for caching, hashing raw bytes: %s", e)
+        return hashlib.sha256(pdf_bytes).hexdigest()
+    return digest.hexdigest()
+
+
+class MarkdownCache(JsonFileCache):
+    """Size-capped, LRU-evicted, on-disk cache of markdown conversions"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: Optional[int] = None):
+        """
+        Initialize the markdown cache.
+
+        Args:
+            cache_dir: Directory holding cache entries (default: MD_CACHE_DIR
+                or outputs/md_cache)
+            max_entries: Maximum number of entries kept (default: MD_CACHE_MAX_ENTRIES or 4096)
+        """
+        if cache_dir is None:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            project_root = os.path.dirname(script_dir)
+            cache_dir = os.getenv("MD_CACHE_DIR", os.path.join(project_root, "outputs", "md_cache"))
+        super().__init__(cache_dir, max_entries or int(os.getenv("MD_CACHE_MAX_ENTRIES", "4096")))
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash: str, prompt: str, model_name: str, generation_config: Dict[str, Any]) -> str:
+        """Build a cache key from the page content hash and everything sent alongside it."""
+        material = json.dumps({
+            "content": content_hash,
+            "prompt": prompt,
+            "model": model_name,
+            "generation_config": generation_config
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached conversion for a key, counting the hit or miss."""
+        value = super().get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Process-wide hit/miss counters since startup."""
+        return {"hits": self.hits, "misses": self.misses, "cache_dir": self.cache_dir, "max_entries": self.max_entries}
+
+
+_shared_cache: Optional[MarkdownCache] = None
+
+
+def get_markdown_cache() -> MarkdownCache:
+    """Return the process-wide markdown cache."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = MarkdownCache()
+    return _shared_cache
+
+
+def summarize_cache_results(conversion_results) -> Dict[str, int]:
+    """Per-job hit/miss counts from a list of conversion results."""
+    states = [result.get("cache") for result in conversion_results if result]
+    return {
+        "hits": states.count("hit"),
+        "misses": states.count("miss"),
+        "disabled": states.count("disabled")
+    }
@@ -4,76 +4,37 @@ Converts split GO PDFs into markdown files using Vertex AI Gemini 2.5-flash.
 """
 
 import os
+import io
 import re
-from typing import Dict, Any, List, Optional
+import time
+import asyncio
+import functools
+import threading
+import contextlib
+from typing import Dict, Any, List, Optional, Iterable
 from dotenv import load_dotenv
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+from vertexai.generative_models import Part
+from pypdf import PdfReader, PdfWriter
 import base64
 
+from .gemini_client import GeminiConverterClient, get_converter_client
+from .markdown_cache import get_markdown_cache, page_content_hash, summarize_cache_results
+from .local_markdown import convert_pdf_to_markdown_local
+from .conversion_progress import ConversionProgress, GoProgress, partial_path
+from .payload import slim_pdf_payload, payload_settings, summarize_payloads
+from .job_budget import JobBudget, BudgetExceeded, DEADLINE
+from . import metrics, tracing
+from .log import get_logger, log_context, sample
+from .token_tracker import TokenTracker, empty_usage, add_usage, split_usage, summarize_usage
+
 # Load environment variables
 load_dotenv()
 
+logger = get_logger(__name__)
 
-def convert_go_to_markdown(pdf_path: str, output_dir: Optional[str] = None) -> Dict[str, Any]:
-    """
-    Convert a single GO PDF file to markdown format using Vertex AI Gemini 2.5-flash.
-    
-    Args:
-        pdf_path: Path to the GO PDF file
-        output_dir: Directory to save the markdown file (default: outputs/markdown_goms)
-    
-    Returns:
-        Dictionary containing:
-        {
-            "status": "success|error",
-            "message": "Description of what happened",
-            "markdown_path": "Path to the created markdown file",
-            "goms_no": "GO number extracted from the document"
-        }
-    """
-    print(f"DEBUG: Converting PDF to markdown using Gemini 2.5-flash: {pdf_path}")
-    try:
-        # Set default output directory
-        if output_dir is None:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(script_dir)
-            output_dir = os.path.join(project_root, "outputs", "markdown_goms")
-        
-        os.makedirs(output_dir, exist_ok=True)
-        print(f"DEBUG: Output directory created/verified: {output_dir}")
-        
-        # Initialize Vertex AI
-        project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-        location = os.getenv("GOOGLE_CLOUD_REGION", "us-central1")
-        
-        if not project_id:
-            return {
-                "status": "error",
-                "message": "GOOGLE_CLOUD_PROJECT environment variable not set",
-                "markdown_path": None,
-                "goms_no": None
-            }
-        
-        print(f"DEBUG: Initializing Vertex AI (project: {project_id}, location: {location})")
-        vertexai.init(project=project_id, location=location)
-        
-        # Initialize Gemini model
-        model = GenerativeModel("gemini-2.0-flash-exp")
-        print(f"DEBUG: Gemini model initialized")
-        
-        # Read PDF file as bytes
-        with open(pdf_path, 'rb') as f:
-            pdf_bytes = f.read()
-        
-        # Create PDF part for Gemini
-        pdf_part = Part.from_data(
-            data=pdf_bytes,
-            mime_type="application/pdf"
-        )
-        
-        # Create prompt for markdown conversion
-        prompt = """Convert this Government Order (GO) PDF document into well-formatted markdown.
+# Markdown conversion prompt and generation config (both are part of the
+# markdown cache key, so changing either invalidates cached conversions)
+CONVERSION_PROMPT = """Convert this Government Order (GO) PDF document into well-formatted markdown.
 
 Instructions:
 1. Extract ALL text content from the document
@@ -90,75 +51,595 @@ Instructions:
 
 Output the complete markdown representation of this document."""
 
-        print(f"DEBUG: Sending PDF to Gemini for conversion...")
-        
-        # Generate content using Gemini
-        response = model.generate_content(
-            [prompt, pdf_part],
-            generation_config={
-                "temperature": 0.0,
-                "max_output_tokens": 8192,
-            }
-        )
-        
-        # Extract markdown content from response
-        if not response.text:
-            return {
-                "status": "error",
-                "message": "No content extracted from PDF by Gemini",
-                "markdown_path": None,
-                "goms_no": None
+GENERATION_CONFIG = {
+    "temperature": 0.0,
+    "max_output_tokens": 8192,
+}
+
+MD_CACHE_ENABLED = os.getenv("MD_CACHE_ENABLED", "true").lower() == "true"
+
+# Text-first conversion: GOs whose text layer scores at least LOCAL_MD_MIN_QUALITY
+# are converted locally (see local_markdown.py) and never reach Gemini
+LOCAL_MD_ENABLED = os.getenv("LOCAL_MD_ENABLED", "true").lower() == "true"
+
+# Process-wide cap on Gemini requests in flight on the async path
+MD_ASYNC_CONCURRENCY = int(os.getenv("MD_ASYNC_CONCURRENCY", "64"))
+
+# Token estimate reserved against the rate limiter's TPM budget before a call
+# (corrected to the reported usage afterwards): Gemini bills 258 input tokens
+# per PDF page; output is roughly a few hundred tokens per page of GO text
+PROMPT_TOKENS_ESTIMATE = 200
+PDF_PAGE_INPUT_TOKENS = 258
+OUTPUT_TOKENS_PER_PAGE_ESTIMATE = 600
+
+
+# Long GOs are converted in chunks of this many pages, in parallel, and stitched
+# back together in page order (0 = always send the whole GO). Keeps each chunk's
+# output well under max_output_tokens and bounds a long GO's latency by its
+# slowest chunk.
+MD_CHUNK_PAGES = int(os.getenv("MD_CHUNK_PAGES", "8"))
+
+CHUNK_PROMPT_SUFFIX = """
+
+This PDF contains pages {first}-{last} of a {total}-page Government Order. Convert only these pages, continuing the document's markdown where the previous pages left off; do not add headings or summaries for pages that are not included."""
+
+
+# Streamed generation: Gemini output is appended to the GO's markdown file and
+# counted in its progress entry as it arrives (see conversion_progress.py)
+MD_STREAM_ENABLED = os.getenv("MD_STREAM_ENABLED", "true").lower() == "true"
+
+# Packing: small GOs that need Gemini are sent several to a request, each PDF
+# preceded by a delimiter line, and the response is split back per GO. Batches
+# are capped by GO count, estimated tokens and PDF bytes; a response that does
+# not split back cleanly falls back to one request per GO.
+MD_PACK_ENABLED = os.getenv("MD_PACK_ENABLED", "false").lower() == "true"
+MD_PACK_GO_MAX_PAGES = int(os.getenv("MD_PACK_GO_MAX_PAGES", "1"))
+MD_PACK_MAX_GOS = int(os.getenv("MD_PACK_MAX_GOS", "8"))
+MD_PACK_MAX_TOKENS = int(os.getenv("MD_PACK_MAX_TOKENS", "8000"))
+MD_PACK_MAX_BYTES = int(os.getenv("MD_PACK_MAX_BYTES", str(10 * 1024 * 1024)))
+
+PACK_DELIMITER = "<<<GO {n}>>>"
+PACK_DELIMITER_PATTERN = re.compile(r'^[ \t]*<<<GO (\d+)>>>[ \t]*$', re.MULTILINE)
+
+PACK_PROMPT_SUFFIX = """
+
+This request contains {count} separate Government Order PDFs. Each PDF is preceded by a label line of the form <<<GO n>>>. Convert each PDF independently, following the instructions above. For each PDF, in the same order, output its label line exactly as given (on a line by itself) followed by that PDF's markdown. Output nothing before the first label."""
+
+
+def estimate_conversion_tokens(pages: int) -> int:
+    """Rough total (input + output) token count of converting pages of a GO PDF."""
+    output_tokens = min(GENERATION_CONFIG["max_output_tokens"], pages * OUTPUT_TOKENS_PER_PAGE_ESTIMATE)
+    return PROMPT_TOKENS_ESTIMATE + pages * PDF_PAGE_INPUT_TOKENS + output_tokens
+
+
+def _count_pages(pdf_bytes: bytes) -> int:
+    try:
+        return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+    except Exception:
+        return 1
+
+
+def plan_page_chunks(pages: int, chunk_pages: Optional[int] = None) -> List[tuple]:
+    """
+    Split a GO's pages into [start, end) chunks of at most chunk_pages pages
+    (default: MD_CHUNK_PAGES). Short GOs, or chunk_pages=0, give one chunk.
+    """
+    chunk_pages = MD_CHUNK_PAGES if chunk_pages is None else chunk_pages
+    if not chunk_pages or pages <= chunk_pages:
+        return [(0, pages)]
+    return [(start, min(start + chunk_pages, pages)) for start in range(0, pages, chunk_pages)]
+
+
+def _pages_pdf_bytes(pdf_bytes: bytes, start: int, end: int) -> bytes:
+    """PDF bytes holding pages [start, end) of a PDF."""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    writer = PdfWriter()
+    for page_num in range(start, end):
+        writer.add_page(reader.pages[page_num])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _response_text(response) -> str:
+    """Response text, or "" when the candidate has no text parts."""
+    try:
+        return (response.text or "").strip()
+    except ValueError:
+        return ""
+
+
+def is_truncated(response) -> bool:
+    """True when Gemini stopped because it hit max_output_tokens."""
+    candidates = getattr(response, "candidates", None) or []
+    if not candidates:
+        return False
+    finish_reason = getattr(candidates[0], "finish_reason", None)
+    return getattr(finish_reason, "name", str(finish_reason)) == "MAX_TOKENS"
+
+
+def _default_output_dir() -> str:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), "outputs", "markdown_goms")
+
+
+def _markdown_path(pdf_path: str, output_dir: str) -> str:
+    return os.path.join(output_dir, f"{os.path.splitext(os.path.basename(pdf_path))[0]}.md")
+
+
+def _write_markdown(pdf_path: str, output_dir: str, markdown_content: str) -> str:
+    """
+    Write markdown as <pdf name>.md in output_dir and return its path. The file
+    is written to a temp file of this thread's own and renamed, so two
+    conversions of the same GO never rename each other's file; the streamed
+    .partial preview is then removed.
+    """
+    output_path = _markdown_path(pdf_path, output_dir)
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(markdown_content)
+    os.replace(temp_path, output_path)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(partial_path(output_path))
+    return output_path
+
+
+def _conversion_error(message: str) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "message": message,
+        "markdown_path": None,
+        "goms_no": None
+    }
+
+
+def _conversion_cancelled(reason: Optional[str]) -> Dict[str, Any]:
+    """Result of a GO that was not converted because its job was stopped (see job_budget.py)."""
+    return {
+        "status": "cancelled",
+        "message": f"Not converted: job {reason} reached" if reason else "Not converted: conversion cancelled",
+        "markdown_path": None,
+        "goms_no": None,
+        "stopped": reason
+    }
+
+
+def summarize_converters(conversion_results) -> Dict[str, int]:
+    """Per-job count of GOs converted locally, by Gemini, or served from the markdown cache."""
+    converters = [result.get("converter") for result in conversion_results if result and result.get("status") == "success"]
+    return {"local": converters.count("local"), "gemini": converters.count("gemini"), "cache": converters.count("cache")}
+
+
+def _extract_goms_no(markdown_content: str) -> str:
+    goms_match = re.search(r'G\.O\.Ms\.No\.?\s*(\d+)', markdown_content, re.IGNORECASE)
+    return goms_match.group(1) if goms_match else "Unknown"
+
+
+def _prepare_conversion(
+    pdf_path: str,
+    output_dir: Optional[str],
+    pdf_bytes: Optional[bytes],
+    client: Optional[GeminiConverterClient],
+    use_cache: bool,
+    local_first: Optional[bool] = None,
+    progress: Optional[ConversionProgress] = None
+) -> Dict[str, Any]:
+    """
+    Everything before the Gemini call: resolve the output directory and client,
+    read the PDF, look it up in the markdown cache and try the local text-layer
+    converter. Blocking (disk, hashing, PDF parsing), so the async path runs it
+    in an executor.
+    
+    Returns:
+        {"output_dir", "client", "pdf_bytes", "cache", "cache_key", "quality",
+        "pages", "chunks", "progress", "payload", "result"} where "result" is a finished conversion
+        result (cache hit, local conversion or configuration error) or None if
+        Gemini still has to be called
+    """
+    # Set default output directory
+    if output_dir is None:
+        output_dir = _default_output_dir()
+    
+    os.makedirs(output_dir, exist_ok=True)
+    logger.debug("Output directory created/verified: %s", output_dir)
+    markdown_path = _markdown_path(pdf_path, output_dir)
+    go_progress = progress.track(pdf_path, markdown_path) if progress else GoProgress(pdf_path, markdown_path)
+    
+    # Shared Gemini client: Vertex AI is initialized once per process
+    client = client or get_converter_client()
+    
+    # Read PDF file as bytes
+    if pdf_bytes is None:
+        with open(pdf_path, 'rb') as f:
+            pdf_bytes = f.read()
+    
+    conversion = {
+        "output_dir": output_dir,
+        "client": client,
+        "pdf_bytes": pdf_bytes,
+        "cache": get_markdown_cache() if use_cache and MD_CACHE_ENABLED else None,
+        "cache_key": None,
+        "quality": None,
+        "pages": _count_pages(pdf_bytes),
+        "progress": go_progress,
+        "payload": None,
+        "result": None
+    }
+    conversion["chunks"] = plan_page_chunks(conversion["pages"])
+    
+    # Content-addressed cache: a hit skips the Vertex call entirely
+    cache = conversion["cache"]
+    if cache is not None:
+        key_config = GENERATION_CONFIG
+        if len(conversion["chunks"]) > 1:
+            key_config = {**key_config, "chunk_pages": MD_CHUNK_PAGES}
+        if payload_settings()["mode"] != "off":
+            key_config = {**key_config, "payload": payload_settings()}
+        conversion["cache_key"] = cache.make_key(page_content_hash(pdf_bytes), CONVERSION_PROMPT, client.model_name, key_config)
+        cached = cache.get(conversion["cache_key"])
+        if cached is not None:
+            output_path = _write_markdown(pdf_path, output_dir, cached["markdown"])
+            logger.debug("Markdown cache hit (%s), wrote %s", conversion["cache_key"][:12], output_path)
+            conversion["result"] = {
+                "status": "success",
+                "message": f"Reused cached markdown for {pdf_path}",
+                "markdown_path": output_path,
+                "goms_no": cached["goms_no"],
+                "cache": "hit",
+                # No Gemini request was made; the cached markdown came from this model
+                "converter": "cache",
+                "cached_model": cached.get("model")
             }
-        
-        markdown_content = response.text.strip()
-        print(f"DEBUG: Markdown extracted ({len(markdown_content)} characters)")
-        
-        # Extract GO number from markdown for filename
-        goms_no = "Unknown"
-        goms_match = re.search(r'G\.O\.Ms\.No\.?\s*(\d+)', markdown_content, re.IGNORECASE)
-        if goms_match:
-            goms_no = goms_match.group(1)
-        
-        # Generate output filename
-        input_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-        output_filename = f"{input_filename}.md"
-        output_path = os.path.join(output_dir, output_filename)
-        
-        # Write markdown file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
-        
-        print(f"DEBUG: Markdown file created: {output_path}")
-        
-        # Track token usage if tracker is available
+            return conversion
+    
+    # Text-first: convert locally when the text layer is good enough
+    if LOCAL_MD_ENABLED if local_first is None else local_first:
         try:
-            from .token_tracker import TokenTracker
-            tracker = TokenTracker()
-            tracker.track_response(response, context="convert_go_to_markdown")
+            local = convert_pdf_to_markdown_local(pdf_path, pdf_bytes)
+            conversion["quality"] = local["quality"]
+            if local["markdown"]:
+                output_path = _write_markdown(pdf_path, output_dir, local["markdown"])
+                logger.debug("Converted locally (quality %s), wrote %s", local["quality"]["score"], output_path)
+                conversion["result"] = {
+                    "status": "success",
+                    "message": f"Converted {pdf_path} to markdown from its text layer",
+                    "markdown_path": output_path,
+                    "goms_no": _extract_goms_no(local["markdown"]),
+                    "converter": "local",
+                    "quality": local["quality"]
+                }
+                return conversion
+            logger.debug("Text layer quality %s below threshold, falling back to Gemini", local["quality"]["score"])
         except Exception as e:
-            print(f"DEBUG: Token tracking not available: {e}")
-        
-        return {
-            "status": "success",
-            "message": f"Successfully converted {pdf_path} to markdown using Gemini 2.5-flash",
-            "markdown_path": output_path,
-            "goms_no": goms_no
+            logger.debug("Local conversion failed, falling back to Gemini: %s", e)
+    
+    if not client.configured:
+        conversion["result"] = _conversion_error("GOOGLE_CLOUD_PROJECT environment variable not set")
+        return conversion
+    
+    # Payload slimming changes what is sent to Gemini, not what was hashed or
+    # converted locally above
+    if payload_settings()["mode"] != "off":
+        payload = slim_pdf_payload(pdf_bytes, pages=conversion["pages"])
+        conversion["pdf_bytes"] = payload.pop("pdf_bytes")
+        conversion["payload"] = payload
+        TokenTracker().track_payload(os.path.basename(pdf_path), payload)
+    
+    return conversion
+
+
+def _conversion_contents(pdf_bytes: bytes, prompt: str = CONVERSION_PROMPT) -> List[Any]:
+    """Prompt + PDF part sent to Gemini."""
+    return [prompt, Part.from_data(data=pdf_bytes, mime_type="application/pdf")]
+
+
+def _chunk_prompt_and_pdf(conversion: Dict[str, Any], start: int, end: int) -> tuple:
+    """Prompt and PDF bytes for converting pages [start, end) of the GO."""
+    pages = conversion["pages"]
+    if (start, end) == (0, pages):
+        return CONVERSION_PROMPT, conversion["pdf_bytes"]
+    prompt = CONVERSION_PROMPT + CHUNK_PROMPT_SUFFIX.format(first=start + 1, last=end, total=pages)
+    return prompt, _pages_pdf_bytes(conversion["pdf_bytes"], start, end)
+
+
+def _chunk_request(conversion: Dict[str, Any], start: int, end: int) -> Dict[str, Any]:
+    """Contents and token estimate for converting pages [start, end) of the GO."""
+    prompt, pdf_bytes = _chunk_prompt_and_pdf(conversion, start, end)
+    return {"contents": _conversion_contents(pdf_bytes, prompt), "estimated_tokens": estimate_conversion_tokens(end - start)}
+
+
+def _request_stream(conversion: Dict[str, Any], start: int, end: int):
+    """Streaming sink for a request; only a request for the whole GO writes the file."""
+    if not MD_STREAM_ENABLED:
+        return None
+    return conversion["progress"].stream(write_file=(start, end) == (0, conversion["pages"]))
+
+
+def _record_progress(conversion: Dict[str, Any]):
+    result = conversion["result"] or {}
+    state = {"success": "done", "cancelled": "cancelled"}.get(result.get("status"), "error")
+    conversion["progress"].finish(state, result.get("markdown_path"))
+
+
+def _chunk_piece(start: int, end: int, response, seconds: Optional[float] = None) -> Dict[str, Any]:
+    return {
+        "start": start,
+        "end": end,
+        "markdown": _response_text(response),
+        "truncated": is_truncated(response),
+        "response": response,
+        "seconds": seconds
+    }
+
+
+def _with_discarded(pieces: List[Dict[str, Any]], response, seconds: float) -> List[Dict[str, Any]]:
+    """
+    Attach a truncated response that was re-split to the first of its pieces: its
+    text is dropped, but its tokens were billed and still count towards the GO.
+    """
+    pieces[0]["discarded"] = [{"response": response, "seconds": seconds}] + pieces[0].get("discarded", [])
+    return pieces
+
+
+def _generate_chunk(conversion: Dict[str, Any], start: int, end: int) -> List[Dict[str, Any]]:
+    """
+    Convert pages [start, end). If Gemini hits max_output_tokens, the range is
+    halved and each half converted again, down to single pages.
+    """
+    request = _chunk_request(conversion, start, end)
+    stream = _request_stream(conversion, start, end)
+    started = time.perf_counter()
+    response = conversion["client"].generate_content(
+        request["contents"],
+        generation_config=GENERATION_CONFIG,
+        estimated_tokens=request["estimated_tokens"],
+        stream=stream
+    )
+    seconds = time.perf_counter() - started
+    if is_truncated(response) and end - start > 1:
+        middle = (start + end) // 2
+        logger.debug("Pages %d-%d truncated, splitting at page %d", start + 1, end, middle)
+        if stream is not None:
+            stream.discard()
+        pieces = _generate_chunk(conversion, start, middle) + _generate_chunk(conversion, middle, end)
+        return _with_discarded(pieces, response, seconds)
+    return [_chunk_piece(start, end, response, seconds)]
+
+
+async def _generate_chunk_async(conversion: Dict[str, Any], start: int, end: int) -> List[Dict[str, Any]]:
+    """
+    Async _generate_chunk. Each request holds a permit of the job's semaphore (if
+    any) and of the process-wide conversion semaphore while it is in flight, and
+    is checked against and charged to the job's budget (if any).
+    """
+    budget = conversion.get("budget")
+    request = await asyncio.get_running_loop().run_in_executor(None, tracing.bind(_chunk_request), conversion, start, end)
+    queued = time.perf_counter()
+    async with conversion.get("job_semaphore") or contextlib.nullcontext():
+        async with get_conversion_semaphore():
+            if budget is not None:
+                budget.ensure()
+            started = time.perf_counter()
+            stream = _request_stream(conversion, start, end)
+            with tracing.span("gemini_request", pages=f"{start + 1}-{end}", queued_seconds=round(started - queued, 6)) as span:
+                response = await conversion["client"].generate_content_async(
+                    request["contents"],
+                    generation_config=GENERATION_CONFIG,
+                    estimated_tokens=request["estimated_tokens"],
+                    stream=stream
+                )
+                if span is not None:
+                    span.set(truncated=is_truncated(response))
+            seconds = time.perf_counter() - started
+            if budget is not None:
+                budget.charge(response)
+    if is_truncated(response) and end - start > 1:
+        middle = (start + end) // 2
+        logger.debug("Pages %d-%d truncated, splitting at page %d", start + 1, end, middle)
+        if stream is not None:
+            stream.discard()
+        halves = await asyncio.gather(
+            _generate_chunk_async(conversion, start, middle),
+            _generate_chunk_async(conversion, middle, end)
+        )
+        return _with_discarded(halves[0] + halves[1], response, seconds)
+    return [_chunk_piece(start, end, response, seconds)]
+
+
+def _generate_chunks(conversion: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert every chunk of the GO, in parallel when there is more than one."""
+    chunks = conversion["chunks"]
+    if len(chunks) == 1:
+        return _generate_chunk(conversion, *chunks[0])
+    from concurrent.futures import ThreadPoolExecutor
+    logger.debug("Converting %d pages in %d chunks", conversion["pages"], len(chunks))
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        futures = [executor.submit(tracing.bind(_generate_chunk), conversion, *chunk) for chunk in chunks]
+        results = [future.result() for future in futures]
+    return [piece for pieces in results for piece in pieces]
+
+
+async def _generate_chunks_async(conversion: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Async _generate_chunks: one task per chunk on the caller's loop."""
+    if len(conversion["chunks"]) > 1:
+        logger.debug("Converting %d pages in %d chunks", conversion["pages"], len(conversion["chunks"]))
+    results = await asyncio.gather(*(_generate_chunk_async(conversion, *chunk) for chunk in conversion["chunks"]))
+    return [piece for pieces in results for piece in pieces]
+
+
+def _finish_conversion(pdf_path: str, conversion: Dict[str, Any], pieces: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Everything after the Gemini calls: stitch the chunks in page order, write the
+    markdown, fill the cache, track tokens.
+    """
+    pieces = sorted(pieces, key=lambda piece: piece["start"])
+    
+    # Token usage and latency of this GO's requests, including truncated ones
+    # that were re-split (a packed request's tokens are shared out between its
+    # GOs; it is counted once, with the first GO)
+    usage = empty_usage()
+    tracker = TokenTracker()
+    source = f"convert_go_to_markdown:{os.path.basename(pdf_path)}"
+    for piece in pieces:
+        for discarded in piece.get("discarded", []):
+            add_usage(usage, tracker.track_request(source, discarded["response"], discarded["seconds"]) or {})
+        if piece["response"] is None:
+            continue
+        share = piece.get("share")
+        if share is None:
+            add_usage(usage, tracker.track_request(source, piece["response"], piece.get("seconds")) or {})
+        else:
+            add_usage(usage, share)
+    
+    # Extract markdown content from the responses
+    markdown_content = "\n\n".join(piece["markdown"] for piece in pieces if piece["markdown"])
+    if not markdown_content:
+        return _conversion_error("No content extracted from PDF by Gemini")
+    logger.debug("Markdown extracted (%d characters)", len(markdown_content))
+    
+    truncated_pages = [[piece["start"] + 1, piece["end"]] for piece in pieces if piece["truncated"]]
+    if truncated_pages:
+        logger.warning("Output still truncated for pages %s of %s", truncated_pages, pdf_path)
+    
+    # Extract GO number from markdown for filename
+    goms_no = _extract_goms_no(markdown_content)
+    
+    # Write markdown file
+    output_path = _write_markdown(pdf_path, conversion["output_dir"], markdown_content)
+    logger.debug("Markdown file created: %s", output_path)
+    
+    # Truncated output is not cached, so a re-run gets another chance
+    cache = conversion["cache"]
+    if cache is not None and not truncated_pages:
+        cache.put(conversion["cache_key"], {"markdown": markdown_content, "goms_no": goms_no, "model": conversion["client"].model_name})
+    
+    return {
+        "status": "success",
+        "message": f"Successfully converted {pdf_path} to markdown using Gemini 2.5-flash",
+        "markdown_path": output_path,
+        "goms_no": goms_no,
+        "cache": "miss" if cache is not None else "disabled",
+        "converter": "gemini",
+        "quality": conversion["quality"],
+        "chunks": len(pieces),
+        "truncated_pages": truncated_pages,
+        "payload": conversion["payload"],
+        "usage": usage
+    }
+
+
+def convert_go_to_markdown(
+    pdf_path: str,
+    output_dir: Optional[str] = None,
+    pdf_bytes: Optional[bytes] = None,
+    client: Optional[GeminiConverterClient] = None,
+    use_cache: bool = True,
+    local_first: Optional[bool] = None,
+    progress: Optional[ConversionProgress] = None
+) -> Dict[str, Any]:
+    """
+    Convert a single GO PDF file to markdown format. GOs with a good text layer
+    are converted locally (local_markdown.py); the rest go to Vertex AI Gemini 2.5-flash.
+    
+    Args:
+        pdf_path: Path to the GO PDF file (also names the markdown output)
+        output_dir: Directory to save the markdown file (default: outputs/markdown_goms)
+        pdf_bytes: PDF content, if already in memory (e.g. a virtual split).
+            When given, pdf_path is not read.
+        client: Gemini client to use (default: the shared process-wide client,
+            see gemini_client.get_converter_client)
+        use_cache: Look up / store the conversion in the content-addressed
+            markdown cache (see markdown_cache.py; also MD_CACHE_ENABLED)
+        local_first: Try the local text-layer converter first and only call
+            Gemini if its quality score is below LOCAL_MD_MIN_QUALITY
+            (default: LOCAL_MD_ENABLED)
+        progress: Optional job ConversionProgress to register this GO in; its
+            entry tracks streamed output as it arrives (see conversion_progress.py)
+    
+    Returns:
+        Dictionary containing:
+        {
+            "status": "success|error",
+            "message": "Description of what happened",
+            "markdown_path": "Path to the created markdown file",
+            "goms_no": "GO number extracted from the document",
+            "cache": "hit|miss|disabled" (Gemini conversions),
+            "converter": "local|gemini|cache",
+            "quality": Text layer quality score (see local_markdown.text_quality_score)
         }
+    """
+    with log_context(go=os.path.basename(pdf_path)):
+        logger.debug("Converting PDF to markdown: %s", pdf_path)
+        conversion = None
+        endpoint = metrics.current_endpoint()
+        metrics.CONVERSIONS_IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            conversion = _prepare_conversion(pdf_path, output_dir, pdf_bytes, client, use_cache, local_first, progress)
+            if conversion["result"] is None:
+                logger.debug("Sending PDF to Gemini for conversion")
+            
+                # Generate content using Gemini (page chunks in parallel for long GOs)
+                pieces = _generate_chunks(conversion)
+                conversion["result"] = _finish_conversion(pdf_path, conversion, pieces)
+            return conversion["result"]
         
-    except Exception as e:
-        print(f"ERROR: Error converting GO to markdown: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return {
-            "status": "error",
-            "message": f"Error converting GO to markdown: {str(e)}",
-            "markdown_path": None,
-            "goms_no": None
-        }
+        except Exception as e:
+            logger.error("Error converting GO to markdown: %s", e, exc_info=True)
+            result = _conversion_error(f"Error converting GO to markdown: {str(e)}")
+            if conversion is not None:
+                conversion["result"] = result
+            return result
+        finally:
+            metrics.CONVERSIONS_IN_FLIGHT.dec(endpoint=endpoint)
+            if conversion is not None:
+                _record_progress(conversion)
 
 
+def convert_manifest_entry_to_markdown(
+    entry: Dict[str, Any],
+    output_dir: Optional[str] = None,
+    progress: Optional[ConversionProgress] = None
+) -> Dict[str, Any]:
+    """
+    Convert a virtual split manifest entry to markdown. The GO's PDF is built in
+    memory from the source PDF, so nothing is written to the split directory.
+    
+    Args:
+        entry: Manifest entry from a virtual split (see splitter.build_manifest)
+        output_dir: Directory to save the markdown file
+        progress: Optional job ConversionProgress
+    
+    Returns:
+        Same dictionary as convert_go_to_markdown
+    """
+    from .splitter import render_go_pdf_bytes
+    
+    return convert_go_to_markdown(entry["split_file"], output_dir, pdf_bytes=render_go_pdf_bytes(entry), progress=progress)
+
+
+def _submit_conversion(executor, item: Dict[str, Any], pdf_path: str, output_dir: Optional[str], progress: Optional[ConversionProgress] = None):
+    """Submit a conversion for a written split PDF or a virtual manifest entry."""
+    if item.get("virtual"):
+        return executor.submit(tracing.bind(convert_manifest_entry_to_markdown), item, output_dir, progress)
+    return executor.submit(tracing.bind(convert_go_to_markdown), pdf_path, output_dir, progress=progress)
+
 
-def convert_split_gos_to_markdown(split_result: Dict[str, Any], output_dir: Optional[str] = None, max_workers: int = 4) -> Dict[str, Any]:
+def _loop_running() -> bool:
+    """Whether the calling thread is running an event loop (asyncio.run would fail)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def convert_split_gos_to_markdown(
+    split_result: Dict[str, Any],
+    output_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    pack: Optional[bool] = None,
+    progress: Optional[ConversionProgress] = None
+) -> Dict[str, Any]:
     """
     Convert all split GO PDFs to markdown files concurrently.
     
@@ -167,7 +648,16 @@ def convert_split_gos_to_markdown(split_result: Dict[str, Any], output_dir: Opti
             - split_files: List of paths to split PDF files
             - go_index: List of GO information
         output_dir: Optional output directory for markdown files
-        max_workers: Maximum number of concurrent workers (default: 4)
+        max_workers: Maximum number of concurrent workers (default: the rate
+            limiter's GEMINI_MAX_CONCURRENCY; the limiter's adaptive limit decides
+            how many of them actually call Gemini at once)
+        pack: Pack small GOs into shared requests (default: MD_PACK_ENABLED).
+            Packing runs on the async path, so this delegates to
+            convert_split_gos_to_markdown_async. Called from a thread that
+            already runs an event loop (a FastAPI route, a notebook), it cannot
+            start one, so the GOs are converted unpacked; await
+            convert_split_gos_to_markdown_async there to pack
+        progress: Optional ConversionProgress the job reads per-GO progress from
     
     Returns:
         Dictionary containing:
@@ -175,10 +665,22 @@ def convert_split_gos_to_markdown(split_result: Dict[str, Any], output_dir: Opti
             "status": "success|error",
             "message": "Description of what happened",
             "markdown_files": List of paths to created markdown files,
-            "conversion_results": List of individual conversion results
+            "conversion_results": List of individual conversion results,
+            "cache_stats": Markdown cache {"hits", "misses", "disabled"} for this call,
+            "converter_stats": GOs converted {"local", "gemini", "cache"},
+            "payload_stats": Payload slimming {"gos", "original_bytes", "bytes", "saved_bytes"},
+            "token_usage": Token usage and request latency {"gos", "requests", "prompt_tokens",
+                "response_tokens", "total_tokens", "latency_seconds"}
         }
     """
-    print(f"DEBUG: Converting split GOs to markdown (concurrent with {max_workers} workers)...")
+    if MD_PACK_ENABLED if pack is None else pack:
+        if not _loop_running():
+            return asyncio.run(convert_split_gos_to_markdown_async(split_result, output_dir, max_in_flight=max_workers, pack=True, progress=progress))
+        logger.warning("An event loop is running in this thread, so GOs are converted unpacked; "
+                       "await convert_split_gos_to_markdown_async to pack them")
+    
+    max_workers = max_workers or get_converter_client().limiter.max_concurrency
+    logger.info("Converting split GOs to markdown (concurrent with up to %d workers)", max_workers)
     
     if split_result.get("status") != "success":
         return {
@@ -197,7 +699,7 @@ def convert_split_gos_to_markdown(split_result: Dict[str, Any], output_dir: Opti
             "conversion_results": []
         }
     
-    print(f"DEBUG: Found {len(split_files)} split files to convert")
+    logger.debug("Found %d split files to convert", len(split_files))
     
     # Use ThreadPoolExecutor for concurrent processing
     from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -205,11 +707,15 @@ def convert_split_gos_to_markdown(split_result: Dict[str, Any], output_dir: Opti
     markdown_files = []
     conversion_results = [None] * len(split_files)  # Preserve order
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    # Virtual splits carry a manifest instead of written PDFs
+    manifest = split_result.get("manifest") if split_result.get("virtual") else None
+    items = manifest or [{} for _ in split_files]
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(split_files))) as executor:
         # Submit all conversion tasks
         future_to_index = {
-            executor.submit(convert_go_to_markdown, pdf_path, output_dir): (i, pdf_path)
-            for i, pdf_path in enumerate(split_files)
+            _submit_conversion(executor, item, pdf_path, output_dir, progress): (i, pdf_path)
+            for i, (item, pdf_path) in enumerate(zip(items, split_files))
         }
         
         # Process results as they complete
@@ -222,15 +728,13 @@ def convert_split_gos_to_markdown(split_result: Dict[str, Any], output_dir: Opti
                 result = future.result()
                 conversion_results[i] = result
                 
-                print(f"\nCompleted {completed}/{len(split_files)}: {os.path.basename(pdf_path)}")
-                
                 if result["status"] == "success":
                     markdown_files.append(result["markdown_path"])
-                    print(f"  ✓ Converted to: {os.path.basename(result['markdown_path'])}")
+                    sample(logger, "convert.completed", "Completed %d/%d: %s", completed, len(split_files), os.path.basename(result["markdown_path"]))
                 else:
-                    print(f"  ✗ Conversion failed: {result['message']}")
+                    logger.warning("Conversion failed for %s: %s", os.path.basename(pdf_path), result["message"])
             except Exception as e:
-                print(f"  ✗ Exception during conversion: {str(e)}")
+                logger.error("Exception during conversion of %s: %s", os.path.basename(pdf_path), e)
                 conversion_results[i] = {
                     "status": "error",
                     "message": f"Exception during conversion: {str(e)}",
@@ -241,21 +745,702 @@ def convert_split_gos_to_markdown(split_result: Dict[str, Any], output_dir: Opti
     successful_conversions = len(markdown_files)
     total_files = len(split_files)
     
-    # Print token usage summary
-    from .token_tracker import TokenTracker
-    TokenTracker().print_summary()
+    # Log token usage summary
+    TokenTracker().log_summary(summarize_usage(conversion_results))
     
     if successful_conversions == 0:
         return {
             "status": "error",
             "message": f"Failed to convert any of the {total_files} split files",
             "markdown_files": [],
-            "conversion_results": conversion_results
+            "conversion_results": conversion_results,
+            "cache_stats": summarize_cache_results(conversion_results),
+            "converter_stats": summarize_converters(conversion_results),
+            "payload_stats": summarize_payloads(conversion_results),
+            "token_usage": summarize_usage(conversion_results)
         }
     
     return {
         "status": "success",
         "message": f"Successfully converted {successful_conversions}/{total_files} GO PDFs to markdown (concurrent processing)",
         "markdown_files": markdown_files,
-        "conversion_results": conversion_results
+        "conversion_results": conversion_results,
+        "cache_stats": summarize_cache_results(conversion_results),
+        "converter_stats": summarize_converters(conversion_results),
+        "payload_stats": summarize_payloads(conversion_results),
+        "token_usage": summarize_usage(conversion_results)
+    }
+
+
+def convert_go_segments_to_markdown(
+    segments: Iterable[Dict[str, Any]],
+    output_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    progress: Optional[ConversionProgress] = None
+) -> Dict[str, Any]:
+    """
+    Convert GO segments to markdown as they are produced by a streaming splitter
+    (see splitter.iter_go_segments). Each segment is submitted for conversion the
+    moment it is yielded, so Gemini calls overlap with the rest of the page scan.
+    
+    Args:
+        segments: Iterable of {"goms_no", "start_page", "end_page", "split_file"} dicts
+            (virtual segments are converted from memory, see convert_manifest_entry_to_markdown)
+        output_dir: Optional output directory for markdown files
+        max_workers: Maximum number of concurrent workers (default: the rate
+            limiter's GEMINI_MAX_CONCURRENCY; the limiter's adaptive limit decides
+            how many of them actually call Gemini at once)
+        progress: Optional ConversionProgress the job reads per-GO progress from
+    
+    Returns:
+        Dictionary containing:
+        {
+            "status": "success|error",
+            "message": "Description of what happened",
+            "markdown_files": List of paths to created markdown files,
+            "conversion_results": List of individual conversion results (segment order),
+            "segments": List of segments consumed from the splitter,
+            "split_error": Error raised by the splitter, if any,
+            "first_markdown_seconds": Seconds until the first markdown file was written,
+            "cache_stats": Markdown cache {"hits", "misses", "disabled"} for this call,
+            "converter_stats": GOs converted {"local", "gemini", "cache"},
+            "payload_stats": Payload slimming {"gos", "original_bytes", "bytes", "saved_bytes"},
+            "token_usage": Token usage and request latency {"gos", "requests", "prompt_tokens",
+                "response_tokens", "total_tokens", "latency_seconds"}
+        }
+    """
+    max_workers = max_workers or get_converter_client().limiter.max_concurrency
+    logger.info("Streaming split GOs to markdown (concurrent with up to %d workers)", max_workers)
+    
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    started_at = time.perf_counter()
+    consumed_segments = []
+    split_error = None
+    future_to_index = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Submit each segment as soon as the splitter closes it
+        try:
+            for segment in segments:
+                i = len(consumed_segments)
+                consumed_segments.append(segment)
+                sample(logger, "convert.segment", "Segment %d ready (GO %s), submitting conversion", i + 1, segment["goms_no"])
+                future = _submit_conversion(executor, segment, segment["split_file"], output_dir, progress)
+                future_to_index[future] = i
+        except Exception as e:
+            logger.error("Streaming splitter failed after %d segments: %s", len(consumed_segments), e)
+            split_error = str(e)
+        
+        markdown_files = []
+        conversion_results = [None] * len(consumed_segments)
+        first_markdown_seconds = None
+        
+        for future in as_completed(future_to_index):
+            i = future_to_index[future]
+            pdf_path = consumed_segments[i]["split_file"]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error("Exception during conversion of %s: %s", os.path.basename(pdf_path), e)
+                result = {
+                    "status": "error",
+                    "message": f"Exception during conversion: {str(e)}",
+                    "markdown_path": None,
+                    "goms_no": None
+                }
+            conversion_results[i] = result
+            
+            if result["status"] == "success":
+                if first_markdown_seconds is None:
+                    first_markdown_seconds = round(time.perf_counter() - started_at, 3)
+                markdown_files.append(result["markdown_path"])
+                sample(logger, "convert.completed", "Converted %s to: %s", os.path.basename(pdf_path), os.path.basename(result["markdown_path"]))
+            else:
+                logger.warning("Conversion failed for %s: %s", os.path.basename(pdf_path), result["message"])
+    
+    # Log token usage summary
+    TokenTracker().log_summary(summarize_usage(conversion_results))
+    
+    total_files = len(consumed_segments)
+    status = "success" if markdown_files and not split_error else "error"
+    if split_error:
+        message = f"Splitter failed after {total_files} segments: {split_error}"
+    elif not markdown_files:
+        message = f"Failed to convert any of the {total_files} split files"
+    else:
+        message = f"Successfully converted {len(markdown_files)}/{total_files} GO PDFs to markdown (streaming)"
+    
+    return {
+        "status": status,
+        "message": message,
+        "markdown_files": markdown_files,
+        "conversion_results": conversion_results,
+        "segments": consumed_segments,
+        "split_error": split_error,
+        "first_markdown_seconds": first_markdown_seconds,
+        "cache_stats": summarize_cache_results(conversion_results),
+        "converter_stats": summarize_converters(conversion_results),
+        "payload_stats": summarize_payloads(conversion_results),
+        "token_usage": summarize_usage(conversion_results)
+    }
+
+
+
+_conversion_semaphore: Optional[asyncio.Semaphore] = None
+_conversion_semaphore_loop = None
+
+
+def get_conversion_semaphore() -> asyncio.Semaphore:
+    """
+    Return the process-wide semaphore bounding async Gemini requests
+    (MD_ASYNC_CONCURRENCY). Must be called from a running event loop; a new
+    semaphore is created if the loop changes (e.g. between test clients).
+    """
+    global _conversion_semaphore, _conversion_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _conversion_semaphore is None or _conversion_semaphore_loop is not loop:
+        _conversion_semaphore = asyncio.Semaphore(MD_ASYNC_CONCURRENCY)
+        _conversion_semaphore_loop = loop
+    return _conversion_semaphore
+
+
+async def convert_go_to_markdown_async(
+    pdf_path: str,
+    output_dir: Optional[str] = None,
+    pdf_bytes: Optional[bytes] = None,
+    client: Optional[GeminiConverterClient] = None,
+    use_cache: bool = True,
+    local_first: Optional[bool] = None,
+    job_semaphore: Optional[asyncio.Semaphore] = None,
+    packer: Optional["GoPacker"] = None,
+    pack_ticket: Optional[Dict[str, bool]] = None,
+    progress: Optional[ConversionProgress] = None,
+    budget: Optional[JobBudget] = None
+) -> Dict[str, Any]:
+    """
+    Async version of convert_go_to_markdown. Gemini requests (one per page chunk)
+    are awaited with the Vertex async API, each under the process-wide conversion
+    semaphore, so no thread is held while they are in flight; only the short
+    disk/cache/PDF steps before and after them run in the default executor.
+    
+    Args:
+        pdf_path, output_dir, pdf_bytes, client, use_cache, local_first, progress: As for convert_go_to_markdown
+        job_semaphore: Optional per-job cap, acquired before the process-wide one
+        packer: Optional GoPacker shared by a batch; small GOs that need Gemini
+            are handed to it instead of being sent alone
+        pack_ticket: Ticket from packer.open_item() for this GO
+        budget: Optional JobBudget; once it is stopped no further request is
+            sent and the result is "cancelled"
+    
+    Returns:
+        Same dictionary as convert_go_to_markdown
+    """
+    loop = asyncio.get_running_loop()
+    conversion = None
+    endpoint = metrics.current_endpoint()
+    metrics.CONVERSIONS_IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        with tracing.span("prepare"):
+            conversion = await loop.run_in_executor(
+                None,
+                tracing.bind(functools.partial(_prepare_conversion, pdf_path, output_dir, pdf_bytes, client, use_cache, local_first, progress))
+            )
+        if conversion["result"] is None:
+            conversion["job_semaphore"] = job_semaphore
+            conversion["budget"] = budget
+            if packer is not None and packer.eligible(conversion):
+                with tracing.span("packed"):
+                    conversion["result"] = await packer.add(pack_ticket, pdf_path, conversion)
+            else:
+                pieces = await _generate_chunks_async(conversion)
+                with tracing.span("finish"):
+                    conversion["result"] = await loop.run_in_executor(None, tracing.bind(_finish_conversion), pdf_path, conversion, pieces)
+        return conversion["result"]
+    
+    except BudgetExceeded as e:
+        result = _conversion_cancelled(e.reason)
+        if conversion is not None:
+            conversion["result"] = result
+        return result
+    except asyncio.CancelledError:
+        if conversion is not None:
+            conversion["result"] = _conversion_cancelled(budget.reason if budget else None)
+        raise
+    except Exception as e:
+        logger.error("Error converting GO to markdown: %s", e, exc_info=True)
+        result = _conversion_error(f"Error converting GO to markdown: {str(e)}")
+        if conversion is not None:
+            conversion["result"] = result
+        return result
+    finally:
+        metrics.CONVERSIONS_IN_FLIGHT.dec(endpoint=endpoint)
+        if conversion is not None:
+            _record_progress(conversion)
+
+
+async def _convert_item_async(
+    item: Dict[str, Any],
+    pdf_path: str,
+    output_dir: Optional[str],
+    job_semaphore: Optional[asyncio.Semaphore],
+    packer: Optional["GoPacker"] = None,
+    pack_ticket: Optional[Dict[str, bool]] = None,
+    progress: Optional[ConversionProgress] = None,
+    budget: Optional[JobBudget] = None
+) -> Dict[str, Any]:
+    """
+    Async conversion of a written split PDF or a virtual manifest entry. With a
+    packer, pack_ticket (from packer.open_item(), taken when the item was
+    scheduled) is released on every path that does not hand the GO to the packer.
+    """
+    try:
+        with log_context(go=os.path.basename(pdf_path)), tracing.span("convert_go", go=os.path.basename(pdf_path)) as span:
+            pdf_bytes = None
+            if item.get("virtual"):
+                from .splitter import render_go_pdf_bytes
+                with tracing.span("render_go_pdf"):
+                    pdf_bytes = await asyncio.get_running_loop().run_in_executor(None, tracing.bind(render_go_pdf_bytes), item)
+            result = await convert_go_to_markdown_async(
+                pdf_path, output_dir, pdf_bytes=pdf_bytes, job_semaphore=job_semaphore, packer=packer, pack_ticket=pack_ticket,
+                progress=progress, budget=budget
+            )
+            if span is not None:
+                span.set(result=result.get("status"), converter=result.get("converter"), cache=result.get("cache"), chunks=result.get("chunks"))
+            return result
+    finally:
+        if packer is not None:
+            packer.release(pack_ticket)
+
+
+def split_packed_response(text: str, count: int) -> Optional[List[str]]:
+    """
+    Split a packed response into per-GO markdown. Returns None unless it holds
+    exactly the labels 1..count, in order, each followed by non-empty markdown
+    and with nothing before the first label.
+    """
+    parts = PACK_DELIMITER_PATTERN.split(text)
+    labels, sections = parts[1::2], [section.strip() for section in parts[2::2]]
+    if parts[0].strip() or labels != [str(n) for n in range(1, count + 1)] or not all(sections):
+        return None
+    return sections
+
+
+class GoPacker:
+    """
+    Packs small GOs that need Gemini into shared requests (async path).
+
+    Items are registered with open_item() when they are scheduled. Each one
+    either hands its prepared conversion to add() (and awaits the returned
+    future) or releases its ticket. A batch is sent as soon as it is full, and
+    the remainder once close() has been called and every open item has been
+    added or released. cancel() drops the batches still running when the job
+    is stopped.
+    """
+
+    def __init__(
+        self,
+        job_semaphore: Optional[asyncio.Semaphore] = None,
+        go_max_pages: Optional[int] = None,
+        max_gos: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        budget: Optional[JobBudget] = None
+    ):
+        self.job_semaphore = job_semaphore
+        self.budget = budget
+        self.go_max_pages = go_max_pages or MD_PACK_GO_MAX_PAGES
+        self.max_gos = max_gos or MD_PACK_MAX_GOS
+        self.max_tokens = max_tokens or MD_PACK_MAX_TOKENS
+        self.max_bytes = max_bytes or MD_PACK_MAX_BYTES
+        self._pending = []
+        self._pending_tokens = PROMPT_TOKENS_ESTIMATE
+        self._pending_bytes = 0
+        self._open = 0
+        self._closed = False
+        self._tasks = []
+        self.requests = 0
+        self.packed_gos = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _go_tokens(conversion: Dict[str, Any]) -> int:
+        return estimate_conversion_tokens(conversion["pages"]) - PROMPT_TOKENS_ESTIMATE
+
+    def eligible(self, conversion: Dict[str, Any]) -> bool:
+        return (
+            conversion["pages"] <= self.go_max_pages
+            and len(conversion["chunks"]) == 1
+            and len(conversion["pdf_bytes"]) <= self.max_bytes
+        )
+
+    def open_item(self) -> Dict[str, bool]:
+        self._open += 1
+        return {"open": True}
+
+    def release(self, ticket: Optional[Dict[str, bool]]):
+        if ticket and ticket["open"]:
+            ticket["open"] = False
+            self._open -= 1
+            self._maybe_flush()
+
+    def add(self, ticket: Optional[Dict[str, bool]], pdf_path: str, conversion: Dict[str, Any]) -> asyncio.Future:
+        """Queue a prepared conversion; the future resolves to its conversion result."""
+        tokens, size = self._go_tokens(conversion), len(conversion["pdf_bytes"])
+        if self._pending and (
+            self._pending_tokens + tokens > self.max_tokens or self._pending_bytes + size > self.max_bytes
+        ):
+            self._launch()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((pdf_path, conversion, future))
+        self._pending_tokens += tokens
+        self._pending_bytes += size
+        if len(self._pending) >= self.max_gos:
+            self._launch()
+        self.release(ticket)
+        return future
+
+    def close(self):
+        """No more items will be opened; send what is left once they are all in."""
+        self._closed = True
+        self._maybe_flush()
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def _maybe_flush(self):
+        if self._closed and self._open == 0 and self._pending:
+            self._launch()
+
+    def _launch(self):
+        batch, tokens = self._pending, self._pending_tokens
+        self._pending, self._pending_tokens, self._pending_bytes = [], PROMPT_TOKENS_ESTIMATE, 0
+        self._tasks.append(asyncio.create_task(self._run(batch, tokens)))
+
+    async def _run(self, batch, tokens: int):
+        try:
+            packed = await self._request(batch, tokens) if len(batch) > 1 else None
+        except BudgetExceeded as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(_conversion_cancelled(e.reason))
+            return
+        if packed is None:
+            if len(batch) > 1:
+                self.fallbacks += len(batch)
+            await asyncio.gather(*(self._convert_alone(*entry) for entry in batch))
+            return
+        sections, response, seconds = packed
+        self.requests += 1
+        self.packed_gos += len(batch)
+        usage = TokenTracker().track_request(f"convert_go_to_markdown:packed x{len(batch)}", response, seconds)
+        shares = split_usage(usage or empty_usage(), len(batch))
+        loop = asyncio.get_running_loop()
+        for i, (pdf_path, conversion, future) in enumerate(batch):
+            piece = {"start": 0, "end": conversion["pages"], "markdown": sections[i], "truncated": False, "response": response, "share": shares[i]}
+            try:
+                with log_context(go=os.path.basename(pdf_path)):
+                    result = await loop.run_in_executor(None, tracing.bind(_finish_conversion), pdf_path, conversion, [piece])
+                result["packed"] = len(batch)
+            except Exception as e:
+                result = _conversion_error(f"Error converting GO to markdown: {str(e)}")
+            if not future.done():
+                future.set_result(result)
+
+    async def _request(self, batch, tokens: int):
+        """
+        Send one packed request; (sections, response, seconds), or None to fall
+        back. Raises BudgetExceeded if the job's budget is stopped.
+        """
+        contents = [CONVERSION_PROMPT + PACK_PROMPT_SUFFIX.format(count=len(batch))]
+        for n, (_, conversion, _) in enumerate(batch, 1):
+            contents.append(PACK_DELIMITER.format(n=n))
+            contents.append(Part.from_data(data=conversion["pdf_bytes"], mime_type="application/pdf"))
+        client = batch[0][1]["client"]
+        try:
+            async with self.job_semaphore or contextlib.nullcontext():
+                async with get_conversion_semaphore():
+                    if self.budget is not None:
+                        self.budget.ensure()
+                    started = time.perf_counter()
+                    with tracing.span("gemini_packed_request", gos=len(batch)):
+                        response = await client.generate_content_async(contents, generation_config=GENERATION_CONFIG, estimated_tokens=tokens)
+                    seconds = time.perf_counter() - started
+                    if self.budget is not None:
+                        self.budget.charge(response)
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            logger.debug("Packed request for %d GOs failed, converting individually: %s", len(batch), e)
+            return None
+        if is_truncated(response):
+            logger.debug("Packed response for %d GOs truncated, converting individually", len(batch))
+            return None
+        sections = split_packed_response(_response_text(response), len(batch))
+        if sections is None:
+            logger.debug("Packed response for %d GOs did not split cleanly, converting individually", len(batch))
+            return None
+        logger.debug("Converted %d GOs in one packed request", len(batch))
+        return sections, response, seconds
+
+    async def _convert_alone(self, pdf_path: str, conversion: Dict[str, Any], future: asyncio.Future):
+        with log_context(go=os.path.basename(pdf_path)):
+            try:
+                pieces = await _generate_chunks_async(conversion)
+                result = await asyncio.get_running_loop().run_in_executor(None, tracing.bind(_finish_conversion), pdf_path, conversion, pieces)
+            except BudgetExceeded as e:
+                result = _conversion_cancelled(e.reason)
+            except Exception as e:
+                logger.error("Error converting GO to markdown: %s", e, exc_info=True)
+                result = _conversion_error(f"Error converting GO to markdown: {str(e)}")
+        if not future.done():
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        return {"requests": self.requests, "packed_gos": self.packed_gos, "fallbacks": self.fallbacks}
+
+
+def _job_semaphore(max_in_flight: Optional[int]) -> Optional[asyncio.Semaphore]:
+    return asyncio.Semaphore(max_in_flight) if max_in_flight else None
+
+
+async def _gather_conversions(tasks, budget: Optional[JobBudget] = None, packer: Optional[GoPacker] = None) -> List[Dict[str, Any]]:
+    """
+    Await a job's conversion tasks, in order. With a budget deadline, the tasks
+    still running when it passes are cancelled, along with the packer's batches,
+    and come back as "cancelled" results.
+    """
+    gathered = asyncio.gather(*tasks, return_exceptions=True)
+    remaining = budget.remaining_seconds() if budget is not None else None
+    if remaining is not None and tasks:
+        try:
+            await asyncio.wait_for(asyncio.shield(gathered), remaining)
+        except asyncio.TimeoutError:
+            budget.stop(DEADLINE)
+            logger.info("Cancelling %d unfinished GO conversions (deadline)", sum(not task.done() for task in tasks))
+            for task in tasks:
+                task.cancel()
+            if packer is not None:
+                packer.cancel()
+        except asyncio.CancelledError:
+            gathered.cancel()
+            raise
+    outcomes = await gathered
+    conversion_results = []
+    for outcome in outcomes:
+        if isinstance(outcome, asyncio.CancelledError):
+            conversion_results.append(_conversion_cancelled(budget.reason if budget else None))
+        elif isinstance(outcome, BaseException):
+            conversion_results.append(_conversion_error(f"Exception during conversion: {str(outcome)}"))
+        else:
+            conversion_results.append(outcome)
+    if budget is not None:
+        budget.cancelled_gos = sum(result["status"] == "cancelled" for result in conversion_results)
+    return conversion_results
+
+
+def _stopped_message(budget: Optional[JobBudget], converted: int, total: int) -> Optional[str]:
+    if budget is None or budget.reason is None:
+        return None
+    return f"Stopped early ({budget.reason}): converted {converted}/{total} GO PDFs to markdown, {budget.cancelled_gos} cancelled"
+
+
+async def convert_split_gos_to_markdown_async(
+    split_result: Dict[str, Any],
+    output_dir: Optional[str] = None,
+    max_in_flight: Optional[int] = None,
+    pack: Optional[bool] = None,
+    progress: Optional[ConversionProgress] = None,
+    budget: Optional[JobBudget] = None
+) -> Dict[str, Any]:
+    """
+    Async version of convert_split_gos_to_markdown: every GO becomes a task on the
+    caller's event loop instead of a thread in a per-job pool.
+    
+    Args:
+        split_result: Result dictionary from split_goms
+        output_dir: Optional output directory for markdown files
+        max_in_flight: Optional cap on this job's Gemini requests in flight
+            (the process-wide MD_ASYNC_CONCURRENCY cap always applies)
+        pack: Pack small GOs into shared requests (default: MD_PACK_ENABLED)
+        progress: Optional ConversionProgress the job reads per-GO progress from
+        budget: Optional JobBudget (token budget and deadline); once it is
+            stopped, unfinished GOs are cancelled
+    
+    Returns:
+        Same dictionary as convert_split_gos_to_markdown, plus "pack_stats"
+        ({"requests", "packed_gos", "fallbacks"}) when packing, and "stopped"
+        (the budget's reason, or None) and "budget" (JobBudget.summary()) with a budget
+    """
+    if split_result.get("status") != "success":
+        return {
+            "status": "error",
+            "message": f"Cannot convert: split operation failed - {split_result.get('message')}",
+            "markdown_files": [],
+            "conversion_results": []
+        }
+    
+    split_files = split_result.get("split_files", [])
+    if not split_files:
+        return {
+            "status": "error",
+            "message": "No split files found to convert",
+            "markdown_files": [],
+            "conversion_results": []
+        }
+    
+    logger.info("Converting %d split GOs to markdown (async)", len(split_files))
+    
+    manifest = split_result.get("manifest") if split_result.get("virtual") else None
+    items = manifest or [{} for _ in split_files]
+    job_semaphore = _job_semaphore(max_in_flight)
+    packer = GoPacker(job_semaphore, budget=budget) if (MD_PACK_ENABLED if pack is None else pack) else None
+    
+    tasks = [
+        asyncio.ensure_future(_convert_item_async(
+            item, pdf_path, output_dir, job_semaphore, packer, packer.open_item() if packer else None, progress, budget
+        ))
+        for item, pdf_path in zip(items, split_files)
+    ]
+    if packer:
+        packer.close()
+    conversion_results = await _gather_conversions(tasks, budget, packer)
+    markdown_files = [result["markdown_path"] for result in conversion_results if result["status"] == "success"]
+    
+    # Log token usage summary
+    TokenTracker().log_summary(summarize_usage(conversion_results))
+    
+    total_files = len(split_files)
+    pack_stats = packer.stats() if packer else None
+    budget_stats = {"stopped": budget.reason, "budget": budget.summary()} if budget is not None else {}
+    if not markdown_files:
+        return {
+            "status": "error",
+            "message": _stopped_message(budget, 0, total_files) or f"Failed to convert any of the {total_files} split files",
+            "markdown_files": [],
+            "conversion_results": conversion_results,
+            "cache_stats": summarize_cache_results(conversion_results),
+            "converter_stats": summarize_converters(conversion_results),
+            "payload_stats": summarize_payloads(conversion_results),
+            "token_usage": summarize_usage(conversion_results),
+            "pack_stats": pack_stats,
+            **budget_stats
+        }
+    
+    return {
+        "status": "success",
+        "message": _stopped_message(budget, len(markdown_files), total_files) or f"Successfully converted {len(markdown_files)}/{total_files} GO PDFs to markdown (async)",
+        "markdown_files": markdown_files,
+        "conversion_results": conversion_results,
+        "cache_stats": summarize_cache_results(conversion_results),
+        "converter_stats": summarize_converters(conversion_results),
+        "payload_stats": summarize_payloads(conversion_results),
+        "token_usage": summarize_usage(conversion_results),
+        "pack_stats": pack_stats,
+        **budget_stats
+    }
+
+
+async def convert_go_segments_to_markdown_async(
+    segments: Iterable[Dict[str, Any]],
+    output_dir: Optional[str] = None,
+    max_in_flight: Optional[int] = None,
+    pack: Optional[bool] = None,
+    progress: Optional[ConversionProgress] = None,
+    budget: Optional[JobBudget] = None
+) -> Dict[str, Any]:
+    """
+    Async version of convert_go_segments_to_markdown. The (blocking) splitter is
+    advanced one segment at a time in the default executor and each segment is
+    scheduled as a conversion task the moment it is yielded.
+    
+    Args:
+        segments: Iterable of GO segments (see splitter.iter_go_segments)
+        output_dir: Optional output directory for markdown files
+        max_in_flight: Optional cap on this job's Gemini requests in flight
+        pack: Pack small GOs into shared requests (default: MD_PACK_ENABLED);
+            a partial batch is sent once the splitter is exhausted
+        progress: Optional ConversionProgress the job reads per-GO progress from
+        budget: Optional JobBudget; once it is stopped no further segment is
+            read from the splitter and unfinished GOs are cancelled
+    
+    Returns:
+        Same dictionary as convert_go_segments_to_markdown, plus "pack_stats",
+        and "stopped" and "budget" as in convert_split_gos_to_markdown_async
+    """
+    logger.info("Streaming split GOs to markdown (async)")
+    
+    loop = asyncio.get_running_loop()
+    started_at = time.perf_counter()
+    job_semaphore = _job_semaphore(max_in_flight)
+    packer = GoPacker(job_semaphore, budget=budget) if (MD_PACK_ENABLED if pack is None else pack) else None
+    consumed_segments = []
+    tasks = []
+    completed_at = {}
+    split_error = None
+    
+    async def convert_segment(i: int, segment: Dict[str, Any], pack_ticket) -> Dict[str, Any]:
+        result = await _convert_item_async(segment, segment["split_file"], output_dir, job_semaphore, packer, pack_ticket, progress, budget)
+        completed_at[i] = time.perf_counter()
+        return result
+    
+    iterator = iter(segments)
+    exhausted = object()
+    # The splitter runs in executor threads; bind it to the job's log and trace context
+    read_next = tracing.bind(next)
+    try:
+        while True:
+            if budget is not None and budget.check():
+                logger.info("Job %s reached, not reading further segments", budget.reason)
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    await loop.run_in_executor(None, close)
+                break
+            segment = await loop.run_in_executor(None, read_next, iterator, exhausted)
+            if segment is exhausted:
+                break
+            i = len(consumed_segments)
+            consumed_segments.append(segment)
+            sample(logger, "convert.segment", "Segment %d ready (GO %s), scheduling conversion", i + 1, segment["goms_no"])
+            tasks.append(asyncio.create_task(convert_segment(i, segment, packer.open_item() if packer else None)))
+    except Exception as e:
+        logger.error("Streaming splitter failed after %d segments: %s", len(consumed_segments), e)
+        split_error = str(e)
+    if packer:
+        packer.close()
+    
+    conversion_results = await _gather_conversions(tasks, budget, packer)
+    markdown_files = [result["markdown_path"] for result in conversion_results if result["status"] == "success"]
+    success_times = [completed_at[i] for i, result in enumerate(conversion_results) if result["status"] == "success" and i in completed_at]
+    first_markdown_seconds = round(min(success_times) - started_at, 3) if success_times else None
+    
+    # Log token usage summary
+    TokenTracker().log_summary(summarize_usage(conversion_results))
+    
+    total_files = len(consumed_segments)
+    status = "success" if markdown_files and not split_error else "error"
+    if split_error:
+        message = f"Splitter failed after {total_files} segments: {split_error}"
+    elif budget is not None and budget.reason:
+        message = _stopped_message(budget, len(markdown_files), total_files)
+    elif not markdown_files:
+        message = f"Failed to convert any of the {total_files} split files"
+    else:
+        message = f"Successfully converted {len(markdown_files)}/{total_files} GO PDFs to markdown (async streaming)"
+    
+    return {
+        "status": status,
+        "message": message,
+        "markdown_files": markdown_files,
+        "conversion_results": conversion_results,
+        "segments": consumed_segments,
+        "split_error": split_error,
+        "first_markdown_seconds": first_markdown_seconds,
+        "cache_stats": summarize_cache_results(conversion_results),
+        "converter_stats": summarize_converters(conversion_results),
+        "payload_stats": summarize_payloads(conversion_results),
+        "token_usage": summarize_usage(conversion_results),
+        "pack_stats": packer.stats() if packer else None,
+        **({"stopped": budget.reason, "budget": budget.summary()} if budget is not None else {})
     }
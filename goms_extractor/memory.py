@@ -0,0 +1,72 @@
+"""
+Resident memory sampling for the splitter.
+
+RSS is read from /proc/self/statm where available (Linux containers) and falls
+back to the process high-water mark from resource.getrusage elsewhere.
+"""
+
+import os
+import sys
+from typing import Dict, Any, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_MB = 1024 * 1024
+
+
+def process_peak_rss_bytes() -> Optional[int]:
+    """High-water RSS of the whole process so far, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Current RSS of the process, or None if unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return process_peak_rss_bytes()
+
+
+class RssSampler:
+    """Tracks the highest RSS seen across explicit sample points of one run"""
+
+    def __init__(self):
+        self.start_rss = current_rss_bytes()
+        self.peak_rss = self.start_rss
+        self.samples = 1
+
+    def sample(self) -> Optional[int]:
+        """Read the current RSS and update the peak."""
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+        self.samples += 1
+        return rss
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns:
+            {"start_rss_mb", "peak_rss_mb", "growth_mb", "process_peak_rss_mb", "samples"}
+        """
+        self.sample()
+        process_peak = process_peak_rss_bytes()
+        return {
+            "start_rss_mb": _to_mb(self.start_rss),
+            "peak_rss_mb": _to_mb(self.peak_rss),
+            "growth_mb": _to_mb(self.peak_rss - self.start_rss) if self.peak_rss is not None and self.start_rss is not None else None,
+            "process_peak_rss_mb": _to_mb(process_peak),
+            "samples": self.samples
+        }
+
+
+def _to_mb(value: Optional[int]) -> Optional[float]:
+    return round(value / _MB, 1) if value is not None else None
@@ -0,0 +1,277 @@
+"""
+Process-wide Prometheus metrics, served by the API at /metrics.
+
+A small in-process registry (counters, gauges, histograms with labels) rendered
+in the Prometheus text exposition format, so scraping needs no extra dependency.
+Every series carries an `endpoint` label: "adk" or "direct" for work done for a
+gateway job of that kind, "other" outside a job (CLI, batch backfill). The label
+is taken from a context variable set at the start of each job (set_endpoint);
+asyncio tasks inherit it, so Gemini calls made by a job's conversions are
+attributed to its endpoint.
+
+Stages:
+- split: goms_split_seconds, goms_split_pages_total, goms_split_pages_per_second
+- Gemini: goms_gemini_request_seconds (per call, retries included),
+  goms_gemini_tokens_total (rate() gives tokens per second),
+  goms_gemini_requests_in_flight
+- conversion: goms_conversions_in_flight (GOs being converted)
+- GCS upload: goms_gcs_upload_seconds (per file), goms_gcs_upload_bytes_total
+- jobs: goms_job_seconds, goms_jobs_total (finished, by status), goms_jobs
+  (current, by status; "pending" is the queue depth)
+- logging: goms_log_records_dropped (records dropped because the log queue was
+  full since logging was set up)
+"""
+
+import math
+import time
+import threading
+import contextlib
+import contextvars
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+ENDPOINTS = ("adk", "direct", "other")
+
+_endpoint: contextvars.ContextVar = contextvars.ContextVar("goms_endpoint", default="other")
+
+
+def set_endpoint(endpoint: str):
+    """Attribute metrics recorded from this context (and tasks it starts) to endpoint."""
+    return _endpoint.set(endpoint)
+
+
+def current_endpoint() -> str:
+    return _endpoint.get()
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ("endpoint",)):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if "endpoint" in self.labelnames and "endpoint" not in labels:
+            labels = {**labels, "endpoint": current_endpoint()}
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        with self._lock:
+            return [(self.name, self.labelnames, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labelnames, key, value in self._samples():
+            lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ("endpoint",)):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextlib.contextmanager
+    def track_inprogress(self, **labels):
+        key_labels = labels if "endpoint" in labels else {**labels, "endpoint": current_endpoint()}
+        self.inc(**key_labels)
+        try:
+            yield
+        finally:
+            self.dec(**key_labels)
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Compute the gauge at scrape time: function returns {label values tuple: value}."""
+        self._function = function
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        if self._function is not None:
+            return self._function().get(key, 0)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def _samples(self):
+        if self._function is None:
+            return super()._samples()
+        return [(self.name, self.labelnames, key, value) for key, value in sorted(self._function().items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float], labelnames: Tuple[str, ...] = ("endpoint",)):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block."""
+        labels = labels if "endpoint" in labels else {**labels, "endpoint": current_endpoint()}
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state["count"] if state else 0
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, {"counts": list(s["counts"]), "sum": s["sum"], "count": s["count"]}) for key, s in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", self.labelnames + ("le",), key + (_format_value(bound),), cumulative))
+            samples.append((f"{self.name}_sum", self.labelnames, key, state["sum"]))
+            samples.append((f"{self.name}_count", self.labelnames, key, state["count"]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+# Content type of the text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+SPLIT_SECONDS = REGISTRY.register(Histogram(
+    "goms_split_seconds", "Time to split a gazette into GOs", SECONDS_BUCKETS
+))
+SPLIT_PAGES = REGISTRY.register(Counter(
+    "goms_split_pages_total", "Pages scanned by the splitter"
+))
+SPLIT_PAGES_PER_SECOND = REGISTRY.register(Histogram(
+    "goms_split_pages_per_second", "Page extraction rate of each split",
+    (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+))
+GEMINI_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "goms_gemini_request_seconds", "Gemini generate_content call time, retries and rate limiter waits included",
+    SECONDS_BUCKETS, ("endpoint", "outcome")
+))
+GEMINI_TOKENS = REGISTRY.register(Counter(
+    "goms_gemini_tokens_total", "Gemini tokens used, by kind (prompt or response)", ("endpoint", "kind")
+))
+GEMINI_IN_FLIGHT = REGISTRY.register(Gauge(
+    "goms_gemini_requests_in_flight", "Gemini requests in flight"
+))
+CONVERSIONS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "goms_conversions_in_flight", "GOs being converted to markdown"
+))
+GCS_UPLOAD_SECONDS = REGISTRY.register(Histogram(
+    "goms_gcs_upload_seconds", "Time to upload one file to GCS", (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+))
+GCS_UPLOAD_BYTES = REGISTRY.register(Counter(
+    "goms_gcs_upload_bytes_total", "Bytes uploaded to GCS"
+))
+JOB_SECONDS = REGISTRY.register(Histogram(
+    "goms_job_seconds", "Time from the start of a job's processing to its end",
+    (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "goms_jobs_total", "Finished jobs, by status", ("endpoint", "status")
+))
+JOBS = REGISTRY.register(Gauge(
+    "goms_jobs", "Current jobs, by status (pending jobs are the queue depth)", ("endpoint", "status")
+))
+
+LOG_RECORDS_DROPPED = REGISTRY.register(Gauge(
+    "goms_log_records_dropped", "Log records dropped because the log queue was full", ()
+))
+
+
+def record_gemini_usage(response):
+    """Count a Gemini response's prompt and response tokens."""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+    for kind, attribute in (("prompt", "prompt_token_count"), ("response", "candidates_token_count")):
+        tokens = getattr(usage, attribute, None)
+        if isinstance(tokens, int) and tokens > 0:
+            GEMINI_TOKENS.inc(tokens, kind=kind)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
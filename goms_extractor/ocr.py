@@ -0,0 +1,389 @@
+"""
+Selective OCR stage for the GO splitter.
+
+Finds pages whose text layer is missing or garbled, OCRs only those pages with
+OCRmyPDF (one single-page job per page, spread across the available cores) and
+swaps the OCR'd pages back into a copy of the input PDF. OCR output is cached per
+page, keyed by a hash of the page's content, so re-runs and reprinted pages are
+free.
+"""
+
+import os
+import io
+import re
+import time
+import shutil
+import string
+import hashlib
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import pypdfium2 as pdfium
+from pypdf import PdfReader, PdfWriter
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# A page with fewer printable characters than this has no usable text layer
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", "40"))
+# A page where less than this share of characters is letters/digits/punctuation/space
+# (e.g. unmapped glyphs from a broken font encoding) is treated as garbled
+OCR_MIN_VALID_RATIO = float(os.getenv("OCR_MIN_VALID_RATIO", "0.85"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+
+_VALID_PUNCTUATION = set(string.punctuation) | set("“”‘’–—•°§")
+# pdfminer-style placeholders for glyphs without a unicode mapping
+_CID_PATTERN = re.compile(r'\(cid:\d+\)')
+
+
+def text_layer_quality(text: str) -> Dict[str, Any]:
+    """
+    Score a page's extracted text layer.
+
+    Returns:
+        {"chars": printable character count, "valid_ratio": share of expected
+         characters, "needs_ocr": bool, "reason": "missing|garbled|None"}
+    """
+    stripped = "".join(text.split())
+    chars = len(stripped)
+    if chars < OCR_MIN_TEXT_CHARS:
+        return {"chars": chars, "valid_ratio": 0.0, "needs_ocr": True, "reason": "missing"}
+
+    cid_chars = sum(len(m) for m in _CID_PATTERN.findall(stripped))
+    valid = sum(1 for ch in stripped if ch.isalnum() or ch in _VALID_PUNCTUATION) - cid_chars
+    valid_ratio = max(valid, 0) / chars
+    if valid_ratio < OCR_MIN_VALID_RATIO:
+        return {"chars": chars, "valid_ratio": round(valid_ratio, 3), "needs_ocr": True, "reason": "garbled"}
+    return {"chars": chars, "valid_ratio": round(valid_ratio, 3), "needs_ocr": False, "reason": None}
+
+
+def find_pages_needing_ocr(input_pdf_path: str) -> List[Dict[str, Any]]:
+    """
+    Check the text layer of every page.
+
+    Returns:
+        List of {"page", "reason", "chars", "valid_ratio"} for pages that need OCR
+    """
+    return _check_text_layer(input_pdf_path)[1]
+
+
+def _check_text_layer(input_pdf_path: str, texts: Optional[Dict[int, str]] = None) -> tuple:
+    """
+    (page count, pages needing OCR) of a PDF; see find_pages_needing_ocr. Given
+    a texts dict, the extracted text of every page is kept in it.
+    """
+    pages = []
+    doc = pdfium.PdfDocument(input_pdf_path)
+    try:
+        num_pages = len(doc)
+        for i in range(num_pages):
+            page = doc[i]
+            try:
+                text = page_text(page)
+            finally:
+                page.close()
+            if texts is not None:
+                texts[i] = text
+            quality = text_layer_quality(text)
+            if quality["needs_ocr"]:
+                pages.append({"page": i, "reason": quality["reason"], "chars": quality["chars"], "valid_ratio": quality["valid_ratio"]})
+    finally:
+        doc.close()
+    return num_pages, pages
+
+
+def ocr_file_text(ocr_file: str) -> str:
+    """Text of an OCR'd single-page PDF from the page cache."""
+    doc = pdfium.PdfDocument(ocr_file)
+    try:
+        page = doc[0]
+        try:
+            return page_text(page)
+        finally:
+            page.close()
+    finally:
+        doc.close()
+
+
+def _single_page_pdf(reader: PdfReader, page_num: int) -> bytes:
+    """Extract one page into a standalone PDF (deterministic bytes for a given page)."""
+    writer = PdfWriter()
+    writer.add_page(reader.pages[page_num])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _ocr_page(page_bytes: bytes, cache_path: str) -> str:
+    """Run OCRmyPDF on a single-page PDF and store the result at cache_path."""
+    temp_base = f"{cache_path}.{os.getpid()}.{threading.get_ident()}"
+    temp_in = f"{temp_base}.in.pdf"
+    temp_out = f"{temp_base}.out.pdf"
+    try:
+        with open(temp_in, "wb") as f:
+            f.write(page_bytes)
+        subprocess.run(
+            ["ocrmypdf", "--force-ocr", "--jobs", "1", "--output-type", "pdf", temp_in, temp_out],
+            check=True,
+            capture_output=True
+        )
+        os.replace(temp_out, cache_path)
+        return cache_path
+    finally:
+        for path in (temp_in, temp_out):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _default_cache_dir() -> str:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.getenv("OCR_CACHE_DIR", os.path.join(project_root, "outputs", "ocr_cache"))
+
+
+def _ocr_pages(reader: PdfReader, needing_ocr: List[Dict[str, Any]], cache_dir: str, workers: int, result: Dict[str, Any]) -> Dict[int, str]:
+    """
+    OCR the given pages, each as a single-page PDF, through the per-page cache.
+    Counts cache hits, OCR'd and failed pages into result.
+
+    Returns:
+        {page number: path of its OCR'd single-page PDF} for the pages that succeeded
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Per-page cache lookup, keyed by the hash of the standalone page.
+    # Identical pages (e.g. reprinted GOs) share one OCR job.
+    ocr_paths = {}
+    pending = {}
+    for entry in needing_ocr:
+        page_bytes = _single_page_pdf(reader, entry["page"])
+        page_hash = hashlib.sha256(page_bytes).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{page_hash}.pdf")
+        if os.path.exists(cache_path):
+            ocr_paths[entry["page"]] = cache_path
+            result["cache_hits"] += 1
+        elif cache_path in pending:
+            pending[cache_path][1].append(entry["page"])
+        else:
+            pending[cache_path] = (page_bytes, [entry["page"]])
+
+    # OCR the remaining pages in parallel; each job is a separate ocrmypdf process
+    if pending:
+        logger.debug("Running OCRmyPDF on %d pages with %d workers", len(pending), workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_ocr_page, page_bytes, cache_path): page_nums
+                for cache_path, (page_bytes, page_nums) in pending.items()
+            }
+            for future, page_nums in futures.items():
+                try:
+                    cache_path = future.result()
+                    for page_num in page_nums:
+                        ocr_paths[page_num] = cache_path
+                    result["pages_ocred"] += len(page_nums)
+                except subprocess.CalledProcessError as e:
+                    logger.warning("OCRmyPDF failed on page %d: %s", page_nums[0] + 1, e.stderr.decode(errors="replace"))
+                    result["failed_pages"].extend(page_nums)
+                except Exception as e:
+                    logger.warning("OCR failed on page %d: %s", page_nums[0] + 1, e)
+                    result["failed_pages"].extend(page_nums)
+    return ocr_paths
+
+
+def page_text(page) -> str:
+    """Full text of a pdfium page."""
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range()
+    finally:
+        textpage.close()
+
+
+class PageOcr:
+    """
+    Selective OCR applied batch by batch, for the streaming splitter: pages are
+    checked and OCR'd as the scan reaches them, so the first GO does not wait for
+    the whole file. OCR'd pages are kept as single-page PDFs in the per-page cache
+    (see run_selective_ocr); ocr_files maps each replaced page to its file.
+    """
+
+    def __init__(self, input_pdf_path: str, workers: Optional[int] = None, cache_dir: Optional[str] = None, pages: Optional[List[int]] = None):
+        """
+        Args:
+            input_pdf_path: Path to the input PDF
+            workers: Concurrent single-page OCR jobs (default: OCR_WORKERS or CPU count)
+            cache_dir: Per-page OCR cache directory (default: OCR_CACHE_DIR or outputs/ocr_cache)
+            pages: Pages already known to need OCR; the text layer check is skipped
+        """
+        self.input_pdf_path = input_pdf_path
+        self.workers = workers or OCR_WORKERS
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.known_pages = set(pages) if pages is not None else None
+        self.available = shutil.which("ocrmypdf") is not None
+        self.ocr_files: Dict[int, str] = {}
+        self._reader: Optional[PdfReader] = None
+        self.stats = {
+            "pages_checked": 0,
+            "pages_needing_ocr": [],
+            "pages_ocred": 0,
+            "cache_hits": 0,
+            "failed_pages": [],
+            "seconds": 0.0
+        }
+
+    def apply(self, doc, page_nums) -> Dict[int, str]:
+        """
+        Check the given pages of doc (an open pdfium document over the input) and
+        OCR those with a missing or garbled text layer.
+
+        Returns:
+            {page number: text} for every page whose text was read, the OCR'd
+            text for replaced pages
+        """
+        started = time.perf_counter()
+        texts = {}
+        needing_ocr = []
+        for page_num in page_nums:
+            if self.known_pages is not None:
+                if page_num in self.known_pages:
+                    needing_ocr.append({"page": page_num, "reason": "known"})
+                continue
+            page = doc[page_num]
+            try:
+                texts[page_num] = page_text(page)
+            finally:
+                page.close()
+            quality = text_layer_quality(texts[page_num])
+            self.stats["pages_checked"] += 1
+            if quality["needs_ocr"]:
+                needing_ocr.append({"page": page_num, "reason": quality["reason"], "chars": quality["chars"], "valid_ratio": quality["valid_ratio"]})
+
+        self.stats["pages_needing_ocr"].extend(needing_ocr)
+        if needing_ocr and not self.available:
+            if len(self.stats["pages_needing_ocr"]) == len(needing_ocr):
+                logger.warning("OCRmyPDF not found, pages without a text layer will be split as-is")
+        elif needing_ocr:
+            if self._reader is None:
+                self._reader = PdfReader(self.input_pdf_path)
+            ocr_paths = _ocr_pages(self._reader, needing_ocr, self.cache_dir, self.workers, self.stats)
+            for page_num, ocr_file in ocr_paths.items():
+                texts[page_num] = ocr_file_text(ocr_file)
+            self.ocr_files.update(ocr_paths)
+        self.stats["seconds"] = round(self.stats["seconds"] + time.perf_counter() - started, 4)
+        return texts
+
+    def pages_in(self, go: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The GO's replaced pages, as stored on a segment ("ocr_pages", see splitter._build_go_writer)."""
+        return [
+            {"page": page_num, "ocr_file": self.ocr_files[page_num]}
+            for page_num in range(go["start_page"], go["end_page"] + 1)
+            if page_num in self.ocr_files
+        ]
+
+
+def run_selective_ocr(
+    input_pdf_path: str,
+    output_dir: str,
+    workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    pages: Optional[List[int]] = None,
+    texts: Optional[Dict[int, str]] = None
+) -> Dict[str, Any]:
+    """
+    OCR only the pages of a PDF whose text layer is missing or garbled.
+
+    Args:
+        input_pdf_path: Path to the input PDF
+        output_dir: Directory for the patched PDF (ocr_<name>.pdf)
+        workers: Concurrent single-page OCR jobs (default: OCR_WORKERS or CPU count)
+        cache_dir: Per-page OCR cache directory (default: OCR_CACHE_DIR or outputs/ocr_cache)
+        pages: Pages already known to need OCR (e.g. recorded in the split cache).
+            The text layer check is skipped and only these pages are OCR'd;
+            an empty list returns without opening the PDF.
+        texts: Filled with every page's text as read by the text layer check
+            (the OCR'd text for pages that were OCR'd), so callers such as the
+            text sidecars need not extract it again. Left empty when pages is given.
+
+    Returns:
+        Dictionary containing:
+        {
+            "status": "skipped|applied|unavailable|partial",
+            "message": "Description of what happened",
+            "pdf_path": PDF to use downstream (patched copy or the original),
+            "pages_checked": int (0 when pages was given),
+            "pages_needing_ocr": List of {"page", "reason", ...},
+            "pages_ocred": int,
+            "cache_hits": int,
+            "failed_pages": List of page numbers OCRmyPDF failed on,
+            "seconds": float
+        }
+    """
+    started = time.perf_counter()
+    workers = workers or OCR_WORKERS
+    cache_dir = cache_dir or _default_cache_dir()
+
+    pages_checked = 0
+    if pages is None:
+        pages_checked, needing_ocr = _check_text_layer(input_pdf_path, texts)
+    else:
+        needing_ocr = [{"page": page, "reason": "known"} for page in pages]
+    result = {
+        "status": "skipped",
+        "message": "All pages have a usable text layer",
+        "pdf_path": input_pdf_path,
+        "pages_checked": pages_checked,
+        "pages_needing_ocr": needing_ocr,
+        "pages_ocred": 0,
+        "cache_hits": 0,
+        "failed_pages": [],
+        "seconds": 0.0
+    }
+    if not needing_ocr:
+        result["seconds"] = round(time.perf_counter() - started, 4)
+        return result
+
+    # The PDF is only parsed with pypdf when there are pages to cut out and swap
+    reader = PdfReader(input_pdf_path)
+    num_pages = len(reader.pages)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%d/%d pages need OCR: %s", len(needing_ocr), num_pages, [p["page"] + 1 for p in needing_ocr])
+    if not shutil.which("ocrmypdf"):
+        logger.warning("OCRmyPDF not found, %d pages will be split without a text layer", len(needing_ocr))
+        result.update({
+            "status": "unavailable",
+            "message": "OCRmyPDF is not installed; pages without a text layer were left as-is",
+            "seconds": round(time.perf_counter() - started, 4)
+        })
+        return result
+
+    ocr_paths = _ocr_pages(reader, needing_ocr, cache_dir, workers, result)
+    if texts is not None:
+        for page_num, ocr_file in ocr_paths.items():
+            texts[page_num] = ocr_file_text(ocr_file)
+
+    # Swap the OCR'd pages into a copy of the input
+    if ocr_paths:
+        writer = PdfWriter()
+        for i in range(num_pages):
+            if i in ocr_paths:
+                writer.add_page(PdfReader(ocr_paths[i]).pages[0])
+            else:
+                writer.add_page(reader.pages[i])
+        os.makedirs(output_dir, exist_ok=True)
+        patched_path = os.path.join(output_dir, f"ocr_{os.path.basename(input_pdf_path)}")
+        with open(patched_path, "wb") as f:
+            writer.write(f)
+        result["pdf_path"] = patched_path
+
+    result["status"] = "partial" if result["failed_pages"] else "applied"
+    result["message"] = (
+        f"OCR applied to {len(ocr_paths)}/{len(needing_ocr)} pages needing it "
+        f"({result['cache_hits']} from cache, {len(result['failed_pages'])} failed)"
+    )
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    logger.debug("%s in %ss", result["message"], result["seconds"])
+    return result
@@ -0,0 +1,185 @@
+"""
+Payload slimming for the PDFs sent to Gemini.
+
+Split GOs are sent inline, and scanned gazettes carry full-resolution page images
+(3400x4400 RGB) or dense vector scans, several hundred KB per page. Gemini reads a
+PDF page as an image of fixed token cost, so most of those bytes only slow the
+upload and eat into the inline request size limit. Before a GO goes to Gemini
+its PDF can be slimmed (MD_PAYLOAD_MODE):
+
+- off: send the split PDF as is
+- strip: drop objects that do not change what a page shows (document metadata,
+  outlines, embedded files, JavaScript, structure tree, page thumbnails and
+  non-widget annotations) and compress content streams
+- raster: render every page at MD_PAYLOAD_DPI (150) and re-encode it, bilevel
+  with CCITT G4 compression (MD_PAYLOAD_COLOR=bilevel, threshold
+  MD_PAYLOAD_THRESHOLD) or as grayscale JPEG (MD_PAYLOAD_COLOR=gray, quality
+  MD_PAYLOAD_JPEG_QUALITY)
+- auto: strip, and also rasterize when the stripped PDF still averages more
+  than MD_PAYLOAD_RASTER_MIN_PAGE_BYTES per page, keeping the smaller result
+
+A slimmed payload is only used when it is smaller than the original.
+benchmarks/bench_payload.py compares sizes, token counts and latency with the
+unmodified PDFs.
+"""
+
+import io
+import os
+import time
+from typing import Dict, Any, Optional
+
+import pypdfium2 as pdfium
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import NameObject, ArrayObject
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+PAYLOAD_MODES = ("off", "strip", "raster", "auto")
+
+MD_PAYLOAD_MODE = os.getenv("MD_PAYLOAD_MODE", "off").lower()
+MD_PAYLOAD_DPI = int(os.getenv("MD_PAYLOAD_DPI", "150"))
+MD_PAYLOAD_COLOR = os.getenv("MD_PAYLOAD_COLOR", "bilevel").lower()
+MD_PAYLOAD_THRESHOLD = int(os.getenv("MD_PAYLOAD_THRESHOLD", "160"))
+MD_PAYLOAD_JPEG_QUALITY = int(os.getenv("MD_PAYLOAD_JPEG_QUALITY", "60"))
+MD_PAYLOAD_RASTER_MIN_PAGE_BYTES = int(os.getenv("MD_PAYLOAD_RASTER_MIN_PAGE_BYTES", str(100 * 1024)))
+
+# Catalog and page entries that do not affect rendering
+_CATALOG_KEYS = ("/Metadata", "/Outlines", "/StructTreeRoot", "/MarkInfo", "/PieceInfo", "/OpenAction", "/AA")
+_PAGE_KEYS = ("/Thumb", "/PieceInfo", "/Metadata", "/StructParents", "/AA", "/B")
+
+
+def payload_settings(mode: Optional[str] = None) -> Dict[str, Any]:
+    """Settings that change the slimmed payload (part of the markdown cache key)."""
+    mode = mode or MD_PAYLOAD_MODE
+    if mode in ("off", "strip"):
+        return {"mode": mode}
+    settings = {"mode": mode, "dpi": MD_PAYLOAD_DPI, "color": MD_PAYLOAD_COLOR}
+    if MD_PAYLOAD_COLOR == "bilevel":
+        settings["threshold"] = MD_PAYLOAD_THRESHOLD
+    else:
+        settings["jpeg_quality"] = MD_PAYLOAD_JPEG_QUALITY
+    if mode == "auto":
+        settings["raster_min_page_bytes"] = MD_PAYLOAD_RASTER_MIN_PAGE_BYTES
+    return settings
+
+
+def strip_pdf(pdf_bytes: bytes) -> bytes:
+    """Drop objects that do not change how pages render and recompress the rest."""
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(pdf_bytes)))
+    root = writer._root_object
+    for key in _CATALOG_KEYS:
+        if key in root:
+            del root[NameObject(key)]
+    names = root.get("/Names")
+    if names is not None:
+        names = names.get_object()
+        for key in ("/EmbeddedFiles", "/JavaScript"):
+            if key in names:
+                del names[NameObject(key)]
+    writer.metadata = None
+
+    for page in writer.pages:
+        for key in _PAGE_KEYS:
+            if key in page:
+                del page[NameObject(key)]
+        annots = page.get("/Annots")
+        if annots is not None:
+            # Form widgets can carry visible values; everything else is dropped
+            widgets = [annot for annot in annots.get_object() if annot.get_object().get("/Subtype") == "/Widget"]
+            if widgets:
+                page[NameObject("/Annots")] = ArrayObject(widgets)
+            else:
+                del page[NameObject("/Annots")]
+        page.compress_content_streams()
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def rasterize_pdf(pdf_bytes: bytes, dpi: Optional[int] = None, color: Optional[str] = None) -> bytes:
+    """
+    Render every page at dpi and rebuild the PDF from the page images, each page
+    keeping its original size. color is "bilevel" (1-bit, CCITT G4) or "gray" (JPEG).
+    """
+    dpi = dpi or MD_PAYLOAD_DPI
+    color = color or MD_PAYLOAD_COLOR
+    threshold = MD_PAYLOAD_THRESHOLD
+    doc = pdfium.PdfDocument(pdf_bytes)
+    images = []
+    try:
+        for page in doc:
+            try:
+                bitmap = page.render(scale=dpi / 72, grayscale=True)
+                image = bitmap.to_pil().convert("L")
+                bitmap.close()
+            finally:
+                page.close()
+            if color == "bilevel":
+                image = image.point(lambda value: 255 if value > threshold else 0).convert("1")
+            images.append(image)
+    finally:
+        doc.close()
+
+    output = io.BytesIO()
+    options = {"resolution": dpi, "save_all": True, "append_images": images[1:]}
+    if color != "bilevel":
+        options["quality"] = MD_PAYLOAD_JPEG_QUALITY
+    images[0].save(output, format="PDF", **options)
+    return output.getvalue()
+
+
+def slim_pdf_payload(pdf_bytes: bytes, mode: Optional[str] = None, pages: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Slim a GO's PDF before it is sent to Gemini.
+
+    Args:
+        pdf_bytes: GO PDF content
+        mode: off|strip|raster|auto (default: MD_PAYLOAD_MODE)
+        pages: Page count, if already known (used by auto)
+
+    Returns:
+        {"pdf_bytes": payload to send, "mode": requested mode, "applied":
+        "none|strip|raster", "original_bytes", "bytes", "saved_bytes", "seconds"}
+    """
+    mode = mode or MD_PAYLOAD_MODE
+    if mode not in PAYLOAD_MODES:
+        raise ValueError(f"Unknown MD_PAYLOAD_MODE '{mode}' (expected one of {', '.join(PAYLOAD_MODES)})")
+    started = time.perf_counter()
+    candidates = {"none": pdf_bytes}
+    try:
+        if mode in ("strip", "auto"):
+            candidates["strip"] = strip_pdf(pdf_bytes)
+        if mode == "raster":
+            candidates["raster"] = rasterize_pdf(pdf_bytes)
+        elif mode == "auto":
+            pages = pages or len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+            if len(candidates["strip"]) > MD_PAYLOAD_RASTER_MIN_PAGE_BYTES * max(pages, 1):
+                candidates["raster"] = rasterize_pdf(pdf_bytes)
+    except Exception as e:
+        logger.debug("Could not slim PDF payload (%s), sending it as is: %s", mode, e)
+
+    applied = min(candidates, key=lambda name: len(candidates[name]))
+    payload = candidates[applied]
+    return {
+        "pdf_bytes": payload,
+        "mode": mode,
+        "applied": applied,
+        "original_bytes": len(pdf_bytes),
+        "bytes": len(payload),
+        "saved_bytes": len(pdf_bytes) - len(payload),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+
+def summarize_payloads(conversion_results) -> Dict[str, int]:
+    """Per-job payload totals from a list of conversion results."""
+    payloads = [result["payload"] for result in conversion_results if result and result.get("payload")]
+    return {
+        "gos": len(payloads),
+        "original_bytes": sum(payload["original_bytes"] for payload in payloads),
+        "bytes": sum(payload["bytes"] for payload in payloads),
+        "saved_bytes": sum(payload["saved_bytes"] for payload in payloads)
+    }
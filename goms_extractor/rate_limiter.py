@@ -0,0 +1,267 @@
+"""
+Adaptive rate limiter shared by every Gemini call in the process.
+
+Three controls stack on each request:
+
+- Budgets: requests-per-minute and tokens-per-minute over a sliding 60 s window
+  (GEMINI_RPM / GEMINI_TPM, 0 = no budget). Requests reserve an estimated token
+  count up front; the reservation is corrected to the actual usage afterwards
+  (and refunded when the request is throttled or cancelled).
+- AIMD concurrency: the number of requests allowed in flight grows by one per
+  round of successful requests (additive increase) and is halved when Vertex
+  throttles (429 / 503, multiplicative decrease), at most once per cooldown so a
+  single burst of 429s counts as one signal. Throughput therefore climbs until
+  the quota pushes back and settles just below it, across all concurrent jobs.
+- Retry: throttled requests are retried with full-jitter exponential backoff.
+
+Both blocking (threads) and asyncio callers use the same limiter state.
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Callable
+
+WINDOW_SECONDS = 60.0
+POLL_SECONDS = 0.05
+THROTTLE_STATUS_CODES = (429, 503)
+THROTTLE_ERROR_NAMES = ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable")
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """True for quota / overload errors from Vertex AI (HTTP 429/503, gRPC RESOURCE_EXHAUSTED)."""
+    code = getattr(error, "code", None)
+    try:
+        if int(code) in THROTTLE_STATUS_CODES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return type(error).__name__ in THROTTLE_ERROR_NAMES
+
+
+def response_total_tokens(response) -> Optional[int]:
+    """Total token count from a Gemini response, if it reports usage."""
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None) if usage else None
+    return total if isinstance(total, int) else None
+
+
+class AdaptiveRateLimiter:
+    """RPM/TPM budgets plus AIMD concurrency and jittered retry"""
+
+    def __init__(
+        self,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        initial_concurrency: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: int = 1,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 2.0,
+        max_retries: Optional[int] = None,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            rpm: Requests per minute budget (default: GEMINI_RPM or 0 = none)
+            tpm: Tokens per minute budget (default: GEMINI_TPM or 0 = none)
+            initial_concurrency: Starting in-flight limit (default: GEMINI_INITIAL_CONCURRENCY or 4)
+            max_concurrency: Ceiling for the in-flight limit (default: GEMINI_MAX_CONCURRENCY or 64)
+            min_concurrency: Floor for the in-flight limit
+            decrease_factor: Multiplier applied to the limit on throttling
+            decrease_cooldown: Minimum seconds between two decreases
+            max_retries: Retries of a throttled request (default: GEMINI_MAX_RETRIES or 5)
+            base_backoff: First backoff ceiling in seconds (doubles per attempt)
+            max_backoff: Backoff ceiling in seconds
+            clock: Monotonic clock (injectable for tests)
+        """
+        self.rpm = int(os.getenv("GEMINI_RPM", "0")) if rpm is None else rpm
+        self.tpm = int(os.getenv("GEMINI_TPM", "0")) if tpm is None else tpm
+        self.max_concurrency = max_concurrency or int(os.getenv("GEMINI_MAX_CONCURRENCY", "64"))
+        self.min_concurrency = min_concurrency
+        initial = initial_concurrency or int(os.getenv("GEMINI_INITIAL_CONCURRENCY", "4"))
+        self.limit = float(min(max(initial, min_concurrency), self.max_concurrency))
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.max_retries = int(os.getenv("GEMINI_MAX_RETRIES", "5")) if max_retries is None else max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._window = deque()  # [timestamp, tokens] per request in the last minute
+        self._last_decrease = float("-inf")
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self.retries = 0
+        self.errors = 0
+
+    # -- admission --------------------------------------------------------
+
+    def _try_acquire(self, estimated_tokens: int):
+        """
+        Admit one request if concurrency and budgets allow.
+
+        Returns:
+            (ticket, 0.0) when admitted, or (None, seconds to wait) otherwise
+        """
+        with self._lock:
+            now = self.clock()
+            while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+                self._window.popleft()
+
+            if self.in_flight >= int(self.limit):
+                return None, POLL_SECONDS
+            if self.rpm and len(self._window) >= self.rpm:
+                return None, max(self._window[0][0] + WINDOW_SECONDS - now, POLL_SECONDS)
+            if self.tpm and self._window:
+                used = sum(entry[1] for entry in self._window)
+                if used + estimated_tokens > self.tpm:
+                    # Wait until enough reservations leave the window
+                    for timestamp, tokens in self._window:
+                        used -= tokens
+                        if used + estimated_tokens <= self.tpm:
+                            return None, max(timestamp + WINDOW_SECONDS - now, POLL_SECONDS)
+                    return None, max(self._window[-1][0] + WINDOW_SECONDS - now, POLL_SECONDS)
+
+            ticket = [now, estimated_tokens]
+            self._window.append(ticket)
+            self.in_flight += 1
+            return ticket, 0.0
+
+    def acquire(self, estimated_tokens: int = 0):
+        """Block until a request may be sent. Returns a ticket for release()."""
+        while True:
+            ticket, wait = self._try_acquire(estimated_tokens)
+            if ticket is not None:
+                return ticket
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens: int = 0):
+        """Await until a request may be sent. Returns a ticket for release()."""
+        while True:
+            ticket, wait = self._try_acquire(estimated_tokens)
+            if ticket is not None:
+                return ticket
+            await asyncio.sleep(wait)
+
+    def release(self, ticket, outcome: str, actual_tokens: Optional[int] = None):
+        """
+        Finish a request and feed its outcome to the AIMD controller.
+
+        Args:
+            ticket: Value returned by acquire()
+            outcome: "success", "throttled", "error" or "cancelled" (the caller
+                gave up on the request; it does not count towards the controller)
+            actual_tokens: Reported usage; replaces the estimate in the TPM window.
+                Throttled and cancelled requests without reported usage are
+                refunded their reservation, so a retry does not count it twice.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if actual_tokens is not None:
+                ticket[1] = actual_tokens
+            elif outcome in ("throttled", "cancelled"):
+                ticket[1] = 0
+            if outcome == "success":
+                self.successes += 1
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            elif outcome == "throttled":
+                self.throttled += 1
+                now = self.clock()
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            elif outcome != "cancelled":
+                self.errors += 1
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    # -- calls ------------------------------------------------------------
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0):
+        """Run fn() under the limiter, retrying throttled attempts with backoff."""
+        for attempt in range(self.max_retries + 1):
+            ticket = self.acquire(estimated_tokens)
+            # Anything that escapes fn() other than an Exception (KeyboardInterrupt,
+            # SystemExit) releases the ticket as cancelled
+            outcome, tokens = "cancelled", None
+            try:
+                result = fn()
+                outcome, tokens = "success", response_total_tokens(result)
+                return result
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                outcome = "throttled" if throttled else "error"
+                if not throttled or attempt == self.max_retries:
+                    raise
+            finally:
+                self.release(ticket, outcome, tokens)
+            self._count_retry()
+            time.sleep(self.backoff_delay(attempt))
+
+    async def call_async(self, fn: Callable[[], Any], estimated_tokens: int = 0):
+        """Await fn() under the limiter, retrying throttled attempts with backoff."""
+        for attempt in range(self.max_retries + 1):
+            ticket = await self.acquire_async(estimated_tokens)
+            # Cancellation (asyncio.CancelledError) releases the ticket as cancelled
+            outcome, tokens = "cancelled", None
+            try:
+                result = await fn()
+                outcome, tokens = "success", response_total_tokens(result)
+                return result
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                outcome = "throttled" if throttled else "error"
+                if not throttled or attempt == self.max_retries:
+                    raise
+            finally:
+                self.release(ticket, outcome, tokens)
+            self._count_retry()
+            await asyncio.sleep(self.backoff_delay(attempt))
+
+    def _count_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Limiter state for /health."""
+        with self._lock:
+            now = self.clock()
+            window = [entry for entry in self._window if entry[0] > now - WINDOW_SECONDS]
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "rpm_budget": self.rpm,
+                "tpm_budget": self.tpm,
+                "requests_last_minute": len(window),
+                "tokens_last_minute": sum(entry[1] for entry in window),
+                "successes": self.successes,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "errors": self.errors
+            }
+
+
+_shared_limiter: Optional[AdaptiveRateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Return the process-wide Gemini rate limiter."""
+    global _shared_limiter
+    if _shared_limiter is None:
+        with _shared_limiter_lock:
+            if _shared_limiter is None:
+                _shared_limiter = AdaptiveRateLimiter()
+    return _shared_limiter
@@ -0,0 +1,165 @@
+"""
+Persistent cache for split_goms results, keyed by a hash of the input PDF bytes.
+
+Each entry stores the go_index and split file locations for one input, so a
+re-submitted gazette skips the page scan entirely. Entries are JSON files in the
+cache directory (JsonFileCache, shared with the markdown cache); their mtime
+doubles as the LRU clock and the oldest entries are evicted once the cache grows
+past its size cap.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    """Stream a file through SHA-256 and return the hex digest."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_and_hash(src, dst) -> str:
+    """
+    Copy a binary file object to another (like shutil.copyfileobj) while hashing
+    the bytes as they stream through. Returns the SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: src.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+        dst.write(chunk)
+    return digest.hexdigest()
+
+
+class JsonFileCache:
+    """
+    Size-capped, LRU-evicted store of JSON entries, one file per key. Subclasses
+    pick the directory and cap and define their own make_key.
+
+    The number of entries is counted once and then kept up to date by put and
+    invalidate, so the directory is only listed when the count passes the cap.
+    Eviction then goes a tenth below the cap, so a full cache is not re-listed
+    on every put. Other processes sharing the directory can make the count
+    drift; it is re-read from the directory at every eviction.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._count: Optional[int] = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value for a key (and mark it recently used), or None."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path, None)
+            return value
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a value, then evict least recently used entries over the cap."""
+        path = self._entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({**value, "cached_at": time.time()}, f)
+        is_new = not os.path.exists(path)
+        os.replace(temp_path, path)
+        with self._lock:
+            if self._count is None:
+                self._count = len(self._list_entries())
+            elif is_new:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def invalidate(self, key: str):
+        """Drop an entry (e.g. when its split files no longer exist)."""
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._count:
+                self._count -= 1
+
+    def _list_entries(self):
+        """(mtime, path) of every entry in the directory."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def _evict(self):
+        """Remove the least recently used entries down to a tenth below the cap (caller holds _lock)."""
+        entries = self._list_entries()
+        keep = self.max_entries - self.max_entries // 10
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - keep]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            entries = entries[len(entries) - keep:]
+        self._count = len(entries)
+
+
+class SplitCache(JsonFileCache):
+    """Size-capped, LRU-evicted, on-disk cache of split results"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: Optional[int] = None):
+        """
+        Initialize the split cache.
+
+        Args:
+            cache_dir: Directory holding cache entries (default: SPLIT_CACHE_DIR
+                or outputs/split_cache)
+            max_entries: Maximum number of entries kept (default: SPLIT_CACHE_MAX_ENTRIES or 512)
+        """
+        if cache_dir is None:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            project_root = os.path.dirname(script_dir)
+            cache_dir = os.getenv("SPLIT_CACHE_DIR", os.path.join(project_root, "outputs", "split_cache"))
+        super().__init__(cache_dir, max_entries or int(os.getenv("SPLIT_CACHE_MAX_ENTRIES", "512")))
+
+    @staticmethod
+    def make_key(content_hash: str, rules_version: str, **params) -> str:
+        """
+        Build a cache key from the input hash, the boundary rules version and any
+        scan parameters that can change the resulting boundaries.
+        """
+        material = json.dumps({"content": content_hash, "rules": rules_version, **params}, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+_shared_cache: Optional[SplitCache] = None
+
+
+def get_split_cache() -> SplitCache:
+    """Return the process-wide split cache."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SplitCache()
+    return _shared_cache
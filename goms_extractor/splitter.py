@@ -3,56 +3,1122 @@ GO splitter module for splitting PDFs containing multiple Government Orders (GOs
 """
 
 import os
+import io
+import gc
 import re
 import json
+import threading
 import time
 import math
-from typing import List, Dict, Any, Optional
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import List, Dict, Any, Optional, Iterator, Iterable
 
 import pdfplumber
+import pypdfium2 as pdfium
 from pypdf import PdfReader, PdfWriter
 from dotenv import load_dotenv
-from dotenv import load_dotenv
+
+from .split_cache import get_split_cache, hash_file
+from .boundary_rules import get_boundary_engine, go_number
+from .ocr import run_selective_ocr, page_text, PageOcr
+from .memory import RssSampler
+from .text_sidecar import text_sidecar_path, write_text_sidecar
+from . import tracing
+from .log import get_logger, sample
+
+logger = get_logger(__name__)
+
+# Fraction of the page height (measured from the top edge) that is scanned for
+# the GO start headings (see boundary_rules) in header-band mode.
+HEADER_BAND_RATIO = 0.3
+
+# "header": single-open scan of a cropped header band per page (fast path)
+# "full":   full-page pdfplumber text extraction for every page (legacy)
+SCAN_MODES = ("header", "full")
+DEFAULT_SCAN_MODE = os.getenv("SPLIT_SCAN_MODE", "header")
+
+# Process-pool sharded scanning. With 1 worker the scan runs in-process.
+DEFAULT_SCAN_WORKERS = int(os.getenv("SPLIT_SCAN_WORKERS", "1"))
+# Smallest shard worth shipping to a worker process (each worker re-opens the file)
+MIN_PAGES_PER_SHARD = 25
+# Shards per worker, so a slow shard (e.g. image-heavy pages) doesn't stall the pool
+SHARDS_PER_WORKER = 4
+# Pages handed to the boundary rule engine per evaluate_batch call
+SCAN_BATCH_SIZE = 32
+
+# Split PDF writer: worker processes for the write phase (1 = write in-process)
+DEFAULT_WRITE_WORKERS = int(os.getenv("SPLIT_WRITE_WORKERS", "1"))
+# Compress content streams and merge identical objects (fonts, images repeated
+# on every page of a gazette) in each split PDF
+DEFAULT_WRITE_OPTIMIZE = os.getenv("SPLIT_WRITE_OPTIMIZE", "false").lower() == "true"
+
+# Write a per-GO text sidecar (JSONL of page texts) next to each split PDF
+DEFAULT_TEXT_SIDECAR = os.getenv("SPLIT_TEXT_SIDECAR", "true").lower() == "true"
+
+# Bounded-memory mode: pages are scanned and read in windows of this many pages,
+# with the PDF re-opened per window so parser caches never outgrow one window.
+# 0 = off (one open handle for the whole run).
+DEFAULT_WINDOW_PAGES = int(os.getenv("SPLIT_WINDOW_PAGES", "0"))
+
+# Bump whenever the boundary detection logic changes, so cached split results are
+# not reused (the configured rule set is part of the cache key on its own)
+BOUNDARY_RULES_VERSION = "2"
+SPLIT_CACHE_ENABLED = os.getenv("SPLIT_CACHE_ENABLED", "true").lower() == "true"
 
 
 def analyze_page_regex(text: str) -> Dict[str, Any]:
     """
     Analyzes a page using regex to identify GO Start/End.
-    STRICT MODE: Splits only by Heading ("GOVERNMENT OF...")
-    """
-    is_start = False
-    is_end = False
-    goms_no = None
-    
-    # Start detection - STRICTLY BY HEADING
-    # Look for "GOVERNMENT OF" in the first 300 characters (Header)
-    # This is the primary signal for a new GO.
-    if "GOVERNMENT OF" in text[:300].upper():
-        is_start = True
-        
-        # Extract GOMs No for metadata if available
-        match = re.search(r'G\.O\.Ms\.No\.?\s*(\d+)', text, re.IGNORECASE)
-        if match:
-            goms_no = match.group(1)
-            
-    # Disable explicit end detection to rely solely on the next header (start)
-    # This ensures we split "Start to Start"
-    is_end = False
-        
+    STRICT MODE: Splits only by Heading ("GOVERNMENT OF..." or another start rule
+    of the configured boundary rule set)
+    """
+    return _page_analysis(get_boundary_engine().evaluate(text))
+
+
+def _page_analysis(evaluation: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a boundary rule evaluation into the per-page analysis dict."""
+    return {
+        "is_start": evaluation["is_start"],
+        # Disable explicit end detection to rely solely on the next header (start)
+        # This ensures we split "Start to Start"
+        "is_end": False,
+        "goms_no": go_number(evaluation["metadata"]),
+        "start_rule": evaluation["start_rule"],
+        "metadata": evaluation["metadata"]
+    }
+
+
+def iter_pages_full(input_pdf_path: str, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Legacy boundary scan: extracts the full text of every page with pdfplumber
+    and evaluates the boundary rules on it, SCAN_BATCH_SIZE pages per call.
+    Yields one analysis per page, in order.
+
+    Args:
+        input_pdf_path: Path to the PDF
+        start_page: First page to scan (0-indexed)
+        end_page: Page to stop before (exclusive, default: last page)
+
+    Yields:
+        Per-page analysis dicts ({"page", "is_start", "is_end", "goms_no", "start_rule", "metadata"})
+    """
+    engine = get_boundary_engine()
+    with pdfplumber.open(input_pdf_path) as pdf:
+        pages = pdf.pages[start_page:end_page]
+        for batch_start in range(0, len(pages), SCAN_BATCH_SIZE):
+            texts = [_extract_page_text(page) for page in pages[batch_start:batch_start + SCAN_BATCH_SIZE]]
+            for offset, evaluation in enumerate(engine.evaluate_batch(texts)):
+                analysis = _page_analysis(evaluation)
+                analysis["page"] = start_page + batch_start + offset
+                yield analysis
+
+
+def _extract_page_text(page) -> str:
+    """Full text of a pdfplumber page, releasing the page's cached layout objects."""
+    try:
+        return page.extract_text() or ""
+    finally:
+        page.close()
+
+
+def scan_pages_full(input_pdf_path: str, start_page: int = 0, end_page: Optional[int] = None) -> List[Dict[str, Any]]:
+    """List form of iter_pages_full."""
+    return list(iter_pages_full(input_pdf_path, start_page, end_page))
+
+
+def _band_text(page, header_band: float) -> str:
+    """Text in the top `header_band` fraction of a pdfium page."""
+    textpage = page.get_textpage()
+    try:
+        width, height = page.get_size()
+        # PDFium uses a bottom-left origin: the header band is the top slice
+        return textpage.get_text_bounded(0, height * (1 - header_band), width, height)
+    finally:
+        textpage.close()
+
+
+def iter_pages_header_band(
+    source,
+    header_band: float = HEADER_BAND_RATIO,
+    start_page: int = 0,
+    end_page: Optional[int] = None,
+    ocr: Optional[PageOcr] = None,
+    texts: Optional[Dict[int, str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Fast boundary scan: pulls text only from the top `header_band` fraction of
+    each page. The full page text is extracted only for pages flagged as GO
+    starts, so the G.O.Ms.No lookup still sees the whole page. Yields one
+    analysis per page, in order.
+
+    Args:
+        source: Path to the PDF or an open binary file handle (seekable)
+        header_band: Fraction of the page height to scan, measured from the top
+        start_page: First page to scan (0-indexed)
+        end_page: Page to stop before (exclusive, default: last page)
+        ocr: Selective OCR applied to each batch before it is scanned; OCR'd
+            pages are scanned from their OCR'd copy
+        texts: Filled with the full page texts read while scanning (every page
+            the OCR check reads, plus start pages)
+
+    Yields:
+        Per-page analysis dicts ({"page", "is_start", "is_end", "goms_no", "start_rule", "metadata"})
+    """
+    engine = get_boundary_engine()
+    doc = pdfium.PdfDocument(source)
+    texts = {} if texts is None else texts
+
+    def full_text(page_num: int) -> str:
+        if page_num not in texts:
+            page = doc[page_num]
+            try:
+                texts[page_num] = page_text(page)
+            finally:
+                page.close()
+        return texts[page_num]
+
+    def band_text(page_num: int) -> str:
+        ocr_file = ocr.ocr_files.get(page_num) if ocr else None
+        page_doc = pdfium.PdfDocument(ocr_file) if ocr_file else doc
+        page = page_doc[0 if ocr_file else page_num]
+        try:
+            return _band_text(page, header_band)
+        finally:
+            page.close()
+            if ocr_file:
+                page_doc.close()
+
+    try:
+        if end_page is None:
+            end_page = len(doc)
+        for batch_start in range(start_page, end_page, SCAN_BATCH_SIZE):
+            batch_pages = range(batch_start, min(batch_start + SCAN_BATCH_SIZE, end_page))
+            if ocr:
+                texts.update(ocr.apply(doc, batch_pages))
+            band_texts = [band_text(i) for i in batch_pages]
+            # Metadata (G.O.Ms.No etc.) is read from the full text of start pages only
+            evaluations = engine.evaluate_batch(band_texts, full_text=lambda offset: full_text(batch_pages[offset]))
+            for i, evaluation in zip(batch_pages, evaluations):
+                analysis = _page_analysis(evaluation)
+                analysis["page"] = i
+                yield analysis
+    finally:
+        doc.close()
+
+
+def scan_pages_header_band(
+    source,
+    header_band: float = HEADER_BAND_RATIO,
+    start_page: int = 0,
+    end_page: Optional[int] = None,
+    texts: Optional[Dict[int, str]] = None
+) -> List[Dict[str, Any]]:
+    """List form of iter_pages_header_band."""
+    return list(iter_pages_header_band(source, header_band, start_page, end_page, texts=texts))
+
+
+def iter_pages_windowed(
+    input_pdf_path: str,
+    num_pages: int,
+    scan_mode: str = "header",
+    header_band: float = HEADER_BAND_RATIO,
+    window_pages: int = 200,
+    sampler: Optional[RssSampler] = None,
+    ocr: Optional[PageOcr] = None,
+    texts: Optional[Dict[int, str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Bounded-memory boundary scan: scans `window_pages` pages at a time with a
+    fresh document handle per window, so pdfium / pdfplumber page caches are
+    released between windows. Yields one analysis per page, in order.
+
+    Args:
+        input_pdf_path: Path to the PDF
+        num_pages: Number of pages in the PDF
+        scan_mode: "header" or "full"
+        header_band: Fraction of the page height scanned in header mode
+        window_pages: Pages per window
+        sampler: Optional RssSampler, sampled after each window
+        ocr, texts: See iter_pages_header_band (header mode only)
+    """
+    for start in range(0, num_pages, window_pages):
+        end = min(start + window_pages, num_pages)
+        if scan_mode == "header":
+            yield from iter_pages_header_band(input_pdf_path, header_band, start, end, ocr, texts)
+        else:
+            yield from iter_pages_full(input_pdf_path, start, end)
+        # Parsed page objects hold reference cycles; free them before the next window
+        gc.collect()
+        if sampler:
+            sampler.sample()
+
+
+class WindowedReader:
+    """
+    Hands out PdfReaders over one open file, replacing the reader once it has
+    served `window_pages` pages. pypdf keeps every parsed page object for the
+    lifetime of a reader; dropping it per window keeps that cache bounded.
+    """
+
+    def __init__(self, pdf_file, window_pages: int, sampler: Optional[RssSampler] = None):
+        self.pdf_file = pdf_file
+        self.window_pages = window_pages
+        self.sampler = sampler
+        self.windows = 0
+        self._reader = None
+        self._pages_served = 0
+
+    def reader_for(self, go: Dict[str, Any]) -> PdfReader:
+        """Return a reader for one GO's pages, starting a new window when due."""
+        if self._reader is None or self._pages_served >= self.window_pages:
+            # pypdf objects point back at their reader, so the old window is only
+            # released by the cycle collector
+            self._reader = None
+            gc.collect()
+            if self.sampler:
+                self.sampler.sample()
+            self._reader = PdfReader(self.pdf_file)
+            self._pages_served = 0
+            self.windows += 1
+        self._pages_served += max(go["end_page"] - go["start_page"] + 1, 0)
+        return self._reader
+
+
+def _scan_shard(input_pdf_path: str, scan_mode: str, header_band: float, start_page: int, end_page: int):
+    """
+    Process-pool worker: opens its own handle on the PDF and scans one page range.
+
+    Returns:
+        Tuple of (start_page, per-page results, seconds spent in the worker)
+    """
+    shard_start = time.perf_counter()
+    if scan_mode == "header":
+        results = scan_pages_header_band(input_pdf_path, header_band, start_page, end_page)
+    else:
+        results = scan_pages_full(input_pdf_path, start_page, end_page)
+    return start_page, results, time.perf_counter() - shard_start
+
+
+def plan_shards(num_pages: int, workers: int) -> List[tuple]:
+    """
+    Split the page range into contiguous (start, end) shards for the process pool.
+
+    Returns:
+        List of (start_page, end_page) tuples, end exclusive. A single shard when
+        the document is too small to be worth parallelizing.
+    """
+    if workers <= 1 or num_pages < 2 * MIN_PAGES_PER_SHARD:
+        return [(0, num_pages)]
+    num_shards = max(1, min(workers * SHARDS_PER_WORKER, num_pages // MIN_PAGES_PER_SHARD))
+    shard_size = math.ceil(num_pages / num_shards)
+    return [(start, min(start + shard_size, num_pages)) for start in range(0, num_pages, shard_size)]
+
+
+def scan_pages_parallel(
+    input_pdf_path: str,
+    num_pages: int,
+    scan_mode: str = "header",
+    header_band: float = HEADER_BAND_RATIO,
+    workers: int = DEFAULT_SCAN_WORKERS
+) -> Dict[str, Any]:
+    """
+    Sharded boundary scan across a process pool. Each worker opens its own handle
+    on the file and scans a contiguous page range; the per-page results are merged
+    back in page order.
+
+    Args:
+        input_pdf_path: Path to the PDF
+        num_pages: Number of pages in the PDF
+        scan_mode: "header" or "full"
+        header_band: Fraction of the page height scanned in header mode
+        workers: Number of worker processes
+
+    Returns:
+        {
+            "results": Per-page analysis dicts in page order,
+            "workers": Worker processes used,
+            "shards": Number of shards,
+            "worker_seconds": Total time spent scanning inside the workers,
+            "wall_seconds": Elapsed time for the whole parallel scan,
+            "parallelism": worker_seconds / wall_seconds, the average number of
+                           workers busy scanning (not a speedup over a serial
+                           scan: pool startup and per-worker opens are not in
+                           worker_seconds)
+        }
+    """
+    shards = plan_shards(num_pages, workers)
+    wall_start = time.perf_counter()
+    shard_results = []
+    if len(shards) == 1:
+        workers = 1
+        shard_results.append(_scan_shard(input_pdf_path, scan_mode, header_band, 0, num_pages))
+    else:
+        workers = min(workers, len(shards))
+        logger.debug("Scanning %d pages in %d shards across %d worker processes", num_pages, len(shards), workers)
+        # spawn: the API calls this from a threaded server, where fork is unsafe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(_scan_shard, input_pdf_path, scan_mode, header_band, start, end)
+                for start, end in shards
+            ]
+            for future in futures:
+                shard_results.append(future.result())
+    wall_seconds = time.perf_counter() - wall_start
+
+    # Merge back in page order
+    shard_results.sort(key=lambda shard: shard[0])
+    results = [res for _, shard, _ in shard_results for res in shard]
+    worker_seconds = sum(elapsed for _, _, elapsed in shard_results)
+
     return {
-        "is_start": is_start,
-        "is_end": is_end,
-        "goms_no": goms_no
+        "results": results,
+        "workers": workers,
+        "shards": len(shards),
+        "worker_seconds": round(worker_seconds, 4),
+        "wall_seconds": round(wall_seconds, 4),
+        "parallelism": round(worker_seconds / wall_seconds, 2) if wall_seconds > 0 else None
     }
 
 
-def split_goms(input_pdf_path: str, output_dir: Optional[str] = None) -> Dict[str, Any]:
+def iter_go_index(results: Iterable[Dict[str, Any]], num_pages: int) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally build the GO index from per-page analysis results. Each GO is
+    yielded as soon as it is closed - by the next "GOVERNMENT OF" heading or by
+    the end of the document - so callers can act on it before the scan finishes.
+
+    Args:
+        results: Per-page analysis dicts in page order (list or generator)
+        num_pages: Total number of pages in the source PDF
+
+    Yields:
+        {"goms_no", "start_page", "end_page"} dicts (0-indexed pages)
+    """
+    current_go = None
+
+    for res in results:
+        page_num = res.get("page")
+        is_start = res.get("is_start")
+        is_end = res.get("is_end")
+        goms_no = res.get("goms_no")
+
+        # Start of new GO
+        if is_start:
+            # If previous GO was open, close it at previous page
+            if current_go:
+                current_go["end_page"] = page_num - 1 # Close at previous page
+                sample(logger, "split.go_boundary", "Completed previous GO: %s (pages %d to %d)", current_go["goms_no"], current_go["start_page"] + 1, current_go["end_page"] + 1)
+                yield current_go
+
+            current_go = {
+                "goms_no": goms_no or "Unknown",
+                "start_page": page_num, # 0-indexed
+                "end_page": None # Will be set later
+            }
+            sample(logger, "split.go_boundary", "Started new GO: %s at page %d", current_go["goms_no"], current_go["start_page"] + 1)
+
+        # End of GO
+        if is_end and current_go:
+            # If we find an end marker, it's likely the end of the current GO
+            # But sometimes end marker is on the same page as start (single page GO)
+            # Or multiple end markers (e.g. one for notification, one for order)
+            # We'll assume the last end marker closes it, or the next start marker closes it.
+            # For now, let's just mark it. If we encounter a new start, we'll close it anyway.
+            # If we encounter an end, we can close it, but what if there are pages after?
+            # Usually "SECTION OFFICER" is the very end.
+            current_go["end_page"] = page_num
+            # We don't append yet, in case there are multiple end markers or we want to wait for next start?
+            # Actually, if we close it here, and there's no next start immediately, we might miss pages?
+            # But "SECTION OFFICER" is usually the end.
+            # Let's close it.
+            sample(logger, "split.go_boundary", "Ended GO: %s at page %d", current_go["goms_no"], current_go["end_page"] + 1)
+            yield current_go
+            current_go = None
+
+    # Handle last GO if still open
+    if current_go:
+        current_go["end_page"] = num_pages - 1
+        logger.debug("Completed final GO: %s (pages %d to %d)", current_go["goms_no"], current_go["start_page"] + 1, current_go["end_page"] + 1)
+        yield current_go
+
+
+def build_go_index(results: Iterable[Dict[str, Any]], num_pages: int) -> List[Dict[str, Any]]:
+    """
+    Build the GO index (start/end pages per GO) from per-page analysis results.
+
+    Args:
+        results: Per-page analysis dicts in page order
+        num_pages: Total number of pages in the source PDF
+
+    Returns:
+        List of {"goms_no", "start_page", "end_page"} dicts (0-indexed pages)
+    """
+    logger.debug("Building GO index from analysis results")
+    go_index = list(iter_go_index(results, num_pages))
+    logger.debug("GO index built with %d documents", len(go_index))
+    return go_index
+
+
+def go_pdf_filename(go: Dict[str, Any]) -> str:
+    """Return the split PDF filename for a GO index entry."""
+    start = go["start_page"]
+    end = go["end_page"]
+    num = go["goms_no"]
+
+    # Sanitize GO number for filename
+    clean_num = re.sub(r'[^\w\d-]', '', num.replace("G.O.Ms.No.", "").strip())
+    filename = f"GO_{clean_num}_Pages_{start+1}-{end+1}.pdf"
+    return re.sub(r'[<>:"/\\|?*]', '_', filename)
+
+
+def _build_go_writer(reader: PdfReader, go: Dict[str, Any], optimize: Optional[bool] = None) -> PdfWriter:
+    """
+    Collect the pages of one GO into a PdfWriter. Pages listed in the GO's
+    "ocr_pages" (streaming OCR, see ocr.PageOcr) are taken from their OCR'd
+    single-page PDF. With optimize (default: SPLIT_WRITE_OPTIMIZE), content
+    streams are compressed and identical objects merged, so a font or image
+    repeated on every page is stored once.
+    """
+    writer = PdfWriter()
+    ocr_files = {entry["page"]: entry["ocr_file"] for entry in go.get("ocr_pages", [])}
+    for p in range(go["start_page"], go["end_page"] + 1):
+        writer.add_page(PdfReader(ocr_files[p]).pages[0] if p in ocr_files else reader.pages[p])
+    if DEFAULT_WRITE_OPTIMIZE if optimize is None else optimize:
+        for page in writer.pages:
+            # Re-encoding is expensive; only touch pages with raw content streams
+            if _has_unfiltered_content(page):
+                page.compress_content_streams()
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    return writer
+
+
+def _has_unfiltered_content(page) -> bool:
+    """True if any of the page's content streams is stored without a /Filter."""
+    contents = page.get("/Contents")
+    if contents is None:
+        return False
+    contents = contents.get_object()
+    streams = contents if isinstance(contents, list) else [contents]
+    return any("/Filter" not in stream.get_object() for stream in streams)
+
+
+def write_go_pdf(reader: PdfReader, go: Dict[str, Any], output_dir: str, optimize: Optional[bool] = None) -> Optional[str]:
+    """
+    Write the pages of one GO to its own PDF file.
+
+    Args:
+        reader: PdfReader over the source PDF
+        go: GO index entry ({"goms_no", "start_page", "end_page"})
+        output_dir: Directory to write the split PDF into
+        optimize: Deduplicate / compress shared objects (default: SPLIT_WRITE_OPTIMIZE)
+
+    Returns:
+        Path to the written file, or None if the page range is invalid
+    """
+    start = go["start_page"]
+    end = go["end_page"]
+
+    # Validate range
+    if start > end:
+        logger.warning("Invalid range for GO %s: %d-%d, skipping", go["goms_no"], start + 1, end + 1)
+        return None
+
+    output_path = os.path.join(output_dir, go_pdf_filename(go))
+    with open(output_path, "wb") as f:
+        _build_go_writer(reader, go, optimize).write(f)
+
+    return output_path
+
+
+def plan_write_batches(go_index: List[Dict[str, Any]], workers: int, max_pages: Optional[int] = None) -> List[List[int]]:
+    """
+    Group GO index positions into contiguous batches of roughly equal page count
+    for the write workers.
+
+    Args:
+        go_index: GO index entries
+        workers: Number of write workers
+        max_pages: Optional page cap per batch (bounded-memory mode)
+
+    Returns:
+        List of batches, each a list of positions in go_index
+    """
+    total_pages = sum(max(go["end_page"] - go["start_page"] + 1, 0) for go in go_index)
+    target = max(1, math.ceil(total_pages / max(workers * SHARDS_PER_WORKER, 1)))
+    if max_pages:
+        target = min(target, max_pages)
+    batches, batch, batch_pages = [], [], 0
+    for position, go in enumerate(go_index):
+        batch.append(position)
+        batch_pages += max(go["end_page"] - go["start_page"] + 1, 0)
+        if batch_pages >= target:
+            batches.append(batch)
+            batch, batch_pages = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _write_go_batch(
+    input_pdf_path: str,
+    gos: List[Dict[str, Any]],
+    output_dir: str,
+    optimize: Optional[bool],
+    window_pages: int,
+    text_sidecar: bool = False,
+    texts: Optional[Dict[int, str]] = None
+) -> List[tuple]:
+    """
+    Write-worker: opens its own handle on the PDF and writes a batch of GOs.
+    Sidecars are written from texts (the batch's page texts) when given.
+
+    Returns:
+        List of (split_file or None, bytes written, text sidecar info or None)
+        per GO, in order
+    """
+    written = []
+    text_doc = pdfium.PdfDocument(input_pdf_path) if text_sidecar and texts is None else None
+    texts = texts if text_sidecar else None
+    try:
+        with open(input_pdf_path, "rb") as pdf_file:
+            reader = WindowedReader(pdf_file, window_pages) if window_pages else PdfReader(pdf_file)
+            for go in gos:
+                go_reader = reader.reader_for(go) if window_pages else reader
+                written.append(_write_go_outputs(go_reader, text_doc, go, output_dir, optimize, texts))
+    finally:
+        if text_doc:
+            text_doc.close()
+    return written
+
+
+def _write_go_outputs(
+    reader: PdfReader,
+    text_doc,
+    go: Dict[str, Any],
+    output_dir: str,
+    optimize: Optional[bool],
+    texts: Optional[Dict[int, str]] = None
+) -> tuple:
+    """Write one GO's PDF and, given page texts or a pdfium document, its text sidecar."""
+    output_path = write_go_pdf(reader, go, output_dir, optimize)
+    if output_path is None:
+        return None, 0, None
+    has_text = text_doc is not None or texts is not None
+    sidecar = write_text_sidecar(text_doc, go, text_sidecar_path(output_path), texts) if has_text else None
+    return output_path, os.path.getsize(output_path), sidecar
+
+
+def _batch_texts(page_texts: Optional[Dict[int, str]], gos: List[Dict[str, Any]]) -> Optional[Dict[int, str]]:
+    """The page texts a write worker needs for its GOs."""
+    if page_texts is None:
+        return None
+    return {p: page_texts[p] for go in gos for p in range(go["start_page"], go["end_page"] + 1) if p in page_texts}
+
+
+def write_go_pdfs(
+    input_pdf_path: str,
+    go_index: List[Dict[str, Any]],
+    output_dir: str,
+    workers: Optional[int] = None,
+    optimize: Optional[bool] = None,
+    reader=None,
+    window_pages: int = 0,
+    sampler: Optional[RssSampler] = None,
+    text_sidecar: Optional[bool] = None,
+    page_texts: Optional[Dict[int, str]] = None
+) -> Dict[str, Any]:
+    """
+    Split writer stage: writes one PDF per GO, across a process pool when more
+    than one worker is requested (each worker opens its own reader).
+
+    Args:
+        input_pdf_path: Path to the source PDF
+        go_index: GO index entries
+        output_dir: Directory to write the split PDFs into
+        workers: Write worker processes (default: SPLIT_WRITE_WORKERS, 1 = in-process)
+        optimize: Deduplicate / compress shared objects (default: SPLIT_WRITE_OPTIMIZE)
+        reader: Already-open PdfReader or WindowedReader for the in-process path
+        window_pages: Bounded-memory mode page window (0 = off)
+        sampler: Optional RssSampler, sampled per written GO (in-process path)
+        text_sidecar: Write a JSONL text sidecar next to each split PDF
+            (default: SPLIT_TEXT_SIDECAR, see text_sidecar.py)
+        page_texts: Page texts already read (e.g. by the OCR check), written to
+            the sidecars instead of extracting them again
+
+    Returns:
+        {
+            "split_files": Paths of the written files, in GO order,
+            "text_sidecars": [{"goms_no", "split_file", "text_file", "pages",
+                               "chars", "low_text_pages"}, ...] (empty when disabled),
+            "write_stats": {"workers", "optimize", "seconds", "total_bytes",
+                            "per_go": [{"goms_no", "split_file", "bytes"}, ...]}
+        }
+    """
+    workers = workers or DEFAULT_WRITE_WORKERS
+    optimize = DEFAULT_WRITE_OPTIMIZE if optimize is None else optimize
+    text_sidecar = DEFAULT_TEXT_SIDECAR if text_sidecar is None else text_sidecar
+    os.makedirs(output_dir, exist_ok=True)
+    write_start = time.perf_counter()
+    written: List[tuple] = []
+
+    batches = plan_write_batches(go_index, workers, window_pages or None) if workers > 1 else []
+    if len(batches) > 1:
+        workers = min(workers, len(batches))
+        logger.debug("Writing %d GOs in %d batches across %d worker processes", len(go_index), len(batches), workers)
+        # spawn: the API calls this from a threaded server, where fork is unsafe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(
+                    _write_go_batch, input_pdf_path, [go_index[i] for i in batch], output_dir, optimize, window_pages, text_sidecar,
+                    _batch_texts(page_texts, [go_index[i] for i in batch])
+                )
+                for batch in batches
+            ]
+            for future in futures:
+                written.extend(future.result())
+    else:
+        workers = 1
+        pdf_file = None
+        if reader is None:
+            pdf_file = open(input_pdf_path, "rb")
+            reader = WindowedReader(pdf_file, window_pages, sampler) if window_pages else PdfReader(pdf_file)
+        text_doc = pdfium.PdfDocument(input_pdf_path) if text_sidecar and page_texts is None else None
+        texts = page_texts if text_sidecar else None
+        try:
+            for i, go in enumerate(go_index):
+                sample(logger, "split.write", "Creating file %d/%d: GO %s, pages %d to %d", i + 1, len(go_index), go["goms_no"], go["start_page"] + 1, go["end_page"] + 1)
+                go_reader = reader.reader_for(go) if isinstance(reader, WindowedReader) else reader
+                written.append(_write_go_outputs(go_reader, text_doc, go, output_dir, optimize, texts))
+                if sampler:
+                    sampler.sample()
+        finally:
+            if text_doc:
+                text_doc.close()
+            if pdf_file:
+                pdf_file.close()
+
+    split_files = []
+    text_sidecars = []
+    per_go = []
+    for go, (output_path, size, sidecar) in zip(go_index, written):
+        if output_path is None:
+            continue
+        split_files.append(output_path)
+        per_go.append({"goms_no": go["goms_no"], "split_file": output_path, "bytes": size})
+        if sidecar:
+            text_sidecars.append({"goms_no": go["goms_no"], "split_file": output_path, **sidecar})
+        sample(logger, "split.created", "Created: %s (%d bytes)", output_path, size)
+
+    return {
+        "split_files": split_files,
+        "text_sidecars": text_sidecars,
+        "write_stats": {
+            "workers": workers,
+            "optimize": optimize,
+            "seconds": round(time.perf_counter() - write_start, 4),
+            "total_bytes": sum(entry["bytes"] for entry in per_go),
+            "per_go": per_go
+        }
+    }
+
+
+def render_go_pdf_bytes(entry: Dict[str, Any]) -> bytes:
+    """
+    Build the PDF for one manifest entry in memory, without touching disk.
+
+    Args:
+        entry: Manifest entry ({"source_pdf", "start_page", "end_page", ...})
+
+    Returns:
+        The GO's PDF as bytes
+    """
+    buffer = io.BytesIO()
+    with open(entry["source_pdf"], "rb") as pdf_file:
+        _build_go_writer(PdfReader(pdf_file), entry).write(buffer)
+    return buffer.getvalue()
+
+
+def materialize_go_pdf(entry: Dict[str, Any]) -> str:
+    """
+    Lazily write the split PDF for a virtual manifest entry. The file is cached at
+    the entry's planned "split_file" path, so repeat requests reuse it.
+
+    Args:
+        entry: Manifest entry from a virtual split_goms / iter_go_segments result
+
+    Returns:
+        Path to the materialized split PDF
+    """
+    output_path = entry["split_file"]
+    if os.path.exists(output_path):
+        return output_path
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Write to a temp name first so concurrent callers never see a partial file
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(render_go_pdf_bytes(entry))
+    os.replace(temp_path, output_path)
+    logger.debug("Materialized split PDF: %s", output_path)
+    return output_path
+
+
+def build_manifest(input_pdf_path: str, go_index: List[Dict[str, Any]], output_dir: str) -> List[Dict[str, Any]]:
+    """
+    Build a virtual split manifest: one entry per valid GO with the source PDF,
+    its page range and the path the split PDF will have once materialized.
+    """
+    source_pdf = os.path.abspath(input_pdf_path)
+    manifest = []
+    for go in go_index:
+        if go["start_page"] > go["end_page"]:
+            logger.warning("Invalid range for GO %s: %d-%d, skipping", go["goms_no"], go["start_page"] + 1, go["end_page"] + 1)
+            continue
+        manifest.append({
+            **go,
+            "source_pdf": source_pdf,
+            "split_file": os.path.join(output_dir, go_pdf_filename(go)),
+            "virtual": True
+        })
+    return manifest
+
+
+def _with_text_sidecar(text_doc, entry: Dict[str, Any], texts: Optional[Dict[int, str]] = None) -> Dict[str, Any]:
+    """
+    Write the text sidecar for a segment / manifest entry and attach its summary.
+    Texts already read are used as they are; other pages are extracted from
+    text_doc. Without either, no sidecar is written.
+    """
+    if text_doc is None and texts is None:
+        return entry
+    sidecar = write_text_sidecar(text_doc, entry, text_sidecar_path(entry["split_file"]), texts)
+    return {**entry, "text_sidecar": sidecar}
+
+
+def _drop_texts(texts: Dict[int, str], last_page: int):
+    """Forget page texts up to last_page once their GO's sidecar is written."""
+    for page_num in [page_num for page_num in texts if page_num <= last_page]:
+        del texts[page_num]
+
+
+def _memory_stats(sampler: RssSampler, window_pages: int, num_pages: int) -> Dict[str, Any]:
+    """memory_stats for a split result: window settings plus the sampled RSS."""
+    return {
+        "window_pages": window_pages,
+        "windows": math.ceil(num_pages / window_pages) if window_pages else 0,
+        **sampler.stats()
+    }
+
+
+def _ocr_pages_entry(ocr_stats: Dict[str, Any], cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    {"ocr_pages": [...]} for a split cache entry: the pages the OCR stage found
+    needing OCR, so a hit can OCR them without checking every page again. Empty
+    if OCR did not run (and the cached entry recorded none).
+    """
+    if ocr_stats.get("status") == "disabled":
+        return {"ocr_pages": cached["ocr_pages"]} if cached and "ocr_pages" in cached else {}
+    return {"ocr_pages": [entry["page"] for entry in ocr_stats.get("pages_needing_ocr", [])]}
+
+
+def _file_digest(path: str) -> Dict[str, Any]:
+    """Size and SHA-256 of an output file, recorded in the split cache entry."""
+    return {"path": path, "bytes": os.path.getsize(path), "sha256": hash_file(path)}
+
+
+def _outputs_unchanged(cached: Dict[str, Any], paths: List[str]) -> bool:
+    """True if every path is recorded in the cache entry and still has the recorded size and hash."""
+    digests = {entry["path"]: entry for entry in cached.get("file_digests", [])}
+    for path in paths:
+        digest = digests.get(path)
+        if digest is None:
+            return False
+        try:
+            if os.path.getsize(path) != digest["bytes"] or hash_file(path) != digest["sha256"]:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def _place_outputs(split_files: List[str], sidecars: List[Dict[str, Any]], output_dir: str) -> tuple:
+    """
+    Copy cached split files (and their sidecars) that were written to another
+    output directory into output_dir, so the caller gets files of its own that
+    another job cannot delete or overwrite. Returns the (split_files, sidecars)
+    paths in output_dir.
+    """
+    def place(path: str) -> str:
+        target = os.path.join(output_dir, os.path.basename(path))
+        if os.path.realpath(path) != os.path.realpath(target):
+            temp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, target)
+        return target
+
+    return [place(path) for path in split_files], [{**entry, "text_file": place(entry["text_file"])} for entry in sidecars]
+
+
+def _cached_outputs(cached: Dict[str, Any], output_dir: str, text_sidecar: bool) -> Optional[tuple]:
+    """
+    The (split_files, sidecars) of a split cache entry, placed in output_dir, or
+    None if the entry has no files or they no longer have the bytes they were
+    written with (split files of different inputs can share a name).
+    """
+    split_files = cached.get("split_files")
+    sidecars = cached.get("text_sidecars", []) if text_sidecar else []
+    if not split_files or (text_sidecar and len(sidecars) != len(split_files)):
+        return None
+    if not _outputs_unchanged(cached, split_files + [entry["text_file"] for entry in sidecars]):
+        return None
+    return _place_outputs(split_files, sidecars, output_dir)
+
+
+def _written_gos(go_index: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The GOs that write_go_pdf writes a file for (in order), i.e. those with a valid page range."""
+    return [go for go in go_index if go["start_page"] <= go["end_page"]]
+
+
+def _output_cache_entry(go_index: List[Dict[str, Any]], split_files: List[str], text_sidecars: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Split cache fields that let a later hit serve the written files as they are."""
+    return {
+        "go_index": go_index,
+        "split_files": split_files,
+        "text_sidecars": text_sidecars,
+        "file_digests": [_file_digest(path) for path in split_files + [entry["text_file"] for entry in text_sidecars]]
+    }
+
+
+def _split_cache_key(input_pdf_path: str, content_hash: Optional[str], scan_mode: str, header_band: float) -> str:
+    """Cache key for a split: input bytes + boundary rules + scan parameters."""
+    return get_split_cache().make_key(
+        content_hash or hash_file(input_pdf_path),
+        BOUNDARY_RULES_VERSION,
+        boundary_rules=get_boundary_engine().fingerprint,
+        scan_mode=scan_mode,
+        header_band=header_band
+    )
+
+
+def iter_go_segments(
+    input_pdf_path: str,
+    output_dir: Optional[str] = None,
+    scan_mode: Optional[str] = None,
+    header_band: float = HEADER_BAND_RATIO,
+    virtual: bool = False,
+    use_cache: bool = True,
+    content_hash: Optional[str] = None,
+    ocr: bool = True,
+    window_pages: Optional[int] = None,
+    sampler: Optional[RssSampler] = None,
+    text_sidecar: Optional[bool] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming splitter: scans the PDF page by page and yields each GO segment as
+    soon as the next "GOVERNMENT OF" heading closes it, with its split PDF already
+    written. Lets callers start converting the first GO while the rest of the
+    document is still being scanned.
+
+    Unlike split_goms, errors are raised rather than returned as a status dict.
+
+    Args:
+        input_pdf_path: Path to the input PDF file containing multiple GOs
+        output_dir: Directory to save the split PDFs (default: outputs/split_goms)
+        scan_mode: Boundary scan mode - "header" or "full" (default: SPLIT_SCAN_MODE)
+        header_band: Fraction of the page height scanned in header mode
+        virtual: Yield manifest entries without writing the split PDFs
+            (see materialize_go_pdf)
+        use_cache: Reuse / store the GO index and written files in the
+            content-hash split cache. On a hit no pages are scanned; if the
+            split files (and sidecars) of the cached run are unchanged they are
+            yielded without writing, otherwise they are rebuilt from the cached
+            index.
+        content_hash: SHA-256 of the input bytes, if already known
+        ocr: Run the selective OCR stage. In header mode (and from a cached index)
+            pages are checked and OCR'd batch by batch as the scan reaches them,
+            and segments carry their OCR'd pages as "ocr_pages"; the full scan
+            OCRs the whole file first.
+        window_pages: Bounded-memory mode - scan and read the PDF in windows of
+            this many pages (default: SPLIT_WINDOW_PAGES, 0 = off)
+        sampler: Optional RssSampler, sampled per window and per written GO
+        text_sidecar: Write a JSONL text sidecar next to each split PDF
+            (default: SPLIT_TEXT_SIDECAR); its summary is attached to the
+            segment as "text_sidecar"
+
+    Yields:
+        {"goms_no", "start_page", "end_page", "split_file", "bytes"} per GO, in
+        page order. Virtual segments carry "source_pdf" and "virtual": True
+        instead of "bytes". Segments with OCR'd pages carry "ocr_pages":
+        [{"page", "ocr_file"}], which render_go_pdf_bytes also honours.
+    """
+    scan_mode = scan_mode or DEFAULT_SCAN_MODE
+    window_pages = DEFAULT_WINDOW_PAGES if window_pages is None else window_pages
+    text_sidecar = DEFAULT_TEXT_SIDECAR if text_sidecar is None else text_sidecar
+    if scan_mode not in SCAN_MODES:
+        raise ValueError(f"Unknown scan_mode '{scan_mode}'. Expected one of: {', '.join(SCAN_MODES)}")
+
+    if output_dir is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        project_root = os.path.dirname(script_dir)
+        output_dir = os.path.join(project_root, "outputs", "split_goms")
+    os.makedirs(output_dir, exist_ok=True)
+
+    cache_key = None
+    cached = None
+    if use_cache and SPLIT_CACHE_ENABLED:
+        cache_key = _split_cache_key(input_pdf_path, content_hash, scan_mode, header_band)
+        cached = get_split_cache().get(cache_key)
+        outputs = None if virtual or not cached else _cached_outputs(cached, output_dir, text_sidecar)
+        if outputs:
+            # The split files of the last run are intact: serve them without writing
+            split_files, sidecars = outputs
+            logger.info("Split cache hit (%s), serving %d split files", cache_key[:12], len(split_files))
+            for i, (go, split_file) in enumerate(zip(_written_gos(cached["go_index"]), split_files)):
+                segment = {**go, "split_file": split_file, "bytes": os.path.getsize(split_file)}
+                if sidecars:
+                    segment["text_sidecar"] = {k: v for k, v in sidecars[i].items() if k not in ("goms_no", "split_file")}
+                yield segment
+            return
+
+    # Header-band scans and cached indexes are OCR'd batch by batch as the scan
+    # reaches the pages (ocr.PageOcr), so the first GO does not wait for the whole
+    # file. The legacy full scan reads pages with pdfplumber and needs the OCR'd
+    # file up front.
+    ocr_stats = {"status": "disabled"}
+    page_ocr = None
+    if ocr and (cached or scan_mode == "header"):
+        page_ocr = PageOcr(input_pdf_path, pages=cached.get("ocr_pages") if cached else None)
+    elif ocr:
+        ocr_stats = run_selective_ocr(input_pdf_path, output_dir)
+        input_pdf_path = ocr_stats["pdf_path"]
+
+    logger.info("Streaming split of PDF: %s (%s)", input_pdf_path, "cached index" if cached else scan_mode + " scan")
+    # Page texts read by the scan / OCR check, reused for the sidecars
+    texts: Dict[int, str] = {}
+    doc = pdfium.PdfDocument(input_pdf_path) if text_sidecar or (page_ocr and cached) else None
+    text_doc = doc if text_sidecar else None
+    sidecar_texts = texts if text_sidecar else None
+    with open(input_pdf_path, "rb") as pdf_file:
+        reader = PdfReader(pdf_file)
+        num_pages = len(reader.pages)
+        if window_pages:
+            # Only the page count is kept from the first reader
+            reader = WindowedReader(pdf_file, window_pages, sampler)
+        if cached:
+            go_source = iter(cached["go_index"])
+        else:
+            if window_pages:
+                pages = iter_pages_windowed(input_pdf_path, num_pages, scan_mode, header_band, window_pages, sampler, page_ocr, texts)
+            elif scan_mode == "header":
+                pages = iter_pages_header_band(pdf_file, header_band, ocr=page_ocr, texts=texts)
+            else:
+                pages = iter_pages_full(input_pdf_path)
+            go_source = iter_go_index(pages, num_pages)
+
+        go_index = []
+        segments = []
+        try:
+            for go in go_source:
+                go_index.append(dict(go))
+                if page_ocr:
+                    if cached:
+                        texts.update(page_ocr.apply(doc, range(go["start_page"], go["end_page"] + 1)))
+                    ocr_pages = page_ocr.pages_in(go)
+                    if ocr_pages:
+                        go = {**go, "ocr_pages": ocr_pages}
+                if virtual:
+                    entries = [_with_text_sidecar(text_doc, entry, sidecar_texts) for entry in build_manifest(input_pdf_path, [go], output_dir)]
+                    _drop_texts(texts, go["end_page"])
+                    yield from entries
+                    continue
+                go_reader = reader.reader_for(go) if window_pages else reader
+                split_file = write_go_pdf(go_reader, go, output_dir)
+                if sampler:
+                    sampler.sample()
+                if split_file is None:
+                    continue
+                size = os.path.getsize(split_file)
+                sample(logger, "split.created", "Created: %s (%d bytes)", split_file, size)
+                segment = _with_text_sidecar(text_doc, {**go, "split_file": split_file, "bytes": size}, sidecar_texts)
+                _drop_texts(texts, go["end_page"])
+                segments.append(segment)
+                yield segment
+        finally:
+            if doc:
+                doc.close()
+
+    if page_ocr and page_ocr.stats["pages_needing_ocr"]:
+        logger.debug(
+            "Streaming OCR: %d pages needed OCR, %d OCR'd, %d from cache, %d failed in %ss",
+            len(page_ocr.stats["pages_needing_ocr"]), page_ocr.stats["pages_ocred"], page_ocr.stats["cache_hits"],
+            len(page_ocr.stats["failed_pages"]), page_ocr.stats["seconds"]
+        )
+
+    # Only a fully consumed scan is cached; written files are recorded so a
+    # repeat run can serve them (as split_goms does)
+    if cache_key and (not cached or not virtual):
+        if cached:
+            ocr_entry = _ocr_pages_entry(ocr_stats, cached)
+        elif page_ocr:
+            ocr_entry = {"ocr_pages": [entry["page"] for entry in page_ocr.stats["pages_needing_ocr"]]}
+        else:
+            ocr_entry = _ocr_pages_entry(ocr_stats)
+        entry = {"go_index": go_index}
+        if not virtual:
+            entry = _output_cache_entry(go_index, [segment["split_file"] for segment in segments], [
+                {"goms_no": segment["goms_no"], "split_file": segment["split_file"], **segment["text_sidecar"]}
+                for segment in segments if "text_sidecar" in segment
+            ])
+        get_split_cache().put(cache_key, {**(cached or {}), **entry, **ocr_entry})
+
+
+def split_goms(
+    input_pdf_path: str,
+    output_dir: Optional[str] = None,
+    scan_mode: Optional[str] = None,
+    header_band: float = HEADER_BAND_RATIO,
+    scan_workers: Optional[int] = None,
+    virtual: bool = False,
+    use_cache: bool = True,
+    content_hash: Optional[str] = None,
+    ocr: bool = True,
+    window_pages: Optional[int] = None,
+    write_workers: Optional[int] = None,
+    optimize_pdfs: Optional[bool] = None,
+    text_sidecar: Optional[bool] = None
+) -> Dict[str, Any]:
     """
     Split a PDF containing multiple Government Orders (GOs) into individual PDF files.
 
     Args:
         input_pdf_path: Path to the input PDF file containing multiple GOs
         output_dir: Directory to save the split PDFs (default: outputs/split_goms)
+        scan_mode: Boundary scan mode - "header" (default, single open, header band
+            only) or "full" (legacy full-page text extraction). Defaults to the
+            SPLIT_SCAN_MODE environment variable.
+        header_band: Fraction of the page height scanned in header mode
+        scan_workers: Worker processes for the sharded page scan (default:
+            SPLIT_SCAN_WORKERS, 1 = scan in-process)
+        virtual: Return a manifest of page ranges instead of writing one PDF per
+            GO. split_files then lists the planned paths; materialize_go_pdf (or
+            render_go_pdf_bytes) builds an individual GO PDF on demand.
+        use_cache: Look up / store the result in the content-hash split cache
+        content_hash: SHA-256 of the input bytes, if already known (e.g. hashed
+            while the upload was streamed to disk)
+        ocr: Run the selective OCR stage (pages with a missing or garbled text
+            layer only, see ocr.run_selective_ocr)
+        window_pages: Bounded-memory mode for very large PDFs - pages are scanned
+            and copied in windows of this many pages, re-opening the PDF per
+            window, and only the boundary results are kept. Runs the scan
+            in-process (scan_workers is ignored). Default: SPLIT_WINDOW_PAGES,
+            0 = off.
+        write_workers: Worker processes for writing the split PDFs (default:
+            SPLIT_WRITE_WORKERS, 1 = write in-process)
+        optimize_pdfs: Compress content streams and merge identical objects in
+            each split PDF (default: SPLIT_WRITE_OPTIMIZE)
+        text_sidecar: Write a JSONL sidecar with the page texts of each GO next
+            to its split PDF (default: SPLIT_TEXT_SIDECAR, see text_sidecar.py)
 
     Returns:
         Dictionary containing information about the split process:
@@ -60,11 +1126,34 @@ def split_goms(input_pdf_path: str, output_dir: Optional[str] = None) -> Dict[st
             "status": "success|error",
             "message": "Description of what happened",
             "split_files": List of paths to created files,
-            "go_index": List of GO information with start/end pages
+            "go_index": List of GO information with start/end pages,
+            "scan_stats": {"scan_mode", "pages", "scan_seconds", "pages_per_sec",
+                           "workers", "shards", "worker_seconds", "parallelism"},
+            "virtual": True if no PDFs were written,
+            "manifest": Manifest entries (virtual mode only),
+            "cache": {"enabled", "hit", "key"},
+            "ocr_stats": Result of the selective OCR stage ({"status": "cached",
+                         "cached": True, "ocr_pages"} when the files are served
+                         from the split cache),
+            "memory_stats": {"window_pages", "windows", "start_rss_mb", "peak_rss_mb",
+                             "growth_mb", "process_peak_rss_mb", "samples"},
+            "write_stats": {"workers", "optimize", "seconds", "total_bytes",
+                            "per_go": [{"goms_no", "split_file", "bytes"}]}
+                           ("cached": True and nothing written on a split cache hit),
+            "text_sidecars": [{"goms_no", "split_file", "text_file", "pages", "chars",
+                               "low_text_pages"}] (empty when disabled)
         }
     """
-    print(f"DEBUG: Starting to split PDF: {input_pdf_path}")
+    logger.info("Starting to split PDF: %s", input_pdf_path)
+    scan_mode = scan_mode or DEFAULT_SCAN_MODE
+    scan_workers = scan_workers or DEFAULT_SCAN_WORKERS
+    window_pages = DEFAULT_WINDOW_PAGES if window_pages is None else window_pages
+    text_sidecar = DEFAULT_TEXT_SIDECAR if text_sidecar is None else text_sidecar
+    sampler = RssSampler()
     try:
+        if scan_mode not in SCAN_MODES:
+            raise ValueError(f"Unknown scan_mode '{scan_mode}'. Expected one of: {', '.join(SCAN_MODES)}")
+
         # Set default output directory
         if output_dir is None:
             script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -72,165 +1161,190 @@ def split_goms(input_pdf_path: str, output_dir: Optional[str] = None) -> Dict[st
             output_dir = os.path.join(project_root, "outputs", "split_goms")
 
         os.makedirs(output_dir, exist_ok=True)
-        print(f"DEBUG: Output directory created/verified: {output_dir}")
+        logger.debug("Output directory created/verified: %s", output_dir)
 
-        import shutil
-        import subprocess
-        
-        if not shutil.which("ocrmypdf"):
-            raise RuntimeError(
-                "OCRmyPDF is required but not found. Please install it:\n"
-                "  Ubuntu/Debian: sudo apt-get install ocrmypdf\n"
-                "  macOS: brew install ocrmypdf\n"
-                "  pip: pip install ocrmypdf"
-            )
-        
-            print(f"DEBUG: Running OCRmyPDF on input file: {input_pdf_path}...")
-            temp_ocr_filename = f"ocr_{os.path.basename(input_pdf_path)}"
-            temp_ocr_path = os.path.join(output_dir, temp_ocr_filename)
-            
-            try:
-                # --force-ocr: always perform OCR even if text is present
-                # --jobs 4: use 4 cores
-                # --output-type pdf: ensure output is PDF
-                subprocess.run(
-                    ["ocrmypdf", "--force-ocr", "--jobs", "4", input_pdf_path, temp_ocr_path],
-                    check=True,
-                    capture_output=True
-                )
-                print(f"DEBUG: OCR completed. Using OCR'd file: {temp_ocr_path}")
-                input_pdf_path = temp_ocr_path # Switch to using the OCR'd file
-            except subprocess.CalledProcessError as e:
-                print(f"WARNING: OCRmyPDF failed: {e.stderr.decode()}. Using original PDF.")
-            except Exception as e:
-                raise RuntimeError(f"OCRmyPDF processing failed: {str(e)}")
-
-        # Load PDF
-        reader = PdfReader(input_pdf_path)
-        num_pages = len(reader.pages)
-        print(f"DEBUG: Loaded PDF with {num_pages} pages")
+        # Split cache: a repeat submission of the same bytes skips the page scan
+        cache_info = {"enabled": use_cache and SPLIT_CACHE_ENABLED, "hit": False, "key": None}
+        cached = None
+        if cache_info["enabled"]:
+            cache_info["key"] = _split_cache_key(input_pdf_path, content_hash, scan_mode, header_band)
+            cached = get_split_cache().get(cache_info["key"])
+            if cached:
+                cache_info["hit"] = True
+                logger.info("Split cache hit (%s)", cache_info["key"][:12])
+                outputs = None if virtual else _cached_outputs(cached, output_dir, text_sidecar)
+                if outputs:
+                    cached_files, cached_sidecars = outputs
+                    per_go = [
+                        {"goms_no": go["goms_no"], "split_file": path, "bytes": os.path.getsize(path)}
+                        for go, path in zip(_written_gos(cached["go_index"]), cached_files)
+                    ]
+                    return {
+                        "status": "success",
+                        "message": f"Split result for {input_pdf_path} served from cache ({len(cached_files)} files)",
+                        "split_files": cached_files,
+                        "go_index": cached["go_index"],
+                        "scan_stats": {**cached.get("scan_stats", {}), "cached": True},
+                        "cache": cache_info,
+                        "ocr_stats": {"status": "cached", "cached": True, "ocr_pages": cached.get("ocr_pages", [])},
+                        "memory_stats": _memory_stats(sampler, window_pages, 0),
+                        "write_stats": {
+                            "workers": 0,
+                            "optimize": False,
+                            "seconds": 0.0,
+                            "total_bytes": sum(entry["bytes"] for entry in per_go),
+                            "per_go": per_go,
+                            "cached": True
+                        },
+                        "text_sidecars": cached_sidecars
+                    }
 
-        # Extract text for all pages
-        all_pages_text = []
-        print(f"DEBUG: Extracting text from all pages...")
-        with pdfplumber.open(input_pdf_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text() or ""
-                all_pages_text.append((i, text))
-                # print(f"  Page {i+1}: {len(text)} characters")
+        # Selective OCR: only pages whose text layer is missing or garbled. On a
+        # cache hit the pages needing OCR are known, so the text layer check is skipped
+        ocr_stats = {"status": "disabled"}
+        # The check reads every page's full text; keep it for the sidecars and the
+        # scan's start pages rather than extracting it again (not in bounded-memory mode)
+        page_texts = {} if ocr and text_sidecar and not window_pages else None
+        if ocr:
+            with tracing.span("split.ocr"):
+                ocr_stats = run_selective_ocr(input_pdf_path, output_dir, pages=cached.get("ocr_pages") if cached else None, texts=page_texts)
+            input_pdf_path = ocr_stats["pdf_path"] # Switch to using the OCR'd file
 
-        # Analyze pages using regex
-        results = []
-        print(f"DEBUG: Analyzing {num_pages} pages using regex...")
+        # Open the PDF once; the same handle backs the page scan and the writer
+        with open(input_pdf_path, "rb") as pdf_file:
+            reader = PdfReader(pdf_file)
+            num_pages = len(reader.pages)
+            logger.debug("Loaded PDF with %d pages", num_pages)
+            if window_pages:
+                # Only the page count is kept from the first reader
+                reader = WindowedReader(pdf_file, window_pages, sampler)
+                logger.debug("Bounded-memory mode, %d-page windows", window_pages)
+            if page_texts is not None and len(page_texts) != num_pages:
+                # The check was skipped (cache hit with known OCR pages)
+                page_texts = None
 
-        for i, text in all_pages_text:
-            analysis = analyze_page_regex(text)
-            analysis["page"] = i
-            results.append(analysis)
+            # Analyze pages using regex
+            logger.debug("Analyzing %d pages using regex (%s scan)", num_pages, scan_mode)
+            scan_start = time.perf_counter()
+            if cached:
+                # Boundaries are known; only the files need (re)building
+                results = []
+                parallel_stats = {"workers": 0, "shards": 0, "cached": True}
+            elif window_pages:
+                # Boundaries are folded into the GO index window by window;
+                # no per-page results are kept
+                results = None
+                go_index = build_go_index(
+                    iter_pages_windowed(input_pdf_path, num_pages, scan_mode, header_band, window_pages, sampler),
+                    num_pages
+                )
+                parallel_stats = {"workers": 1, "shards": 1}
+            elif len(plan_shards(num_pages, scan_workers)) > 1:
+                parallel_scan = scan_pages_parallel(input_pdf_path, num_pages, scan_mode, header_band, scan_workers)
+                results = parallel_scan["results"]
+                parallel_stats = {k: v for k, v in parallel_scan.items() if k != "results"}
+            else:
+                if scan_mode == "header":
+                    results = scan_pages_header_band(pdf_file, header_band, texts=page_texts)
+                else:
+                    results = scan_pages_full(input_pdf_path)
+                parallel_stats = {"workers": 1, "shards": 1}
+            scan_end = time.perf_counter()
+            scan_seconds = scan_end - scan_start
+            tracing.record("split.scan", scan_start, scan_end, pages=num_pages, scan_mode=scan_mode, workers=parallel_stats.get("workers"))
+            parallel_stats.setdefault("worker_seconds", round(scan_seconds, 4))
+            parallel_stats.setdefault("parallelism", 1.0)
+            scan_stats = {
+                "scan_mode": scan_mode,
+                "pages": num_pages,
+                "scan_seconds": round(scan_seconds, 4),
+                "pages_per_sec": round(num_pages / scan_seconds, 2) if scan_seconds > 0 else None,
+                **parallel_stats
+            }
 
-        print(f"DEBUG: Analyzed all pages, found {len([r for r in results if r['is_start'] or r['is_end']])} potential GO boundaries")
+            sampler.sample()
+            if results is not None:
+                logger.debug("Analyzed all pages, found %d potential GO boundaries", sum(1 for r in results if r["is_start"] or r["is_end"]))
 
-        # Build Index
-        go_index = []
-        current_go = None
-        print(f"DEBUG: Building GO index from analysis results...")
-
-        for res in results:
-            page_num = res.get("page")
-            is_start = res.get("is_start")
-            is_end = res.get("is_end")
-            goms_no = res.get("goms_no")
-
-            # Start of new GO
-            if is_start:
-                # If previous GO was open, close it at previous page
-                if current_go:
-                    current_go["end_page"] = page_num - 1 # Close at previous page
-                    print(f"  Completed previous GO: {current_go['goms_no']} (pages {current_go['start_page']+1} to {current_go['end_page']+1})")
-                    go_index.append(current_go)
-
-                current_go = {
-                    "goms_no": goms_no or "Unknown",
-                    "start_page": page_num, # 0-indexed
-                    "end_page": None # Will be set later
+            # Build Index
+            if cached:
+                go_index = cached["go_index"]
+            else:
+                if results is not None:
+                    go_index = build_go_index(results, num_pages)
+                if cache_info["enabled"]:
+                    get_split_cache().put(cache_info["key"], {"go_index": go_index, "scan_stats": scan_stats, **_ocr_pages_entry(ocr_stats)})
+
+            # Virtual mode: hand back the manifest, PDFs are built on demand
+            if virtual:
+                manifest = build_manifest(input_pdf_path, go_index, output_dir)
+                if text_sidecar:
+                    text_doc = pdfium.PdfDocument(input_pdf_path) if page_texts is None else None
+                    try:
+                        manifest = [_with_text_sidecar(text_doc, entry, page_texts) for entry in manifest]
+                    finally:
+                        if text_doc:
+                            text_doc.close()
+                logger.debug("Virtual split - manifest with %d GOs, no files written", len(manifest))
+                return {
+                    "status": "success",
+                    "message": f"Successfully indexed {input_pdf_path} into {len(manifest)} GOs (virtual split, PDFs built on demand). Output directory: {output_dir}",
+                    "split_files": [entry["split_file"] for entry in manifest],
+                    "go_index": go_index,
+                    "scan_stats": scan_stats,
+                    "virtual": True,
+                    "manifest": manifest,
+                    "cache": cache_info,
+                    "ocr_stats": ocr_stats,
+                    "memory_stats": _memory_stats(sampler, window_pages, num_pages),
+                    "text_sidecars": [
+                        {"goms_no": entry["goms_no"], "split_file": entry["split_file"], **entry["text_sidecar"]}
+                        for entry in manifest if "text_sidecar" in entry
+                    ]
                 }
-                print(f"  Started new GO: {current_go['goms_no']} at page {current_go['start_page']+1}")
-
-            # End of GO
-            if is_end and current_go:
-                # If we find an end marker, it's likely the end of the current GO
-                # But sometimes end marker is on the same page as start (single page GO)
-                # Or multiple end markers (e.g. one for notification, one for order)
-                # We'll assume the last end marker closes it, or the next start marker closes it.
-                # For now, let's just mark it. If we encounter a new start, we'll close it anyway.
-                # If we encounter an end, we can close it, but what if there are pages after?
-                # Usually "SECTION OFFICER" is the very end.
-                current_go["end_page"] = page_num
-                # We don't append yet, in case there are multiple end markers or we want to wait for next start?
-                # Actually, if we close it here, and there's no next start immediately, we might miss pages?
-                # But "SECTION OFFICER" is usually the end.
-                # Let's close it.
-                print(f"  Ended GO: {current_go['goms_no']} at page {current_go['end_page']+1}")
-                go_index.append(current_go)
-                current_go = None
-
-        # Handle last GO if still open
-        if current_go:
-            current_go["end_page"] = num_pages - 1
-            print(f"  Completed final GO: {current_go['goms_no']} (pages {current_go['start_page']+1} to {current_go['end_page']+1})")
-            go_index.append(current_go)
-
-        print(f"DEBUG: GO index built with {len(go_index)} documents")
-
-        # Split Files
-        split_files = []
-        print(f"DEBUG: Creating individual PDF files...")
-        for i, go in enumerate(go_index):
-            start = go["start_page"]
-            end = go["end_page"]
-            num = go["goms_no"]
-
-            print(f"  Creating file {i+1}/{len(go_index)}: GO {num}, pages {start+1} to {end+1}")
-
-            # Validate range
-            if start > end:
-                print(f"   ⚠️ Invalid range for GO {num}: {start+1}-{end+1}. Skipping.")
-                continue
-
-            writer = PdfWriter()
-            for p in range(start, end + 1):
-                writer.add_page(reader.pages[p])
-
-            # Sanitize GO number for filename
-            clean_num = re.sub(r'[^\w\d-]', '', num.replace("G.O.Ms.No.", "").strip())
-            filename = f"GO_{clean_num}_Pages_{start+1}-{end+1}.pdf"
-            filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-            output_path = os.path.join(output_dir, filename)
-
-            with open(output_path, "wb") as f:
-                writer.write(f)
-
-            split_files.append(output_path)
-            print(f"    Created: {output_path}")
-
-        print(f"DEBUG: Splitting completed successfully")
-        
-        # Print token usage summary
-        from .token_tracker import TokenTracker
-        TokenTracker().print_summary()
+
+            # Split Files
+            logger.debug("Creating individual PDF files")
+            with tracing.span("split.write", gos=len(go_index)):
+                write_result = write_go_pdfs(
+                    input_pdf_path,
+                    go_index,
+                    output_dir,
+                    workers=write_workers,
+                    optimize=optimize_pdfs,
+                    reader=reader,
+                    window_pages=window_pages,
+                    sampler=sampler,
+                    text_sidecar=text_sidecar,
+                    page_texts=page_texts
+                )
+            split_files = write_result["split_files"]
+
+        if cache_info["enabled"]:
+            get_split_cache().put(cache_info["key"], {
+                **_output_cache_entry(go_index, split_files, write_result["text_sidecars"]),
+                "scan_stats": {**scan_stats, "cached": False},
+                **_ocr_pages_entry(ocr_stats, cached)
+            })
+
+        logger.info("Splitting completed successfully")
         
         result = {
             "status": "success",
             "message": f"Successfully split {input_pdf_path} into {len(split_files)} files. Output directory: {output_dir}",
             "split_files": split_files,
-            "go_index": go_index
+            "go_index": go_index,
+            "scan_stats": scan_stats,
+            "cache": cache_info,
+            "ocr_stats": ocr_stats,
+            "memory_stats": _memory_stats(sampler, window_pages, num_pages),
+            "write_stats": write_result["write_stats"],
+            "text_sidecars": write_result["text_sidecars"]
         }
-        print(f"DEBUG: Returning result - {len(split_files)} files created")
+        logger.debug("Returning result - %d files created", len(split_files))
         return result
     except Exception as e:
-        print(f"ERROR: Error splitting GOs: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("Error splitting GOs: %s", e, exc_info=True)
         return {
             "status": "error",
             "message": f"Error splitting GOs: {str(e)}",
@@ -0,0 +1,92 @@
+"""
+Per-GO text sidecars written next to the split PDFs.
+
+Each sidecar is a JSONL file (GO_<no>_Pages_<a>-<b>.text.jsonl) with one line
+per page of the GO:
+
+    {"page": 12, "chars": 1834, "valid_ratio": 0.998, "text": "..."}
+
+"page" is the 0-indexed page of the source PDF (as in the GO index); "chars"
+and "valid_ratio" come from ocr.text_layer_quality, so later stages can tell
+from the sidecar alone whether a GO's text layer is usable without calling the
+LLM or re-extracting the PDF.
+"""
+
+import os
+import json
+import threading
+from typing import List, Dict, Any, Optional
+
+import pypdfium2 as pdfium
+
+from .ocr import text_layer_quality, page_text
+
+SIDECAR_SUFFIX = ".text.jsonl"
+
+
+def text_sidecar_path(split_file: str) -> str:
+    """Sidecar path for a split PDF path."""
+    return os.path.splitext(split_file)[0] + SIDECAR_SUFFIX
+
+
+def write_text_sidecar(
+    doc: Optional[pdfium.PdfDocument],
+    go: Dict[str, Any],
+    text_file: str,
+    texts: Optional[Dict[int, str]] = None
+) -> Dict[str, Any]:
+    """
+    Write the text of one GO's pages as a JSONL sidecar.
+
+    Args:
+        doc: Open pdfium document over the source PDF, for pages not in texts
+        go: GO index entry ({"goms_no", "start_page", "end_page"})
+        text_file: Sidecar path to write
+        texts: Page texts already extracted (e.g. by the OCR check), by source
+            page; only the missing pages are extracted from doc
+
+    Returns:
+        {"text_file", "pages", "chars", "low_text_pages"} where low_text_pages
+        lists the source pages whose text layer is missing or garbled
+    """
+    chars = 0
+    low_text_pages = []
+    temp_path = f"{text_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for page_num in range(go["start_page"], go["end_page"] + 1):
+            if texts is not None and page_num in texts:
+                text = texts[page_num]
+            else:
+                page = doc[page_num]
+                try:
+                    text = page_text(page)
+                finally:
+                    page.close()
+            quality = text_layer_quality(text)
+            chars += quality["chars"]
+            if quality["needs_ocr"]:
+                low_text_pages.append(page_num)
+            f.write(json.dumps({
+                "page": page_num,
+                "chars": quality["chars"],
+                "valid_ratio": quality["valid_ratio"],
+                "text": text
+            }, ensure_ascii=False) + "\n")
+    os.replace(temp_path, text_file)
+    return {
+        "text_file": text_file,
+        "pages": go["end_page"] - go["start_page"] + 1,
+        "chars": chars,
+        "low_text_pages": low_text_pages
+    }
+
+
+def read_text_sidecar(text_file: str) -> List[Dict[str, Any]]:
+    """Load a sidecar back into a list of per-page dicts, in page order."""
+    with open(text_file, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def read_go_text(text_file: str) -> str:
+    """Full text of a GO from its sidecar, pages separated by form feeds."""
+    return "\f".join(page["text"] for page in read_text_sidecar(text_file))
@@ -1,74 +1,262 @@
 """
 Token usage tracker for Gemini API calls.
+
+Accounting happens at three levels:
+
+- per request: response_usage() reads the token counts from a response
+- per GO and per job: conversion results carry the usage of their own requests
+  ("usage"), and summarize_usage() adds them up for a job. Nothing is shared
+  between GOs or jobs, so this needs no locking
+- per process: the TokenTracker singleton keeps running totals and a bounded log
+  of recent requests (TOKEN_LOG_MAX_ENTRIES). Totals are kept in one shard per
+  thread, so conversion threads never wait on each other to record a request.
+  When a thread exits its shard is folded into a base total, so the number of
+  shards stays at the number of live threads
 """
 
-from dataclasses import dataclass
+import os
+import weakref
+import threading
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Dict, Any, Optional
 import logging
 
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+TOKEN_LOG_MAX_ENTRIES = int(os.getenv("TOKEN_LOG_MAX_ENTRIES", "1000"))
+
+USAGE_KEYS = ("requests", "prompt_tokens", "response_tokens", "total_tokens", "latency_seconds")
+
+
 @dataclass
 class TokenUsage:
     prompt_tokens: int = 0
     response_tokens: int = 0
     total_tokens: int = 0
+    requests: int = 0
+    latency_seconds: float = 0.0
+
+
+def response_usage(response) -> Optional[Dict[str, int]]:
+    """{"prompt_tokens", "response_tokens", "total_tokens"} of a Gemini response, or None without usage metadata."""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "response_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        "total_tokens": getattr(usage, "total_token_count", 0) or 0
+    }
+
+
+def empty_usage() -> Dict[str, Any]:
+    return {"requests": 0, "prompt_tokens": 0, "response_tokens": 0, "total_tokens": 0, "latency_seconds": 0.0}
+
+
+def add_usage(total: Dict[str, Any], usage: Dict[str, Any]) -> Dict[str, Any]:
+    """Add usage (any subset of USAGE_KEYS) into total, in place."""
+    for key in USAGE_KEYS:
+        total[key] += usage.get(key, 0) or 0
+    total["latency_seconds"] = round(total["latency_seconds"], 3)
+    return total
+
+
+def split_usage(usage: Dict[str, Any], parts: int) -> list:
+    """
+    Share one request's usage out between parts (e.g. the GOs of a packed
+    request): tokens are split evenly, the request and its latency go to the first.
+    """
+    shares = []
+    for i in range(parts):
+        share = {key: 0 for key in USAGE_KEYS}
+        for key in ("prompt_tokens", "response_tokens", "total_tokens"):
+            share[key] = usage[key] // parts + (usage[key] % parts if i == 0 else 0)
+        if i == 0:
+            share["requests"] = usage["requests"]
+            share["latency_seconds"] = usage["latency_seconds"]
+        shares.append(share)
+    return shares
+
+
+def summarize_usage(conversion_results) -> Dict[str, Any]:
+    """Per-job token and latency totals from a list of conversion results."""
+    usages = [result["usage"] for result in conversion_results if result and result.get("usage")]
+    total = empty_usage()
+    for usage in usages:
+        add_usage(total, usage)
+    return {"gos": len(usages), **total}
+
+
+class _ShardOwner:
+    """Stand-in whose lifetime is a thread's (see TokenTracker._shard)"""
+
+
+def _add_into(total: TokenUsage, usage: TokenUsage):
+    for field in fields(TokenUsage):
+        setattr(total, field.name, getattr(total, field.name) + getattr(usage, field.name))
+
 
 class TokenTracker:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(TokenTracker, cls).__new__(cls)
-            cls._instance.reset()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super(TokenTracker, cls).__new__(cls)
+                    # Re-entrant: dropping the old threading.local in reset()
+                    # runs the shard finalizers in the resetting thread
+                    instance._shards_lock = threading.RLock()
+                    instance.reset()
+                    cls._instance = instance
         return cls._instance
 
     def reset(self):
-        self.total_usage = TokenUsage()
-        self.request_log = []
+        with self._shards_lock:
+            # Shards of live threads by id(), and the totals of exited threads
+            self._shards: Dict[int, TokenUsage] = {}
+            self._base = TokenUsage()
+            self._local = threading.local()
+        # deque.append is atomic, and maxlen keeps the log bounded
+        self.request_log = deque(maxlen=TOKEN_LOG_MAX_ENTRIES)
+        self.payload_log = deque(maxlen=TOKEN_LOG_MAX_ENTRIES)
+
+    def _shard(self) -> TokenUsage:
+        """
+        This thread's running totals (registered once per thread). The owner
+        object lives only in the thread's threading.local, so it is collected when
+        the thread exits and its finalizer folds the shard into the base total.
+        """
+        local = self._local
+        shard = getattr(local, "usage", None)
+        if shard is None:
+            shard = TokenUsage()
+            owner = local.owner = _ShardOwner()
+            weakref.finalize(owner, self._fold, shard)
+            with self._shards_lock:
+                self._shards[id(shard)] = shard
+            local.usage = shard
+        return shard
+
+    def _fold(self, shard: TokenUsage):
+        """Move an exited thread's shard into the base total."""
+        with self._shards_lock:
+            # Shards registered before a reset() are no longer counted
+            if self._shards.pop(id(shard), None) is not shard:
+                return
+            _add_into(self._base, shard)
 
-    def track_request(self, source: str, response):
+    @property
+    def total_usage(self) -> TokenUsage:
+        """Process-wide totals: the base total plus the live thread shards."""
+        total = TokenUsage()
+        with self._shards_lock:
+            _add_into(total, self._base)
+            shards = list(self._shards.values())
+        for shard in shards:
+            _add_into(total, shard)
+        total.latency_seconds = round(total.latency_seconds, 3)
+        return total
+
+    def track_request(self, source: str, response, latency_seconds: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """
         Tracks token usage from a Gemini response object.
         Args:
             source: The name of the component/function making the call.
             response: The GenerateContentResponse object from Vertex AI.
+            latency_seconds: Wall time of the call, if measured.
+        Returns:
+            The request's usage ({"requests": 1, "prompt_tokens", "response_tokens",
+            "total_tokens", "latency_seconds"}), or None if it could not be read.
         """
         try:
-            # Check if usage_metadata exists (it might be missing in some error cases or mocked responses)
-            if not hasattr(response, 'usage_metadata') or not response.usage_metadata:
-                print(f"DEBUG: No usage metadata in response from {source}")
-                return
+            # usage_metadata can be missing in some error cases or mocked responses
+            tokens = response_usage(response)
+            if tokens is None:
+                logger.debug("No usage metadata in response from %s", source)
+                tokens = {"prompt_tokens": 0, "response_tokens": 0, "total_tokens": 0}
+            usage = {"requests": 1, **tokens, "latency_seconds": round(latency_seconds or 0.0, 3)}
 
-            usage = response.usage_metadata
-            prompt_tokens = usage.prompt_token_count
-            response_tokens = usage.candidates_token_count
-            total_tokens = usage.total_token_count
-
-            self.total_usage.prompt_tokens += prompt_tokens
-            self.total_usage.response_tokens += response_tokens
-            self.total_usage.total_tokens += total_tokens
-
-            log_entry = {
-                "source": source,
-                "prompt_tokens": prompt_tokens,
-                "response_tokens": response_tokens,
-                "total_tokens": total_tokens
-            }
-            self.request_log.append(log_entry)
-            
-            print(f"TOKEN USAGE [{source}]: Prompt: {prompt_tokens}, Response: {response_tokens}, Total: {total_tokens}")
+            shard = self._shard()
+            shard.prompt_tokens += usage["prompt_tokens"]
+            shard.response_tokens += usage["response_tokens"]
+            shard.total_tokens += usage["total_tokens"]
+            shard.requests += 1
+            shard.latency_seconds += usage["latency_seconds"]
+
+            self.request_log.append({"source": source, **usage})
+            logger.debug(
+                "Token usage [%s]: Prompt: %d, Response: %d, Total: %d, Latency: %ss",
+                source, usage["prompt_tokens"], usage["response_tokens"], usage["total_tokens"], usage["latency_seconds"]
+            )
+            return usage
         except Exception as e:
-            print(f"WARNING: Failed to track token usage: {e}")
+            logger.warning("Failed to track token usage: %s", e)
+            return None
+
+    def track_payload(self, source: str, payload: dict, prompt_tokens: int = None, original_prompt_tokens: int = None):
+        """
+        Records how much a GO's PDF was slimmed before being sent to Gemini.
+        Args:
+            source: The GO (or component) the payload belongs to.
+            payload: Result of payload.slim_pdf_payload (without the PDF bytes).
+            prompt_tokens / original_prompt_tokens: Token counts of the slimmed and
+                original request, when they were measured (e.g. by the benchmark).
+        """
+        log_entry = {
+            "source": source,
+            "applied": payload.get("applied"),
+            "original_bytes": payload.get("original_bytes", 0),
+            "bytes": payload.get("bytes", 0),
+            "saved_bytes": payload.get("saved_bytes", 0),
+            "seconds": payload.get("seconds"),
+            "original_prompt_tokens": original_prompt_tokens,
+            "prompt_tokens": prompt_tokens
+        }
+        self.payload_log.append(log_entry)
+        if logger.isEnabledFor(logging.DEBUG):
+            tokens = f", Tokens: {original_prompt_tokens} -> {prompt_tokens}" if prompt_tokens is not None else ""
+            logger.debug("Payload [%s]: %s, Bytes: %d -> %d%s", source, log_entry["applied"], log_entry["original_bytes"], log_entry["bytes"], tokens)
+
+    def get_payload_summary(self):
+        payload_log = list(self.payload_log)
+        saved_tokens = [
+            entry["original_prompt_tokens"] - entry["prompt_tokens"]
+            for entry in payload_log
+            if entry["prompt_tokens"] is not None and entry["original_prompt_tokens"] is not None
+        ]
+        return {
+            "payloads": len(payload_log),
+            "original_bytes": sum(entry["original_bytes"] for entry in payload_log),
+            "bytes": sum(entry["bytes"] for entry in payload_log),
+            "saved_bytes": sum(entry["saved_bytes"] for entry in payload_log),
+            "saved_prompt_tokens": sum(saved_tokens) if saved_tokens else None
+        }
 
     def get_summary(self):
-        return f"Total Token Usage - Prompt: {self.total_usage.prompt_tokens}, Response: {self.total_usage.response_tokens}, Total: {self.total_usage.total_tokens}"
-
-    def print_summary(self):
-        print("\n" + "="*50)
-        print("TOKEN USAGE SUMMARY")
-        print("="*50)
-        print(f"{'Source':<30} | {'Prompt':<6} | {'Resp':<6} | {'Total':<6}")
-        print("-" * 50)
-        for entry in self.request_log:
-            print(f"{entry['source']:<30} | {entry['prompt_tokens']:<6} | {entry['response_tokens']:<6} | {entry['total_tokens']:<6}")
-        print("-" * 50)
-        print(self.get_summary())
-        print("="*50 + "\n")
+        usage = self.total_usage
+        return f"Total Token Usage - Requests: {usage.requests}, Prompt: {usage.prompt_tokens}, Response: {usage.response_tokens}, Total: {usage.total_tokens}, Latency: {usage.latency_seconds:.1f}s"
+
+    def log_summary(self, usage: Optional[Dict[str, Any]] = None):
+        """
+        Log a job's totals (summarize_usage) when given and the process totals at
+        INFO, and the recent request log at DEBUG.
+        """
+        if usage is not None:
+            logger.info(
+                "Job token usage - GOs: %d, Requests: %d, Prompt: %d, Response: %d, Total: %d, Latency: %.1fs",
+                usage["gos"], usage["requests"], usage["prompt_tokens"], usage["response_tokens"], usage["total_tokens"], usage["latency_seconds"]
+            )
+        logger.info(self.get_summary())
+        if self.payload_log:
+            payloads = self.get_payload_summary()
+            logger.info("Payload slimming - %d GOs, Bytes: %d -> %d (saved %d)", payloads["payloads"], payloads["original_bytes"], payloads["bytes"], payloads["saved_bytes"])
+        if logger.isEnabledFor(logging.DEBUG):
+            lines = [f"{'Source':<30} | {'Prompt':<6} | {'Resp':<6} | {'Total':<6} | {'Secs':<6}", "-" * 50]
+            for entry in list(self.request_log):
+                lines.append(f"{entry['source'][:30]:<30} | {entry['prompt_tokens']:<6} | {entry['response_tokens']:<6} | {entry['total_tokens']:<6} | {entry['latency_seconds']:<6}")
+            logger.debug("Recent Gemini requests:\n%s", "\n".join(lines))
@@ -78,9 +78,9 @@ def parse_amendments(input_pdf_path: str) -> Dict[str, Any]:
         }
         print(f"DEBUG: Parse amendments completed successfully")
         
-        # Print token usage summary
+        # Log token usage summary
         from .token_tracker import TokenTracker
-        TokenTracker().print_summary()
+        TokenTracker().log_summary()
         
         return result
     except Exception as e:
@@ -171,9 +171,9 @@ def parse_amendments_from_markdown(markdown_files: list) -> Dict[str, Any]:
         }
         print(f"DEBUG: Parse amendments from markdown completed successfully")
         
-        # Print token usage summary
+        # Log token usage summary
         from .token_tracker import TokenTracker
-        TokenTracker().print_summary()
+        TokenTracker().log_summary()
         
         return result
     except Exception as e:
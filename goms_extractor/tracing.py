@@ -0,0 +1,414 @@
+"""
+Per-job tracing of the processing pipeline.
+
+A trace is a tree of timed spans: the job, and inside it the split (OCR, page
+scan, writing the GO PDFs), each GO conversion (preparation, every Gemini
+request, writing the markdown) and each GCS upload. Spans are OpenTelemetry SDK
+spans from this module's TracerProvider. The current span is kept in a context
+variable (and made the current OpenTelemetry span), so spans opened in nested
+calls and in asyncio tasks attach to their parent automatically. Work handed to
+a thread pool keeps its parent if it is submitted through bind().
+
+A span processor (JobSpanProcessor) collects every span of a live job's trace
+onto its Trace, which is what /jobs/{id}/trace and critical_path() read, so a
+running job can be inspected without an exporter. With TRACE_CLOUD_EXPORT the
+spans are also exported to Cloud Trace (opentelemetry-exporter-gcp-trace).
+
+A finished trace is written to TRACE_DIR/<job id>.json in the Chrome trace
+event format, which chrome://tracing and https://ui.perfetto.dev open directly
+without a collector. Concurrent spans are laid out on separate rows (tid).
+
+critical_path() walks the span tree backwards from the end of the job: at each
+level it follows the child that finished last, then the child that finished
+last before that one started, and so on. Time not covered by a child is the
+span's own (self) time. The result is the chain of spans that decided how
+long the job took.
+"""
+
+import os
+import json
+import time
+import threading
+import contextlib
+import contextvars
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+from dotenv import load_dotenv
+from opentelemetry import context as otel_context
+from opentelemetry import trace as otel_trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.trace import Status, StatusCode
+
+from .log import get_logger
+
+# Load environment variables
+load_dotenv()
+
+logger = get_logger(__name__)
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+TRACE_DIR = os.getenv("TRACE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "outputs", "traces"
+)
+TRACE_CLOUD_EXPORT = os.getenv("TRACE_CLOUD_EXPORT", "false").lower() == "true"
+
+# (trace, span) the current code runs in, if any
+_current: contextvars.ContextVar = contextvars.ContextVar("goms_trace", default=None)
+
+
+class JobSpanProcessor(SpanProcessor):
+    """Collects the spans of every open Trace, by OpenTelemetry trace id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._traces: Dict[int, "Trace"] = {}
+
+    def register(self, trace: "Trace"):
+        with self._lock:
+            self._traces[trace.root.sdk_span.get_span_context().trace_id] = trace
+
+    def on_start(self, span, parent_context=None):
+        with self._lock:
+            trace = self._traces.get(span.get_span_context().trace_id)
+        if trace is not None:
+            trace._add(span)
+
+    def on_end(self, span: ReadableSpan):
+        # The job's root span ending closes the trace
+        if span.parent is None:
+            with self._lock:
+                self._traces.pop(span.get_span_context().trace_id, None)
+
+
+def _create_provider() -> TracerProvider:
+    provider = TracerProvider(resource=Resource.create({"service.name": "goms-extractor"}))
+    provider.add_span_processor(_processor)
+    if TRACE_CLOUD_EXPORT:
+        try:
+            from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+            provider.add_span_processor(BatchSpanProcessor(CloudTraceSpanExporter()))
+        except Exception as e:
+            logger.warning("Cloud Trace export disabled: %s", e)
+    return provider
+
+
+_processor = JobSpanProcessor()
+_provider = _create_provider()
+_tracer = _provider.get_tracer(__name__)
+
+
+def get_tracer(name: str):
+    """
+    An OpenTelemetry tracer on this module's provider. Spans it starts inside a
+    job's trace (e.g. with start_as_current_span) are collected into the trace.
+    """
+    return _provider.get_tracer(name)
+
+
+def _attributes(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenTelemetry attribute values: None is dropped, anything but a primitive becomes a string."""
+    return {
+        key: value if isinstance(value, (str, bool, int, float)) else str(value)
+        for key, value in attributes.items()
+        if value is not None
+    }
+
+
+class Span:
+    """One timed operation (an SDK span); times are seconds since the trace started"""
+
+    def __init__(self, trace: "Trace", sdk_span):
+        self.trace = trace
+        self.sdk_span = sdk_span
+
+    @property
+    def name(self) -> str:
+        return self.sdk_span.name
+
+    @property
+    def span_id(self) -> str:
+        return otel_trace.format_span_id(self.sdk_span.get_span_context().span_id)
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        parent = self.sdk_span.parent
+        return otel_trace.format_span_id(parent.span_id) if parent is not None else None
+
+    @property
+    def attributes(self) -> Dict[str, Any]:
+        return dict(self.sdk_span.attributes or {})
+
+    @property
+    def status(self) -> str:
+        return "error" if self.sdk_span.status.status_code is StatusCode.ERROR else "ok"
+
+    @property
+    def start(self) -> float:
+        return self.trace._seconds(self.sdk_span.start_time)
+
+    @property
+    def end(self) -> Optional[float]:
+        end_time = self.sdk_span.end_time
+        return self.trace._seconds(end_time) if end_time is not None else None
+
+    @end.setter
+    def end(self, seconds: float):
+        self.sdk_span.end(end_time=self.trace._ns(seconds))
+
+    def set(self, **attributes):
+        self.sdk_span.set_attributes(_attributes(attributes))
+
+    def fail(self, error: BaseException):
+        self.sdk_span.set_status(Status(StatusCode.ERROR, str(error)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        start = self.start
+        end = self.end if self.end is not None else self.trace.now()
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(start, 6),
+            "end": round(end, 6),
+            "duration": round(end - start, 6),
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class Trace:
+    """The spans of one job"""
+
+    def __init__(self, trace_id: str, name: str, **attributes):
+        self.trace_id = trace_id
+        self.started_at = datetime.now().isoformat()
+        # Span times are perf_counter offsets from these, so spans recorded from
+        # perf_counter() measurements line up with the ones timed here
+        self._origin = time.perf_counter()
+        self._origin_ns = time.time_ns()
+        self._lock = threading.Lock()
+        self.spans: List[Any] = []
+        root = _tracer.start_span(
+            name, context=otel_context.Context(), start_time=self._origin_ns,
+            attributes=_attributes({**attributes, "job.id": trace_id})
+        )
+        # The root starts before the trace is registered, so it is added here
+        self.root = Span(self, root)
+        self._add(root)
+        _processor.register(self)
+        self.path: Optional[str] = None
+
+    def now(self) -> float:
+        return time.perf_counter() - self._origin
+
+    def _ns(self, seconds: float) -> int:
+        return self._origin_ns + int(seconds * 1e9)
+
+    def _seconds(self, ns: int) -> float:
+        return (ns - self._origin_ns) / 1e9
+
+    def _add(self, sdk_span):
+        """Called by JobSpanProcessor for every span started in this trace."""
+        with self._lock:
+            self.spans.append(sdk_span)
+
+    def _open(self, name: str, parent: Span, attributes: Dict[str, Any], started: Optional[float] = None) -> Span:
+        sdk_span = _tracer.start_span(
+            name, context=otel_trace.set_span_in_context(parent.sdk_span),
+            start_time=self._ns(self.now() if started is None else started),
+            attributes=_attributes(attributes)
+        )
+        return Span(self, sdk_span)
+
+    def record(self, name: str, started: float, ended: float, parent: Optional[Span] = None, **attributes) -> Span:
+        """Add a span measured elsewhere (started/ended are time.perf_counter() values)."""
+        span = self._open(name, parent or self.root, attributes, started - self._origin)
+        span.end = ended - self._origin
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "spans": sorted((Span(self, span).to_dict() for span in spans), key=lambda span: span["start"])
+        }
+
+
+def current() -> Optional[tuple]:
+    """(trace, span) of the calling context, or None outside a trace."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def _activate(trace: Trace, span: Span):
+    """Make span the current span, here and for OpenTelemetry."""
+    token = _current.set((trace, span))
+    otel_token = otel_context.attach(otel_trace.set_span_in_context(span.sdk_span))
+    try:
+        yield
+    finally:
+        otel_context.detach(otel_token)
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def start_trace(trace_id: str, name: str, **attributes):
+    """Trace the with block as the root span of a new trace; yields the Trace (None when disabled)."""
+    if not TRACE_ENABLED:
+        yield None
+        return
+    trace = Trace(trace_id, name, **attributes)
+    try:
+        with _activate(trace, trace.root):
+            yield trace
+    except BaseException as e:
+        trace.root.fail(e)
+        raise
+    finally:
+        trace.root.end = trace.now()
+        try:
+            trace.path = export_chrome_trace(trace)
+        except Exception as e:
+            logger.warning("Could not write trace %s: %s", trace_id, e)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Trace the with block as a child of the current span; yields the Span (None outside a trace)."""
+    context = _current.get()
+    if context is None:
+        yield None
+        return
+    trace, parent = context
+    child = trace._open(name, parent, attributes)
+    try:
+        with _activate(trace, child):
+            yield child
+    except BaseException as e:
+        child.fail(e)
+        child.set(error=str(e))
+        raise
+    finally:
+        child.end = trace.now()
+
+
+def record(name: str, started: float, ended: float, **attributes) -> Optional[Span]:
+    """Add an already measured span (time.perf_counter() values) under the current span."""
+    context = _current.get()
+    if context is None:
+        return None
+    trace, parent = context
+    return trace.record(name, started, ended, parent, **attributes)
+
+
+def bind(function: Callable) -> Callable:
+    """Run function in the calling context (and so under the current span) from another thread."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+def _lanes(spans: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Row per span such that spans on a row are either disjoint or nested."""
+    lanes: List[List[float]] = []
+    assignment = {}
+    for span in sorted(spans, key=lambda span: (span["start"], -span["duration"])):
+        for index, stack in enumerate(lanes):
+            while stack and stack[-1] <= span["start"]:
+                stack.pop()
+            if not stack or stack[-1] >= span["end"]:
+                break
+        else:
+            index, stack = len(lanes), []
+            lanes.append(stack)
+        stack.append(span["end"])
+        assignment[span["span_id"]] = index
+    return assignment
+
+
+def chrome_trace(trace: Trace) -> Dict[str, Any]:
+    """The trace as Chrome trace events (complete events, microseconds)."""
+    spans = trace.to_dict()["spans"]
+    lanes = _lanes(spans)
+    events = [
+        {
+            "name": span["name"],
+            "cat": "goms",
+            "ph": "X",
+            "ts": round(span["start"] * 1e6, 1),
+            "dur": round(span["duration"] * 1e6, 1),
+            "pid": 1,
+            "tid": lanes[span["span_id"]],
+            "args": {**span["attributes"], "span_id": span["span_id"], "parent_id": span["parent_id"], "status": span["status"]}
+        }
+        for span in spans
+    ]
+    events.append({"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"job {trace.trace_id}"}})
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": trace.trace_id, "started_at": trace.started_at}}
+
+
+def export_chrome_trace(trace: Trace, trace_dir: Optional[str] = None) -> str:
+    """Write the trace to <trace_dir>/<trace id>.json and return the path."""
+    trace_dir = trace_dir or TRACE_DIR
+    os.makedirs(trace_dir, exist_ok=True)
+    path = os.path.join(trace_dir, f"{trace.trace_id}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(trace), f)
+    return path
+
+
+def critical_path(trace: Trace) -> Dict[str, Any]:
+    """
+    The spans that determined the job's duration.
+
+    Returns:
+        {"trace_id", "duration", "trace_file", "critical_path": [{"name", "span_id",
+        "start", "end", "duration", "self_seconds", "attributes"}] in start order,
+        "by_name": {span name: self seconds on the critical path}, "spans": span count}
+    """
+    spans = trace.to_dict()["spans"]
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for span in spans:
+        children.setdefault(span["parent_id"], []).append(span)
+
+    path = []
+
+    def walk(span: Dict[str, Any]):
+        covered, chain = 0.0, []
+        cursor = span["end"]
+        candidates = sorted(children.get(span["span_id"], []), key=lambda child: child["end"], reverse=True)
+        for child in candidates:
+            if child["end"] <= cursor + 1e-9 and child["start"] >= span["start"] - 1e-9:
+                chain.append(child)
+                covered += child["duration"]
+                cursor = child["start"]
+        path.append({
+            "name": span["name"],
+            "span_id": span["span_id"],
+            "start": span["start"],
+            "end": span["end"],
+            "duration": span["duration"],
+            "self_seconds": round(max(span["duration"] - covered, 0.0), 6),
+            "attributes": span["attributes"]
+        })
+        for child in reversed(chain):
+            walk(child)
+
+    root = trace.root.to_dict()
+    walk(root)
+    path.sort(key=lambda entry: entry["start"])
+    by_name: Dict[str, float] = {}
+    for entry in path:
+        by_name[entry["name"]] = round(by_name.get(entry["name"], 0.0) + entry["self_seconds"], 6)
+    return {
+        "trace_id": trace.trace_id,
+        "duration": root["duration"],
+        "trace_file": trace.path,
+        "critical_path": path,
+        "by_name": dict(sorted(by_name.items(), key=lambda item: item[1], reverse=True)),
+        "spans": len(spans)
+    }
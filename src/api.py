@@ -4,15 +4,15 @@ Provides a simplified REST API that forwards requests to the ADK API server.
 """
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List, Union
 import os
 import shutil
+import time
 import uuid
 from datetime import datetime
-import logging
 import httpx
 import asyncio
 import functools
@@ -26,15 +26,21 @@ load_dotenv()
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from goms_extractor.splitter import split_goms
-from goms_extractor.md_converter import convert_split_gos_to_markdown
+from goms_extractor.splitter import split_goms, iter_go_segments, materialize_go_pdf, DEFAULT_SCAN_MODE, DEFAULT_SCAN_WORKERS
+from goms_extractor.split_cache import copy_and_hash
+from goms_extractor.memory import RssSampler
+from goms_extractor.md_converter import convert_split_gos_to_markdown_async, convert_go_segments_to_markdown_async
+from goms_extractor.gemini_client import get_converter_client
+from goms_extractor.conversion_progress import ConversionProgress
+from goms_extractor.job_budget import JobBudget
+from goms_extractor import metrics, tracing
+from goms_extractor.log import get_logger, log_context, dropped_records
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Set up logging (queued, see goms_extractor/log.py; uvicorn keeps its own handlers)
+logger = get_logger("api")
 
 GCS_BUCKET = os.getenv("GCS_BUCKET")  # Set via environment variable
-print(f"GCS_BUCKET is set to: {GCS_BUCKET}")
+logger.info("GCS_BUCKET is set to: %s", GCS_BUCKET)
 
 # Create FastAPI app
 app = FastAPI(
@@ -65,6 +71,9 @@ GCS_ENABLED = GCS_BUCKET is not None
 # HTTP client for ADK API
 http_client = httpx.AsyncClient(timeout=600.0)  # 10 minute timeout for long-running tasks
 
+# Warm the shared Gemini converter client at startup (direct processing endpoints)
+GEMINI_PREFLIGHT = os.getenv("GEMINI_PREFLIGHT", "true").lower() == "true"
+
 
 class ProcessRequest(BaseModel):
     """Request model for processing a PDF from a file path"""
@@ -93,12 +102,119 @@ class JobStatusResponse(BaseModel):
     status: str
     message: Optional[str] = None
     result: Optional[Union[Dict[str, Any], List[Any]]] = None
+    progress: Optional[Dict[str, Any]] = None
     created_at: str
     updated_at: str
 
 jobs: Dict[str, Dict[str, Any]] = {}
 
 
+def _job_counts() -> Dict[tuple, int]:
+    """Current jobs by (endpoint, status), for the goms_jobs gauge."""
+    counts: Dict[tuple, int] = {}
+    for job in list(jobs.values()):
+        key = (job.get("endpoint", "adk"), job["status"])
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+metrics.JOBS.set_function(_job_counts)
+metrics.LOG_RECORDS_DROPPED.set_function(lambda: {(): dropped_records()})
+
+
+def _job_finished(job_id: str, started: float):
+    """Record a finished job's duration and final status."""
+    job = jobs.get(job_id)
+    metrics.JOB_SECONDS.observe(time.perf_counter() - started)
+    metrics.JOBS_FINISHED.inc(status=job["status"] if job else "deleted")
+
+
+def _record_split(seconds: float, pages: int, endpoint: Optional[str] = None):
+    endpoint = endpoint or metrics.current_endpoint()
+    metrics.SPLIT_SECONDS.observe(seconds, endpoint=endpoint)
+    metrics.SPLIT_PAGES.inc(pages, endpoint=endpoint)
+    if seconds > 0 and pages:
+        metrics.SPLIT_PAGES_PER_SECOND.observe(pages / seconds, endpoint=endpoint)
+
+
+def _timed_segments(segments, started: float, scan_stats: Optional[Dict[str, Any]] = None):
+    """
+    Pass GO segments through, recording the split stage (metrics and a "split"
+    span) once the splitter is done. The endpoint and span are captured here:
+    the segments are pulled from executor threads. scan_stats, if given, is
+    filled in the shape of split_goms' scan_stats (a single in-process scan).
+    """
+    endpoint = metrics.current_endpoint()
+    trace_context = tracing.current()
+
+    def timed():
+        pages = gos = 0
+        for segment in segments:
+            pages += max(segment["end_page"] - segment["start_page"] + 1, 0)
+            gos += 1
+            yield segment
+        ended = time.perf_counter()
+        seconds = ended - started
+        if scan_stats is not None:
+            scan_stats.update({
+                "scan_mode": DEFAULT_SCAN_MODE,
+                "pages": pages,
+                "scan_seconds": round(seconds, 4),
+                "pages_per_sec": round(pages / seconds, 2) if seconds > 0 else None,
+                "workers": 1,
+                "shards": 1,
+                "worker_seconds": round(seconds, 4),
+                "parallelism": 1.0,
+                "streaming": True
+            })
+        _record_split(seconds, pages, endpoint)
+        if trace_context is not None:
+            trace, parent = trace_context
+            trace.record("split", started, ended, parent, pages=pages, gos=gos, streaming=True)
+
+    return timed()
+
+
+def _traced_job(endpoint: str):
+    """
+    Run a job task under the given metrics endpoint label, the job's log context
+    and its own trace (see goms_extractor/tracing.py), kept on the job for
+    /jobs/{job_id}/trace.
+    """
+    def decorator(task):
+        @functools.wraps(task)
+        async def wrapper(job_id: str, pdf_path: str, *args, **kwargs):
+            metrics.set_endpoint(endpoint)
+            with log_context(job=job_id), tracing.start_trace(job_id, "job", endpoint=endpoint, file=os.path.basename(pdf_path)) as trace:
+                if job_id in jobs:
+                    jobs[job_id]["trace"] = trace
+                await task(job_id, pdf_path, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def _upload_file(uploader, local_path: str, gcs_path: str) -> Dict[str, Any]:
+    """Upload one file to GCS from the executor, recording its time and size."""
+    started = time.perf_counter()
+    with tracing.span("gcs_upload", file=os.path.basename(local_path)) as span:
+        upload_result = await asyncio.get_event_loop().run_in_executor(
+            None,
+            functools.partial(uploader.upload_file, local_path, gcs_path, False)
+        )
+        if span is not None:
+            span.set(result=upload_result["status"], bytes=os.path.getsize(local_path))
+    metrics.GCS_UPLOAD_SECONDS.observe(time.perf_counter() - started)
+    if upload_result["status"] == "success":
+        metrics.GCS_UPLOAD_BYTES.inc(os.path.getsize(local_path))
+    return upload_result
+
+
+def _job_status(job: Dict[str, Any]) -> JobStatusResponse:
+    """Job status, with the job's live ConversionProgress (direct jobs) rendered as a snapshot."""
+    progress = job.get("progress")
+    return JobStatusResponse(**{**job, "progress": progress.snapshot() if progress else None})
+
+
 def generate_ids():
     """Generate unique user and session IDs"""
     job_id = str(uuid.uuid4())
@@ -114,7 +230,7 @@ async def create_adk_session(user_id: str, session_id: str) -> bool:
         response = await http_client.post(url, json={})
         return response.status_code in [200, 201]
     except Exception as e:
-        logger.error(f"Failed to create ADK session: {e}")
+        logger.error("Failed to create ADK session: %s", e)
         return False
 
 
@@ -132,25 +248,28 @@ async def send_message_to_agent(user_id: str, session_id: str, message: str) ->
             }
         }
         
-        logger.info(f"Sending request to ADK API: {url}")
+        logger.info("Sending request to ADK API: %s", url)
         response = await http_client.post(url, json=payload)
         response.raise_for_status()
         
         return response.json()
     except Exception as e:
-        logger.error(f"Failed to send message to agent: {e}")
+        logger.error("Failed to send message to agent: %s", e)
         raise
 
 
+@_traced_job("adk")
 async def process_pdf_task(job_id: str, pdf_path: str, user_id: str, session_id: str, output_dir: Optional[str] = None):
     """Background task to process PDF"""
+    started = time.perf_counter()
     try:
-        logger.info(f"Job {job_id}: Starting processing")
+        logger.info("Job %s: Starting processing", job_id)
         jobs[job_id]["status"] = "processing"
         jobs[job_id]["updated_at"] = datetime.now().isoformat()
 
         # Create session in ADK
-        session_created = await create_adk_session(user_id, session_id)
+        with tracing.span("adk_session"):
+            session_created = await create_adk_session(user_id, session_id)
         if not session_created:
             raise Exception("Failed to create ADK session")
 
@@ -160,8 +279,9 @@ async def process_pdf_task(job_id: str, pdf_path: str, user_id: str, session_id:
             message += f"\nSave outputs to: {output_dir}"
 
         # Send to agent
-        logger.info(f"Job {job_id}: Sending message to agent with file path: {pdf_path}")
-        result = await send_message_to_agent(user_id, session_id, message)
+        logger.info("Job %s: Sending message to agent with file path: %s", job_id, pdf_path)
+        with tracing.span("adk_run"):
+            result = await send_message_to_agent(user_id, session_id, message)
 
         # Update job status
         jobs[job_id]["status"] = "completed"
@@ -169,90 +289,217 @@ async def process_pdf_task(job_id: str, pdf_path: str, user_id: str, session_id:
         jobs[job_id]["message"] = "Processing completed successfully"
         jobs[job_id]["updated_at"] = datetime.now().isoformat()
 
-        logger.info(f"Job {job_id}: Completed successfully")
+        logger.info("Job %s: Completed successfully", job_id)
+        _job_finished(job_id, started)
 
         # Clean up the uploaded file after successful processing
         try:
             if os.path.exists(pdf_path):
                 os.remove(pdf_path)
-                logger.info(f"Cleaned up file: {pdf_path}")
+                logger.info("Cleaned up file: %s", pdf_path)
         except Exception as cleanup_error:
-            logger.warning(f"Failed to clean up file {pdf_path}: {cleanup_error}")
+            logger.warning("Failed to clean up file %s: %s", pdf_path, cleanup_error)
 
     except Exception as e:
-        logger.error(f"Job {job_id}: Failed - {str(e)}", exc_info=True)
+        logger.error("Job %s: Failed - %s", job_id, e, exc_info=True)
         jobs[job_id]["status"] = "failed"
         jobs[job_id]["message"] = f"Processing failed: {str(e)}"
         jobs[job_id]["updated_at"] = datetime.now().isoformat()
+        _job_finished(job_id, started)
 
         # Even in case of failure, try to clean up the file
         try:
             if os.path.exists(pdf_path):
                 os.remove(pdf_path)
-                logger.info(f"Cleaned up file after failure: {pdf_path}")
+                logger.info("Cleaned up file after failure: %s", pdf_path)
         except Exception as cleanup_error:
-            logger.warning(f"Failed to clean up file after failure {pdf_path}: {cleanup_error}")
+            logger.warning("Failed to clean up file after failure %s: %s", pdf_path, cleanup_error)
 
 
+def _validate_budget(max_tokens: Optional[int], deadline_seconds: Optional[float]):
+    if max_tokens is not None and max_tokens < 0:
+        raise HTTPException(status_code=400, detail="max_tokens must be positive (0 for no limit)")
+    if deadline_seconds is not None and deadline_seconds < 0:
+        raise HTTPException(status_code=400, detail="deadline_seconds must be positive (0 for no limit)")
+
+
+def _concurrency_label(max_workers: Optional[int]) -> str:
+    if max_workers:
+        return f"adaptive concurrency, at most {max_workers} Gemini requests in flight"
+    return "adaptive concurrency"
+
+
+@_traced_job("direct")
 async def process_pdf_task_direct(
     job_id: str, 
     pdf_path: str, 
     output_dir: Optional[str] = None, 
-    max_workers: int = 4
+    max_workers: Optional[int] = None,
+    scan_workers: Optional[int] = None,
+    virtual_split: bool = False,
+    upload_split_pdfs: bool = True,
+    content_hash: Optional[str] = None,
+    window_pages: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    deadline_seconds: Optional[float] = None
 ):
     """
     Background task to process PDF using direct in-process calls (concurrent).
-    This bypasses the ADK agent and directly calls split_goms and convert_split_gos_to_markdown.
+    This bypasses the ADK agent and directly calls split_goms and the async
+    markdown converter (convert_split_gos_to_markdown_async): GO conversions are
+    tasks on this event loop, bounded by the process-wide MD_ASYNC_CONCURRENCY
+    semaphore and the shared adaptive rate limiter (rate_limiter.py). max_workers,
+    if given, additionally caps this job's Gemini requests in flight.
     Automatically uploads results to GCS if GCS_BUCKET is configured.
+    With virtual_split, split PDFs are only built when something asks for them
+    (GCS upload when upload_split_pdfs is set, or the split PDF download endpoint).
+    content_hash (hashed while the upload was saved) keys the split cache without
+    re-reading the file. window_pages enables the splitter's bounded-memory mode;
+    peak RSS is reported under summary.memory_stats either way.
+    max_tokens and deadline_seconds (default JOB_MAX_TOKENS / JOB_DEADLINE_SECONDS)
+    bound the job's Gemini tokens and wall-clock time: once one is reached, no
+    further GO is converted, unfinished ones are cancelled and the job completes
+    with what it has, marked with result.stopped and summary.budget.
     """
+    started = time.perf_counter()
+    budget = JobBudget.from_limits(max_tokens, deadline_seconds)
     try:
-        logger.info(f"Job {job_id}: Starting direct processing (concurrent with {max_workers} workers)")
+        logger.info("Job %s: Starting direct processing (%s)", job_id, _concurrency_label(max_workers))
         jobs[job_id]["status"] = "processing"
         jobs[job_id]["updated_at"] = datetime.now().isoformat()
+        progress = jobs[job_id]["progress"] = ConversionProgress()
 
-        # Step 1: Split the PDF into individual GOs
-        logger.info(f"Job {job_id}: Splitting PDF into individual GOs...")
         loop = asyncio.get_event_loop()
-        split_result = await loop.run_in_executor(
-            None,
-            functools.partial(split_goms, input_pdf_path=pdf_path, output_dir=output_dir)
-        )
-        
-        if split_result.get("status") != "success":
-            raise Exception(f"Splitting failed: {split_result.get('message')}")
-        
-        logger.info(f"Job {job_id}: Split completed - {len(split_result.get('split_files', []))} files created")
-
-        # Step 2: Convert split PDFs to markdown (concurrent)
-        logger.info(f"Job {job_id}: Converting split PDFs to markdown (concurrent)...")
-        markdown_result = await loop.run_in_executor(
-            None,
-            functools.partial(
-                convert_split_gos_to_markdown, 
-                split_result=split_result, 
-                output_dir=output_dir,
-                max_workers=max_workers
-            )
-        )
+        scan_workers = scan_workers or DEFAULT_SCAN_WORKERS
+        if scan_workers > 1:
+            # Step 1: Split the PDF into individual GOs (sharded page scan)
+            logger.info("Job %s: Splitting PDF into individual GOs...", job_id)
+            split_started = time.perf_counter()
+            with tracing.span("split", scan_workers=scan_workers):
+                split_result = await loop.run_in_executor(
+                    None,
+                    tracing.bind(functools.partial(
+                        split_goms,
+                        input_pdf_path=pdf_path,
+                        output_dir=output_dir,
+                        scan_workers=scan_workers,
+                        virtual=virtual_split,
+                        content_hash=content_hash,
+                        window_pages=window_pages
+                    ))
+                )
+            
+            if split_result.get("status") != "success":
+                raise Exception(f"Splitting failed: {split_result.get('message')}")
+            scan_stats = split_result.get("scan_stats", {})
+            _record_split(time.perf_counter() - split_started, 0 if scan_stats.get("cached") else scan_stats.get("pages", 0))
+            
+            logger.info("Job %s: Split completed - %d files created", job_id, len(split_result.get("split_files", [])))
+
+            # Step 2: Convert split PDFs to markdown (async, on this event loop)
+            logger.info("Job %s: Converting split PDFs to markdown (async)...", job_id)
+            with tracing.span("convert_markdown", gos=len(split_result.get("split_files", []))):
+                markdown_result = await convert_split_gos_to_markdown_async(
+                    split_result=split_result,
+                    output_dir=output_dir,
+                    max_in_flight=max_workers,
+                    progress=progress,
+                    budget=budget
+                )
+        else:
+            # Steps 1+2: Stream GO segments out of the splitter and convert each
+            # one as soon as the next heading closes it
+            logger.info("Job %s: Streaming split and markdown conversion...", job_id)
+            sampler = RssSampler()
+            scan_stats = {}
+            with tracing.span("split_and_convert", streaming=True):
+                streamed = await convert_go_segments_to_markdown_async(
+                    segments=_timed_segments(
+                        iter_go_segments(
+                            pdf_path,
+                            output_dir=output_dir,
+                            virtual=virtual_split,
+                            content_hash=content_hash,
+                            window_pages=window_pages,
+                            sampler=sampler
+                        ),
+                        time.perf_counter(),
+                        scan_stats
+                    ),
+                    output_dir=output_dir,
+                    max_in_flight=max_workers,
+                    progress=progress,
+                    budget=budget
+                )
+            
+            if streamed.get("split_error"):
+                raise Exception(f"Splitting failed: {streamed['split_error']}")
+            
+            segments = streamed.get("segments", [])
+            split_result = {
+                "status": "success",
+                "message": f"Successfully split {pdf_path} into {len(segments)} files (streaming)",
+                "split_files": [segment["split_file"] for segment in segments],
+                "go_index": [
+                    {k: segment[k] for k in ("goms_no", "start_page", "end_page")}
+                    for segment in segments
+                ],
+                "scan_stats": scan_stats,
+                "memory_stats": {"window_pages": window_pages, **sampler.stats()},
+                "text_sidecars": [
+                    {"goms_no": segment["goms_no"], "split_file": segment["split_file"], **segment["text_sidecar"]}
+                    for segment in segments if "text_sidecar" in segment
+                ],
+                "write_stats": {
+                    "total_bytes": sum(segment.get("bytes", 0) for segment in segments),
+                    "per_go": [
+                        {"goms_no": segment["goms_no"], "split_file": segment["split_file"], "bytes": segment["bytes"]}
+                        for segment in segments if "bytes" in segment
+                    ]
+                }
+            }
+            if virtual_split:
+                split_result["virtual"] = True
+                split_result["manifest"] = segments
+            markdown_result = {
+                k: streamed.get(k)
+                for k in ("status", "message", "markdown_files", "conversion_results", "first_markdown_seconds", "cache_stats", "converter_stats", "payload_stats", "pack_stats", "token_usage", "stopped", "budget")
+            }
+            logger.info("Job %s: Streaming split produced %d GOs, first markdown after %ss", job_id, len(segments), streamed.get("first_markdown_seconds"))
         
         if markdown_result.get("status") != "success":
-            logger.warning(f"Job {job_id}: Markdown conversion had issues: {markdown_result.get('message')}")
+            logger.warning("Job %s: Markdown conversion had issues: %s", job_id, markdown_result.get("message"))
+        if markdown_result.get("stopped"):
+            logger.warning("Job %s: %s", job_id, markdown_result.get("message"))
 
         # Combine results
         result = {
             "split_result": split_result,
             "markdown_result": markdown_result,
+            "stopped": markdown_result.get("stopped"),
             "summary": {
                 "total_gos_found": len(split_result.get("split_files", [])),
                 "successful_conversions": len(markdown_result.get("markdown_files", [])),
                 "split_files": split_result.get("split_files", []),
-                "markdown_files": markdown_result.get("markdown_files", [])
+                "markdown_files": markdown_result.get("markdown_files", []),
+                "scan_stats": split_result.get("scan_stats", {}),
+                "split_cache": split_result.get("cache", {}),
+                "markdown_cache": markdown_result.get("cache_stats") or {},
+                "converters": markdown_result.get("converter_stats") or {},
+                "packing": markdown_result.get("pack_stats"),
+                "payload": markdown_result.get("payload_stats") or {},
+                "token_usage": markdown_result.get("token_usage") or {},
+                "budget": markdown_result.get("budget"),
+                "ocr_stats": split_result.get("ocr_stats", {}),
+                "memory_stats": split_result.get("memory_stats", {}),
+                "write_stats": split_result.get("write_stats", {}),
+                "text_sidecars": [entry["text_file"] for entry in split_result.get("text_sidecars", [])]
             }
         }
 
         # Step 3: Upload to GCS if configured, otherwise use local storage
         if GCS_ENABLED:
-            logger.info(f"Job {job_id}: Uploading results to GCS bucket: {GCS_BUCKET}...")
+            logger.info("Job %s: Uploading results to GCS bucket: %s...", job_id, GCS_BUCKET)
             try:
                 from src.gcs_storage import GCSUploader
                 
@@ -267,15 +514,31 @@ async def process_pdf_task_direct(
                 successful_uploads = 0
                 failed_uploads = 0
                 
-                # Upload split PDFs
-                logger.info(f"Job {job_id}: Uploading {len(split_result.get('split_files', []))} split PDFs...")
-                for pdf_file in split_result.get("split_files", []):
+                # Upload split PDFs (virtual splits are materialized only if requested)
+                split_uploads = split_result.get("manifest") or [{"split_file": f} for f in split_result.get("split_files", [])]
+                if split_result.get("virtual") and not upload_split_pdfs:
+                    logger.info("Job %s: Virtual split - skipping upload of %d split PDFs", job_id, len(split_uploads))
+                    split_uploads = []
+                logger.info("Job %s: Uploading %d split PDFs...", job_id, len(split_uploads))
+                for entry in split_uploads:
+                    pdf_file = entry["split_file"]
+                    if entry.get("virtual"):
+                        pdf_file = await loop.run_in_executor(None, materialize_go_pdf, entry)
                     filename = os.path.basename(pdf_file)
                     gcs_path = f"{gcs_prefix}/split_pdfs/{filename}"
-                    upload_result = await loop.run_in_executor(
-                        None,
-                        functools.partial(uploader.upload_file, pdf_file, gcs_path, False)
-                    )
+                    upload_result = await _upload_file(uploader, pdf_file, gcs_path)
+                    upload_results.append(upload_result)
+                    if upload_result["status"] == "success":
+                        successful_uploads += 1
+                    else:
+                        failed_uploads += 1
+                
+                # Upload per-GO text sidecars next to the split PDFs
+                text_files = [entry["text_file"] for entry in split_result.get("text_sidecars", [])]
+                logger.info("Job %s: Uploading %d text sidecars...", job_id, len(text_files))
+                for text_file in text_files:
+                    gcs_path = f"{gcs_prefix}/split_text/{os.path.basename(text_file)}"
+                    upload_result = await _upload_file(uploader, text_file, gcs_path)
                     upload_results.append(upload_result)
                     if upload_result["status"] == "success":
                         successful_uploads += 1
@@ -283,14 +546,11 @@ async def process_pdf_task_direct(
                         failed_uploads += 1
                 
                 # Upload markdown files
-                logger.info(f"Job {job_id}: Uploading {len(markdown_result.get('markdown_files', []))} markdown files...")
+                logger.info("Job %s: Uploading %d markdown files...", job_id, len(markdown_result.get("markdown_files", [])))
                 for md_file in markdown_result.get("markdown_files", []):
                     filename = os.path.basename(md_file)
                     gcs_path = f"{gcs_prefix}/markdown/{filename}"
-                    upload_result = await loop.run_in_executor(
-                        None,
-                        functools.partial(uploader.upload_file, md_file, gcs_path, False)
-                    )
+                    upload_result = await _upload_file(uploader, md_file, gcs_path)
                     upload_results.append(upload_result)
                     if upload_result["status"] == "success":
                         successful_uploads += 1
@@ -313,10 +573,10 @@ async def process_pdf_task_direct(
                 
                 result["storage"] = gcs_result
                 result["storage_type"] = "gcs"
-                logger.info(f"Job {job_id}: GCS upload completed - {gcs_result['message']}")
+                logger.info("Job %s: GCS upload completed - %s", job_id, gcs_result["message"])
                 
             except Exception as gcs_error:
-                logger.error(f"Job {job_id}: GCS upload failed - {str(gcs_error)}")
+                logger.error("Job %s: GCS upload failed - %s", job_id, gcs_error)
                 result["storage"] = {
                     "status": "error",
                     "message": f"GCS upload failed: {str(gcs_error)}"
@@ -324,7 +584,7 @@ async def process_pdf_task_direct(
                 result["storage_type"] = "gcs"
         else:
             # Use local storage when GCS is not configured
-            logger.info(f"Job {job_id}: GCS_BUCKET not configured, using local storage")
+            logger.info("Job %s: GCS_BUCKET not configured, using local storage", job_id)
             
             # Get the output directories from the results
             split_dir = os.path.dirname(split_result.get("split_files", [""])[0]) if split_result.get("split_files") else "N/A"
@@ -339,7 +599,7 @@ async def process_pdf_task_direct(
                 "message": f"Files stored locally (GCS not configured)"
             }
             result["storage_type"] = "local"
-            logger.info(f"Job {job_id}: Using local storage - split PDFs: {split_dir}, markdown: {markdown_dir}")
+            logger.info("Job %s: Using local storage - split PDFs: %s, markdown: %s", job_id, split_dir, markdown_dir)
 
         # Update job status
         jobs[job_id]["status"] = "completed"
@@ -347,6 +607,8 @@ async def process_pdf_task_direct(
         
         # Update message to include storage info
         message = f"Processing completed: {result['summary']['successful_conversions']}/{result['summary']['total_gos_found']} GOs converted"
+        if result["stopped"]:
+            message = f"Stopped early ({result['stopped']}): {result['summary']['successful_conversions']}/{result['summary']['total_gos_found']} GOs converted"
         if result.get("storage_type") == "gcs" and result.get("storage", {}).get("status") == "success":
             message += f" | Uploaded to GCS: gs://{GCS_BUCKET}/{result['storage']['gcs_prefix']}"
         elif result.get("storage_type") == "local":
@@ -355,29 +617,34 @@ async def process_pdf_task_direct(
         jobs[job_id]["message"] = message
         jobs[job_id]["updated_at"] = datetime.now().isoformat()
 
-        logger.info(f"Job {job_id}: Completed successfully - {result['summary']}")
+        logger.info("Job %s: Completed successfully - %s", job_id, result["summary"])
+        _job_finished(job_id, started)
 
-        # Clean up the uploaded file after successful processing
+        # Clean up the uploaded file after successful processing. Virtual splits
+        # keep it until the job is deleted: split PDFs are still built from it.
         try:
-            if os.path.exists(pdf_path) and pdf_path.startswith(UPLOAD_DIR):
+            if virtual_split:
+                logger.info("Keeping source file for virtual split: %s", pdf_path)
+            elif os.path.exists(pdf_path) and pdf_path.startswith(UPLOAD_DIR):
                 os.remove(pdf_path)
-                logger.info(f"Cleaned up file: {pdf_path}")
+                logger.info("Cleaned up file: %s", pdf_path)
         except Exception as cleanup_error:
-            logger.warning(f"Failed to clean up file {pdf_path}: {cleanup_error}")
+            logger.warning("Failed to clean up file %s: %s", pdf_path, cleanup_error)
 
     except Exception as e:
-        logger.error(f"Job {job_id}: Failed - {str(e)}", exc_info=True)
+        logger.error("Job %s: Failed - %s", job_id, e, exc_info=True)
         jobs[job_id]["status"] = "failed"
         jobs[job_id]["message"] = f"Processing failed: {str(e)}"
         jobs[job_id]["updated_at"] = datetime.now().isoformat()
+        _job_finished(job_id, started)
 
         # Even in case of failure, try to clean up the file
         try:
             if os.path.exists(pdf_path) and pdf_path.startswith(UPLOAD_DIR):
                 os.remove(pdf_path)
-                logger.info(f"Cleaned up file after failure: {pdf_path}")
+                logger.info("Cleaned up file after failure: %s", pdf_path)
         except Exception as cleanup_error:
-            logger.warning(f"Failed to clean up file after failure {pdf_path}: {cleanup_error}")
+            logger.warning("Failed to clean up file after failure %s: %s", pdf_path, cleanup_error)
 
 
 
@@ -399,7 +666,10 @@ async def root():
             "/process-direct": "Process a PDF file (upload) with direct concurrent processing",
             "/process-path-direct": "Process a PDF from file path with direct concurrent processing",
             "/jobs/{job_id}": "Get job status",
+            "/jobs/{job_id}/trace": "Critical path of a job's trace (spans for split, conversions, uploads)",
+            "/jobs/{job_id}/split-pdfs/{go_number}": "Download a split GO PDF (built on demand for virtual splits)",
             "/jobs": "List all jobs",
+            "/metrics": "Prometheus metrics (per-stage latency, queue depth, in-flight work, tokens, upload bytes)",
             "/adk/list-apps": "List ADK apps (passthrough)"
         }
     }
@@ -425,7 +695,9 @@ async def health_check():
         "adk_api_healthy": adk_healthy,
         "adk_api_url": ADK_API_URL,
         "ocrmypdf_available": ocr_available,
-        "ocrmypdf_required": True
+        "ocrmypdf_required": True,
+        "gemini_client": get_converter_client().status(),
+        "rate_limiter": get_converter_client().limiter.stats()
     }
 
 
@@ -464,13 +736,14 @@ async def process_pdf_upload(
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat(),
         "file_path": file_path,
-        "original_filename": file.filename
+        "original_filename": file.filename,
+        "endpoint": "adk"
     }
 
     # Add background task
     background_tasks.add_task(process_pdf_task, job_id, file_path, user_id, session_id)
 
-    logger.info(f"Created job {job_id} for file {file.filename}")
+    logger.info("Created job %s for file %s", job_id, file.filename)
 
     return JobResponse(**jobs[job_id])
 
@@ -507,7 +780,8 @@ async def process_pdf_path(
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat(),
         "file_path": request.pdf_path,
-        "original_filename": os.path.basename(request.pdf_path)
+        "original_filename": os.path.basename(request.pdf_path),
+        "endpoint": "adk"
     }
     
     # Add background task
@@ -520,7 +794,7 @@ async def process_pdf_path(
         request.output_dir
     )
     
-    logger.info(f"Created job {job_id} for file {request.pdf_path}")
+    logger.info("Created job %s for file %s", job_id, request.pdf_path)
     
     return JobResponse(**jobs[job_id])
 
@@ -529,11 +803,19 @@ async def process_pdf_path(
 async def process_pdf_upload_direct(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    max_workers: int = 4
+    max_workers: Optional[int] = None,
+    scan_workers: Optional[int] = None,
+    virtual_split: bool = False,
+    upload_split_pdfs: bool = True,
+    window_pages: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    deadline_seconds: Optional[float] = None
 ):
     """
     Upload and process a PDF file using direct in-process calls (concurrent).
     This endpoint bypasses the ADK agent and directly calls the processing functions.
+    max_tokens and deadline_seconds limit the job's Gemini tokens and run time;
+    a job that reaches either returns the GOs converted so far.
     Returns a job ID that can be used to check processing status.
     """
     # Log storage configuration (GCS or local)
@@ -543,15 +825,17 @@ async def process_pdf_upload_direct(
     # Validate file type
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    _validate_budget(max_tokens, deadline_seconds)
 
     # Generate IDs
     job_id = str(uuid.uuid4())
 
-    # Save uploaded file to shared directory with unique name
+    # Save uploaded file to shared directory with unique name, hashing the bytes
+    # as they stream through so the split cache needs no second read
     file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{file.filename}")
     try:
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            content_hash = copy_and_hash(file.file, buffer)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
@@ -561,18 +845,32 @@ async def process_pdf_upload_direct(
         "user_id": "direct",
         "session_id": "direct",
         "status": "pending",
-        "message": f"Job created, direct processing will start shortly (concurrent with {max_workers} workers)",
+        "message": f"Job created, direct processing will start shortly ({_concurrency_label(max_workers)})",
         "result": None,
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat(),
         "file_path": file_path,
-        "original_filename": file.filename
+        "original_filename": file.filename,
+        "endpoint": "direct"
     }
 
     # Add background task for direct processing
-    background_tasks.add_task(process_pdf_task_direct, job_id, file_path, None, max_workers)
+    background_tasks.add_task(
+        process_pdf_task_direct,
+        job_id,
+        file_path,
+        None,
+        max_workers,
+        scan_workers,
+        virtual_split,
+        upload_split_pdfs,
+        content_hash,
+        window_pages=window_pages,
+        max_tokens=max_tokens,
+        deadline_seconds=deadline_seconds
+    )
 
-    logger.info(f"Created direct processing job {job_id} for file {file.filename}")
+    logger.info("Created direct processing job %s for file %s", job_id, file.filename)
 
     return JobResponse(**jobs[job_id])
 
@@ -581,12 +879,20 @@ async def process_pdf_upload_direct(
 async def process_pdf_path_direct(
     background_tasks: BackgroundTasks,
     request: ProcessRequest,
-    max_workers: int = 4
+    max_workers: Optional[int] = None,
+    scan_workers: Optional[int] = None,
+    virtual_split: bool = False,
+    upload_split_pdfs: bool = True,
+    window_pages: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    deadline_seconds: Optional[float] = None
 ):
     """
     Process a PDF file from a file path using direct in-process calls (concurrent).
     This endpoint bypasses the ADK agent and directly calls the processing functions.
     Automatically uploads results to GCS if GCS_BUCKET environment variable is set.
+    max_tokens and deadline_seconds limit the job's Gemini tokens and run time;
+    a job that reaches either returns the GOs converted so far.
     Returns a job ID that can be used to check processing status.
     """
     # Log storage configuration (GCS or local)
@@ -599,12 +905,13 @@ async def process_pdf_path_direct(
     
     if not request.pdf_path.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    _validate_budget(max_tokens, deadline_seconds)
     
     # Generate job ID
     job_id = str(uuid.uuid4())
     
     # Create job entry
-    message = f"Job created, direct processing will start shortly (concurrent with {max_workers} workers)"
+    message = f"Job created, direct processing will start shortly ({_concurrency_label(max_workers)})"
     if GCS_ENABLED:
         message += f" | Will auto-upload to GCS: {GCS_BUCKET}"
     else:
@@ -620,7 +927,8 @@ async def process_pdf_path_direct(
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat(),
         "file_path": request.pdf_path,
-        "original_filename": os.path.basename(request.pdf_path)
+        "original_filename": os.path.basename(request.pdf_path),
+        "endpoint": "direct"
     }
     
     # Add background task for direct processing
@@ -629,23 +937,78 @@ async def process_pdf_path_direct(
         job_id,
         request.pdf_path,
         request.output_dir,
-        max_workers
+        max_workers,
+        scan_workers,
+        virtual_split,
+        upload_split_pdfs,
+        window_pages=window_pages,
+        max_tokens=max_tokens,
+        deadline_seconds=deadline_seconds
     )
     
-    logger.info(f"Created direct processing job {job_id} for file {request.pdf_path}")
+    logger.info("Created direct processing job %s for file %s", job_id, request.pdf_path)
     
     return JobResponse(**jobs[job_id])
 
 
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: per-stage latency histograms, queue depth, in-flight work, tokens and upload bytes"""
+    return Response(content=metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str):
+    """
+    Critical path of a job's trace: the chain of spans (split, GO conversions,
+    Gemini requests, uploads) that determined how long the job took, with each
+    span's self time, plus self time per span name. The full trace is written
+    to trace_file in Chrome trace format once the job ends.
+    """
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    trace = jobs[job_id].get("trace")
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No trace recorded for job {job_id}")
+    return {"job_id": job_id, "status": jobs[job_id]["status"], **tracing.critical_path(trace)}
+
+
 @app.get("/jobs/{job_id}", response_model=JobStatusResponse)
 async def get_job_status(job_id: str):
     """Get the status of a processing job"""
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     
-    return JobStatusResponse(**jobs[job_id])
+    return _job_status(jobs[job_id])
+
+
+@app.get("/jobs/{job_id}/split-pdfs/{go_number}")
+async def download_split_pdf(job_id: str, go_number: int):
+    """
+    Download one split GO PDF (0-based position in the job's go_index).
+    For virtual splits the PDF is built on first request and cached on disk.
+    """
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    split_result = (jobs[job_id].get("result") or {}).get("split_result") or {}
+    entries = split_result.get("manifest") or [{"split_file": f} for f in split_result.get("split_files", [])]
+    if not 0 <= go_number < len(entries):
+        raise HTTPException(status_code=404, detail=f"Split PDF {go_number} not found for job {job_id}")
+    
+    entry = entries[go_number]
+    pdf_file = entry["split_file"]
+    if entry.get("virtual"):
+        if not os.path.exists(entry["source_pdf"]):
+            raise HTTPException(status_code=410, detail="Source PDF for this virtual split is no longer available")
+        loop = asyncio.get_event_loop()
+        pdf_file = await loop.run_in_executor(None, materialize_go_pdf, entry)
+    elif not os.path.exists(pdf_file):
+        raise HTTPException(status_code=404, detail=f"Split PDF file not found: {pdf_file}")
+    
+    return FileResponse(pdf_file, media_type="application/pdf", filename=os.path.basename(pdf_file))
 
 
 @app.get("/jobs")
@@ -653,7 +1016,7 @@ async def list_jobs():
     """List all jobs"""
     return {
         "total": len(jobs),
-        "jobs": [JobStatusResponse(**job) for job in jobs.values()]
+        "jobs": [_job_status(job) for job in jobs.values()]
     }
 
 
@@ -670,9 +1033,9 @@ async def delete_job(job_id: str):
         try:
             if os.path.exists(job["file_path"]):
                 os.remove(job["file_path"])
-                logger.info(f"Deleted file during job cleanup: {job['file_path']}")
+                logger.info("Deleted file during job cleanup: %s", job["file_path"])
         except Exception as e:
-            logger.warning(f"Failed to delete file {job['file_path']}: {e}")
+            logger.warning("Failed to delete file %s: %s", job["file_path"], e)
     
     # Remove from store
     del jobs[job_id]
@@ -692,6 +1055,16 @@ async def list_adk_apps():
         raise HTTPException(status_code=500, detail=f"Failed to list apps: {str(e)}")
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Create the shared Gemini converter client and warm it in the background"""
+    client = get_converter_client()
+    if GEMINI_PREFLIGHT and client.configured:
+        # Don't hold up startup on the network round trip
+        asyncio.get_event_loop().run_in_executor(None, client.preflight)
+    logger.info("Gemini converter client ready (model: %s, preflight: %s)", client.model_name, GEMINI_PREFLIGHT and client.configured)
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
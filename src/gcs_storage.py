@@ -48,7 +48,7 @@ class GCSUploader:
         self.client = storage.Client()
         self.bucket = self.client.bucket(self.bucket_name)
         
-        logger.info(f"GCS Uploader initialized for bucket: {self.bucket_name}")
+        logger.info("GCS Uploader initialized for bucket: %s", self.bucket_name)
     
     def upload_file(
         self, 
@@ -106,11 +106,11 @@ class GCSUploader:
             if make_public:
                 result["public_url"] = blob.public_url
             
-            logger.info(f"Uploaded: {local_path} -> gs://{self.bucket_name}/{gcs_path}")
+            logger.info("Uploaded: %s -> gs://%s/%s", local_path, self.bucket_name, gcs_path)
             return result
             
         except Exception as e:
-            logger.error(f"Failed to upload {local_path}: {str(e)}")
+            logger.error("Failed to upload %s: %s", local_path, e)
             return {
                 "status": "error",
                 "local_path": local_path,
@@ -201,7 +201,7 @@ class GCSUploader:
             }
             
         except Exception as e:
-            logger.error(f"Failed to upload directory {local_dir}: {str(e)}")
+            logger.error("Failed to upload directory %s: %s", local_dir, e)
             return {
                 "status": "error",
                 "message": f"Directory upload failed: {str(e)}"
@@ -324,7 +324,7 @@ def upload_to_gcs(
         }
         
     except Exception as e:
-        logger.error(f"GCS upload failed: {str(e)}")
+        logger.error("GCS upload failed: %s", e)
         return {
             "status": "error",
             "message": f"GCS upload failed: {str(e)}"
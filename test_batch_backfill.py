@@ -0,0 +1,301 @@
+"""
+Unit tests for the batch prediction backfill, against a local fake batch service
+"""
+
+import pytest
+import os
+import re
+import json
+import shutil
+from unittest.mock import patch
+
+from goms_extractor import md_converter
+from goms_extractor.markdown_cache import MarkdownCache
+from goms_extractor.batch_backfill import (
+    BatchPredictionClient,
+    BatchJobFailed,
+    prepare_backfill,
+    submit_backfill,
+    wait_for_backfill,
+    collect_backfill,
+    backfill_markdown,
+    load_manifest,
+    _split_corpus
+)
+from pypdf import PdfReader, PdfWriter
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SINGLE_GO_PDF = os.path.join(DATA_DIR, "GO_123_Dated_the-14--March--2001.pdf")
+
+
+class FakeBatchClient(BatchPredictionClient):
+    """
+    Directory-backed batch service: staged files are copied into a local
+    directory and a job runs on its first poll, answering every request line
+    with handler(request, pdf_reader) (a text, or an Exception for a failed line).
+    """
+
+    def __init__(self, root, handler=None, polls_before_done=1, fail_job=False):
+        self.root = str(root)
+        self.project_id = "test-project"
+        self.model_name = "gemini-test"
+        self.handler = handler or self.echo_pages
+        self.polls_before_done = polls_before_done
+        self.fail_job = fail_job
+        self.jobs = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def echo_pages(request, reader):
+        return f"## G.O.Ms.No.{len(reader.pages)}\n{len(reader.pages)} pages"
+
+    def stage_file(self, local_path, name):
+        path = os.path.join(self.root, "staged", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(local_path, path)
+        return f"file://{path}"
+
+    def submit(self, input_uri, job_name):
+        job_id = f"jobs/{len(self.jobs) + 1}"
+        self.jobs[job_id] = {"input": input_uri[len("file://"):], "polls": 0, "name": job_name}
+        return job_id
+
+    def poll(self, job_id):
+        job = self.jobs[job_id]
+        job["polls"] += 1
+        if job["polls"] < self.polls_before_done:
+            return {"state": "running", "error": None, "output": None}
+        if self.fail_job:
+            return {"state": "failed", "error": "quota exceeded", "output": None}
+        output = os.path.join(self.root, "output", job["name"])
+        if not os.path.exists(output):
+            self._run(job["input"], output)
+        return {"state": "succeeded", "error": None, "output": output}
+
+    def _run(self, input_path, output):
+        os.makedirs(output)
+        with open(input_path) as f, open(os.path.join(output, "predictions.jsonl"), "w") as out:
+            for line in f:
+                request = json.loads(line)["request"]
+                uri = request["contents"][0]["parts"][1]["fileData"]["fileUri"]
+                answer = self.handler(request, PdfReader(uri[len("file://"):]))
+                if isinstance(answer, Exception):
+                    out.write(json.dumps({"request": request, "status": str(answer)}) + "\n")
+                    continue
+                response = {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": answer}]}, "finishReason": "STOP"}],
+                    "usageMetadata": {"promptTokenCount": 300, "candidatesTokenCount": 20, "totalTokenCount": 320}
+                }
+                out.write(json.dumps({"request": request, "status": "", "response": response}) + "\n")
+
+    def read_outputs(self, output):
+        with open(os.path.join(output, "predictions.jsonl")) as f:
+            for line in f:
+                yield json.loads(line)
+
+
+@pytest.fixture(autouse=True)
+def gemini_only():
+    with patch.object(md_converter, "LOCAL_MD_ENABLED", False):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def markdown_cache(tmp_path):
+    cache = MarkdownCache(cache_dir=str(tmp_path / "md_cache"))
+    with patch("goms_extractor.md_converter.get_markdown_cache", return_value=cache):
+        yield cache
+
+
+def _go_pdfs(tmp_path, pages_per_go):
+    split_dir = tmp_path / "split"
+    split_dir.mkdir(exist_ok=True)
+    paths = []
+    for i, pages in enumerate(pages_per_go):
+        writer = PdfWriter()
+        for page in range(pages):
+            writer.add_blank_page(width=600 + 10 * i + page, height=800)
+        path = str(split_dir / f"GO_{i + 1}_Pages_{i}-{i}.pdf")
+        with open(path, "wb") as f:
+            writer.write(f)
+        paths.append(path)
+    return paths
+
+
+class TestBatchBackfill:
+    """Test the prepare / submit / wait / collect cycle"""
+
+    def test_round_trip_writes_markdown(self, tmp_path):
+        """Test that batch responses are written back as <split name>.md files"""
+        go_pdfs = _go_pdfs(tmp_path, [1, 2, 1])
+        client = FakeBatchClient(tmp_path / "service", polls_before_done=2)
+        output_dir = str(tmp_path / "markdown")
+
+        result = backfill_markdown(go_pdfs, client, output_dir=output_dir, work_dir=str(tmp_path / "work"), poll_seconds=0)
+
+        assert result["status"] == "success"
+        assert result["batch"]["requests"] == 3
+        assert result["batch"]["failed_requests"] == 0
+        assert sorted(os.listdir(output_dir)) == ["GO_1_Pages_0-0.md", "GO_2_Pages_1-1.md", "GO_3_Pages_2-2.md"]
+        with open(os.path.join(output_dir, "GO_2_Pages_1-1.md"), encoding="utf-8") as f:
+            assert f.read() == "## G.O.Ms.No.2\n2 pages"
+        assert [r["goms_no"] for r in result["conversion_results"]] == ["1", "2", "1"]
+        assert all(r["batch_job"] == "jobs/1" for r in result["conversion_results"])
+
+    def test_request_lines_match_online_requests(self, tmp_path):
+        """Test the request file: conversion prompt, generation config and key label"""
+        go_pdfs = _go_pdfs(tmp_path, [1])
+        client = FakeBatchClient(tmp_path / "service")
+
+        manifest = prepare_backfill(go_pdfs, client, str(tmp_path / "markdown"), str(tmp_path / "work"))
+
+        with open(manifest["input_file"]) as f:
+            request = json.loads(f.readline())["request"]
+        assert request["contents"][0]["parts"][0]["text"] == md_converter.CONVERSION_PROMPT
+        assert request["generationConfig"]["maxOutputTokens"] == md_converter.GENERATION_CONFIG["max_output_tokens"]
+        assert request["labels"] == {"backfill_key": "go-000000-000"}
+
+    def test_long_go_is_chunked_and_stitched(self, tmp_path):
+        """Test that a long GO becomes one request per page chunk, stitched in order"""
+        go_pdfs = _go_pdfs(tmp_path, [5])
+
+        def handler(request, reader):
+            match = re.search(r"pages (\d+)-(\d+) of a", request["contents"][0]["parts"][0]["text"])
+            return f"pages {match.group(1)}-{match.group(2)} ({len(reader.pages)})"
+
+        client = FakeBatchClient(tmp_path / "service", handler=handler)
+        with patch.object(md_converter, "MD_CHUNK_PAGES", 2):
+            result = backfill_markdown(go_pdfs, client, output_dir=str(tmp_path / "markdown"), work_dir=str(tmp_path / "work"), poll_seconds=0)
+
+        assert result["batch"]["requests"] == 3
+        assert result["conversion_results"][0]["chunks"] == 3
+        with open(result["markdown_files"][0], encoding="utf-8") as f:
+            assert f.read().split("\n\n") == ["pages 1-2 (2)", "pages 3-4 (2)", "pages 5-5 (1)"]
+
+    def test_failed_line_reports_error(self, tmp_path):
+        """Test that a failed request fails only its GO"""
+        go_pdfs = _go_pdfs(tmp_path, [1, 2])
+
+        def handler(request, reader):
+            return RuntimeError("INVALID_ARGUMENT") if len(reader.pages) == 2 else "## G.O.Ms.No.7"
+
+        client = FakeBatchClient(tmp_path / "service", handler=handler)
+        result = backfill_markdown(go_pdfs, client, output_dir=str(tmp_path / "markdown"), work_dir=str(tmp_path / "work"), poll_seconds=0)
+
+        assert result["batch"]["failed_requests"] == 1
+        assert [r["status"] for r in result["conversion_results"]] == ["success", "error"]
+        assert "INVALID_ARGUMENT" in result["conversion_results"][1]["message"]
+
+    def test_cache_hits_skip_the_batch(self, tmp_path):
+        """Test that a second backfill of the same corpus sends no requests"""
+        go_pdfs = _go_pdfs(tmp_path, [1, 1])
+        client = FakeBatchClient(tmp_path / "service")
+        backfill_markdown(go_pdfs, client, output_dir=str(tmp_path / "markdown"), work_dir=str(tmp_path / "work1"), poll_seconds=0)
+
+        result = backfill_markdown(go_pdfs, client, output_dir=str(tmp_path / "markdown"), work_dir=str(tmp_path / "work2"), poll_seconds=0)
+
+        assert result["batch"]["requests"] == 0
+        assert len(client.jobs) == 1
+        assert result["cache_stats"]["hits"] == 2
+        assert len(result["markdown_files"]) == 2
+
+    def test_prepare_holds_a_bounded_window(self, tmp_path):
+        """Test that GOs are written out as they are prepared, not after the whole corpus"""
+        go_pdfs = _go_pdfs(tmp_path, [1] * 12)
+        client = FakeBatchClient(tmp_path / "service")
+        prepared, staged, ahead = [], [], []
+        real_prepare = md_converter._prepare_conversion
+        real_stage = client.stage_file
+
+        def prepare(*args, **kwargs):
+            prepared.append(1)
+            ahead.append(len(prepared) - len(staged))
+            return real_prepare(*args, **kwargs)
+
+        def stage_file(local_path, name):
+            staged.append(name)
+            return real_stage(local_path, name)
+
+        client.stage_file = stage_file
+        with patch.object(md_converter, "_prepare_conversion", side_effect=prepare):
+            manifest = prepare_backfill(go_pdfs, client, str(tmp_path / "markdown"), str(tmp_path / "work"), max_workers=2)
+
+        assert manifest["requests"] == 12
+        assert max(ahead) <= 4
+
+    def test_resume_from_manifest(self, tmp_path):
+        """Test collecting a submitted job from its saved manifest"""
+        go_pdfs = _go_pdfs(tmp_path, [1])
+        client = FakeBatchClient(tmp_path / "service")
+        manifest = prepare_backfill(go_pdfs, client, str(tmp_path / "markdown"), str(tmp_path / "work"))
+        submit_backfill(manifest, client)
+
+        resumed = load_manifest(str(tmp_path / "work" / "manifest.json"))
+        assert resumed["state"] == "running"
+        wait_for_backfill(resumed, client, poll_seconds=0)
+        result = collect_backfill(resumed, client)
+
+        assert result["status"] == "success"
+        assert load_manifest(str(tmp_path / "work" / "manifest.json"))["state"] == "collected"
+
+    def test_failed_job_raises(self, tmp_path):
+        """Test that a failed batch job raises BatchJobFailed"""
+        go_pdfs = _go_pdfs(tmp_path, [1])
+        client = FakeBatchClient(tmp_path / "service", fail_job=True)
+
+        with pytest.raises(BatchJobFailed, match="quota exceeded"):
+            backfill_markdown(go_pdfs, client, output_dir=str(tmp_path / "markdown"), work_dir=str(tmp_path / "work"), poll_seconds=0)
+
+    def test_wait_times_out(self, tmp_path):
+        """Test that waiting gives up after the timeout, leaving the job to resume"""
+        go_pdfs = _go_pdfs(tmp_path, [1])
+        client = FakeBatchClient(tmp_path / "service", polls_before_done=100)
+        manifest = submit_backfill(prepare_backfill(go_pdfs, client, str(tmp_path / "markdown"), str(tmp_path / "work")), client)
+
+        with pytest.raises(TimeoutError):
+            wait_for_backfill(manifest, client, poll_seconds=0, timeout=0)
+        assert manifest["state"] == "running"
+
+
+class TestCorpusBackfill:
+    """Test splitting and backfilling a corpus of several gazettes"""
+
+    def _gazette(self, path, starts):
+        """Gazette whose GOs all start with the GO_123 page (True) followed by blank pages (False)"""
+        start_page = PdfReader(SINGLE_GO_PDF).pages[0]
+        writer = PdfWriter()
+        for is_start in starts:
+            if is_start:
+                writer.add_page(start_page)
+            else:
+                writer.add_blank_page(width=start_page.mediabox.width, height=start_page.mediabox.height)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        writer.write(path)
+        return path
+
+    def test_gazettes_with_overlapping_gos_are_kept_apart(self, tmp_path):
+        """Test that GOs with the same number and page range in two gazettes each get their own files"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        # Same file name in two year directories; both have a GO 123 on pages 1-2
+        gazettes = [
+            self._gazette(str(tmp_path / "2001" / "gazette.pdf"), (True, False, True)),
+            self._gazette(str(tmp_path / "2002" / "gazette.pdf"), (True, False, True, False))
+        ]
+        with patch("goms_extractor.splitter.SPLIT_CACHE_ENABLED", False):
+            go_pdfs, output_subdirs = _split_corpus(gazettes, str(tmp_path / "split"))
+
+        assert len(go_pdfs) == len(set(go_pdfs)) == 4
+        assert len(set(output_subdirs.values())) == 2
+        client = FakeBatchClient(tmp_path / "service")
+        output_dir = str(tmp_path / "markdown")
+        result = backfill_markdown(go_pdfs, client, output_dir=output_dir, work_dir=str(tmp_path / "work"), poll_seconds=0, output_subdirs=output_subdirs)
+
+        assert result["batch"]["requests"] == 4
+        assert len(result["markdown_files"]) == len(set(result["markdown_files"])) == 4
+        names = sorted(os.path.relpath(path, output_dir) for path in result["markdown_files"])
+        first, second = sorted(set(output_subdirs.values()))
+        assert [os.path.dirname(name) for name in names] == [first, first, second, second]
+        assert sum(os.path.basename(name) == "GO_123_Pages_1-2.md" for name in names) == 2
+        for path in result["markdown_files"]:
+            assert os.path.exists(path)
@@ -30,6 +30,13 @@ def mock_http_client():
         yield mock
 
 
+@pytest.fixture(autouse=True)
+def trace_dir(tmp_path):
+    """Write job traces under the test's temporary directory"""
+    with patch("goms_extractor.tracing.TRACE_DIR", str(tmp_path / "traces")):
+        yield tmp_path / "traces"
+
+
 @pytest.fixture(autouse=True)
 def clear_jobs():
     """Clear jobs dictionary before each test"""
@@ -128,6 +135,21 @@ class TestHealthCheck:
         
         assert data["ocrmypdf_available"] is False
 
+    def test_health_check_gemini_client(self, client, mock_http_client):
+        """Test health check reports the shared Gemini converter client"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_http_client.get = AsyncMock(return_value=mock_response)
+        
+        response = client.get("/health")
+        
+        assert response.status_code == 200
+        gemini = response.json()["gemini_client"]
+        
+        assert "configured" in gemini
+        assert "preflight" in gemini
+        assert gemini["model"]
+
 
 class TestProcessPdfPath:
     """Test process PDF from path endpoint"""
@@ -288,6 +310,34 @@ class TestJobManagement:
         assert data["status"] == "completed"
         assert data["result"]["test"] == "data"
     
+    def test_get_job_status_progress(self, client, tmp_path):
+        """Test that a running direct job reports per-GO streaming progress"""
+        from goms_extractor.conversion_progress import ConversionProgress
+        progress = ConversionProgress()
+        stream = progress.track(str(tmp_path / "GO_1_Pages_0-0.pdf")).stream()
+        stream.begin()
+        stream.append("## GOVERNMENT")
+        job_id = "test-job-progress"
+        jobs[job_id] = {
+            "job_id": job_id,
+            "user_id": "direct",
+            "session_id": "direct",
+            "status": "processing",
+            "result": None,
+            "progress": progress,
+            "created_at": "2025-12-03T00:00:00",
+            "updated_at": "2025-12-03T00:00:00"
+        }
+        
+        response = client.get(f"/jobs/{job_id}")
+        
+        assert response.status_code == 200
+        data = response.json()["progress"]
+        assert data["gos"]["GO_1_Pages_0-0"]["state"] == "streaming"
+        assert data["gos"]["GO_1_Pages_0-0"]["chars"] == 13
+        assert data["totals"]["streaming"] == 1
+        assert "idle_seconds" in data["gos"]["GO_1_Pages_0-0"]
+    
     def test_get_job_status_not_found(self, client):
         """Test getting non-existent job"""
         response = client.get("/jobs/nonexistent-job")
@@ -355,6 +405,55 @@ class TestJobManagement:
         assert response.status_code == 404
 
 
+class TestSplitPdfDownload:
+    """Test split PDF download endpoint"""
+    
+    def test_download_virtual_split_pdf(self, client, tmp_path):
+        """Test that a virtual split PDF is materialized on download"""
+        source_pdf = os.path.join(os.path.dirname(__file__), "data", "GO_123_Dated_the-14--March--2001.pdf")
+        if not os.path.exists(source_pdf):
+            pytest.skip(f"Test file not found: {source_pdf}")
+        
+        split_file = str(tmp_path / "GO_123_Pages_1-1.pdf")
+        jobs["test-job-id"] = {
+            "job_id": "test-job-id",
+            "status": "completed",
+            "result": {
+                "split_result": {
+                    "virtual": True,
+                    "split_files": [split_file],
+                    "manifest": [{
+                        "goms_no": "123",
+                        "start_page": 0,
+                        "end_page": 0,
+                        "source_pdf": source_pdf,
+                        "split_file": split_file,
+                        "virtual": True
+                    }]
+                }
+            }
+        }
+        
+        response = client.get("/jobs/test-job-id/split-pdfs/0")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert response.content.startswith(b"%PDF")
+        assert os.path.exists(split_file)
+    
+    def test_download_split_pdf_out_of_range(self, client):
+        """Test downloading a split PDF that does not exist"""
+        jobs["test-job-id"] = {
+            "job_id": "test-job-id",
+            "status": "completed",
+            "result": {"split_result": {"split_files": []}}
+        }
+        
+        response = client.get("/jobs/test-job-id/split-pdfs/3")
+        
+        assert response.status_code == 404
+
+
 class TestADKPassthrough:
     """Test ADK API passthrough endpoints"""
     
@@ -441,6 +540,242 @@ class TestBackgroundTasks:
             await send_message_to_agent("user_1", "session_1", "Test message")
 
 
+class TestMetrics:
+    """Test the Prometheus /metrics endpoint"""
+    
+    def test_metrics_exposition(self, client):
+        """Test the text format and the queue depth gauge"""
+        jobs["queued-job"] = {"job_id": "queued-job", "status": "pending", "endpoint": "direct"}
+        
+        response = client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert "# TYPE goms_gemini_request_seconds histogram" in body
+        assert "# TYPE goms_split_seconds histogram" in body
+        assert "# TYPE goms_gcs_upload_bytes_total counter" in body
+        assert 'goms_jobs{endpoint="direct",status="pending"} 1' in body
+        assert "# TYPE goms_log_records_dropped gauge" in body
+        assert "goms_log_records_dropped " in body
+    
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket, sum and count lines of a histogram"""
+        from goms_extractor.metrics import Histogram
+        histogram = Histogram("test_seconds", "Test", (1, 5))
+        for value in (0.5, 2, 2, 10):
+            histogram.observe(value, endpoint="direct")
+        
+        lines = histogram.render().splitlines()
+        
+        assert 'test_seconds_bucket{endpoint="direct",le="1"} 1' in lines
+        assert 'test_seconds_bucket{endpoint="direct",le="5"} 3' in lines
+        assert 'test_seconds_bucket{endpoint="direct",le="+Inf"} 4' in lines
+        assert 'test_seconds_sum{endpoint="direct"} 14.5' in lines
+        assert 'test_seconds_count{endpoint="direct"} 4' in lines
+    
+    @pytest.mark.asyncio
+    async def test_adk_job_recorded_with_endpoint_label(self):
+        """Test that an ADK job's duration and outcome are recorded under the adk endpoint"""
+        from api import process_pdf_task
+        from goms_extractor import metrics
+        before = metrics.JOBS_FINISHED.value(endpoint="adk", status="completed")
+        jobs["adk-job"] = {"job_id": "adk-job", "status": "pending", "endpoint": "adk"}
+        
+        with patch("api.create_adk_session", AsyncMock(return_value=True)), \
+             patch("api.send_message_to_agent", AsyncMock(return_value={"response": "ok"})):
+            await process_pdf_task("adk-job", "/nonexistent/test.pdf", "user_1", "session_1")
+        
+        assert jobs["adk-job"]["status"] == "completed"
+        assert metrics.JOBS_FINISHED.value(endpoint="adk", status="completed") == before + 1
+        assert metrics.JOB_SECONDS.count(endpoint="adk") >= 1
+    
+    @pytest.mark.asyncio
+    async def test_gemini_calls_labelled_by_endpoint(self):
+        """Test that Gemini call time and tokens are attributed to the job's endpoint"""
+        from types import SimpleNamespace
+        from goms_extractor import metrics
+        from goms_extractor.gemini_client import GeminiConverterClient
+        from goms_extractor.rate_limiter import AdaptiveRateLimiter
+        
+        response = SimpleNamespace(text="## GO", usage_metadata=SimpleNamespace(prompt_token_count=300, candidates_token_count=40, total_token_count=340))
+        gemini = GeminiConverterClient(project_id="test-project", limiter=AdaptiveRateLimiter(rpm=0, tpm=0))
+        gemini._model = SimpleNamespace(generate_content_async=AsyncMock(return_value=response))
+        calls = metrics.GEMINI_REQUEST_SECONDS.count(endpoint="direct", outcome="ok")
+        tokens = metrics.GEMINI_TOKENS.value(endpoint="direct", kind="response")
+        
+        async def job():
+            metrics.set_endpoint("direct")
+            await gemini.generate_content_async(["prompt"])
+        await asyncio.create_task(job())
+        
+        assert metrics.GEMINI_REQUEST_SECONDS.count(endpoint="direct", outcome="ok") == calls + 1
+        assert metrics.GEMINI_TOKENS.value(endpoint="direct", kind="response") == tokens + 40
+        assert metrics.GEMINI_IN_FLIGHT.value(endpoint="direct") == 0
+        assert metrics.current_endpoint() == "other"
+
+
+class TestTracing:
+    """Test job tracing and the /jobs/{job_id}/trace critical path view"""
+    
+    def test_critical_path_follows_last_finishing_children(self):
+        """Test that the critical path skips spans that finished before the chain needed them"""
+        from goms_extractor.tracing import Trace, critical_path
+        trace = Trace("t1", "job")
+        t0 = trace._origin
+        trace.record("split", t0 + 0.5, t0 + 2)
+        fast = trace.record("convert_go", t0 + 2, t0 + 3, go="GO_1")
+        slow = trace.record("convert_go", t0 + 2, t0 + 7, go="GO_2")
+        trace.record("gemini_request", t0 + 2.5, t0 + 6.5, parent=slow)
+        trace.record("gemini_request", t0 + 2.2, t0 + 2.9, parent=fast)
+        trace.record("gcs_upload", t0 + 7, t0 + 8)
+        trace.root.end = 8.5
+        
+        result = critical_path(trace)
+        
+        names = [(entry["name"], entry["attributes"].get("go")) for entry in result["critical_path"]]
+        assert names == [("job", None), ("split", None), ("convert_go", "GO_2"), ("gemini_request", None), ("gcs_upload", None)]
+        assert result["by_name"]["gemini_request"] == pytest.approx(4)
+        assert result["by_name"]["convert_go"] == pytest.approx(1)
+        assert result["by_name"]["job"] == pytest.approx(1, abs=1e-3)
+    
+    @pytest.mark.asyncio
+    async def test_spans_follow_tasks_and_bound_threads(self, trace_dir):
+        """Test parent propagation into asyncio tasks and bind()-ed executor calls, and the Chrome trace file"""
+        import json
+        from goms_extractor import tracing
+        
+        def blocking():
+            with tracing.span("in_thread"):
+                pass
+        
+        async def child(n):
+            with tracing.span("child", n=n):
+                await asyncio.get_running_loop().run_in_executor(None, tracing.bind(blocking))
+        
+        with tracing.start_trace("t2", "job") as trace:
+            await asyncio.gather(child(1), child(2))
+        
+        spans = {span["span_id"]: span for span in trace.to_dict()["spans"]}
+        children = [span for span in spans.values() if span["name"] == "child"]
+        threads = [span for span in spans.values() if span["name"] == "in_thread"]
+        assert all(span["parent_id"] == trace.root.span_id for span in children)
+        assert sorted(spans[span["parent_id"]]["attributes"]["n"] for span in threads) == [1, 2]
+        with open(trace_dir / "t2.json") as f:
+            events = [event for event in json.load(f)["traceEvents"] if event["ph"] == "X"]
+        assert len(events) == 5
+        assert len({event["tid"] for event in events if event["name"] == "child"}) == 2
+    
+    def test_sdk_spans_collected_into_trace(self, trace_dir):
+        """Test that spans started on the OpenTelemetry tracer inside a job land in its trace"""
+        from goms_extractor import tracing
+        
+        with tracing.start_trace("t3", "job") as trace:
+            with tracing.span("outer", pages=3, workers=None) as outer:
+                with tracing.get_tracer("test").start_as_current_span("sdk_child"):
+                    pass
+        with tracing.get_tracer("test").start_as_current_span("outside"):
+            pass
+        
+        spans = {span["name"]: span for span in trace.to_dict()["spans"]}
+        assert set(spans) == {"job", "outer", "sdk_child"}
+        assert spans["sdk_child"]["parent_id"] == outer.span_id
+        assert spans["outer"]["attributes"] == {"pages": 3}
+        assert spans["job"]["attributes"]["job.id"] == "t3"
+    
+    @pytest.mark.asyncio
+    async def test_direct_job_trace_endpoint(self, client, tmp_path, trace_dir):
+        """Test that a direct job traces split, per-GO conversion and Gemini requests"""
+        import json
+        from types import SimpleNamespace
+        from api import process_pdf_task_direct
+        from goms_extractor import md_converter
+        from goms_extractor.gemini_client import GeminiConverterClient
+        from goms_extractor.rate_limiter import AdaptiveRateLimiter
+        pdf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "GO_123_Dated_the-14--March--2001.pdf")
+        if not os.path.exists(pdf_path):
+            pytest.skip(f"Test file not found: {pdf_path}")
+        
+        gemini = GeminiConverterClient(project_id="test-project", limiter=AdaptiveRateLimiter(rpm=0, tpm=0))
+        response = SimpleNamespace(text="## G.O.Ms.No.123", candidates=None, usage_metadata=None)
+        gemini._model = SimpleNamespace(generate_content_async=AsyncMock(return_value=response))
+        jobs["direct-job"] = {"job_id": "direct-job", "status": "pending", "endpoint": "direct", "created_at": "", "updated_at": ""}
+        
+        with patch.object(md_converter, "LOCAL_MD_ENABLED", False), \
+             patch.object(md_converter, "MD_CACHE_ENABLED", False), \
+             patch.object(md_converter, "MD_STREAM_ENABLED", False), \
+             patch("goms_extractor.splitter.SPLIT_CACHE_ENABLED", False), \
+             patch("api.GCS_ENABLED", False), \
+             patch("goms_extractor.md_converter.get_converter_client", return_value=gemini):
+            await process_pdf_task_direct("direct-job", pdf_path, str(tmp_path / "out"))
+        
+        assert jobs["direct-job"]["status"] == "completed"
+        response = client.get("/jobs/direct-job/trace")
+        assert response.status_code == 200
+        data = response.json()
+        names = [entry["name"] for entry in data["critical_path"]]
+        assert names[0] == "job"
+        assert "convert_go" in names and "gemini_request" in names
+        assert data["spans"] >= 4
+        with open(data["trace_file"]) as f:
+            span_names = {event["name"] for event in json.load(f)["traceEvents"]}
+        assert {"split", "convert_go", "gemini_request"} <= span_names
+    
+    def test_trace_not_found(self, client):
+        """Test 404 for unknown jobs and jobs without a trace"""
+        jobs["untraced"] = {"job_id": "untraced", "status": "pending"}
+        
+        assert client.get("/jobs/missing/trace").status_code == 404
+        assert client.get("/jobs/untraced/trace").status_code == 404
+
+
+class TestJobBudget:
+    """Test token budgets and deadlines on the direct endpoints"""
+    
+    def test_invalid_budget_rejected(self, client, tmp_path):
+        """Test that negative limits are rejected"""
+        pdf_path = tmp_path / "test_go.pdf"
+        pdf_path.write_bytes(b"test")
+        
+        response = client.post("/process-path-direct?max_tokens=-1", json={"pdf_path": str(pdf_path)})
+        assert response.status_code == 400
+        response = client.post("/process-path-direct?deadline_seconds=-5", json={"pdf_path": str(pdf_path)})
+        assert response.status_code == 400
+    
+    @pytest.mark.asyncio
+    async def test_stopped_job_is_marked(self, tmp_path):
+        """Test that a job that used up its token budget completes marked with the reason"""
+        from types import SimpleNamespace
+        from api import process_pdf_task_direct
+        from goms_extractor import md_converter
+        from goms_extractor.gemini_client import GeminiConverterClient
+        from goms_extractor.rate_limiter import AdaptiveRateLimiter
+        pdf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "GO_123_Dated_the-14--March--2001.pdf")
+        if not os.path.exists(pdf_path):
+            pytest.skip(f"Test file not found: {pdf_path}")
+        
+        gemini = GeminiConverterClient(project_id="test-project", limiter=AdaptiveRateLimiter(rpm=0, tpm=0))
+        usage = SimpleNamespace(prompt_token_count=400, candidates_token_count=100, total_token_count=500)
+        response = SimpleNamespace(text="## G.O.Ms.No.123", candidates=None, usage_metadata=usage)
+        gemini._model = SimpleNamespace(generate_content_async=AsyncMock(return_value=response))
+        jobs["budget-job"] = {"job_id": "budget-job", "status": "pending", "endpoint": "direct", "created_at": "", "updated_at": ""}
+        
+        with patch.object(md_converter, "LOCAL_MD_ENABLED", False), \
+             patch.object(md_converter, "MD_CACHE_ENABLED", False), \
+             patch.object(md_converter, "MD_STREAM_ENABLED", False), \
+             patch("goms_extractor.splitter.SPLIT_CACHE_ENABLED", False), \
+             patch("api.GCS_ENABLED", False), \
+             patch("goms_extractor.md_converter.get_converter_client", return_value=gemini):
+            await process_pdf_task_direct("budget-job", pdf_path, str(tmp_path / "out"), max_tokens=100)
+        
+        job = jobs["budget-job"]
+        assert job["status"] == "completed"
+        assert job["message"].startswith("Stopped early (token_budget)")
+        assert job["result"]["stopped"] == "token_budget"
+        budget = job["result"]["summary"]["budget"]
+        assert (budget["max_tokens"], budget["tokens_used"], budget["stopped"]) == (100, 500, "token_budget")
+
+
 class TestProcessingLogicIntegration:
     """Integration tests for processing logic against reference data"""
     
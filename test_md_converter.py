@@ -0,0 +1,1326 @@
+"""
+Unit tests for the markdown converter and its shared Gemini client
+"""
+
+import pytest
+import io
+import os
+import re
+import json
+import queue
+import asyncio
+import logging
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+from google.api_core import exceptions as google_exceptions
+
+from goms_extractor import gemini_client
+from goms_extractor.gemini_client import GeminiConverterClient, get_converter_client
+from goms_extractor.markdown_cache import MarkdownCache, page_content_hash
+from goms_extractor.rate_limiter import AdaptiveRateLimiter
+from goms_extractor.local_markdown import convert_pdf_to_markdown_local, text_quality_score
+from goms_extractor.text_sidecar import text_sidecar_path
+from goms_extractor.conversion_progress import ConversionProgress
+from goms_extractor.payload import slim_pdf_payload, strip_pdf
+from goms_extractor.token_tracker import TokenTracker
+from goms_extractor.job_budget import JobBudget
+from goms_extractor import log
+from goms_extractor import md_converter
+from goms_extractor.md_converter import (
+    plan_page_chunks,
+    is_truncated,
+    split_packed_response,
+    convert_go_to_markdown,
+    convert_go_to_markdown_async,
+    convert_split_gos_to_markdown,
+    convert_split_gos_to_markdown_async,
+    convert_go_segments_to_markdown,
+    convert_go_segments_to_markdown_async,
+    summarize_converters
+)
+from pypdf import PdfReader, PdfWriter
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SINGLE_GO_PDF = os.path.join(DATA_DIR, "GO_123_Dated_the-14--March--2001.pdf")
+
+
+class FakeResponse:
+    """Minimal stand-in for a GenerateContentResponse"""
+
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+def stream_chunks(response, size=8):
+    """Split a response into streamed chunks; the last one carries the finish reason and usage"""
+    text = response.text
+    pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+    chunks = [SimpleNamespace(text=piece, candidates=None, usage_metadata=None) for piece in pieces]
+    chunks[-1].candidates = getattr(response, "candidates", None)
+    chunks[-1].usage_metadata = response.usage_metadata
+    return chunks
+
+
+def make_split_result(tmp_path, count, pages=1):
+    """Write count distinct GO PDFs of the given page count (distinct so none hit the cache)"""
+    tmp_path.mkdir(parents=True, exist_ok=True)
+    split_files = []
+    for i in range(count):
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=612 + i, height=792)
+        path = str(tmp_path / f"GO_{i}_Pages_{i}-{i}.pdf")
+        with open(path, "wb") as f:
+            writer.write(f)
+        split_files.append(path)
+    return {"status": "success", "split_files": split_files}
+
+
+class FakeModel:
+    """GenerativeModel stand-in that records its calls"""
+
+    def __init__(self, text="## GOVERNMENT OF ANDHRA PRADESH\n**G.O.Ms.No.123**"):
+        self.text = text
+        self.calls = []
+
+    def respond(self, contents):
+        return FakeResponse(self.text)
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        self.calls.append((contents, generation_config))
+        response = self.respond(contents)
+        return iter(stream_chunks(response)) if stream else response
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        self.in_flight = getattr(self, "in_flight", 0) + 1
+        self.peak_in_flight = max(getattr(self, "peak_in_flight", 0), self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        response = self.generate_content(contents, generation_config)
+        if not stream:
+            return response
+
+        async def chunks():
+            for chunk in stream_chunks(response):
+                yield chunk
+        return chunks()
+
+    def count_tokens(self, contents):
+        return MagicMock(total_tokens=1)
+
+
+@pytest.fixture(autouse=True)
+def gemini_only():
+    """Send every conversion to the (fake) Gemini model unless a test opts into local_first"""
+    with patch.object(md_converter, "LOCAL_MD_ENABLED", False):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def markdown_cache(tmp_path):
+    """Isolate every test in its own markdown cache directory"""
+    cache = MarkdownCache(cache_dir=str(tmp_path / "md_cache"))
+    with patch("goms_extractor.md_converter.get_markdown_cache", return_value=cache):
+        yield cache
+
+
+@pytest.fixture
+def fake_client():
+    """Configured client with a fake model already attached"""
+    limiter = AdaptiveRateLimiter(rpm=0, tpm=0, initial_concurrency=4, max_concurrency=64, base_backoff=0.001)
+    client = GeminiConverterClient(project_id="test-project", location="us-central1", limiter=limiter)
+    client._model = FakeModel()
+    return client
+
+
+class TestGeminiConverterClient:
+    """Test the shared Gemini converter client"""
+
+    def test_vertex_initialized_once_across_conversions(self, tmp_path):
+        """Test that many conversions share one vertexai.init and one model"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        client = GeminiConverterClient(project_id="test-project")
+
+        with patch("vertexai.init") as mock_init, \
+             patch("vertexai.generative_models.GenerativeModel", return_value=FakeModel()) as mock_model:
+            for _ in range(3):
+                result = convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path), client=client, use_cache=False)
+                assert result["status"] == "success"
+
+        mock_init.assert_called_once_with(project="test-project", location="us-central1")
+        mock_model.assert_called_once()
+        assert client.calls == 3
+
+    def test_preflight_ok(self, fake_client):
+        """Test that a successful preflight is recorded in the status"""
+        result = fake_client.preflight()
+
+        assert result["status"] == "ok"
+        assert fake_client.status()["preflight"]["status"] == "ok"
+        assert fake_client.status()["initialized"] is True
+
+    def test_preflight_not_configured(self):
+        """Test that preflight without a project reports not_configured"""
+        with patch.dict(os.environ, {}, clear=True):
+            client = GeminiConverterClient()
+
+        result = client.preflight()
+
+        assert result["status"] == "not_configured"
+        assert client.status()["initialized"] is False
+
+    def test_preflight_error_does_not_raise(self, fake_client):
+        """Test that a failing preflight is reported, not raised"""
+        fake_client._model.count_tokens = MagicMock(side_effect=RuntimeError("permission denied"))
+
+        result = fake_client.preflight()
+
+        assert result["status"] == "error"
+        assert "permission denied" in result["error"]
+
+    def test_generate_errors_counted(self, fake_client):
+        """Test that failed calls are counted and the last error kept"""
+        fake_client._model.generate_content = MagicMock(side_effect=RuntimeError("quota"))
+
+        with pytest.raises(RuntimeError):
+            fake_client.generate_content(["prompt"])
+
+        assert (fake_client.calls, fake_client.errors, fake_client.last_error) == (1, 1, "quota")
+
+    def test_throttled_call_retried_through_limiter(self, fake_client):
+        """Test that a 429 is retried by the shared limiter, not surfaced"""
+        from google.api_core.exceptions import ResourceExhausted
+        model = fake_client._model
+        responses = [ResourceExhausted("quota"), FakeResponse("## GO")]
+
+        def flaky(contents, generation_config=None):
+            outcome = responses.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        model.generate_content = flaky
+        response = fake_client.generate_content(["prompt"], estimated_tokens=1000)
+
+        assert response.text == "## GO"
+        assert (fake_client.calls, fake_client.errors) == (1, 0)
+        assert fake_client.limiter.stats()["retries"] == 1
+
+    def test_get_converter_client_is_shared(self):
+        """Test that the process-wide client is a singleton"""
+        with patch.object(gemini_client, "_shared_client", None):
+            assert get_converter_client() is get_converter_client()
+
+
+class TestConvertGoToMarkdown:
+    """Test single-GO conversion"""
+
+    def test_convert_writes_markdown(self, tmp_path, fake_client):
+        """Test that the Gemini output is written to <pdf name>.md"""
+        result = convert_go_to_markdown("/nonexistent/GO_123_Pages_1-1.pdf", str(tmp_path), pdf_bytes=b"%PDF-1.4", client=fake_client)
+
+        assert result["status"] == "success"
+        assert result["goms_no"] == "123"
+        assert os.path.basename(result["markdown_path"]) == "GO_123_Pages_1-1.md"
+        assert len(fake_client._model.calls) == 1
+
+    def test_convert_without_project(self, tmp_path):
+        """Test the error returned when no GCP project is configured"""
+        client = GeminiConverterClient(project_id="")
+        client.project_id = None
+
+        result = convert_go_to_markdown("GO_1.pdf", str(tmp_path), pdf_bytes=b"%PDF-1.4", client=client)
+
+        assert result["status"] == "error"
+        assert "GOOGLE_CLOUD_PROJECT" in result["message"]
+
+
+class TestMarkdownCache:
+    """Test the content-addressed markdown conversion cache"""
+
+    def _rewrite(self, src, dst, **metadata):
+        """Re-save a PDF with a different document ID/metadata (a 'reprint')"""
+        writer = PdfWriter()
+        for page in PdfReader(src).pages:
+            writer.add_page(page)
+        writer.add_metadata(metadata)
+        with open(dst, "wb") as f:
+            writer.write(f)
+
+    def test_content_hash_ignores_file_level_changes(self, tmp_path):
+        """Test that re-saved copies of the same pages hash identically"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        copy_a, copy_b = str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")
+        self._rewrite(SINGLE_GO_PDF, copy_a, **{"/Producer": "gazette A"})
+        self._rewrite(SINGLE_GO_PDF, copy_b, **{"/Producer": "gazette B", "/Title": "reprint"})
+
+        with open(copy_a, "rb") as f:
+            bytes_a = f.read()
+        with open(copy_b, "rb") as f:
+            bytes_b = f.read()
+
+        assert bytes_a != bytes_b
+        assert page_content_hash(bytes_a) == page_content_hash(bytes_b)
+
+    def test_content_hash_differs_for_different_pages(self):
+        """Test that different GOs do not collide"""
+        other_pdf = os.path.join(DATA_DIR, "68-73.pdf")
+        if not (os.path.exists(SINGLE_GO_PDF) and os.path.exists(other_pdf)):
+            pytest.skip("Test files not found")
+        with open(SINGLE_GO_PDF, "rb") as f:
+            single = f.read()
+        with open(other_pdf, "rb") as f:
+            other = f.read()
+
+        assert page_content_hash(single) != page_content_hash(other)
+
+    def test_hit_skips_vertex_call(self, tmp_path, fake_client, markdown_cache):
+        """Test that a repeated conversion is served from the cache"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path / "run1"), client=fake_client)
+        second = convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path / "run2"), client=fake_client)
+
+        assert (first["cache"], second["cache"]) == ("miss", "hit")
+        assert (first["converter"], second["converter"]) == ("gemini", "cache")
+        assert second["cached_model"] == fake_client.model_name
+        assert summarize_converters([first, second]) == {"local": 0, "gemini": 1, "cache": 1}
+        assert len(fake_client._model.calls) == 1
+        assert second["goms_no"] == first["goms_no"] == "123"
+        with open(second["markdown_path"], encoding="utf-8") as f:
+            assert f.read() == fake_client._model.text
+        assert (markdown_cache.hits, markdown_cache.misses) == (1, 1)
+
+    def test_hit_without_project(self, tmp_path, fake_client):
+        """Test that cached conversions do not need Vertex AI to be configured"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path), client=fake_client)
+        offline = GeminiConverterClient(project_id="", model_name=fake_client.model_name)
+        offline.project_id = None
+
+        result = convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path), client=offline)
+
+        assert result["status"] == "success"
+        assert result["cache"] == "hit"
+
+    def test_model_change_misses(self, tmp_path, fake_client):
+        """Test that the model name is part of the key"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path), client=fake_client)
+        fake_client.model_name = "gemini-other"
+
+        result = convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path), client=fake_client)
+
+        assert result["cache"] == "miss"
+        assert len(fake_client._model.calls) == 2
+
+    def test_lru_eviction(self, tmp_path):
+        """Test that the least recently used entry is evicted past the cap"""
+        cache = MarkdownCache(cache_dir=str(tmp_path / "lru"), max_entries=2)
+        keys = [cache.make_key(f"content-{i}", "prompt", "model", {}) for i in range(3)]
+        cache.put(keys[0], {"markdown": "0", "goms_no": "0"})
+        cache.put(keys[1], {"markdown": "1", "goms_no": "1"})
+        os.utime(cache._entry_path(keys[0]), (1, 1))
+        os.utime(cache._entry_path(keys[1]), (2, 2))
+        cache.get(keys[0])  # refresh 0, so 1 is now least recently used
+
+        cache.put(keys[2], {"markdown": "2", "goms_no": "2"})
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0])["markdown"] == "0"
+        assert cache.get(keys[2])["markdown"] == "2"
+
+    def test_job_result_counts(self, tmp_path, fake_client):
+        """Test that batch conversion reports per-job hit/miss counts"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        split_result = {"status": "success", "split_files": [SINGLE_GO_PDF, SINGLE_GO_PDF]}
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            convert_split_gos_to_markdown({**split_result, "split_files": [SINGLE_GO_PDF]}, str(tmp_path), max_workers=1)
+            result = convert_split_gos_to_markdown(split_result, str(tmp_path), max_workers=2)
+
+        assert result["cache_stats"] == {"hits": 2, "misses": 0, "disabled": 0}
+
+    def test_same_go_written_twice_at_once(self, tmp_path):
+        """Test that concurrent writes of one GO's markdown do not rename each other's temp file"""
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        barrier = threading.Barrier(8)
+
+        def write(i):
+            barrier.wait()
+            return md_converter._write_markdown(SINGLE_GO_PDF, str(tmp_path), f"# GO {i}\n")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = list(executor.map(write, range(8)))
+
+        assert len(set(paths)) == 1
+        assert open(paths[0]).read().startswith("# GO ")
+        assert [name for name in os.listdir(tmp_path) if name.startswith("GO_")] == [os.path.basename(paths[0])]
+
+
+class TestAsyncConversion:
+    """Test the native asyncio conversion path"""
+
+    @pytest.mark.asyncio
+    async def test_process_wide_semaphore_bounds_in_flight(self, tmp_path, fake_client):
+        """Test that concurrent jobs share one in-flight cap"""
+        split_result = make_split_result(tmp_path, 12)
+
+        with patch.object(md_converter, "MD_ASYNC_CONCURRENCY", 3), \
+             patch.object(md_converter, "_conversion_semaphore", None), \
+             patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            results = await asyncio.gather(
+                convert_split_gos_to_markdown_async(split_result, str(tmp_path / "job1")),
+                convert_split_gos_to_markdown_async(split_result, str(tmp_path / "job2"))
+            )
+
+        assert [len(r["markdown_files"]) for r in results] == [12, 12]
+        assert fake_client._model.peak_in_flight == 3
+        assert fake_client.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_per_job_cap(self, tmp_path, fake_client):
+        """Test that max_in_flight caps a single job below the process-wide cap"""
+        split_result = make_split_result(tmp_path, 8)
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_split_gos_to_markdown_async(split_result, str(tmp_path), max_in_flight=2)
+
+        assert result["status"] == "success"
+        assert fake_client._model.peak_in_flight == 2
+        assert result["cache_stats"]["misses"] == 8
+
+    @pytest.mark.asyncio
+    async def test_async_errors_are_results(self, tmp_path, fake_client):
+        """Test that a failing Gemini call becomes an error result, not an exception"""
+        split_result = make_split_result(tmp_path, 2)
+
+        async def failing(contents, generation_config=None, stream=False):
+            raise RuntimeError("quota")
+
+        fake_client._model.generate_content_async = failing
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_split_gos_to_markdown_async(split_result, str(tmp_path))
+
+        assert result["status"] == "error"
+        assert all("quota" in r["message"] for r in result["conversion_results"])
+
+    @pytest.mark.asyncio
+    async def test_async_streaming_segments(self, tmp_path, fake_client):
+        """Test that segments from a blocking generator are converted as they arrive"""
+        split_files = make_split_result(tmp_path, 4)["split_files"]
+        segments = ({"goms_no": str(i), "start_page": i, "end_page": i, "split_file": path} for i, path in enumerate(split_files))
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_go_segments_to_markdown_async(segments, str(tmp_path))
+
+        assert result["status"] == "success"
+        assert len(result["segments"]) == 4
+        assert [os.path.basename(r["markdown_path"]) for r in result["conversion_results"]] == \
+            [f"GO_{i}_Pages_{i}-{i}.md" for i in range(4)]
+        assert result["first_markdown_seconds"] is not None
+
+    @pytest.mark.asyncio
+    async def test_async_streaming_split_error(self, tmp_path, fake_client):
+        """Test that a splitter failure is reported after converting what it yielded"""
+        split_files = make_split_result(tmp_path, 1)["split_files"]
+
+        def segments():
+            yield {"goms_no": "0", "start_page": 0, "end_page": 0, "split_file": split_files[0]}
+            raise ValueError("corrupt page")
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_go_segments_to_markdown_async(segments(), str(tmp_path))
+
+        assert result["status"] == "error"
+        assert result["split_error"] == "corrupt page"
+        assert len(result["markdown_files"]) == 1
+
+
+class TestLocalConversion:
+    """Test the text-first local converter and the Gemini fallback"""
+
+    OCR_PDF = os.path.join(DATA_DIR, "28-34_ocr.pdf")
+    SCANNED_PDF = os.path.join(DATA_DIR, "28-34.pdf")
+    REFERENCE_MD = os.path.join(DATA_DIR, "28-34.md")
+
+    def test_local_markdown_structure(self):
+        """Test headings and GO references in locally built markdown"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        result = convert_pdf_to_markdown_local(SINGLE_GO_PDF)
+        markdown = result["markdown"]
+
+        assert result["quality"]["score"] >= 0.9
+        for heading in ("## GOVERNMENT OF ANDHRA PRADESH", "## ABSTRACT", "## NOTIFICATION", "## AMENDMENT"):
+            assert heading + "\n" in markdown
+        assert "**G.O.Ms.No.123**" in markdown
+
+    def test_local_text_matches_reference(self):
+        """Test that local output carries the same text as the checked-in reference"""
+        if not (os.path.exists(self.OCR_PDF) and os.path.exists(self.REFERENCE_MD)):
+            pytest.skip("Test files not found")
+        with open(self.REFERENCE_MD, encoding="utf-8") as f:
+            reference_words = f.read().split()
+
+        markdown = convert_pdf_to_markdown_local(self.OCR_PDF)["markdown"]
+        words = [w for w in markdown.split() if w not in ("##", "|", "---|")]
+
+        overlap = len(set(words) & set(reference_words)) / len(set(reference_words))
+        assert overlap > 0.95
+
+    def test_scanned_pdf_scores_zero_without_layout_pass(self):
+        """Test that a PDF without a text layer is rejected before pdfplumber runs"""
+        if not os.path.exists(self.SCANNED_PDF):
+            pytest.skip(f"Test file not found: {self.SCANNED_PDF}")
+
+        with patch("goms_extractor.local_markdown.pdfplumber.open") as plumber:
+            result = convert_pdf_to_markdown_local(self.SCANNED_PDF)
+
+        assert result["markdown"] is None
+        assert result["quality"]["coverage"] == 0.0
+        plumber.assert_not_called()
+
+    def test_quality_score_penalizes_garbage(self):
+        """Test that OCR noise lowers the score"""
+        clean = "The Governor of Andhra Pradesh hereby makes the following amendment to rule 11. " * 5
+        noisy = "Th3 G0v3rn0r 0f Andhr@ Pr4desh h3r3by m4k3s th3 f0ll0w1ng am3ndm3nt t0 ru!e ll. " * 5
+
+        assert text_quality_score([clean])["score"] > 0.95
+        assert text_quality_score([noisy])["score"] < 0.5
+
+    def test_sidecar_feeds_quality_score(self, tmp_path):
+        """Test that a split GO's text sidecar is used instead of re-extracting"""
+        pdf_path = str(tmp_path / "GO_1_Pages_0-0.pdf")
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        with open(pdf_path, "wb") as f:
+            writer.write(f)
+        with open(text_sidecar_path(pdf_path), "w", encoding="utf-8") as f:
+            f.write('{"page": 0, "chars": 5, "valid_ratio": 0.0, "text": "short"}\n')
+
+        with patch("goms_extractor.local_markdown.pdfium.PdfDocument") as pdfium_doc:
+            result = convert_pdf_to_markdown_local(pdf_path)
+
+        pdfium_doc.assert_not_called()
+        assert result["quality"]["pages"] == 1
+        assert result["markdown"] is None
+
+    def test_good_text_layer_skips_gemini(self, tmp_path, fake_client):
+        """Test that convert_go_to_markdown converts clean GOs locally"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        result = convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path), client=fake_client, local_first=True)
+
+        assert result["status"] == "success"
+        assert result["converter"] == "local"
+        assert result["goms_no"] == "123"
+        assert fake_client._model.calls == []
+
+    def test_low_quality_falls_back_to_gemini(self, tmp_path, fake_client):
+        """Test that scanned GOs go to Gemini with their score attached"""
+        if not os.path.exists(self.SCANNED_PDF):
+            pytest.skip(f"Test file not found: {self.SCANNED_PDF}")
+
+        result = convert_go_to_markdown(self.SCANNED_PDF, str(tmp_path), client=fake_client, local_first=True)
+
+        assert result["converter"] == "gemini"
+        assert result["quality"]["score"] == 0.0
+        assert len(fake_client._model.calls) == 1
+
+    def test_job_converter_stats(self, tmp_path, fake_client):
+        """Test per-job local/gemini counts"""
+        if not (os.path.exists(SINGLE_GO_PDF) and os.path.exists(self.SCANNED_PDF)):
+            pytest.skip("Test files not found")
+        split_result = {"status": "success", "split_files": [SINGLE_GO_PDF, self.SCANNED_PDF]}
+
+        with patch.object(md_converter, "LOCAL_MD_ENABLED", True), \
+             patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = convert_split_gos_to_markdown(split_result, str(tmp_path), max_workers=2)
+
+        assert result["converter_stats"] == {"local": 1, "gemini": 1, "cache": 0}
+
+
+class ChunkModel(FakeModel):
+    """Fake model that echoes the page range it was asked for and truncates long ranges"""
+
+    def __init__(self, max_pages=None, total_pages=None):
+        super().__init__()
+        self.max_pages = max_pages
+        self.total_pages = total_pages
+
+    def respond(self, contents):
+        match = re.search(r"pages (\d+)-(\d+) of a (\d+)-page", contents[0])
+        first, last = (int(match.group(1)), int(match.group(2))) if match else (1, self.total_pages)
+        response = FakeResponse(f"pages {first}-{last}")
+        finish = "MAX_TOKENS" if self.max_pages and last - first + 1 > self.max_pages else "STOP"
+        response.candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name=finish))]
+        return response
+
+
+class TestChunkedConversion:
+    """Test page-chunked conversion of long GOs"""
+
+    def _long_go(self, tmp_path, pages):
+        writer = PdfWriter()
+        for i in range(pages):
+            writer.add_blank_page(width=600 + i, height=800)
+        path = str(tmp_path / f"GO_9_Pages_0-{pages - 1}.pdf")
+        with open(path, "wb") as f:
+            writer.write(f)
+        return path
+
+    def _stitched(self, result):
+        with open(result["markdown_path"], encoding="utf-8") as f:
+            return f.read().split("\n\n")
+
+    def test_plan_page_chunks(self):
+        """Test chunk planning"""
+        assert plan_page_chunks(5, 8) == [(0, 5)]
+        assert plan_page_chunks(20, 8) == [(0, 8), (8, 16), (16, 20)]
+        assert plan_page_chunks(20, 0) == [(0, 20)]
+
+    def test_is_truncated(self):
+        """Test finish reason detection"""
+        truncated = SimpleNamespace(candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name="MAX_TOKENS"))])
+        finished = SimpleNamespace(candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name="STOP"))])
+
+        assert is_truncated(truncated)
+        assert not is_truncated(finished)
+        assert not is_truncated(FakeResponse("text"))
+
+    def test_long_go_chunked_and_stitched_in_order(self, tmp_path, fake_client):
+        """Test that a 20-page GO is converted in 3 chunks and stitched in page order"""
+        pdf_path = self._long_go(tmp_path, 20)
+        fake_client._model = ChunkModel(total_pages=20)
+
+        with patch.object(md_converter, "MD_CHUNK_PAGES", 8):
+            result = convert_go_to_markdown(pdf_path, str(tmp_path), client=fake_client)
+
+        assert result["status"] == "success"
+        assert result["chunks"] == 3
+        assert self._stitched(result) == ["pages 1-8", "pages 9-16", "pages 17-20"]
+        assert result["truncated_pages"] == []
+
+    def test_short_go_sent_whole(self, tmp_path, fake_client):
+        """Test that GOs within the chunk size use the original prompt"""
+        pdf_path = self._long_go(tmp_path, 3)
+        fake_client._model = ChunkModel(total_pages=3)
+
+        with patch.object(md_converter, "MD_CHUNK_PAGES", 8):
+            result = convert_go_to_markdown(pdf_path, str(tmp_path), client=fake_client)
+
+        assert result["chunks"] == 1
+        assert fake_client._model.calls[0][0][0] == md_converter.CONVERSION_PROMPT
+
+    def test_truncated_chunk_is_split(self, tmp_path, fake_client):
+        """Test that a MAX_TOKENS chunk is halved until it fits"""
+        pdf_path = self._long_go(tmp_path, 16)
+        fake_client._model = ChunkModel(max_pages=4, total_pages=16)
+
+        with patch.object(md_converter, "MD_CHUNK_PAGES", 8):
+            result = convert_go_to_markdown(pdf_path, str(tmp_path), client=fake_client)
+
+        assert self._stitched(result) == ["pages 1-4", "pages 5-8", "pages 9-12", "pages 13-16"]
+        assert result["truncated_pages"] == []
+
+    def test_unsplittable_truncation_reported_and_not_cached(self, tmp_path, fake_client, markdown_cache):
+        """Test that a truncated single page is flagged and kept out of the cache"""
+        pdf_path = self._long_go(tmp_path, 2)
+        fake_client._model = ChunkModel(max_pages=0.5, total_pages=2)
+
+        with patch.object(md_converter, "MD_CHUNK_PAGES", 8):
+            result = convert_go_to_markdown(pdf_path, str(tmp_path), client=fake_client)
+
+        assert result["status"] == "success"
+        assert result["truncated_pages"] == [[1, 1], [2, 2]]
+        assert os.listdir(markdown_cache.cache_dir) == []
+
+    def test_resplit_responses_counted_in_usage(self, tmp_path, fake_client):
+        """Test that the tokens of truncated responses that were re-split still count towards the GO"""
+        pdf_path = self._long_go(tmp_path, 16)
+        fake_client._model = ChunkModel(max_pages=4, total_pages=16)
+        respond = fake_client._model.respond
+
+        def billed(contents):
+            response = respond(contents)
+            response.usage_metadata = SimpleNamespace(prompt_token_count=90, candidates_token_count=10, total_token_count=100)
+            return response
+
+        fake_client._model.respond = billed
+        with patch.object(md_converter, "MD_CHUNK_PAGES", 8):
+            result = convert_go_to_markdown(pdf_path, str(tmp_path), client=fake_client)
+
+        # Two truncated 8-page requests, then four 4-page requests
+        assert result["chunks"] == 4
+        assert result["usage"]["requests"] == 6
+        assert result["usage"]["total_tokens"] == 600
+
+    @pytest.mark.asyncio
+    async def test_async_resplit_usage_matches_budget(self, tmp_path, fake_client):
+        """Test that on the async path a GO's usage matches what its job budget was charged"""
+        pdf_path = self._long_go(tmp_path, 16)
+        fake_client._model = ChunkModel(max_pages=4, total_pages=16)
+        respond = fake_client._model.respond
+
+        def billed(contents):
+            response = respond(contents)
+            response.usage_metadata = SimpleNamespace(prompt_token_count=90, candidates_token_count=10, total_token_count=100)
+            return response
+
+        fake_client._model.respond = billed
+        budget = JobBudget(max_tokens=10000)
+        with patch.object(md_converter, "MD_CHUNK_PAGES", 8):
+            result = await convert_go_to_markdown_async(pdf_path, str(tmp_path), client=fake_client, budget=budget)
+
+        assert result["usage"]["requests"] == budget.requests == 6
+        assert result["usage"]["total_tokens"] == budget.tokens_used == 600
+
+    @pytest.mark.asyncio
+    async def test_async_chunks_run_concurrently(self, tmp_path, fake_client):
+        """Test that the async path converts a long GO's chunks in parallel"""
+        pdf_path = self._long_go(tmp_path, 24)
+        fake_client._model = ChunkModel(total_pages=24)
+
+        with patch.object(md_converter, "MD_CHUNK_PAGES", 8):
+            result = await convert_go_to_markdown_async(pdf_path, str(tmp_path), client=fake_client)
+
+        assert self._stitched(result) == ["pages 1-8", "pages 9-16", "pages 17-24"]
+        assert fake_client._model.peak_in_flight == 3
+
+
+class PackModel(FakeModel):
+    """Fake model that answers packed requests with one labelled section per GO"""
+
+    def __init__(self, mangle=False):
+        super().__init__(text="single")
+        self.mangle = mangle
+
+    def respond(self, contents):
+        labels = [part for part in contents[1:] if isinstance(part, str)]
+        if not labels:
+            return FakeResponse("single")
+        if self.mangle:
+            labels = labels[:-1]
+        return FakeResponse("\n\n".join(f"{label}\n## markdown {n}" for n, label in enumerate(labels, 1)))
+
+
+class TestPackedConversion:
+    """Test packing small GOs into shared requests"""
+
+    def _read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_split_packed_response(self):
+        """Test splitting on labels and rejecting anything that does not line up"""
+        assert split_packed_response("<<<GO 1>>>\n## a\n<<<GO 2>>>\n## b\n", 2) == ["## a", "## b"]
+        assert split_packed_response("<<<GO 1>>>\n## a", 2) is None
+        assert split_packed_response("<<<GO 2>>>\n## b\n<<<GO 1>>>\n## a", 2) is None
+        assert split_packed_response("Here you go\n<<<GO 1>>>\n## a", 1) is None
+        assert split_packed_response("<<<GO 1>>>\n\n<<<GO 2>>>\n## b", 2) is None
+
+    @pytest.mark.asyncio
+    async def test_small_gos_share_requests(self, tmp_path, fake_client):
+        """Test that 5 one-page GOs go out as batches of at most MD_PACK_MAX_GOS and come back per GO"""
+        split_result = make_split_result(tmp_path, 5)
+        fake_client._model = PackModel()
+
+        with patch.object(md_converter, "MD_PACK_MAX_GOS", 2), \
+             patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_split_gos_to_markdown_async(split_result, str(tmp_path / "md"), pack=True)
+
+        assert len(result["markdown_files"]) == 5
+        assert len(fake_client._model.calls) == 3
+        assert result["pack_stats"] == {"requests": 2, "packed_gos": 4, "fallbacks": 0}
+        packed = [r for r in result["conversion_results"] if r.get("packed")]
+        assert sorted(r["packed"] for r in packed) == [2, 2, 2, 2]
+        for r in packed:
+            assert re.fullmatch(r"## markdown \d", self._read(r["markdown_path"]))
+
+    @pytest.mark.asyncio
+    async def test_bad_split_falls_back_to_individual_requests(self, tmp_path, fake_client, markdown_cache):
+        """Test that a response missing a section is redone one GO per request"""
+        split_result = make_split_result(tmp_path, 3)
+        fake_client._model = PackModel(mangle=True)
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_split_gos_to_markdown_async(split_result, str(tmp_path / "md"), pack=True)
+
+        assert len(result["markdown_files"]) == 3
+        assert len(fake_client._model.calls) == 4
+        assert result["pack_stats"] == {"requests": 0, "packed_gos": 0, "fallbacks": 3}
+        assert all(self._read(path) == "single" for path in result["markdown_files"])
+
+    @pytest.mark.asyncio
+    async def test_token_ceiling_and_page_limit(self, tmp_path, fake_client):
+        """Test that the token ceiling closes batches and multi-page GOs are sent alone"""
+        fake_client._model = PackModel()
+        one_page = md_converter.estimate_conversion_tokens(1) - md_converter.PROMPT_TOKENS_ESTIMATE
+
+        with patch.object(md_converter, "MD_PACK_MAX_TOKENS", md_converter.PROMPT_TOKENS_ESTIMATE + 2 * one_page), \
+             patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            small = await convert_split_gos_to_markdown_async(make_split_result(tmp_path / "small", 4), str(tmp_path / "md"), pack=True)
+            large = await convert_split_gos_to_markdown_async(make_split_result(tmp_path / "large", 2, pages=2), str(tmp_path / "md2"), pack=True)
+
+        assert small["pack_stats"]["requests"] == 2
+        assert large["pack_stats"]["requests"] == 0
+        assert all("packed" not in r for r in large["conversion_results"])
+
+    def test_sync_converter_packs(self, tmp_path, fake_client):
+        """Test that the threaded batch converter delegates to the async packer"""
+        split_result = make_split_result(tmp_path, 3)
+        fake_client._model = PackModel()
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = convert_split_gos_to_markdown(split_result, str(tmp_path / "md"), pack=True)
+
+        assert len(result["markdown_files"]) == 3
+        assert len(fake_client._model.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_sync_converter_inside_running_loop(self, tmp_path, fake_client):
+        """Test that the sync converter called from a running loop converts unpacked instead of failing"""
+        split_result = make_split_result(tmp_path, 3)
+        fake_client._model = PackModel()
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = convert_split_gos_to_markdown(split_result, str(tmp_path / "md"), pack=True)
+
+        assert result["status"] == "success"
+        assert len(result["markdown_files"]) == 3
+        assert len(fake_client._model.calls) == 3
+        assert "pack_stats" not in result
+
+
+class TestStreamedConversion:
+    """Test streamed generation with incremental markdown writes"""
+
+    def _go(self, tmp_path, name="GO_5_Pages_0-0.pdf"):
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        path = str(tmp_path / name)
+        with open(path, "wb") as f:
+            writer.write(f)
+        return path
+
+    def test_chunks_written_as_they_arrive(self, tmp_path, fake_client):
+        """Test that the markdown file grows while the response is still streaming"""
+        pdf_path = self._go(tmp_path)
+        output_path = str(tmp_path / "md" / "GO_5_Pages_0-0.md")
+        seen = []
+        partial_opens = []
+
+        def generate(contents, generation_config=None, stream=False):
+            assert stream
+            for piece in ["## GOVERNMENT ", "**G.O.Ms.No.5**"]:
+                yield SimpleNamespace(text=piece, candidates=None, usage_metadata=None)
+                assert not os.path.exists(output_path)
+                seen.append(os.path.exists(output_path + ".partial"))
+
+        def counting_open(path, *args, **kwargs):
+            if str(path).endswith(".partial"):
+                partial_opens.append(path)
+            return open(path, *args, **kwargs)
+
+        fake_client._model.generate_content = generate
+        progress = ConversionProgress()
+        with patch("goms_extractor.conversion_progress.open", counting_open, create=True):
+            result = convert_go_to_markdown(pdf_path, str(tmp_path / "md"), client=fake_client, progress=progress)
+
+        # The .partial file is opened once for the attempt, not once per chunk
+        assert seen == [True, True]
+        assert len(partial_opens) == 1
+        assert result["goms_no"] == "5"
+        assert result["markdown_path"] == output_path
+        assert not os.path.exists(output_path + ".partial")
+        entry = progress.snapshot()["gos"]["GO_5_Pages_0-0"]
+        assert entry["state"] == "done"
+        assert entry["chars"] == 29
+        assert entry["output_tokens"] == 29 // 4
+        assert entry["first_chunk_seconds"] is not None
+        assert entry["markdown_path"] == result["markdown_path"]
+
+    def test_reported_usage_replaces_estimate(self, tmp_path, fake_client):
+        """Test that output tokens reported with a chunk are used instead of the chars/4 estimate"""
+        pdf_path = self._go(tmp_path)
+
+        def generate(contents, generation_config=None, stream=False):
+            yield SimpleNamespace(text="## ABSTRACT", candidates=None, usage_metadata=SimpleNamespace(candidates_token_count=3, total_token_count=300))
+
+        fake_client._model.generate_content = generate
+        progress = ConversionProgress()
+        convert_go_to_markdown(pdf_path, str(tmp_path), client=fake_client, progress=progress)
+
+        assert progress.snapshot()["totals"]["output_tokens"] == 3
+
+    def test_retried_stream_starts_over(self, tmp_path, fake_client):
+        """Test that a stream throttled midway is not written or counted twice"""
+        pdf_path = self._go(tmp_path)
+        attempts = []
+
+        def generate(contents, generation_config=None, stream=False):
+            attempts.append(1)
+            yield SimpleNamespace(text="## ORDER", candidates=None, usage_metadata=None)
+            if len(attempts) == 1:
+                raise google_exceptions.ResourceExhausted("quota")
+            yield SimpleNamespace(text="\nText", candidates=None, usage_metadata=None)
+
+        fake_client._model.generate_content = generate
+        progress = ConversionProgress()
+        result = convert_go_to_markdown(pdf_path, str(tmp_path), client=fake_client, progress=progress)
+
+        with open(result["markdown_path"], encoding="utf-8") as f:
+            assert f.read() == "## ORDER\nText"
+        entry = progress.snapshot()["gos"]["GO_5_Pages_0-0"]
+        assert (entry["chars"], entry["requests"]) == (13, 1)
+
+    def test_resplit_stream_not_counted_twice(self, tmp_path, fake_client):
+        """Test that a truncated whole-GO stream's text leaves the progress when its halves are streamed"""
+        writer = PdfWriter()
+        for _ in range(2):
+            writer.add_blank_page(width=612, height=792)
+        pdf_path = str(tmp_path / "GO_6_Pages_0-1.pdf")
+        writer.write(pdf_path)
+
+        def generate(contents, generation_config=None, stream=False):
+            if "pages 1-" in contents[0] or "pages 2-" in contents[0]:
+                yield SimpleNamespace(text="half", candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name="STOP"))], usage_metadata=None)
+                return
+            yield SimpleNamespace(text="x" * 40, candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name="MAX_TOKENS"))], usage_metadata=None)
+
+        fake_client._model.generate_content = generate
+        progress = ConversionProgress()
+        result = convert_go_to_markdown(pdf_path, str(tmp_path / "md"), client=fake_client, progress=progress)
+
+        with open(result["markdown_path"], encoding="utf-8") as f:
+            assert f.read() == "half\n\nhalf"
+        entry = progress.snapshot()["gos"]["GO_6_Pages_0-1"]
+        assert entry["chars"] == 8
+        assert entry["requests"] == 3
+
+    def test_failed_stream_leaves_no_markdown(self, tmp_path, fake_client):
+        """Test that a stream that fails midway leaves neither the markdown file nor its .partial"""
+        pdf_path = self._go(tmp_path)
+
+        def generate(contents, generation_config=None, stream=False):
+            yield SimpleNamespace(text="## ORDER", candidates=None, usage_metadata=None)
+            raise ValueError("connection reset")
+
+        fake_client._model.generate_content = generate
+        progress = ConversionProgress()
+        result = convert_go_to_markdown(pdf_path, str(tmp_path / "md"), client=fake_client, progress=progress)
+
+        assert result["status"] == "error"
+        assert os.listdir(tmp_path / "md") == []
+        assert progress.snapshot()["gos"]["GO_5_Pages_0-0"]["state"] == "error"
+
+    def test_streaming_disabled(self, tmp_path, fake_client):
+        """Test that MD_STREAM_ENABLED=false sends plain requests"""
+        pdf_path = self._go(tmp_path)
+        fake_client._model.generate_content = MagicMock(return_value=FakeResponse("## ORDER"))
+
+        with patch.object(md_converter, "MD_STREAM_ENABLED", False):
+            result = convert_go_to_markdown(pdf_path, str(tmp_path), client=fake_client)
+
+        assert result["status"] == "success"
+        assert "stream" not in fake_client._model.generate_content.call_args.kwargs
+
+    @pytest.mark.asyncio
+    async def test_async_job_progress(self, tmp_path, fake_client):
+        """Test that the async batch path fills the job's progress, including cache hits and errors"""
+        split_files = [self._go(tmp_path, f"GO_{i}_Pages_{i}-{i}.pdf") for i in range(2)]
+        progress = ConversionProgress()
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_split_gos_to_markdown_async(
+                {"status": "success", "split_files": split_files}, str(tmp_path / "md"), progress=progress
+            )
+
+        snapshot = progress.snapshot()
+        assert len(result["markdown_files"]) == 2
+        assert snapshot["totals"]["done"] == 2
+        assert snapshot["totals"]["chars"] > 0
+        assert all(entry["requests"] <= 1 for entry in snapshot["gos"].values())
+
+
+class TestPayloadSlimming:
+    """Test slimming PDFs before they are sent to Gemini"""
+
+    def test_raster_shrinks_scan_and_keeps_pages(self):
+        """Test that rasterizing a scanned GO keeps its page count and size and shrinks it"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        with open(SINGLE_GO_PDF, "rb") as f:
+            pdf_bytes = f.read()
+
+        result = slim_pdf_payload(pdf_bytes, mode="raster")
+
+        assert result["applied"] == "raster"
+        assert result["bytes"] < result["original_bytes"] / 5
+        original, slimmed = PdfReader(io.BytesIO(pdf_bytes)), PdfReader(io.BytesIO(result["pdf_bytes"]))
+        assert len(slimmed.pages) == len(original.pages)
+        assert [float(v) for v in slimmed.pages[0].mediabox] == pytest.approx([float(v) for v in original.pages[0].mediabox], abs=1)
+
+    def test_strip_drops_metadata_and_links(self):
+        """Test that strip removes metadata, thumbnails and link annotations but keeps the page"""
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        writer.add_metadata({"/Producer": "x" * 5000})
+        writer.add_annotation(0, {"/Type": "/Annot", "/Subtype": "/Link", "/Rect": [0, 0, 10, 10]})
+        buffer = io.BytesIO()
+        writer.write(buffer)
+
+        stripped = PdfReader(io.BytesIO(strip_pdf(buffer.getvalue())))
+
+        assert len(stripped.pages) == 1
+        assert not stripped.metadata
+        assert "/Annots" not in stripped.pages[0]
+
+    def test_never_larger_than_original(self):
+        """Test that a payload that would grow is sent as is"""
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+
+        result = slim_pdf_payload(buffer.getvalue(), mode="raster")
+
+        assert result["applied"] in ("none", "raster")
+        assert result["bytes"] <= result["original_bytes"]
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            slim_pdf_payload(b"%PDF", mode="tiny")
+
+    def test_slimmed_payload_sent_and_reported(self, tmp_path, fake_client, markdown_cache):
+        """Test that Gemini receives the slimmed PDF, and the savings reach the result, the job and the tracker"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        TokenTracker().reset()
+        segment = {"goms_no": "123", "start_page": 0, "end_page": 0, "split_file": SINGLE_GO_PDF}
+
+        with patch("goms_extractor.payload.MD_PAYLOAD_MODE", "auto"), \
+             patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = convert_go_segments_to_markdown([segment], str(tmp_path))
+
+        conversion = result["conversion_results"][0]
+        sent = fake_client._model.calls[0][0][1]
+        assert conversion["payload"]["applied"] == "raster"
+        assert len(sent._raw_part.inline_data.data) == conversion["payload"]["bytes"]
+        assert result["payload_stats"]["saved_bytes"] == conversion["payload"]["saved_bytes"] > 0
+        assert TokenTracker().get_payload_summary()["saved_bytes"] == conversion["payload"]["saved_bytes"]
+
+    def test_payload_settings_in_cache_key(self, tmp_path, fake_client, markdown_cache):
+        """Test that a conversion cached without slimming is not reused for a slimmed payload"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path), client=fake_client)
+        with patch("goms_extractor.payload.MD_PAYLOAD_MODE", "raster"):
+            result = convert_go_to_markdown(SINGLE_GO_PDF, str(tmp_path), client=fake_client)
+
+        assert result["cache"] == "miss"
+        assert len(fake_client._model.calls) == 2
+
+
+def _with_usage(response):
+    response.usage_metadata = SimpleNamespace(prompt_token_count=100, candidates_token_count=10, total_token_count=110)
+    return response
+
+
+class UsageModel(FakeModel):
+    """Fake model that reports 100 prompt and 10 response tokens per request"""
+
+    def respond(self, contents):
+        return _with_usage(super().respond(contents))
+
+
+class PackUsageModel(PackModel):
+    def respond(self, contents):
+        return _with_usage(super().respond(contents))
+
+
+class TestTokenAccounting:
+    """Test per-GO, per-job and process-wide token accounting"""
+
+    def test_usage_attached_to_go_and_job(self, tmp_path, fake_client):
+        """Test that each GO result carries its requests' usage and the job result their sum"""
+        TokenTracker().reset()
+        fake_client._model = UsageModel()
+        split_result = make_split_result(tmp_path / "split", 3)
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = convert_split_gos_to_markdown(split_result, str(tmp_path / "md"), max_workers=3)
+
+        for conversion in result["conversion_results"]:
+            assert conversion["usage"]["requests"] == 1
+            assert conversion["usage"]["prompt_tokens"] == 100
+            assert conversion["usage"]["latency_seconds"] >= 0
+        usage = result["token_usage"]
+        assert (usage["gos"], usage["requests"], usage["total_tokens"]) == (3, 3, 330)
+        assert TokenTracker().total_usage.total_tokens == 330
+
+    @pytest.mark.asyncio
+    async def test_packed_usage_shared_between_gos(self, tmp_path, fake_client):
+        """Test that a packed request is counted once and its tokens split between its GOs"""
+        fake_client._model = PackUsageModel()
+        split_result = make_split_result(tmp_path / "split", 3)
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_split_gos_to_markdown_async(split_result, str(tmp_path / "md"), pack=True)
+
+        usages = sorted((r["usage"] for r in result["conversion_results"]), key=lambda usage: -usage["requests"])
+        assert [usage["requests"] for usage in usages] == [1, 0, 0]
+        assert [usage["prompt_tokens"] for usage in usages] == [34, 33, 33]
+        assert result["token_usage"]["requests"] == 1
+        assert result["token_usage"]["total_tokens"] == 110
+
+    def test_concurrent_tracking_is_exact(self):
+        """Test that totals recorded from many threads at once add up"""
+        from concurrent.futures import ThreadPoolExecutor
+        tracker = TokenTracker()
+        tracker.reset()
+        response = UsageModel().respond(None)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda _: tracker.track_request("test", response, 0.001), range(800)))
+
+        usage = tracker.total_usage
+        assert (usage.requests, usage.prompt_tokens, usage.total_tokens) == (800, 80000, 88000)
+        assert usage.latency_seconds == pytest.approx(0.8)
+
+    def test_exited_threads_fold_their_shards(self):
+        """Test that shards of exited threads are folded into the totals instead of piling up"""
+        import threading
+        tracker = TokenTracker()
+        tracker.reset()
+        response = UsageModel().respond(None)
+
+        for _ in range(5):
+            threads = [threading.Thread(target=tracker.track_request, args=("test", response)) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(tracker._shards) < 20
+        assert tracker.total_usage.requests == 100
+        tracker.track_request("test", response)
+        tracker.reset()
+        assert tracker.total_usage.requests == 0
+
+    def test_request_log_is_bounded(self):
+        """Test that the process-wide log keeps only the most recent requests"""
+        tracker = TokenTracker()
+        with patch("goms_extractor.token_tracker.TOKEN_LOG_MAX_ENTRIES", 5):
+            tracker.reset()
+        response = UsageModel().respond(None)
+        for i in range(12):
+            tracker.track_request(f"request {i}", response)
+
+        assert [entry["source"] for entry in tracker.request_log] == [f"request {i}" for i in range(7, 12)]
+        assert tracker.total_usage.requests == 12
+        tracker.reset()
+
+
+class SlowModel(FakeModel):
+    """Fake model whose async requests take delay seconds"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        await asyncio.sleep(self.delay)
+        return await super().generate_content_async(contents, generation_config, stream)
+
+
+class TestJobBudget:
+    """Test per-job token budgets and deadlines"""
+
+    def test_from_limits_defaults(self):
+        """Test that jobs without limits get no budget and env defaults apply"""
+        assert JobBudget.from_limits() is None
+        with patch("goms_extractor.job_budget.JOB_DEADLINE_SECONDS", 30.0):
+            budget = JobBudget.from_limits(max_tokens=500)
+        assert (budget.max_tokens, budget.deadline_seconds) == (500, 30.0)
+        assert JobBudget.from_limits(max_tokens=0, deadline_seconds=0) is None
+
+    @pytest.mark.asyncio
+    async def test_token_budget_stops_new_requests(self, tmp_path, fake_client):
+        """Test that no request is sent once the token budget is used up"""
+        fake_client._model = UsageModel()
+        budget = JobBudget(max_tokens=250)
+        split_result = make_split_result(tmp_path, 5)
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_split_gos_to_markdown_async(split_result, str(tmp_path / "md"), max_in_flight=1, budget=budget)
+
+        # GOs reach the Gemini request in the order their preparation finishes
+        statuses = [r["status"] for r in result["conversion_results"]]
+        assert sorted(statuses) == ["cancelled"] * 2 + ["success"] * 3
+        assert result["status"] == "success"
+        assert result["stopped"] == "token_budget"
+        assert result["message"].startswith("Stopped early (token_budget): converted 3/5")
+        assert (result["budget"]["tokens_used"], result["budget"]["requests"], result["budget"]["cancelled_gos"]) == (330, 3, 2)
+        assert len(fake_client._model.calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_deadline_cancels_in_flight_conversions(self, tmp_path, fake_client):
+        """Test that GOs still running at the deadline are cancelled and their permits returned"""
+        fake_client._model = SlowModel(0.5)
+        budget = JobBudget(deadline_seconds=0.8)
+        split_result = make_split_result(tmp_path, 4)
+        progress = ConversionProgress()
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_split_gos_to_markdown_async(
+                split_result, str(tmp_path / "md"), max_in_flight=1, progress=progress, budget=budget
+            )
+
+        statuses = [r["status"] for r in result["conversion_results"]]
+        assert sorted(statuses) == ["cancelled"] * 3 + ["success"]
+        assert result["stopped"] == "deadline"
+        assert budget.stopped_after_seconds < 1.0
+        assert fake_client.in_flight == 0
+        assert fake_client.limiter.in_flight == 0
+        totals = progress.snapshot()["totals"]
+        assert (totals["done"], totals["cancelled"]) == (1, 3)
+
+    @pytest.mark.asyncio
+    async def test_streaming_stops_reading_segments(self, tmp_path, fake_client):
+        """Test that the splitter is not advanced (and is closed) once the budget is stopped"""
+        split_files = make_split_result(tmp_path, 4)["split_files"]
+        budget = JobBudget(max_tokens=1000)
+        closed = []
+
+        def segments():
+            try:
+                for i, path in enumerate(split_files):
+                    if i == 2:
+                        budget.stop("token_budget")
+                    yield {"goms_no": str(i), "start_page": i, "end_page": i, "split_file": path}
+            finally:
+                closed.append(True)
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client):
+            result = await convert_go_segments_to_markdown_async(segments(), str(tmp_path / "md"), budget=budget)
+
+        assert len(result["segments"]) == 3
+        assert closed == [True]
+        assert result["stopped"] == "token_budget"
+        assert [r["status"] for r in result["conversion_results"]].count("cancelled") >= 1
+
+
+class TestLogging:
+    """Test the queued, sampled, context-carrying logging layer"""
+
+    @pytest.fixture
+    def captured(self):
+        """Route goms_extractor logs as JSON at DEBUG into a buffer; restores the defaults afterwards"""
+        stream = io.StringIO()
+        log.setup_logging(level="DEBUG", fmt="json", stream=stream)
+
+        def records():
+            log.flush_logging()
+            return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+        yield records
+        log.setup_logging()
+
+    def test_sample_logs_first_and_every_nth(self, captured):
+        """Test that a sampled per-page message is written once per `every` calls"""
+        logger = log.get_logger("test_sampling")
+        for page in range(10):
+            log.sample(logger, "test.sample_every", "page %d", page, every=4)
+
+        records = captured()
+        assert [r["message"] for r in records] == ["page 0", "page 4", "page 8"]
+        assert all(r["sample_every"] == 4 for r in records)
+        assert records[0]["logger"] == "goms_extractor.test_sampling"
+
+    def test_debug_skipped_above_level(self):
+        """Test that debug calls are not queued (nor sampled) when the level is INFO"""
+        stream = io.StringIO()
+        log.setup_logging(level="INFO", stream=stream)
+        try:
+            logger = log.get_logger("test_level")
+            logger.debug("not written")
+            log.sample(logger, "test.level", "not counted")
+            logger.info("written")
+            log.flush_logging()
+        finally:
+            log.setup_logging()
+
+        assert "not written" not in stream.getvalue()
+        assert "written" in stream.getvalue()
+        assert all("test.level" not in counts for counts in log._sample_counts.values())
+
+    def test_sample_counts_are_per_job(self, captured):
+        """Test that a new job writes its first sampled message even if another job used the key"""
+        logger = log.get_logger("test_sampling_jobs")
+        for job in ("job-a", "job-b"):
+            with log.log_context(job=job):
+                for page in range(3):
+                    log.sample(logger, "test.sample_jobs", "page %d", page, every=10)
+
+        records = captured()
+        assert [(r["job"], r["message"]) for r in records] == [("job-a", "page 0"), ("job-b", "page 0")]
+
+    def test_arguments_formatted_when_logged(self, captured):
+        """Test that a logged list changed after the call is written as it was at the call"""
+        logger = log.get_logger("test_args")
+        pages = [1, 2]
+        logger.info("truncated pages: %s", pages)
+        pages.append(3)
+
+        assert captured()[0]["message"] == "truncated pages: [1, 2]"
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that records that do not fit in the queue are dropped and counted"""
+        handler = log.DroppingQueueHandler(queue.Queue(maxsize=2))
+        logger = logging.Logger("test_drop")
+        logger.addHandler(handler)
+        for i in range(5):
+            logger.info("record %d", i)
+
+        assert handler.queue.qsize() == 2
+        assert handler.dropped == 3
+
+    @pytest.mark.asyncio
+    async def test_async_records_carry_job_and_go(self, tmp_path, fake_client, captured):
+        """Test that records from conversion tasks and their executor threads carry job and GO"""
+        split_result = make_split_result(tmp_path, 2)
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client), \
+             log.log_context(job="job-async"):
+            await convert_split_gos_to_markdown_async(split_result, str(tmp_path / "md"))
+
+        written = [r for r in captured() if r["message"].startswith("Markdown file created")]
+        assert sorted(r["go"] for r in written) == ["GO_0_Pages_0-0.pdf", "GO_1_Pages_1-1.pdf"]
+        assert all(r["job"] == "job-async" for r in written)
+        assert all(r["thread"] != "MainThread" for r in written)
+
+    def test_thread_pool_records_carry_job_and_go(self, tmp_path, fake_client, captured):
+        """Test that the threaded converter keeps the job context in its workers"""
+        split_result = make_split_result(tmp_path, 2)
+
+        with patch("goms_extractor.md_converter.get_converter_client", return_value=fake_client), \
+             log.log_context(job="job-threads"):
+            convert_split_gos_to_markdown(split_result, str(tmp_path / "md"), max_workers=2)
+
+        written = [r for r in captured() if r["message"].startswith("Markdown file created")]
+        assert sorted(r["go"] for r in written) == ["GO_0_Pages_0-0.pdf", "GO_1_Pages_1-1.pdf"]
+        assert all(r["job"] == "job-threads" for r in written)
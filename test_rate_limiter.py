@@ -0,0 +1,265 @@
+"""
+Unit tests for the adaptive Gemini rate limiter
+"""
+
+import pytest
+import asyncio
+from unittest.mock import patch
+
+from google.api_core import exceptions as google_exceptions
+
+from goms_extractor.rate_limiter import AdaptiveRateLimiter, is_throttle_error, WINDOW_SECONDS
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeUsage:
+    def __init__(self, total_token_count):
+        self.total_token_count = total_token_count
+
+
+class FakeResponse:
+    def __init__(self, total_tokens=None):
+        self.usage_metadata = FakeUsage(total_tokens) if total_tokens is not None else None
+
+
+def make_limiter(**kwargs):
+    """Limiter with explicit settings (no env) and no real backoff sleeps"""
+    settings = {"rpm": 0, "tpm": 0, "initial_concurrency": 4, "max_concurrency": 64, "max_retries": 3, "base_backoff": 0.001}
+    settings.update(kwargs)
+    return AdaptiveRateLimiter(**settings)
+
+
+class TestThrottleDetection:
+    """Test classification of Vertex errors"""
+
+    @pytest.mark.parametrize("error", [
+        google_exceptions.ResourceExhausted("quota"),
+        google_exceptions.TooManyRequests("slow down"),
+        google_exceptions.ServiceUnavailable("overloaded"),
+    ])
+    def test_throttle_errors(self, error):
+        assert is_throttle_error(error)
+
+    @pytest.mark.parametrize("error", [
+        google_exceptions.InvalidArgument("bad pdf"),
+        google_exceptions.PermissionDenied("no access"),
+        ValueError("boom"),
+    ])
+    def test_other_errors(self, error):
+        assert not is_throttle_error(error)
+
+
+class TestAIMD:
+    """Test the additive-increase / multiplicative-decrease controller"""
+
+    def test_additive_increase(self):
+        """Test that a full round of successes raises the limit by about one"""
+        limiter = make_limiter(initial_concurrency=4)
+
+        for _ in range(4):
+            limiter.release(limiter.acquire(), "success")
+
+        assert 4.9 < limiter.limit < 5.0
+
+    def test_multiplicative_decrease_once_per_cooldown(self):
+        """Test that a burst of 429s halves the limit only once"""
+        clock = FakeClock()
+        limiter = make_limiter(initial_concurrency=16, decrease_cooldown=2.0, clock=clock)
+
+        tickets = [limiter.acquire() for _ in range(8)]
+        for ticket in tickets:
+            limiter.release(ticket, "throttled")
+        assert limiter.limit == 8
+
+        clock.now += 2.0
+        limiter.release(limiter.acquire(), "throttled")
+        assert limiter.limit == 4
+        assert limiter.throttled == 9
+
+    def test_limit_bounds(self):
+        """Test that the limit stays within [min, max]"""
+        clock = FakeClock()
+        limiter = make_limiter(initial_concurrency=2, max_concurrency=3, decrease_cooldown=0, clock=clock)
+
+        for _ in range(50):
+            limiter.release(limiter.acquire(), "success")
+        assert limiter.limit == 3
+
+        for _ in range(10):
+            clock.now += 1
+            limiter.release(limiter.acquire(), "throttled")
+        assert limiter.limit == 1
+
+    def test_concurrency_gate(self):
+        """Test that no more than int(limit) requests are admitted at once"""
+        limiter = make_limiter(initial_concurrency=2)
+
+        first, _ = limiter._try_acquire(0)
+        second, _ = limiter._try_acquire(0)
+        third, wait = limiter._try_acquire(0)
+
+        assert first is not None and second is not None
+        assert third is None and wait > 0
+        limiter.release(first, "success")
+        assert limiter._try_acquire(0)[0] is not None
+
+
+class TestBudgets:
+    """Test the sliding-window RPM/TPM budgets"""
+
+    def test_rpm_budget(self):
+        """Test that the (rpm+1)th request waits for the oldest to leave the window"""
+        clock = FakeClock()
+        limiter = make_limiter(rpm=3, clock=clock)
+
+        for _ in range(3):
+            limiter.release(limiter._try_acquire(0)[0], "success")
+            clock.now += 10
+
+        ticket, wait = limiter._try_acquire(0)
+        assert ticket is None
+        assert wait == pytest.approx(WINDOW_SECONDS - 30)
+
+        clock.now += wait
+        assert limiter._try_acquire(0)[0] is not None
+
+    def test_tpm_budget_uses_actual_usage(self):
+        """Test that reported usage replaces the estimate in the TPM window"""
+        clock = FakeClock()
+        limiter = make_limiter(tpm=10000, clock=clock)
+
+        ticket, _ = limiter._try_acquire(8000)
+        assert limiter._try_acquire(3000)[0] is None
+
+        limiter.release(ticket, "success", actual_tokens=2000)
+        assert limiter._try_acquire(3000)[0] is not None
+        assert limiter.stats()["tokens_last_minute"] == 5000
+
+    def test_oversized_request_admitted_when_window_empty(self):
+        """Test that a request larger than the TPM budget cannot deadlock"""
+        limiter = make_limiter(tpm=1000)
+
+        assert limiter._try_acquire(5000)[0] is not None
+
+
+class TestRetry:
+    """Test retry with jittered backoff"""
+
+    def test_throttled_call_retried(self):
+        """Test that throttled attempts are retried until one succeeds"""
+        limiter = make_limiter()
+        attempts = []
+
+        def fn():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise google_exceptions.ResourceExhausted("quota")
+            return FakeResponse(total_tokens=123)
+
+        result = limiter.call(fn, estimated_tokens=500)
+
+        assert isinstance(result, FakeResponse)
+        assert (len(attempts), limiter.retries, limiter.successes) == (3, 2, 1)
+        assert limiter.in_flight == 0
+
+    def test_non_throttle_error_not_retried(self):
+        """Test that other errors are raised immediately"""
+        limiter = make_limiter()
+        attempts = []
+
+        def fn():
+            attempts.append(1)
+            raise google_exceptions.InvalidArgument("bad pdf")
+
+        with pytest.raises(google_exceptions.InvalidArgument):
+            limiter.call(fn)
+        assert len(attempts) == 1
+        assert limiter.errors == 1
+
+    def test_retries_exhausted(self):
+        """Test that the last throttling error is raised after max_retries"""
+        limiter = make_limiter(max_retries=2)
+
+        def fn():
+            raise google_exceptions.ResourceExhausted("quota")
+
+        with pytest.raises(google_exceptions.ResourceExhausted):
+            limiter.call(fn)
+        assert limiter.throttled == 3
+        assert limiter.in_flight == 0
+
+    def test_throttled_attempts_refund_their_tokens(self):
+        """Test that only the successful attempt's tokens stay in the TPM window"""
+        limiter = make_limiter(tpm=10000)
+        attempts = []
+
+        def fn():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise google_exceptions.ResourceExhausted("quota")
+            return FakeResponse(total_tokens=600)
+
+        limiter.call(fn, estimated_tokens=4000)
+
+        assert limiter.stats()["tokens_last_minute"] == 600
+
+    def test_interrupted_call_releases_ticket(self):
+        """Test that a BaseException from fn() still releases the ticket"""
+        limiter = make_limiter(tpm=10000)
+
+        def fn():
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            limiter.call(fn, estimated_tokens=4000)
+        assert limiter.in_flight == 0
+        assert limiter.errors == 0
+        assert limiter.stats()["tokens_last_minute"] == 0
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Test full-jitter backoff bounds"""
+        limiter = make_limiter(base_backoff=1.0, max_backoff=8.0)
+
+        with patch("random.uniform", side_effect=lambda low, high: high) as uniform:
+            assert limiter.backoff_delay(0) == 1.0
+            assert limiter.backoff_delay(2) == 4.0
+            assert limiter.backoff_delay(10) == 8.0
+        assert all(call.args[0] == 0 for call in uniform.call_args_list)
+
+
+class TestConvergence:
+    """Test that throughput settles at a quota ceiling"""
+
+    @pytest.mark.asyncio
+    async def test_settles_at_capacity(self):
+        """Test that concurrency converges near a server's concurrent-request quota"""
+        capacity = 8
+        limiter = make_limiter(initial_concurrency=2, max_concurrency=64, decrease_cooldown=0.02, max_retries=20)
+        state = {"in_flight": 0, "served": 0}
+
+        async def request():
+            state["in_flight"] += 1
+            try:
+                await asyncio.sleep(0.002)
+                if state["in_flight"] > capacity:
+                    raise google_exceptions.ResourceExhausted("429")
+                state["served"] += 1
+                return FakeResponse(total_tokens=10)
+            finally:
+                state["in_flight"] -= 1
+
+        # Three "jobs" sharing the limiter
+        await asyncio.gather(*(limiter.call_async(request) for _ in range(3 * 150)))
+
+        assert state["served"] == 450
+        assert limiter.throttled > 0
+        assert capacity / 2 <= limiter.limit <= capacity * 2
@@ -0,0 +1,772 @@
+"""
+Unit tests for the GO splitter
+"""
+
+import pytest
+import os
+import shutil
+from unittest.mock import patch
+
+from goms_extractor import split_cache
+from goms_extractor import ocr as ocr_module
+from goms_extractor import splitter as splitter_module
+from goms_extractor.split_cache import SplitCache, hash_file, copy_and_hash
+from goms_extractor.boundary_rules import (
+    BoundaryRule,
+    BoundaryRuleEngine,
+    DEFAULT_RULES,
+    GAZETTE_RULES,
+    load_rules,
+)
+from goms_extractor.text_sidecar import read_go_text, read_text_sidecar, text_sidecar_path
+from goms_extractor.ocr import run_selective_ocr, text_layer_quality
+from goms_extractor.splitter import (
+    analyze_page_regex,
+    build_go_index,
+    iter_go_segments,
+    materialize_go_pdf,
+    plan_shards,
+    plan_write_batches,
+    render_go_pdf_bytes,
+    scan_pages_full,
+    scan_pages_header_band,
+    scan_pages_parallel,
+    split_goms,
+    write_go_pdfs,
+)
+from pypdf import PdfReader, PdfWriter, PageObject, Transformation
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SINGLE_GO_PDF = os.path.join(DATA_DIR, "GO_123_Dated_the-14--March--2001.pdf")
+SCANNED_PDF = os.path.join(DATA_DIR, "45-47.pdf")
+
+
+@pytest.fixture(autouse=True)
+def isolated_split_cache(tmp_path):
+    """Point the shared split cache at a per-test directory"""
+    cache = SplitCache(cache_dir=str(tmp_path / "split_cache"))
+    with patch.object(split_cache, '_shared_cache', cache):
+        yield cache
+
+
+class TestBoundaryAnalysis:
+    """Test per-page boundary analysis and index building"""
+
+    def test_analyze_page_regex_start(self):
+        """Test that a GOVERNMENT OF heading marks a GO start"""
+        analysis = analyze_page_regex("GOVERNMENT OF ANDHRA PRADESH\nG.O.Ms.No.123 Dated")
+
+        assert analysis["is_start"] is True
+        assert analysis["goms_no"] == "123"
+
+    def test_analyze_page_regex_continuation(self):
+        """Test that a page without a heading is not a start"""
+        analysis = analyze_page_regex("continued text of the previous order")
+
+        assert analysis["is_start"] is False
+        assert analysis["goms_no"] is None
+
+    def test_build_go_index_start_to_start(self):
+        """Test that GOs are split from one heading to the next"""
+        results = [
+            {"page": 0, "is_start": True, "is_end": False, "goms_no": "10"},
+            {"page": 1, "is_start": False, "is_end": False, "goms_no": None},
+            {"page": 2, "is_start": True, "is_end": False, "goms_no": None},
+        ]
+
+        go_index = build_go_index(results, 4)
+
+        assert go_index == [
+            {"goms_no": "10", "start_page": 0, "end_page": 1},
+            {"goms_no": "Unknown", "start_page": 2, "end_page": 3},
+        ]
+
+
+class TestBoundaryRuleEngine:
+    """Test the compiled boundary rule engine"""
+
+    def test_gazette_rules_detect_every_start_heading(self):
+        """Test that each start rule of the gazette preset is detected by name"""
+        engine = BoundaryRuleEngine(GAZETTE_RULES)
+
+        starts = engine.detect_starts([
+            "GOVERNMENT OF ANDHRA PRADESH",
+            "The Andhra Pradesh Gazette\nPART I EXTRAORDINARY",
+            "G.O.Rt.No. 45 Dated 02-01-2020",
+            "continued text of the previous order",
+        ])
+
+        assert starts == ["government_heading", "ap_gazette_masthead", "gort_heading", None]
+
+    def test_start_heading_outside_header_chars_is_ignored(self):
+        """Test that headings past the header window do not mark a start"""
+        engine = BoundaryRuleEngine(DEFAULT_RULES, header_chars=20)
+
+        assert engine.detect_starts(["x" * 30 + "GOVERNMENT OF"]) == [None]
+
+    def test_metadata_first_match_per_rule(self):
+        """Test that metadata rules return the first capture of each rule"""
+        engine = BoundaryRuleEngine(DEFAULT_RULES)
+
+        metadata = engine.extract_metadata("G.O.Rt.No. 7 ... G.O.Ms.No.12 ... G.O.Ms.No.99")
+
+        assert metadata == {"gort_no": "7", "goms_no": "12"}
+
+    def test_gort_only_page_gets_rt_label(self):
+        """Test that a GO with only a G.O.Rt.No is labelled Rt.<no>"""
+        analysis = analyze_page_regex("GOVERNMENT OF ANDHRA PRADESH\nG.O.Rt.No.45 Dated")
+
+        assert analysis["goms_no"] == "Rt.45"
+        assert analysis["start_rule"] == "government_heading"
+
+    def test_batch_matches_single_page_evaluation(self):
+        """Test that batch evaluation equals evaluating pages one by one"""
+        engine = BoundaryRuleEngine(GAZETTE_RULES)
+        pages = [
+            "GOVERNMENT OF ANDHRA PRADESH G.O.Ms.No.1",
+            "",
+            "body text",
+            "THE ANDHRA PRADESH GAZETTE G.O.Rt.No.2",
+            "GOVERNMENT OF TELANGANA",
+        ]
+
+        assert engine.evaluate_batch(pages) == [engine.evaluate(page) for page in pages]
+
+    def test_invalid_rule_kind_rejected(self):
+        """Test that unknown rule kinds fail at compile time"""
+        with pytest.raises(ValueError):
+            BoundaryRuleEngine([BoundaryRule("bad", "end", "SECTION OFFICER")])
+
+    def test_rules_file(self, tmp_path):
+        """Test loading a rule set from a JSON rules file"""
+        rules_file = tmp_path / "rules.json"
+        rules_file.write_text('[{"name": "notification", "kind": "start", "pattern": "NOTIFICATION"}]')
+
+        rules = load_rules(rules_file=str(rules_file))
+
+        assert rules == [BoundaryRule("notification", "start", "NOTIFICATION")]
+
+
+class TestScanModes:
+    """Test the header-band and full-page scan modes"""
+
+    def test_header_scan_matches_full_scan(self):
+        """Test that the header-band scan finds the same boundaries as the full scan"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        header_results = scan_pages_header_band(SINGLE_GO_PDF)
+        full_results = scan_pages_full(SINGLE_GO_PDF)
+
+        assert header_results == full_results
+        assert header_results[0]["goms_no"] == "123"
+
+    def _compilation(self, path, layout):
+        """PDF of GO_123 start pages ("start"), the same page moved down half a page ("low") and blank pages ("blank")"""
+        start_page = PdfReader(SINGLE_GO_PDF).pages[0]
+        width, height = float(start_page.mediabox.width), float(start_page.mediabox.height)
+        writer = PdfWriter()
+        for kind in layout:
+            if kind == "start":
+                writer.add_page(start_page)
+            elif kind == "low":
+                page = PageObject.create_blank_page(width=width, height=height)
+                page.merge_transformed_page(start_page, Transformation().translate(0, -0.45 * height))
+                writer.add_page(page)
+            else:
+                writer.add_blank_page(width=width, height=height)
+        writer.write(path)
+        return path
+
+    def test_header_scan_matches_full_scan_multi_go(self, tmp_path):
+        """Test that both scans find the same GOs in a compilation with several GOs"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        pdf_path = self._compilation(str(tmp_path / "compilation.pdf"), ["start", "blank", "blank", "start", "start", "blank", "blank"])
+
+        header_index = build_go_index(scan_pages_header_band(pdf_path), 7)
+        full_index = build_go_index(scan_pages_full(pdf_path), 7)
+
+        assert header_index == full_index
+        assert [(go["start_page"], go["end_page"]) for go in header_index] == [(0, 2), (3, 3), (4, 6)]
+
+    def test_heading_below_band_found_by_full_scan_only(self, tmp_path):
+        """Test the known divergence: a heading below the top band is missed by the header scan"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        pdf_path = self._compilation(str(tmp_path / "low.pdf"), ["start", "blank", "low", "blank"])
+
+        header_index = build_go_index(scan_pages_header_band(pdf_path), 4)
+        full_index = build_go_index(scan_pages_full(pdf_path), 4)
+
+        assert [(go["start_page"], go["end_page"]) for go in full_index] == [(0, 1), (2, 3)]
+        assert [(go["start_page"], go["end_page"]) for go in header_index] == [(0, 3)]
+        # A taller band reaches the heading again
+        assert build_go_index(scan_pages_header_band(pdf_path, header_band=0.8), 4) == full_index
+
+    def test_split_goms_header_mode(self, tmp_path):
+        """Test splitting with the default header-band scan"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        result = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path), scan_mode="header")
+
+        assert result["status"] == "success"
+        assert result["go_index"] == [{"goms_no": "123", "start_page": 0, "end_page": 0}]
+        assert result["scan_stats"]["scan_mode"] == "header"
+        assert all(os.path.exists(f) for f in result["split_files"])
+
+    def test_split_goms_invalid_scan_mode(self, tmp_path):
+        """Test that an unknown scan mode is reported as an error"""
+        result = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path), scan_mode="bogus")
+
+        assert result["status"] == "error"
+        assert "scan_mode" in result["message"]
+
+
+class TestParallelScan:
+    """Test process-pool sharded page scanning"""
+
+    def test_plan_shards_small_document(self):
+        """Test that small documents are scanned as a single shard"""
+        assert plan_shards(10, 4) == [(0, 10)]
+        assert plan_shards(1000, 1) == [(0, 1000)]
+
+    def test_plan_shards_covers_all_pages(self):
+        """Test that shards are contiguous and cover every page once"""
+        shards = plan_shards(1000, 4)
+
+        assert len(shards) > 1
+        assert shards[0][0] == 0
+        assert shards[-1][1] == 1000
+        assert all(prev[1] == nxt[0] for prev, nxt in zip(shards, shards[1:]))
+
+    def test_parallel_scan_matches_serial(self, tmp_path):
+        """Test that sharded results are merged back in page order"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        # Build a 60-page document with a GO heading on every page
+        writer = PdfWriter()
+        page = PdfReader(SINGLE_GO_PDF).pages[0]
+        for _ in range(60):
+            writer.add_page(page)
+        big_pdf = str(tmp_path / "big.pdf")
+        writer.write(big_pdf)
+
+        parallel_scan = scan_pages_parallel(big_pdf, 60, workers=2)
+
+        assert parallel_scan["shards"] > 1
+        assert parallel_scan["results"] == scan_pages_header_band(big_pdf)
+
+
+class TestStreamingSplit:
+    """Test the streaming GO segment generator"""
+
+    def test_iter_go_segments_matches_split_goms(self, tmp_path):
+        """Test that streamed segments match the batch split index"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        segments = list(iter_go_segments(SINGLE_GO_PDF, output_dir=str(tmp_path / "stream")))
+        result = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "batch"))
+
+        assert [{k: s[k] for k in ("goms_no", "start_page", "end_page")} for s in segments] == result["go_index"]
+        assert all(os.path.exists(s["split_file"]) for s in segments)
+
+    def test_iter_go_segments_is_lazy(self, tmp_path):
+        """Test that the first segment is yielded before the scan finishes"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        writer = PdfWriter()
+        page = PdfReader(SINGLE_GO_PDF).pages[0]
+        for _ in range(5):
+            writer.add_page(page)
+        multi_pdf = str(tmp_path / "multi.pdf")
+        writer.write(multi_pdf)
+
+        segments = iter_go_segments(multi_pdf, output_dir=str(tmp_path / "out"))
+        first = next(segments)
+
+        assert (first["start_page"], first["end_page"]) == (0, 0)
+        assert len([f for f in os.listdir(tmp_path / "out") if f.endswith(".pdf")]) == 1
+        segments.close()
+
+
+class TestWindowedSplit:
+    """Test the bounded-memory windowed split mode"""
+
+    @pytest.fixture
+    def compilation_pdf(self, tmp_path):
+        """7-page PDF: GO starts on pages 1, 4 and 5"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        start_page = PdfReader(SINGLE_GO_PDF).pages[0]
+        writer = PdfWriter()
+        for is_start in (True, False, False, True, True, False, False):
+            if is_start:
+                writer.add_page(start_page)
+            else:
+                writer.add_blank_page(width=start_page.mediabox.width, height=start_page.mediabox.height)
+        path = str(tmp_path / "compilation.pdf")
+        writer.write(path)
+        return path
+
+    @pytest.mark.parametrize("scan_mode", ["header", "full"])
+    def test_windowed_split_matches_standard(self, tmp_path, compilation_pdf, scan_mode):
+        """Test that windows smaller than the document give the same GOs and files"""
+        standard = split_goms(compilation_pdf, output_dir=str(tmp_path / "standard"), scan_mode=scan_mode, use_cache=False, window_pages=0)
+        windowed = split_goms(compilation_pdf, output_dir=str(tmp_path / "windowed"), scan_mode=scan_mode, use_cache=False, window_pages=3)
+
+        assert windowed["status"] == "success"
+        assert [(go["start_page"], go["end_page"]) for go in windowed["go_index"]] == [(0, 2), (3, 3), (4, 6)]
+        assert windowed["go_index"] == standard["go_index"]
+        assert [os.path.basename(f) for f in windowed["split_files"]] == [os.path.basename(f) for f in standard["split_files"]]
+        assert windowed["memory_stats"]["windows"] == 3
+
+    def test_windowed_streaming_matches_standard(self, tmp_path, compilation_pdf):
+        """Test that iter_go_segments produces the same segments in windowed mode"""
+        standard = list(iter_go_segments(compilation_pdf, output_dir=str(tmp_path / "standard"), use_cache=False))
+        windowed = list(iter_go_segments(compilation_pdf, output_dir=str(tmp_path / "windowed"), use_cache=False, window_pages=2))
+
+        assert [s["end_page"] for s in windowed] == [s["end_page"] for s in standard]
+        assert all(os.path.exists(s["split_file"]) for s in windowed)
+
+    def test_memory_stats_reported(self, tmp_path, compilation_pdf):
+        """Test that the split result reports sampled peak RSS"""
+        result = split_goms(compilation_pdf, output_dir=str(tmp_path), use_cache=False, window_pages=2)
+        stats = result["memory_stats"]
+
+        assert stats["window_pages"] == 2
+        assert stats["peak_rss_mb"] >= stats["start_rss_mb"] > 0
+        assert stats["samples"] > 1
+
+
+class TestSplitWriter:
+    """Test the concurrent split PDF writer stage"""
+
+    @pytest.fixture
+    def go_index(self):
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        return [{"goms_no": str(n), "start_page": 0, "end_page": 0} for n in range(4)]
+
+    def test_plan_write_batches_balances_pages(self):
+        """Test that batches are contiguous and capped by max_pages"""
+        go_index = [{"goms_no": str(n), "start_page": 2 * n, "end_page": 2 * n + 1} for n in range(6)]
+
+        assert plan_write_batches(go_index, 1) == [[0, 1], [2, 3], [4, 5]]
+        assert plan_write_batches(go_index, 4, max_pages=2) == [[0], [1], [2], [3], [4], [5]]
+
+    def test_parallel_write_matches_serial(self, tmp_path, go_index):
+        """Test that worker processes write the same files as the in-process writer"""
+        serial = write_go_pdfs(SINGLE_GO_PDF, go_index, str(tmp_path / "serial"), workers=1)
+        with patch("goms_extractor.splitter.SHARDS_PER_WORKER", 2):
+            parallel = write_go_pdfs(SINGLE_GO_PDF, go_index, str(tmp_path / "parallel"), workers=2)
+
+        assert parallel["write_stats"]["workers"] == 2
+        assert [os.path.basename(f) for f in parallel["split_files"]] == [os.path.basename(f) for f in serial["split_files"]]
+        assert [e["bytes"] for e in parallel["write_stats"]["per_go"]] == [e["bytes"] for e in serial["write_stats"]["per_go"]]
+
+    def test_bytes_reported_per_go(self, tmp_path, go_index):
+        """Test that per-GO bytes match the written file sizes"""
+        result = write_go_pdfs(SINGLE_GO_PDF, go_index, str(tmp_path), optimize=True)
+        stats = result["write_stats"]
+
+        assert stats["optimize"] is True
+        assert [e["bytes"] for e in stats["per_go"]] == [os.path.getsize(f) for f in result["split_files"]]
+        assert stats["total_bytes"] == sum(e["bytes"] for e in stats["per_go"])
+        assert len(PdfReader(result["split_files"][0]).pages) == 1
+
+    def test_split_goms_reports_write_stats(self, tmp_path):
+        """Test that split_goms returns the writer stats"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        result = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path), use_cache=False)
+
+        assert result["write_stats"]["per_go"][0]["bytes"] == os.path.getsize(result["split_files"][0])
+
+
+class TestTextSidecar:
+    """Test the per-GO text sidecars"""
+
+    def test_split_goms_writes_sidecar_per_go(self, tmp_path):
+        """Test that each split PDF gets a JSONL sidecar with its page texts"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        result = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path), use_cache=False)
+        sidecar = result["text_sidecars"][0]
+        pages = read_text_sidecar(sidecar["text_file"])
+
+        assert sidecar["split_file"] == result["split_files"][0]
+        assert sidecar["text_file"] == text_sidecar_path(result["split_files"][0])
+        assert [page["page"] for page in pages] == [0]
+        assert "GOVERNMENT OF" in pages[0]["text"].upper()
+        assert sidecar["chars"] == pages[0]["chars"] > 0
+        assert sidecar["low_text_pages"] == []
+
+    def test_streamed_segments_carry_sidecar(self, tmp_path):
+        """Test that streamed and virtual segments get a sidecar too"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        segments = list(iter_go_segments(SINGLE_GO_PDF, output_dir=str(tmp_path), virtual=True, use_cache=False))
+
+        assert os.path.exists(segments[0]["text_sidecar"]["text_file"])
+        assert not os.path.exists(segments[0]["split_file"])
+        assert "G.O" in read_go_text(segments[0]["text_sidecar"]["text_file"])
+
+    def test_sidecar_flags_pages_without_text(self, tmp_path):
+        """Test that blank pages are listed as low-text pages"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        writer = PdfWriter()
+        writer.add_page(PdfReader(SINGLE_GO_PDF).pages[0])
+        writer.add_blank_page()
+        pdf_path = str(tmp_path / "with_blank.pdf")
+        writer.write(pdf_path)
+
+        result = split_goms(pdf_path, output_dir=str(tmp_path / "out"), use_cache=False, ocr=False)
+
+        assert result["text_sidecars"][0]["low_text_pages"] == [1]
+
+    @pytest.mark.parametrize("write_workers", [1, 2])
+    def test_page_text_extracted_once_with_ocr_check(self, tmp_path, write_workers):
+        """Test that the OCR check's page texts feed the sidecars instead of a second extraction"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        writer = PdfWriter()
+        for _ in range(3):
+            writer.add_page(PdfReader(SINGLE_GO_PDF).pages[0])
+        pdf_path = str(tmp_path / "three_gos.pdf")
+        writer.write(pdf_path)
+        num_pages = 3
+
+        with patch('goms_extractor.ocr.page_text', wraps=ocr_module.page_text) as check_text, \
+             patch('goms_extractor.splitter.page_text', wraps=ocr_module.page_text) as scan_text, \
+             patch('goms_extractor.text_sidecar.page_text', wraps=ocr_module.page_text) as sidecar_text:
+            result = split_goms(pdf_path, output_dir=str(tmp_path / "out"), use_cache=False, write_workers=write_workers)
+
+        assert result["ocr_stats"]["pages_checked"] == num_pages
+        assert check_text.call_count == num_pages
+        assert scan_text.call_count == 0
+        assert sidecar_text.call_count == 0
+        pages = [page for entry in result["text_sidecars"] for page in read_text_sidecar(entry["text_file"])]
+        assert [page["page"] for page in pages] == list(range(num_pages))
+        assert sum(page["chars"] for page in pages) > 0
+
+    def test_sidecar_disabled(self, tmp_path):
+        """Test that text_sidecar=False writes only the PDFs"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        result = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path), use_cache=False, text_sidecar=False)
+
+        assert result["text_sidecars"] == []
+        assert not os.path.exists(text_sidecar_path(result["split_files"][0]))
+
+
+class TestVirtualSplit:
+    """Test manifest-only splitting with lazy PDF materialization"""
+
+    def test_virtual_split_writes_no_files(self, tmp_path):
+        """Test that a virtual split returns a manifest without writing PDFs"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        out_dir = tmp_path / "out"
+        result = split_goms(SINGLE_GO_PDF, output_dir=str(out_dir), virtual=True)
+
+        assert result["status"] == "success"
+        assert result["virtual"] is True
+        assert len(result["manifest"]) == 1
+        assert result["split_files"] == [result["manifest"][0]["split_file"]]
+        assert [f for f in os.listdir(out_dir) if f.endswith(".pdf")] == []
+
+    def test_materialize_go_pdf_is_cached(self, tmp_path):
+        """Test that materializing builds the PDF once and then reuses it"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        entry = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path), virtual=True)["manifest"][0]
+
+        path = materialize_go_pdf(entry)
+        mtime = os.path.getmtime(path)
+
+        assert len(PdfReader(path).pages) == 1
+        assert materialize_go_pdf(entry) == path
+        assert os.path.getmtime(path) == mtime
+        assert render_go_pdf_bytes(entry).startswith(b"%PDF")
+
+
+class TestSplitCache:
+    """Test the content-hash keyed split result cache"""
+
+    def test_repeat_split_is_served_from_cache(self, tmp_path):
+        """Test that a second split of the same bytes skips the scan"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+        with patch('goms_extractor.splitter.scan_pages_header_band') as scan:
+            second = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+
+        scan.assert_not_called()
+        assert first["cache"]["hit"] is False
+        assert second["cache"]["hit"] is True
+        assert second["go_index"] == first["go_index"]
+        assert second["split_files"] == first["split_files"]
+
+    def test_hit_has_the_same_result_keys(self, tmp_path):
+        """Test that a cache hit returns the keys of a cold split, with cached stats"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+        second = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+
+        assert set(second) == set(first)
+        assert second["ocr_stats"]["cached"] is True
+        assert second["write_stats"]["cached"] is True
+        assert second["write_stats"]["total_bytes"] == first["write_stats"]["total_bytes"]
+
+    def test_cached_index_rebuilds_missing_files(self, tmp_path):
+        """Test that deleted split files are rewritten from the cached index"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+        os.remove(first["split_files"][0])
+        second = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+
+        assert second["cache"]["hit"] is True
+        assert os.path.exists(second["split_files"][0])
+
+    def test_overwritten_files_are_not_served(self, tmp_path):
+        """Test that a hit is not served once another split overwrote its files"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+        original = open(first["split_files"][0], "rb").read()
+        # Another gazette writing a GO with the same number and page range
+        with open(first["split_files"][0], "wb") as f:
+            f.write(b"%PDF-1.4 another gazette")
+        second = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+
+        assert second["cache"]["hit"] is True
+        assert "cached" not in second["write_stats"]  # rebuilt from the cached index, not served as-is
+        assert open(second["split_files"][0], "rb").read() == original
+
+    def test_hit_for_another_output_dir_gets_its_own_files(self, tmp_path):
+        """Test that a hit is served in the requested output_dir, not the first job's"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "a"))
+        second = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "b"))
+
+        assert second["scan_stats"]["cached"] is True
+        assert [os.path.dirname(path) for path in second["split_files"]] == [str(tmp_path / "b")]
+        assert [entry["text_file"] for entry in second["text_sidecars"]] == [text_sidecar_path(second["split_files"][0])]
+        shutil.rmtree(tmp_path / "a")
+        assert [os.path.basename(path) for path in second["split_files"]] == [os.path.basename(path) for path in first["split_files"]]
+        assert all(os.path.exists(path) for path in second["split_files"])
+        assert os.path.exists(second["text_sidecars"][0]["text_file"])
+
+    def test_repeat_stream_serves_cached_files(self, tmp_path):
+        """Test that a streaming hit yields the intact split files without writing them"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = list(iter_go_segments(SINGLE_GO_PDF, output_dir=str(tmp_path / "out")))
+        with patch('goms_extractor.splitter.write_go_pdf') as write, \
+             patch('goms_extractor.splitter.iter_pages_header_band') as scan:
+            second = list(iter_go_segments(SINGLE_GO_PDF, output_dir=str(tmp_path / "out")))
+            third = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"))
+
+        write.assert_not_called()
+        scan.assert_not_called()
+        assert second == first
+        assert third["cache"]["hit"] is True
+        assert third["write_stats"]["cached"] is True
+        assert third["split_files"] == [segment["split_file"] for segment in first]
+
+    def test_stream_hit_rebuilds_overwritten_files(self, tmp_path):
+        """Test that a streaming hit rewrites split files another split overwrote"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = list(iter_go_segments(SINGLE_GO_PDF, output_dir=str(tmp_path / "out")))
+        original = open(first[0]["split_file"], "rb").read()
+        with open(first[0]["split_file"], "wb") as f:
+            f.write(b"%PDF-1.4 another gazette")
+        with patch('goms_extractor.splitter.iter_pages_header_band') as scan:
+            second = list(iter_go_segments(SINGLE_GO_PDF, output_dir=str(tmp_path / "out")))
+
+        scan.assert_not_called()
+        assert [segment["split_file"] for segment in second] == [segment["split_file"] for segment in first]
+        assert open(second[0]["split_file"], "rb").read() == original
+
+    def test_cache_hit_skips_text_layer_check(self, tmp_path):
+        """Test that a hit OCRs the recorded pages instead of checking every page again"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        first = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"), virtual=True)
+        with patch('goms_extractor.ocr._check_text_layer') as check:
+            second = split_goms(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"), virtual=True)
+            segments = list(iter_go_segments(SINGLE_GO_PDF, output_dir=str(tmp_path / "out"), virtual=True))
+
+        check.assert_not_called()
+        assert first["ocr_stats"]["pages_checked"] == 1
+        assert second["cache"]["hit"] is True
+        assert second["ocr_stats"]["status"] == "skipped"
+        assert second["manifest"] == first["manifest"]
+        assert len(segments) == len(first["manifest"])
+
+    def test_lru_eviction(self, tmp_path):
+        """Test that the least recently used entries are evicted over the cap"""
+        cache = SplitCache(cache_dir=str(tmp_path / "lru"), max_entries=2)
+        cache.put("a", {"go_index": []})
+        cache.put("b", {"go_index": []})
+        os.utime(os.path.join(cache.cache_dir, "a.json"), (1, 1))
+        os.utime(os.path.join(cache.cache_dir, "b.json"), (2, 2))
+        cache.put("c", {"go_index": []})
+
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
+        assert cache.get("c") is not None
+
+    def test_directory_listed_only_over_cap(self, tmp_path, monkeypatch):
+        """Test that puts under the cap do not list the cache directory"""
+        from goms_extractor import split_cache as split_cache_module
+        cache = SplitCache(cache_dir=str(tmp_path / "count"), max_entries=20)
+        cache.put("first", {"go_index": []})
+
+        listings = []
+        real_listdir = os.listdir
+        monkeypatch.setattr(split_cache_module.os, "listdir",
+                            lambda path: listings.append(path) or real_listdir(path))
+        for i in range(19):
+            cache.put(f"k{i}", {"go_index": []})
+        cache.put("k0", {"go_index": []})
+        assert listings == []
+
+        cache.put("over", {"go_index": []})
+        assert len(listings) == 1
+        assert len(real_listdir(cache.cache_dir)) == 18
+
+    def test_copy_and_hash_matches_hash_file(self, tmp_path):
+        """Test that hashing during a streamed copy matches hashing the file"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        copy_path = tmp_path / "copy.pdf"
+        with open(SINGLE_GO_PDF, "rb") as src, open(copy_path, "wb") as dst:
+            streamed_hash = copy_and_hash(src, dst)
+
+        assert streamed_hash == hash_file(SINGLE_GO_PDF) == hash_file(str(copy_path))
+
+
+@pytest.fixture
+def fake_ocrmypdf(tmp_path, monkeypatch):
+    """Put an ocrmypdf stand-in on PATH that copies its input to its output"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "ocrmypdf"
+    calls = tmp_path / "ocr_calls.log"
+    script.write_text(
+        "#!/bin/sh\n"
+        f"echo \"$@\" >> {calls}\n"
+        "eval input=\\${$(($# - 1))}\n"
+        "eval output=\\${$#}\n"
+        "cp \"$input\" \"$output\"\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return calls
+
+
+class TestSelectiveOcr:
+    """Test the selective per-page OCR stage"""
+
+    def test_text_layer_quality(self):
+        """Test missing, garbled and usable text layers"""
+        assert text_layer_quality("")["reason"] == "missing"
+        assert text_layer_quality("\ufffd\x01\x02" * 30)["reason"] == "garbled"
+        assert text_layer_quality("GOVERNMENT OF ANDHRA PRADESH ABSTRACT Public Services")["needs_ocr"] is False
+
+    def test_text_layer_pages_are_not_ocred(self, tmp_path, fake_ocrmypdf):
+        """Test that a PDF with a usable text layer skips OCR entirely"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+
+        result = run_selective_ocr(SINGLE_GO_PDF, str(tmp_path / "out"), cache_dir=str(tmp_path / "ocr_cache"))
+
+        assert result["status"] == "skipped"
+        assert result["pdf_path"] == SINGLE_GO_PDF
+        assert not fake_ocrmypdf.exists()
+
+    def test_scanned_pages_are_ocred_and_cached(self, tmp_path, fake_ocrmypdf):
+        """Test that image-only pages are OCRed once and then served from cache"""
+        if not os.path.exists(SCANNED_PDF):
+            pytest.skip(f"Test file not found: {SCANNED_PDF}")
+
+        num_pages = len(PdfReader(SCANNED_PDF).pages)
+        first = run_selective_ocr(SCANNED_PDF, str(tmp_path / "out"), workers=2, cache_dir=str(tmp_path / "ocr_cache"))
+        second = run_selective_ocr(SCANNED_PDF, str(tmp_path / "out"), workers=2, cache_dir=str(tmp_path / "ocr_cache"))
+
+        assert first["status"] == "applied"
+        assert first["pages_ocred"] == num_pages
+        assert len(PdfReader(first["pdf_path"]).pages) == num_pages
+        assert second["cache_hits"] == num_pages
+        assert second["pages_ocred"] == 0
+        assert len(fake_ocrmypdf.read_text().splitlines()) == num_pages
+
+    def test_missing_ocrmypdf_falls_back_to_original(self, tmp_path):
+        """Test that pages are left as-is when OCRmyPDF is not installed"""
+        if not os.path.exists(SCANNED_PDF):
+            pytest.skip(f"Test file not found: {SCANNED_PDF}")
+
+        with patch('shutil.which', return_value=None):
+            result = run_selective_ocr(SCANNED_PDF, str(tmp_path / "out"), cache_dir=str(tmp_path / "ocr_cache"))
+
+        assert result["status"] == "unavailable"
+        assert result["pdf_path"] == SCANNED_PDF
+
+    def test_streaming_split_ocrs_batch_by_batch(self, tmp_path, fake_ocrmypdf, isolated_split_cache):
+        """Test that the first streamed GO only waits for OCR of the pages scanned so far"""
+        if not os.path.exists(SINGLE_GO_PDF):
+            pytest.skip(f"Test file not found: {SINGLE_GO_PDF}")
+        # GO starts on pages 1, 4 and 5; the blank pages have no text layer
+        start_page = PdfReader(SINGLE_GO_PDF).pages[0]
+        writer = PdfWriter()
+        for is_start in (True, False, False, True, True, False, False):
+            if is_start:
+                writer.add_page(start_page)
+            else:
+                writer.add_blank_page(width=start_page.mediabox.width, height=start_page.mediabox.height)
+        pdf_path = str(tmp_path / "compilation.pdf")
+        writer.write(pdf_path)
+
+        with patch.object(splitter_module, "SCAN_BATCH_SIZE", 2), \
+             patch.object(ocr_module, "_ocr_pages", wraps=ocr_module._ocr_pages) as ocr_pages:
+            segments = iter_go_segments(pdf_path, output_dir=str(tmp_path / "out"))
+            first = next(segments)
+            ocred_before_first = [entry["page"] for call in ocr_pages.call_args_list for entry in call.args[1]]
+            rest = list(segments)
+        ocred = [entry["page"] for call in ocr_pages.call_args_list for entry in call.args[1]]
+
+        assert ocred_before_first == [1, 2]
+        assert ocred == [1, 2, 5, 6]
+        assert [entry["page"] for entry in first["ocr_pages"]] == [1, 2]
+        assert len(PdfReader(first["split_file"]).pages) == 3
+        assert [segment["start_page"] for segment in rest] == [3, 4]
+        assert "ocr_pages" not in rest[0]
+        cached = isolated_split_cache.get(next(iter(os.listdir(isolated_split_cache.cache_dir))).removesuffix(".json"))
+        assert cached["ocr_pages"] == [1, 2, 5, 6]
+        assert all("ocr_pages" not in go for go in cached["go_index"])